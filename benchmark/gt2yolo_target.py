@@ -0,0 +1,91 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Time the per-box reference and the vectorized Gt2YoloTarget on a crowded
+batch:
+    python benchmark/gt2yolo_target.py --batch_size 16 --num_boxes 200
+"""
+
+import os
+import sys
+import copy
+import time
+import argparse
+
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 2)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+from ppdet.data.transform.batch_operators import Gt2YoloTarget
+from ppdet.modeling.tests.test_yolo_target import (
+    ANCHORS, ANCHOR_MASKS, DOWNSAMPLE_RATIOS, gt2yolotarget_naive,
+    random_samples)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--batch_size', type=int, default=16, help='samples of the batch')
+    parser.add_argument(
+        '--num_boxes',
+        type=int,
+        default=200,
+        help='max number of boxes of a sample')
+    parser.add_argument(
+        '--num_classes', type=int, default=80, help='number of classes')
+    parser.add_argument(
+        '--size', type=int, default=608, help='input size of the batch')
+    parser.add_argument(
+        '--iou_thresh', type=float, default=0.7, help='iou_thresh of the op')
+    parser.add_argument(
+        '--repeat', type=int, default=5, help='repeats of every method')
+    return parser.parse_args()
+
+
+def timeit(fn, samples, repeat):
+    cost = 0.
+    for _ in range(repeat):
+        inputs = copy.deepcopy(samples)
+        tic = time.perf_counter()
+        fn(inputs)
+        cost += time.perf_counter() - tic
+    return cost / repeat * 1000
+
+
+def main():
+    args = parse_args()
+    samples = random_samples(
+        args.batch_size,
+        args.num_boxes,
+        args.num_classes,
+        size=args.size,
+        seed=1)
+    op = Gt2YoloTarget(ANCHORS, ANCHOR_MASKS, DOWNSAMPLE_RATIOS,
+                       args.num_classes, args.iou_thresh)
+
+    def naive(inputs):
+        gt2yolotarget_naive(inputs, ANCHORS, ANCHOR_MASKS, DOWNSAMPLE_RATIOS,
+                            args.num_classes, args.iou_thresh)
+
+    naive_time = timeit(naive, samples, args.repeat)
+    vectorized_time = timeit(op, samples, args.repeat)
+    print('boxes: {}'.format(sum(len(s['gt_bbox']) for s in samples)))
+    print('{:<12} {:>12}'.format('method', 'time (ms)'))
+    print('{:<12} {:>12.3f}'.format('per-box', naive_time))
+    print('{:<12} {:>12.3f}'.format('vectorized', vectorized_time))
+    print('speedup: {:.1f}x'.format(naive_time / vectorized_time))
+
+
+if __name__ == '__main__':
+    main()
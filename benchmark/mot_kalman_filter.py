@@ -0,0 +1,127 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Time the per-track and the batched Kalman filter steps of the MOT trackers:
+    python benchmark/mot_kalman_filter.py --num_tracks 10,100,1000
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 2)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+from ppdet.modeling.mot.motion import kalman_filter
+from ppdet.modeling.mot.motion.ocsort_kalman_filter import OCSORTKalmanFilter
+from ppdet.modeling.mot.tracker.ocsort_tracker import KalmanBoxTracker, convert_bbox_to_z
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--num_tracks',
+        type=str,
+        default='10,100,1000',
+        help='comma separated numbers of tracks')
+    parser.add_argument(
+        '--repeat', type=int, default=20, help='repeats of every step')
+    return parser.parse_args()
+
+
+def timeit(fn, repeat):
+    fn()  # warm up, e.g. compile the numba kernels
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - tic) / repeat * 1000
+
+
+def random_boxes(rng, num):
+    xy = rng.uniform(0, 1000, (num, 2))
+    wh = rng.uniform(20, 100, (num, 2))
+    return np.concatenate(
+        [xy, xy + wh, rng.uniform(0.5, 1, (num, 1))], axis=1)
+
+
+def bench_kalman_filter(num, repeat, rng):
+    kf = kalman_filter.KalmanFilter()
+    boxes = random_boxes(rng, num)
+    xyah = np.concatenate(
+        [(boxes[:, :2] + boxes[:, 2:4]) / 2,
+         ((boxes[:, 2] - boxes[:, 0]) / (boxes[:, 3] - boxes[:, 1]))[:, None],
+         (boxes[:, 3] - boxes[:, 1])[:, None]],
+        axis=1).astype(np.float32)
+    mean, covariance = kf.multi_initiate(xyah)
+    mean, covariance = kf.multi_predict(mean.astype(np.float32), covariance)
+    measurement = xyah + np.float32(1.)
+
+    def loop_update():
+        for i in range(num):
+            kf.update(mean[i], covariance[i], measurement[i])
+
+    def loop_gating():
+        for i in range(num):
+            kf.gating_distance(mean[i], covariance[i], measurement)
+
+    return [('KalmanFilter.update', timeit(loop_update, repeat),
+             timeit(lambda: kf.multi_update(mean, covariance, measurement),
+                    repeat)),
+            ('KalmanFilter.gating_distance', timeit(loop_gating, repeat),
+             timeit(lambda: kf.multi_gating_distance(mean, covariance,
+                                                     measurement), repeat))]
+
+
+def bench_ocsort_kalman_filter(num, repeat, rng):
+    boxes = random_boxes(rng, num)
+    filters = [KalmanBoxTracker(box).kf for box in boxes]
+    zs = [convert_bbox_to_z(box) for box in boxes + 1.]
+    states = [(f.x, f.P) for f in filters]
+
+    def reset():
+        for f, (x, P) in zip(filters, states):
+            f.x, f.P = x, P
+
+    def loop_update():
+        reset()
+        for f, z in zip(filters, zs):
+            f.update(z)
+
+    def multi_update():
+        reset()
+        OCSORTKalmanFilter.multi_update(filters, zs)
+
+    return [('OCSORTKalmanFilter.update', timeit(loop_update, repeat),
+             timeit(multi_update, repeat))]
+
+
+def main():
+    args = parse_args()
+    rng = np.random.RandomState(0)
+    print('numba: {}'.format(kalman_filter.use_numba))
+    print('{:<30} {:>8} {:>12} {:>12} {:>8}'.format(
+        'step', 'tracks', 'loop (ms)', 'batch (ms)', 'speedup'))
+    for num in [int(n) for n in args.num_tracks.split(',')]:
+        results = bench_kalman_filter(num, args.repeat, rng) + \
+            bench_ocsort_kalman_filter(num, args.repeat, rng)
+        for name, loop, batch in results:
+            print('{:<30} {:>8} {:>12.3f} {:>12.3f} {:>7.1f}x'.format(
+                name, num, loop, batch, loop / batch))
+
+
+if __name__ == '__main__':
+    main()
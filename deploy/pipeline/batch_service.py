@@ -0,0 +1,166 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import queue
+import threading
+import numpy as np
+from concurrent.futures import Future
+
+
+def split_batch_outputs(outputs, counts):
+    """
+    Split the outputs of a merged batch back to the requests, `counts` is
+    the number of inputs of every request. Lists and arrays are sliced,
+    dicts are split by value, values not of the batch length are shared.
+    """
+    total = sum(counts)
+    offsets = np.cumsum([0] + list(counts))
+    if isinstance(outputs, dict):
+        splits = [{} for _ in counts]
+        for k, v in outputs.items():
+            if v is not None and not np.isscalar(v) and len(v) == total:
+                for i, split in enumerate(splits):
+                    split[k] = v[offsets[i]:offsets[i + 1]]
+            else:
+                for split in splits:
+                    split[k] = v
+        return splits
+    return [outputs[offsets[i]:offsets[i + 1]] for i in range(len(counts))]
+
+
+class BatchService(object):
+    """
+    Run one model for several callers, e.g. the threads of all cameras.
+    The inputs submitted by the callers are merged into one batch of up
+    to `max_batch_size` items, waiting at most `max_wait` seconds for more
+    requests once the first arrives, and run by a single worker thread, so
+    one predictor is shared without locking and is fed larger batches.
+
+    Args:
+        predict_fn (callable): takes a list of inputs, returns the outputs
+            of the list, which are split by `split_batch_outputs`.
+        max_batch_size (int): max number of inputs in one batch.
+        max_wait (float): max seconds to wait for requests to fill a batch.
+        name (str): name of the worker thread.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait=0.005,
+                 name=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batch_num = 0
+        self.item_num = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, inputs):
+        future = Future()
+        self._queue.put((list(inputs), future))
+        return future
+
+    def __call__(self, inputs):
+        return self.submit(inputs).result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first):
+        requests = [first]
+        size = len(first[0])
+        deadline = time.time() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.time()
+            try:
+                request = self._queue.get(timeout=max(timeout, 0))
+            except queue.Empty:
+                break
+            if request is None:
+                # stop after this batch
+                self._queue.put(None)
+                break
+            requests.append(request)
+            size += len(request[0])
+        return requests
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                break
+            requests = self._collect(request)
+            counts = [len(inputs) for inputs, _ in requests]
+            inputs = [x for inputs, _ in requests for x in inputs]
+            try:
+                if len(inputs) > 0:
+                    outputs = split_batch_outputs(
+                        self.predict_fn(inputs), counts)
+                else:
+                    outputs = [[] for _ in counts]
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+            self.batch_num += 1
+            self.item_num += len(inputs)
+            for (_, future), output in zip(requests, outputs):
+                future.set_result(output)
+
+
+class SharedPredictor(object):
+    """
+    Wrap a predictor of the pipeline to be used by all cameras, calls to
+    `predict_image` and `predict_batch` are batched across cameras by a
+    `BatchService`, other attributes are read from the predictor.
+
+    Args:
+        predictor (object): AttrDetector, KeyPointDetector, ReID, etc.
+        method (str): method of the predictor to batch, 'predict_image' or
+            'predict_batch'.
+        max_batch_size (int): max number of images in one batch.
+        max_wait (float): max seconds to wait for requests to fill a batch.
+    """
+
+    def __init__(self,
+                 predictor,
+                 method='predict_image',
+                 max_batch_size=32,
+                 max_wait=0.005):
+        self.predictor = predictor
+        if method == 'predict_batch':
+            predict_fn = lambda images: predictor.predict_batch(images, batch_size=predictor.batch_size)
+        else:
+            predict_fn = lambda images: predictor.predict_image(images, visual=False)
+        self.service = BatchService(
+            predict_fn,
+            max_batch_size=max_batch_size,
+            max_wait=max_wait,
+            name=type(predictor).__name__)
+
+    def __getattr__(self, name):
+        return getattr(self.predictor, name)
+
+    def predict_image(self, image_list, visual=False):
+        assert not visual, 'visual is not supported by shared predictors'
+        return self.service(image_list)
+
+    def predict_batch(self, imgs):
+        return self.service(imgs)
+
+    def close(self):
+        self.service.close()
@@ -108,6 +108,13 @@ def argsparser():
         help="Whether use mkldnn with CPU.")
     parser.add_argument(
         "--cpu_threads", type=int, default=1, help="Num of threads with CPU.")
+    parser.add_argument(
+        "--share_models",
+        type=ast.literal_eval,
+        default=True,
+        help="Whether all cameras share one predictor of the MOT, "
+        "attribute, keypoint and ReID models and batch their inputs "
+        "across cameras, only for multi-camera input.")
     parser.add_argument(
         "--trt_min_shape", type=int, default=1, help="min_shape for TensorRT.")
     parser.add_argument(
@@ -28,6 +28,7 @@ import queue
 import time
 from collections import defaultdict
 from datacollector import DataCollector, Result
+from batch_service import BatchService, SharedPredictor
 try:
     from collections.abc import Sequence
 except Exception:
@@ -60,7 +61,7 @@ from pphuman.video_action_infer import VideoActionRecognizer
 from pphuman.action_infer import SkeletonActionRecognizer, DetActionRecognizer, ClsActionRecognizer
 from pphuman.action_utils import KeyPointBuff, ActionVisualHelper
 from pphuman.reid import ReID
-from pphuman.mtmct import mtmct_process
+from pphuman.mtmct import mtmct_process, OnlineMTMCT
 
 from ppvehicle.vehicle_plate import PlateRecognizer
 from ppvehicle.vehicle_attr import VehicleAttr
@@ -94,11 +95,37 @@ class Pipeline(object):
         self.input = self._parse_input(args.image_file, args.image_dir,
                                        args.video_file, args.video_dir,
                                        args.camera_id, args.rtsp)
+        self.services = []
+        self.det_service = None
+        self.online_mtmct = None
+        if self.multi_camera and self.enable_mtmct and reid_cfg.get('online',
+                                                                    False):
+            # global ids are assigned while the cameras are processed
+            self.online_mtmct = OnlineMTMCT(
+                threshold=reid_cfg.get('match_thresh', 0.5),
+                window=reid_cfg.get('window', 300),
+                output_file=os.path.join(self.output_dir, 'mtmct_result.txt'))
         if self.multi_camera:
             self.predictor = []
+            shared_models = None
+            if args.share_models:
+                shared_models = self._create_shared_models(args, cfg)
             for name in self.input:
+                shared = None
+                if shared_models is not None:
+                    # tracking state is kept per camera
+                    shared = dict(shared_models)
+                    if 'mot_predictor' in shared:
+                        shared['mot_predictor'] = shared[
+                            'mot_predictor'].clone_for_camera(
+                                self.det_service)
                 predictor_item = PipePredictor(
-                    args, cfg, is_video=True, multi_camera=True)
+                    args,
+                    cfg,
+                    is_video=True,
+                    multi_camera=True,
+                    shared_models=shared,
+                    online_mtmct=self.online_mtmct)
                 predictor_item.set_file_name(name)
                 self.predictor.append(predictor_item)
 
@@ -107,6 +134,56 @@ class Pipeline(object):
             if self.is_video:
                 self.predictor.set_file_name(self.input)
 
+    def _create_shared_models(self, args, cfg):
+        """
+        Load the batchable models once for all cameras, each is run by a
+        service thread which merges the inputs of all camera threads into
+        one batch. The other models are loaded by the PipePredictor of every
+        camera.
+        """
+        get_model_dir(cfg)
+        predictors = {}
+        if is_enabled(cfg, 'ATTR'):
+            predictors['attr_predictor'] = AttrDetector.init_with_cfg(
+                args, cfg['ATTR'])
+        if is_enabled(cfg, 'VEHICLE_ATTR'):
+            predictors['vehicle_attr_predictor'] = VehicleAttr.init_with_cfg(
+                args, cfg['VEHICLE_ATTR'])
+        if is_enabled(cfg, 'SKELETON_ACTION'):
+            predictors['kpt_predictor'] = create_kpt_predictor(args,
+                                                               cfg['KPT'])
+
+        shared_models = {}
+        for name, predictor in predictors.items():
+            shared_models[name] = SharedPredictor(predictor)
+            self.services.append(shared_models[name].service)
+        if is_enabled(cfg, 'REID'):
+            shared_models['reid_predictor'] = SharedPredictor(
+                ReID.init_with_cfg(args, cfg['REID']), method='predict_batch')
+            self.services.append(shared_models['reid_predictor'].service)
+        if any(
+                is_enabled(cfg, name)
+                for name, mode in PipePredictor.basemode.items()
+                if mode in ['idbased', 'skeletonbased']):
+            # one frame of every camera in a batch, the predictor is built
+            # for this batch size
+            mot_predictor = create_mot_predictor(
+                args, cfg['MOT'], det_batch_size=len(self.input))
+            self.det_service = BatchService(
+                mot_predictor.predict_det_batch,
+                max_batch_size=mot_predictor.batch_size,
+                name='mot_predictor')
+            self.services.append(self.det_service)
+            shared_models['mot_predictor'] = mot_predictor
+        return shared_models
+
+    def close(self):
+        for service in self.services:
+            service.close()
+        self.services = []
+        if self.online_mtmct is not None:
+            self.online_mtmct.close()
+
     def _parse_input(self, image_file, image_dir, video_file, video_dir,
                      camera_id, rtsp):
 
@@ -177,7 +254,8 @@ class Pipeline(object):
                 collector_data = predictor.get_result()
                 multi_res.append(collector_data)
 
-            if self.enable_mtmct:
+            self.close()
+            if self.enable_mtmct and self.online_mtmct is None:
                 mtmct_process(
                     multi_res,
                     self.input,
@@ -191,11 +269,13 @@ class Pipeline(object):
     def run(self):
         if self.multi_camera:
             multi_res = []
-            for predictor, input in zip(self.predictor, self.input):
-                predictor.run(input)
+            for idx, (predictor,
+                      input) in enumerate(zip(self.predictor, self.input)):
+                predictor.run(input, idx)
                 collector_data = predictor.get_result()
                 multi_res.append(collector_data)
-            if self.enable_mtmct:
+            self.close()
+            if self.enable_mtmct and self.online_mtmct is None:
                 mtmct_process(
                     multi_res,
                     self.input,
@@ -206,6 +286,48 @@ class Pipeline(object):
             self.predictor.run(self.input)
 
 
+def is_enabled(cfg, name):
+    return cfg.get(name, False)['enable'] if cfg.get(name, False) else False
+
+
+def create_kpt_predictor(args, kpt_cfg):
+    return KeyPointDetector(
+        kpt_cfg['model_dir'],
+        args.device,
+        args.run_mode,
+        kpt_cfg['batch_size'],
+        args.trt_min_shape,
+        args.trt_max_shape,
+        args.trt_opt_shape,
+        args.trt_calib_mode,
+        args.cpu_threads,
+        args.enable_mkldnn,
+        use_dark=False)
+
+
+def create_mot_predictor(args, mot_cfg, det_batch_size=None):
+    return SDE_Detector(
+        mot_cfg['model_dir'],
+        mot_cfg['tracker_config'],
+        args.device,
+        args.run_mode,
+        mot_cfg['batch_size'],
+        args.trt_min_shape,
+        args.trt_max_shape,
+        args.trt_opt_shape,
+        args.trt_calib_mode,
+        args.cpu_threads,
+        args.enable_mkldnn,
+        skip_frame_num=mot_cfg.get('skip_frame_num', -1),
+        draw_center_traj=args.draw_center_traj,
+        secs_interval=args.secs_interval,
+        do_entrance_counting=args.do_entrance_counting,
+        do_break_in_counting=args.do_break_in_counting,
+        region_type=args.region_type,
+        region_polygon=args.region_polygon,
+        det_batch_size=det_batch_size)
+
+
 def get_model_dir(cfg):
     """ 
         Auto download inference model if the model_path is pedestrian_output_csv url link. 
@@ -269,9 +391,36 @@ class PipePredictor(object):
         is_video (bool): whether the input is video, default as False
         multi_camera (bool): whether to use multi camera in pipeline, 
             default as False
+        shared_models (dict): predictors shared with other cameras, used
+            instead of loading the model, keyed by the attribute name, e.g.
+            'mot_predictor', default as None
+        online_mtmct (OnlineMTMCT): service shared with other cameras to
+            assign the MTMCT global ids online, the ReID features are not
+            collected for `mtmct_process` if set, default as None
     """
 
-    def __init__(self, args, cfg, is_video=True, multi_camera=False):
+    # the input each module is based on
+    basemode = {
+        "MOT": "idbased",
+        "ATTR": "idbased",
+        "VIDEO_ACTION": "videobased",
+        "SKELETON_ACTION": "skeletonbased",
+        "ID_BASED_DETACTION": "idbased",
+        "ID_BASED_CLSACTION": "idbased",
+        "REID": "idbased",
+        "VEHICLE_PLATE": "idbased",
+        "VEHICLE_ATTR": "idbased",
+        "VEHICLE_PRESSING": "idbased",
+        "VEHICLE_RETROGRADE": "idbased",
+    }
+
+    def __init__(self,
+                 args,
+                 cfg,
+                 is_video=True,
+                 multi_camera=False,
+                 shared_models=None,
+                 online_mtmct=None):
         # general module for pphuman and ppvehicle
         self.with_mot = cfg.get('MOT', False)['enable'] if cfg.get(
             'MOT', False) else False
@@ -308,6 +457,7 @@ class PipePredictor(object):
             print('IDBASED Classification Action Recognition enabled')
         if self.with_mtmct:
             print("MTMCT enabled")
+        self.online_mtmct = online_mtmct
 
         # only for ppvehicle
         self.with_vehicleplate = cfg.get(
@@ -341,20 +491,6 @@ class PipePredictor(object):
             "skeletonbased": False
         }
 
-        self.basemode = {
-            "MOT": "idbased",
-            "ATTR": "idbased",
-            "VIDEO_ACTION": "videobased",
-            "SKELETON_ACTION": "skeletonbased",
-            "ID_BASED_DETACTION": "idbased",
-            "ID_BASED_CLSACTION": "idbased",
-            "REID": "idbased",
-            "VEHICLE_PLATE": "idbased",
-            "VEHICLE_ATTR": "idbased",
-            "VEHICLE_PRESSING": "idbased",
-            "VEHICLE_RETROGRADE": "idbased",
-        }
-
         self.is_video = is_video
         self.multi_camera = multi_camera
         self.cfg = cfg
@@ -375,6 +511,7 @@ class PipePredictor(object):
         self.collector = DataCollector()
 
         self.pushurl = args.pushurl
+        shared_models = shared_models or {}
 
         # auto download inference model
         get_model_dir(self.cfg)
@@ -389,14 +526,22 @@ class PipePredictor(object):
             attr_cfg = self.cfg['ATTR']
             basemode = self.basemode['ATTR']
             self.modebase[basemode] = True
-            self.attr_predictor = AttrDetector.init_with_cfg(args, attr_cfg)
+            if 'attr_predictor' in shared_models:
+                self.attr_predictor = shared_models['attr_predictor']
+            else:
+                self.attr_predictor = AttrDetector.init_with_cfg(args,
+                                                                 attr_cfg)
 
         if self.with_vehicle_attr:
             vehicleattr_cfg = self.cfg['VEHICLE_ATTR']
             basemode = self.basemode['VEHICLE_ATTR']
             self.modebase[basemode] = True
-            self.vehicle_attr_predictor = VehicleAttr.init_with_cfg(
-                args, vehicleattr_cfg)
+            if 'vehicle_attr_predictor' in shared_models:
+                self.vehicle_attr_predictor = shared_models[
+                    'vehicle_attr_predictor']
+            else:
+                self.vehicle_attr_predictor = VehicleAttr.init_with_cfg(
+                    args, vehicleattr_cfg)
 
         if self.with_vehicle_press:
             vehiclepress_cfg = self.cfg['VEHICLE_PRESSING']
@@ -451,21 +596,11 @@ class PipePredictor(object):
                 self.skeleton_action_visual_helper = ActionVisualHelper(
                     display_frames)
 
-                kpt_cfg = self.cfg['KPT']
-                kpt_model_dir = kpt_cfg['model_dir']
-                kpt_batch_size = kpt_cfg['batch_size']
-                self.kpt_predictor = KeyPointDetector(
-                    kpt_model_dir,
-                    args.device,
-                    args.run_mode,
-                    kpt_batch_size,
-                    args.trt_min_shape,
-                    args.trt_max_shape,
-                    args.trt_opt_shape,
-                    args.trt_calib_mode,
-                    args.cpu_threads,
-                    args.enable_mkldnn,
-                    use_dark=False)
+                if 'kpt_predictor' in shared_models:
+                    self.kpt_predictor = shared_models['kpt_predictor']
+                else:
+                    self.kpt_predictor = create_kpt_predictor(args,
+                                                              self.cfg['KPT'])
                 self.kpt_buff = KeyPointBuff(skeleton_action_frames)
 
             if self.with_vehicleplate:
@@ -479,7 +614,10 @@ class PipePredictor(object):
                 reid_cfg = self.cfg['REID']
                 basemode = self.basemode['REID']
                 self.modebase[basemode] = True
-                self.reid_predictor = ReID.init_with_cfg(args, reid_cfg)
+                if 'reid_predictor' in shared_models:
+                    self.reid_predictor = shared_models['reid_predictor']
+                else:
+                    self.reid_predictor = ReID.init_with_cfg(args, reid_cfg)
 
             if self.with_vehicle_retrograde:
                 vehicleretrograde_cfg = self.cfg['VEHICLE_RETROGRADE']
@@ -490,32 +628,14 @@ class PipePredictor(object):
 
             if self.with_mot or self.modebase["idbased"] or self.modebase[
                     "skeletonbased"]:
-                mot_cfg = self.cfg['MOT']
-                model_dir = mot_cfg['model_dir']
-                tracker_config = mot_cfg['tracker_config']
-                batch_size = mot_cfg['batch_size']
-                skip_frame_num = mot_cfg.get('skip_frame_num', -1)
                 basemode = self.basemode['MOT']
                 self.modebase[basemode] = True
-                self.mot_predictor = SDE_Detector(
-                    model_dir,
-                    tracker_config,
-                    args.device,
-                    args.run_mode,
-                    batch_size,
-                    args.trt_min_shape,
-                    args.trt_max_shape,
-                    args.trt_opt_shape,
-                    args.trt_calib_mode,
-                    args.cpu_threads,
-                    args.enable_mkldnn,
-                    skip_frame_num=skip_frame_num,
-                    draw_center_traj=self.draw_center_traj,
-                    secs_interval=self.secs_interval,
-                    do_entrance_counting=self.do_entrance_counting,
-                    do_break_in_counting=self.do_break_in_counting,
-                    region_type=self.region_type,
-                    region_polygon=self.region_polygon)
+                if 'mot_predictor' in shared_models:
+                    # a per-camera copy with its own tracker
+                    self.mot_predictor = shared_models['mot_predictor']
+                else:
+                    self.mot_predictor = create_mot_predictor(args,
+                                                              self.cfg['MOT'])
 
             if self.with_video_action:
                 video_action_cfg = self.cfg['VIDEO_ACTION']
@@ -976,9 +1096,17 @@ class PipePredictor(object):
                         "qualities": img_qualities,
                         "rects": rects
                     }
-                    self.pipeline_res.update(reid_res_dict, 'reid')
+                    if self.online_mtmct is not None:
+                        self.online_mtmct.update(thread_idx,
+                                                 frame_id / max(video_fps, 1),
+                                                 reid_res_dict)
+                    else:
+                        self.pipeline_res.update(reid_res_dict, 'reid')
                 else:
                     self.pipeline_res.clear('reid')
+                if self.online_mtmct is not None:
+                    self.online_mtmct.record(thread_idx, frame_id,
+                                             mot_res['boxes'])
 
             if self.with_video_action:
                 # get the params
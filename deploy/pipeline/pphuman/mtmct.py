@@ -18,7 +18,9 @@ import os
 import re
 import cv2
 import gc
+import threading
 import numpy as np
+from collections import deque
 try:
     from sklearn import preprocessing
     from sklearn.cluster import AgglomerativeClustering
@@ -379,3 +381,237 @@ def mtmct_process(multi_res, captures, mtmct_vis=True, output_dir="output"):
             captures,
             output_dir=output_dir,
             multi_res=cid_tid_dict)
+
+
+class TrackFeatureIndex(object):
+    """
+    Nearest neighbour index of the mean ReID features of the tracks of all
+    cameras, searched by brute force cosine distance. The features live in a
+    preallocated matrix indexed by slot and the slots of the removed tracks
+    are reused, so that its memory is bounded by the tracks kept at a time.
+
+    Args:
+        capacity (int): initial number of slots, grown when full.
+    """
+
+    def __init__(self, capacity=256):
+        self.feats = None
+        self.cid = np.zeros(capacity, dtype=np.int64)
+        self.gid = np.zeros(capacity, dtype=np.int64)
+        self.valid = np.zeros(capacity, dtype=bool)
+        self.slots = {}
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _grow(self):
+        capacity = len(self.valid)
+        for name in ['feats', 'cid', 'gid', 'valid']:
+            array = getattr(self, name)
+            if array is None:
+                continue
+            grown = np.zeros(
+                (capacity * 2, ) + array.shape[1:], dtype=array.dtype)
+            grown[:capacity] = array
+            setattr(self, name, grown)
+        self._free = list(range(capacity * 2 - 1, capacity - 1,
+                                -1)) + self._free
+
+    def add(self, key, feat, gid):
+        """Add or update the feature of the track `key` of (cid, tid)."""
+        slot = self.slots.get(key)
+        if slot is None:
+            if len(self._free) == 0:
+                self._grow()
+            slot = self._free.pop()
+            self.slots[key] = slot
+        if self.feats is None:
+            self.feats = np.zeros(
+                (len(self.valid), len(feat)), dtype=np.float32)
+        self.feats[slot] = feat
+        self.cid[slot] = key[0]
+        self.gid[slot] = gid
+        self.valid[slot] = True
+
+    def remove(self, keys):
+        for key in keys:
+            slot = self.slots.pop(key, None)
+            if slot is not None:
+                self.valid[slot] = False
+                self._free.append(slot)
+
+    def search(self, feat):
+        """
+        Cosine distances of the normalized `feat` to the features of the
+        index, with the cameras and the global ids of their tracks.
+        """
+        slots = np.nonzero(self.valid)[0]
+        if len(slots) == 0:
+            return np.zeros(0), self.cid[slots], self.gid[slots]
+        dists = 1. - self.feats[slots].dot(feat)
+        return dists, self.cid[slots], self.gid[slots]
+
+
+class OnlineMTMCT(object):
+    """
+    MTMCT which assigns the global ids while the videos are processed,
+    instead of clustering all the tracks after the videos as `mtmct_process`.
+    The camera threads feed the ReID results of their frames, the mean
+    feature of a track is distilled from its latest features as
+    `distill_idfeat` and kept in a TrackFeatureIndex. A new track joins the
+    global id whose tracks are all in other cameras and within `threshold`
+    cosine distance, the complete linkage of `get_labels`, or starts a new
+    one. The tracks not updated for `window` seconds of their camera are
+    removed, so that the memory is bounded over long videos. Every camera
+    has its own clock, the cameras may start at different times or fall
+    behind the others.
+
+    Args:
+        threshold (float): max cosine distance of the tracks of a global id.
+        window (float): seconds to keep the tracks not updated.
+        min_features (int): features of a track before its global id is
+            assigned.
+        max_features (int): latest features kept per track.
+        output_file (str): file to write the results of `record` to, in the
+            format of `gen_restxt`, default as None to not write.
+    """
+
+    def __init__(self,
+                 threshold=0.5,
+                 window=300.,
+                 min_features=2,
+                 max_features=20,
+                 output_file=None):
+        self.threshold = threshold
+        self.window = window
+        self.min_features = min_features
+        self.max_features = max_features
+        self.index = TrackFeatureIndex()
+        self.tracks = {}
+        self.next_gid = 1
+        # latest timestamp of every camera
+        self.now = {}
+        self._lock = threading.Lock()
+        self._file = None
+        if output_file is not None:
+            output_dir = os.path.dirname(output_file)
+            if output_dir and not os.path.exists(output_dir):
+                os.makedirs(output_dir)
+            self._file = open(output_file, 'w')
+
+    def _evict(self, cid):
+        before = self.now[cid] - self.window
+        stale = [
+            key for key, track in self.tracks.items()
+            if key[0] == cid and track['last_time'] < before
+        ]
+        for key in stale:
+            del self.tracks[key]
+        self.index.remove(stale)
+
+    def _assign(self, cid, feat):
+        dists, cids, gids = self.index.search(feat)
+        if len(gids) > 0:
+            # complete linkage, the max distance to the tracks of a global id
+            uniq, inverse = np.unique(gids, return_inverse=True)
+            max_dists = np.zeros(len(uniq))
+            np.maximum.at(max_dists, inverse, dists)
+            # tracks of the same camera are never merged
+            max_dists[np.isin(uniq, gids[cids == cid])] = np.inf
+            best = np.argmin(max_dists)
+            if max_dists[best] < self.threshold:
+                return int(uniq[best])
+        gid = self.next_gid
+        self.next_gid += 1
+        return gid
+
+    def update(self, cid, timestamp, reid_res):
+        """
+        Feed the ReID results of a frame of a camera.
+
+        Args:
+            cid (int): id of the camera.
+            timestamp (float): time of the frame in seconds, on the clock of
+                the camera.
+            reid_res (dict): 'features', 'qualities' and 'rects' of the
+                tracks in the frame, as the 'reid' result of PipePredictor.
+
+        Returns:
+            Dict of the global ids of the tracks of the frame which have one,
+            keyed by track id.
+        """
+        gids = {}
+        with self._lock:
+            self.now[cid] = max(self.now.get(cid, timestamp), timestamp)
+            self._evict(cid)
+            for feat, quality, rect in zip(reid_res['features'],
+                                           reid_res['qualities'],
+                                           reid_res['rects']):
+                tid = int(rect[0])
+                key = (cid, tid)
+                track = self.tracks.get(key)
+                if track is None:
+                    track = {
+                        'features': deque(maxlen=self.max_features),
+                        'qualities': deque(maxlen=self.max_features),
+                        'rects': deque(maxlen=self.max_features),
+                        'gid': None
+                    }
+                    self.tracks[key] = track
+                track['features'].append(feat)
+                track['qualities'].append(quality)
+                track['rects'].append([rect[2:]])
+                track['last_time'] = timestamp
+                if len(track['features']) < self.min_features:
+                    continue
+
+                mean_feat = distill_idfeat({
+                    'features': list(track['features']),
+                    'qualities': list(track['qualities']),
+                    'rects': list(track['rects'])
+                })
+                mean_feat = mean_feat / max(np.linalg.norm(mean_feat), 1e-12)
+                if track['gid'] is None:
+                    track['gid'] = self._assign(cid, mean_feat)
+                self.index.add(key, mean_feat, track['gid'])
+                gids[tid] = track['gid']
+        return gids
+
+    def get_gid(self, cid, tid):
+        """Global id of a track, None if not assigned."""
+        with self._lock:
+            track = self.tracks.get((cid, tid))
+            return None if track is None else track['gid']
+
+    def record(self, cid, frame_id, boxes):
+        """
+        Write the boxes of a frame of a camera with the global ids of their
+        tracks, the boxes of the tracks without global id are skipped.
+
+        Args:
+            cid (int): id of the camera.
+            frame_id (int): id of the frame.
+            boxes (np.ndarray): tracking results of the frame, in the format
+                of 'id, class, score, xmin, ymin, xmax, ymax'.
+        """
+        if self._file is None:
+            return
+        with self._lock:
+            for box in boxes:
+                track = self.tracks.get((cid, int(box[0])))
+                if track is None or track['gid'] is None:
+                    continue
+                xmin, ymin, xmax, ymax = box[3:7]
+                rect = [
+                    max(int(x), 0)
+                    for x in [xmin, ymin, xmax - xmin, ymax - ymin]
+                ]
+                self._file.write('{} {} {} {}\n'.format(
+                    cid + 1, track['gid'], frame_id + 1, ' '.join(
+                        map(str, rect))))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,158 @@
+#   Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+
+import unittest
+
+# add the paths of deploy and deploy/pipeline as pipeline.py does
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+for path in [parent_path, os.path.join(parent_path, 'pipeline')]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import tempfile
+import numpy as np
+from pphuman.mtmct import TrackFeatureIndex, OnlineMTMCT
+
+
+def unit(*values):
+    feat = np.array(values, dtype=np.float32)
+    return feat / np.linalg.norm(feat)
+
+
+def reid_res(tids, feats):
+    return {
+        'features': list(feats),
+        'qualities': [0.9] * len(tids),
+        'rects': [
+            np.array([tid, 0, 0.9, 10, 10, 60, 160], dtype=np.float32)
+            for tid in tids
+        ]
+    }
+
+
+class TestTrackFeatureIndex(unittest.TestCase):
+    def test_grow(self):
+        index = TrackFeatureIndex(capacity=2)
+        feats = np.eye(5, dtype=np.float32)
+        for i in range(5):
+            index.add((i % 2, i), feats[i], gid=i + 1)
+        self.assertEqual(len(index), 5)
+        self.assertGreaterEqual(len(index.valid), 5)
+        dists, cids, gids = index.search(feats[3])
+        self.assertEqual(gids[np.argmin(dists)], 4)
+        self.assertEqual(cids[np.argmin(dists)], 1)
+        np.testing.assert_allclose(np.sort(dists), [0, 1, 1, 1, 1])
+
+    def test_reuse(self):
+        index = TrackFeatureIndex(capacity=4)
+        feats = np.eye(3, dtype=np.float32)
+        for i in range(3):
+            index.add((0, i), feats[i], gid=i + 1)
+        slot = index.slots[(0, 1)]
+        index.remove([(0, 1)])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(len(index.search(feats[0])[0]), 2)
+        index.add((1, 7), feats[1], gid=9)
+        self.assertEqual(index.slots[(1, 7)], slot)
+        self.assertEqual(len(index.valid), 4)
+        # updating a track keeps its slot
+        index.add((1, 7), feats[2], gid=9)
+        self.assertEqual(index.slots[(1, 7)], slot)
+        self.assertEqual(len(index), 3)
+
+
+class TestOnlineMTMCT(unittest.TestCase):
+    def test_cross_camera(self):
+        mtmct = OnlineMTMCT(min_features=2)
+        feats = [unit(1, 0, 0), unit(0, 1, 0)]
+        # no global id before min_features
+        self.assertEqual(mtmct.update(0, 0., reid_res([1, 2], feats)), {})
+        gids = mtmct.update(0, 1., reid_res([1, 2], feats))
+        self.assertEqual(len(set(gids.values())), 2)
+        for cid in [1, 2]:
+            for t in range(2):
+                other = mtmct.update(cid, t, reid_res([5, 6], feats))
+            self.assertEqual(other, {5: gids[1], 6: gids[2]})
+
+    def test_same_camera(self):
+        mtmct = OnlineMTMCT(min_features=1)
+        feat = unit(1, 0, 0)
+        gids = mtmct.update(0, 0., reid_res([1, 2], [feat, feat]))
+        self.assertNotEqual(gids[1], gids[2])
+        # a third camera cannot join both, it joins the first one
+        gids3 = mtmct.update(1, 0., reid_res([1], [feat]))
+        self.assertEqual(gids3[1], gids[1])
+
+    def test_complete_linkage(self):
+        mtmct = OnlineMTMCT(threshold=0.5, min_features=1)
+        a, b, c = unit(1, 0), unit(1, 1), unit(0, 1)
+        gid_a = mtmct.update(0, 0., reid_res([1], [a]))[1]
+        gid_b = mtmct.update(1, 0., reid_res([1], [b]))[1]
+        self.assertEqual(gid_a, gid_b)
+        # c is within the threshold of b but not of a
+        gid_c = mtmct.update(2, 0., reid_res([1], [c]))[1]
+        self.assertNotEqual(gid_c, gid_a)
+        # the global id of a track is kept
+        self.assertEqual(mtmct.update(1, 1., reid_res([1], [c]))[1], gid_b)
+
+    def test_eviction(self):
+        mtmct = OnlineMTMCT(window=10., min_features=1)
+        feat = unit(1, 0)
+        gid = mtmct.update(0, 0., reid_res([1], [feat]))[1]
+        mtmct.update(0, 5., reid_res([2], [unit(0, 1)]))
+        self.assertEqual(mtmct.get_gid(0, 1), gid)
+        mtmct.update(0, 12., reid_res([2], [unit(0, 1)]))
+        self.assertIsNone(mtmct.get_gid(0, 1))
+        self.assertEqual(len(mtmct.index), 1)
+        # the evicted track does not match the later tracks
+        self.assertNotEqual(
+            mtmct.update(1, 12., reid_res([1], [feat]))[1], gid)
+
+    def test_offset_clocks(self):
+        mtmct = OnlineMTMCT(window=60., min_features=1)
+        feat = unit(1, 0)
+        # camera 0 runs for an hour before camera 1 starts at its time 0
+        for t in range(0, 3600, 10):
+            gids = mtmct.update(0, float(t), reid_res([1], [feat]))
+        gid = gids[1]
+        # the first track of camera 1 is not evicted by the clock of
+        # camera 0 and joins the track of camera 0
+        self.assertEqual(mtmct.update(1, 0., reid_res([3], [feat]))[3], gid)
+        self.assertEqual(mtmct.update(1, 1., reid_res([4], [unit(0, 1)])),
+                         {4: gid + 1})
+        self.assertEqual(mtmct.get_gid(1, 3), gid)
+        # camera 1 falling behind does not evict the tracks of camera 0
+        self.assertEqual(mtmct.get_gid(0, 1), gid)
+
+    def test_record(self):
+        output_file = os.path.join(tempfile.mkdtemp(), 'mtmct_result.txt')
+        mtmct = OnlineMTMCT(min_features=1, output_file=output_file)
+        res = reid_res([1], [unit(1, 0)])
+        gid = mtmct.update(0, 0., res)[1]
+        boxes = np.stack(res['rects'] + [
+            np.array([2, 0, 0.9, 0, 0, 5, 5], dtype=np.float32)
+        ])
+        mtmct.record(0, 4, boxes)
+        mtmct.close()
+        with open(output_file) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines, ['1 {} 5 10 10 50 150'.format(gid)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import os
+import copy
 import time
 import yaml
 import cv2
@@ -78,6 +79,9 @@ class SDE_Detector(Detector):
             the video should be taken by a static camera.
         reid_model_dir (str): reid model dir, default None for ByteTrack, but set for DeepSORT
         mtmct_dir (str): MTMCT dir, default None, set for doing MTMCT
+        det_batch_size (int): batch size the detection predictor is built
+            for, the frames of several cameras are detected in one batch by
+            `predict_det_batch`, default None as batch_size
     """
 
     def __init__(self,
@@ -105,12 +109,13 @@ class SDE_Detector(Detector):
                  region_type='horizontal',
                  region_polygon=[],
                  reid_model_dir=None,
-                 mtmct_dir=None):
+                 mtmct_dir=None,
+                 det_batch_size=None):
         super(SDE_Detector, self).__init__(
             model_dir=model_dir,
             device=device,
             run_mode=run_mode,
-            batch_size=batch_size,
+            batch_size=det_batch_size or batch_size,
             trt_min_shape=trt_min_shape,
             trt_max_shape=trt_max_shape,
             trt_opt_shape=trt_opt_shape,
@@ -164,7 +169,6 @@ class SDE_Detector(Detector):
         assert tracker_config is not None, 'Note that tracker_config should be set.'
         self.tracker_config = tracker_config
         tracker_cfg = yaml.safe_load(open(self.tracker_config))
-        cfg = tracker_cfg[tracker_cfg['type']]
 
         # tracker config
         self.use_deepsort_tracker = True if tracker_cfg[
@@ -174,6 +178,17 @@ class SDE_Detector(Detector):
         self.use_botsort_tracker = True if tracker_cfg[
             'type'] == 'BOTSORTTracker' else False
 
+        self.tracker = self.create_tracker()
+        # shared batched detection used by multi-camera pipelines
+        self.det_service = None
+
+        self.do_mtmct = False if mtmct_dir is None else True
+        self.mtmct_dir = mtmct_dir
+
+    def create_tracker(self):
+        tracker_cfg = yaml.safe_load(open(self.tracker_config))
+        cfg = tracker_cfg[tracker_cfg['type']]
+
         if self.use_deepsort_tracker:
             if self.reid_pred_config is not None and hasattr(
                     self.reid_pred_config, 'tracker'):
@@ -185,7 +200,7 @@ class SDE_Detector(Detector):
             min_box_area = cfg.get('min_box_area', 0)
             vertical_ratio = cfg.get('vertical_ratio', 0)
 
-            self.tracker = DeepSORTTracker(
+            tracker = DeepSORTTracker(
                 budget=budget,
                 max_age=max_age,
                 max_iou_distance=max_iou_distance,
@@ -205,7 +220,7 @@ class SDE_Detector(Detector):
             use_byte = cfg.get('use_byte', False)
             use_angle_cost = cfg.get('use_angle_cost', False)
 
-            self.tracker = OCSORTTracker(
+            tracker = OCSORTTracker(
                 det_thresh=det_thresh,
                 max_age=max_age,
                 min_hits=min_hits,
@@ -226,7 +241,7 @@ class SDE_Detector(Detector):
             camera_motion = cfg.get('camera_motion', False)
             cmc_method = cfg.get('cmc_method', 'sparseOptFlow')
 
-            self.tracker = BOTSORTTracker(
+            tracker = BOTSORTTracker(
                 track_high_thresh=track_high_thresh,
                 track_low_thresh=track_low_thresh,
                 new_track_thresh=new_track_thresh,
@@ -245,7 +260,7 @@ class SDE_Detector(Detector):
             conf_thres = cfg.get('conf_thres', 0.6)
             low_conf_thres = cfg.get('low_conf_thres', 0.1)
 
-            self.tracker = JDETracker(
+            tracker = JDETracker(
                 use_byte=use_byte,
                 det_thresh=det_thresh,
                 num_classes=self.num_classes,
@@ -254,9 +269,41 @@ class SDE_Detector(Detector):
                 match_thres=match_thres,
                 conf_thres=conf_thres,
                 low_conf_thres=low_conf_thres, )
-
-        self.do_mtmct = False if mtmct_dir is None else True
-        self.mtmct_dir = mtmct_dir
+        return tracker
+
+    def clone_for_camera(self, det_service):
+        """
+        Copy of the detector for one more camera, sharing the predictors
+        but with its own tracker and timer, the detection runs through
+        `det_service` which batches the frames of all cameras.
+        """
+        assert not self.use_reid, \
+            'the reid model of DeepSORT can not be shared by cameras'
+        detector = copy.copy(self)
+        detector.tracker = self.create_tracker()
+        detector.det_times = Timer(with_tracker=True)
+        detector.det_service = det_service
+        if self.skip_frame_num > 1:
+            detector.previous_det_result = None
+        return detector
+
+    def predict_det_batch(self, image_list):
+        """
+        Detect a batch of frames, return the postprocessed result of every
+        frame.
+        """
+        inputs = self.preprocess(image_list)
+        result = self.predict()
+        boxes_num = np.asarray(result['boxes_num'])
+        sections = np.cumsum(boxes_num)[:-1]
+        det_results = []
+        for boxes, num in zip(
+                np.split(result['boxes'][:boxes_num.sum()], sections),
+                boxes_num):
+            det_results.append(
+                self.postprocess(inputs, {'boxes': boxes,
+                                          'boxes_num': [num]}))
+        return det_results
 
     def postprocess(self, inputs, result):
         # postprocess output of predictor
@@ -528,20 +575,24 @@ class SDE_Detector(Detector):
             else:
                 if frame_count > self.warmup_frame:
                     self.det_times.preprocess_time_s.start()
-                if not reuse_det_result:
+                if not reuse_det_result and self.det_service is None:
                     inputs = self.preprocess(batch_image_list)
                 if frame_count > self.warmup_frame:
                     self.det_times.preprocess_time_s.end()
                 if frame_count > self.warmup_frame:
                     self.det_times.inference_time_s.start()
-                if not reuse_det_result:
+                if not reuse_det_result and self.det_service is None:
                     result = self.predict()
+                elif not reuse_det_result:
+                    # preprocess and postprocess also run in the service
+                    det_result = self.det_service(batch_image_list)[0]
                 if frame_count > self.warmup_frame:
                     self.det_times.inference_time_s.end()
                 if frame_count > self.warmup_frame:
                     self.det_times.postprocess_time_s.start()
                 if not reuse_det_result:
-                    det_result = self.postprocess(inputs, result)
+                    if self.det_service is None:
+                        det_result = self.postprocess(inputs, result)
                     self.previous_det_result = det_result
                 else:
                     assert self.previous_det_result is not None
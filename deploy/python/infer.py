@@ -16,8 +16,13 @@ import os
 import yaml
 import glob
 import json
+import time
+import queue
+import threading
 from pathlib import Path
 from functools import reduce
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
 import numpy as np
@@ -37,7 +42,7 @@ from preprocess import preprocess, Resize, NormalizeImage, Permute, PadStride, L
 from keypoint_preprocess import EvalAffine, TopDownEvalAffine, expand_crop
 from clrnet_postprocess import CLRNetPostProcess
 from visualize import visualize_box_mask, imshow_lanes
-from utils import argsparser, Timer, get_current_memory_mb, multiclass_nms, coco_clsid2catid
+from utils import argsparser, Timer, get_current_memory_mb, multiclass_nms, coco_clsid2catid, slice_image, shift_tile_boxes
 
 # Global dictionary
 SUPPORT_MODELS = {
@@ -132,6 +137,13 @@ class Detector(object):
         return PredictConfig(model_dir, use_fd_format=use_fd_format)
 
     def preprocess(self, image_list):
+        inputs = self.prepare_inputs(image_list)
+        self.set_inputs(inputs)
+        return inputs
+
+    def prepare_inputs(self, image_list):
+        # decode and transform images, thread safe as it does not touch
+        # the predictor
         preprocess_ops = []
         for op_info in self.pred_config.preprocess_infos:
             new_op_info = op_info.copy()
@@ -144,7 +156,9 @@ class Detector(object):
             im, im_info = preprocess(im_path, preprocess_ops)
             input_im_lst.append(im)
             input_im_info_lst.append(im_info)
-        inputs = create_inputs(input_im_lst, input_im_info_lst)
+        return create_inputs(input_im_lst, input_im_info_lst)
+
+    def set_inputs(self, inputs):
         input_names = self.predictor.get_input_names()
         for i in range(len(input_names)):
             input_tensor = self.predictor.get_input_handle(input_names[i])
@@ -153,8 +167,6 @@ class Detector(object):
             else:
                 input_tensor.copy_from_cpu(inputs[input_names[i]])
 
-        return inputs
-
     def postprocess(self, inputs, result):
         # postprocess output of predictor
         np_boxes_num = result['boxes_num']
@@ -252,112 +264,126 @@ class Detector(object):
                             repeats=1,
                             visual=True,
                             save_results=False):
-        # slice infer only support bs=1
-        results = []
-        try:
-            import sahi
-            from sahi.slicing import slice_image
-        except Exception as e:
-            print(
-                'sahi not found, plaese install sahi. '
-                'for example: `pip install sahi`, see https://github.com/obss/sahi.'
-            )
-            raise e
+        """
+        Predict large images tile by tile. The tiles of consecutive images
+        are packed into batches of self.batch_size, the last batch is padded
+        to the same size, and the tile results are shifted back and merged
+        per image once all its tiles are predicted.
+        """
         num_classes = len(self.pred_config.labels)
-        for i in range(len(img_list)):
-            ori_image = img_list[i]
-            slice_image_result = sahi.slicing.slice_image(
-                image=ori_image,
-                slice_height=slice_size[0],
-                slice_width=slice_size[1],
-                overlap_height_ratio=overlap_ratio[0],
-                overlap_width_ratio=overlap_ratio[1])
-            sub_img_num = len(slice_image_result)
-            merged_bboxs = []
-            print('slice to {} sub_samples.', sub_img_num)
-
-            batch_image_list = [
-                slice_image_result.images[_ind] for _ind in range(sub_img_num)
-            ]
+        results = []
+        # queued tiles: (image index, tile view, tile start [x, y])
+        pending = []
+        tile_boxes = {}
+        tiles_left = {}
+
+        def merge_image(i):
+            boxes = tile_boxes.pop(i)
+            tiles_left.pop(i)
+            boxes = np.concatenate(boxes) if len(boxes) > 0 else np.zeros(
+                (0, 6), dtype=np.float32)
+            merged_results = {'boxes': []}
+            if combine_method in ['nms', 'soft_nms', 'wbf']:
+                final_boxes = multiclass_nms(
+                    boxes,
+                    num_classes,
+                    match_threshold,
+                    match_metric,
+                    method=combine_method)
+                merged_results['boxes'] = np.concatenate(final_boxes) \
+                    if len(final_boxes) > 0 else np.zeros((0, 6))
+            elif combine_method == 'concat':
+                merged_results['boxes'] = boxes
+            else:
+                raise ValueError(
+                    "Now only support 'nms', 'soft_nms', 'wbf' or 'concat' to "
+                    "fuse detection results.")
+            merged_results['boxes_num'] = np.array(
+                [len(merged_results['boxes'])], dtype=np.int32)
+            self.det_times.img_num += 1
+
+            if visual:
+                visualize(
+                    [img_list[i]],  # should be list
+                    merged_results,
+                    self.pred_config.labels,
+                    output_dir=self.output_dir,
+                    threshold=self.threshold)
+            results.append(merged_results)
+            print('Test iter {}'.format(i))
+
+        def run_batch(batch):
+            batch_image_list = [tile for _, tile, _ in batch]
+            # keep the batch size fixed for the predictor
+            batch_image_list += [batch_image_list[-1]] * (
+                self.batch_size - len(batch_image_list))
             if run_benchmark:
-                # preprocess
                 inputs = self.preprocess(batch_image_list)  # warmup
                 self.det_times.preprocess_time_s.start()
                 inputs = self.preprocess(batch_image_list)
                 self.det_times.preprocess_time_s.end()
 
-                # model prediction
                 result = self.predict(repeats=50, run_benchmark=True)  # warmup
                 self.det_times.inference_time_s.start()
                 result = self.predict(repeats=repeats, run_benchmark=True)
                 self.det_times.inference_time_s.end(repeats=repeats)
 
-                # postprocess
                 result_warmup = self.postprocess(inputs, result)  # warmup
                 self.det_times.postprocess_time_s.start()
                 result = self.postprocess(inputs, result)
                 self.det_times.postprocess_time_s.end()
-                self.det_times.img_num += 1
 
                 cm, gm, gu = get_current_memory_mb()
                 self.cpu_mem += cm
                 self.gpu_mem += gm
                 self.gpu_util += gu
             else:
-                # preprocess
                 self.det_times.preprocess_time_s.start()
                 inputs = self.preprocess(batch_image_list)
                 self.det_times.preprocess_time_s.end()
 
-                # model prediction
                 self.det_times.inference_time_s.start()
                 result = self.predict()
                 self.det_times.inference_time_s.end()
 
-                # postprocess
                 self.det_times.postprocess_time_s.start()
                 result = self.postprocess(inputs, result)
                 self.det_times.postprocess_time_s.end()
-                self.det_times.img_num += 1
-
-            st, ed = 0, result['boxes_num'][0]  # start_index, end_index
-            for _ind in range(sub_img_num):
-                boxes_num = result['boxes_num'][_ind]
-                ed = st + boxes_num
-                shift_amount = slice_image_result.starting_pixels[_ind]
-                result['boxes'][st:ed][:, 2:4] = result['boxes'][
-                    st:ed][:, 2:4] + shift_amount
-                result['boxes'][st:ed][:, 4:6] = result['boxes'][
-                    st:ed][:, 4:6] + shift_amount
-                merged_bboxs.append(result['boxes'][st:ed])
-                st = ed
-
-            merged_results = {'boxes': []}
-            if combine_method == 'nms':
-                final_boxes = multiclass_nms(
-                    np.concatenate(merged_bboxs), num_classes, match_threshold,
-                    match_metric)
-                merged_results['boxes'] = np.concatenate(final_boxes)
-            elif combine_method == 'concat':
-                merged_results['boxes'] = np.concatenate(merged_bboxs)
-            else:
-                raise ValueError(
-                    "Now only support 'nms' or 'concat' to fuse detection results."
-                )
-            merged_results['boxes_num'] = np.array(
-                [len(merged_results['boxes'])], dtype=np.int32)
 
-            if visual:
-                visualize(
-                    [ori_image],  # should be list
-                    merged_results,
-                    self.pred_config.labels,
-                    output_dir=self.output_dir,
-                    threshold=self.threshold)
-
-            results.append(merged_results)
-            print('Test iter {}'.format(i))
+                # drop the padded tiles, shift boxes to image coordinates
+                boxes_num = np.asarray(result['boxes_num'])[:len(batch)]
+                boxes = result['boxes'][:boxes_num.sum()]
+                starts = np.stack([start for _, _, start in batch])
+                boxes = shift_tile_boxes(boxes, boxes_num, starts)
+                im_ids = np.repeat([i for i, _, _ in batch], boxes_num)
+                for i in np.unique([i for i, _, _ in batch]):
+                    tile_boxes[i].append(boxes[im_ids == i])
+
+            for i, _, _ in batch:
+                tiles_left[i] -= 1
+                if tiles_left[i] == 0:
+                    if run_benchmark:
+                        tile_boxes.pop(i)
+                        tiles_left.pop(i)
+                        self.det_times.img_num += 1
+                    else:
+                        merge_image(i)
+
+        for i, im_file in enumerate(img_list):
+            im, _ = decode_image(im_file, {})
+            tiles, starts = slice_image(im, slice_size, overlap_ratio)
+            print('slice to {} sub_samples.'.format(len(tiles)))
+            tile_boxes[i] = []
+            tiles_left[i] = len(tiles)
+            pending.extend(zip([i] * len(tiles), tiles, starts))
+            while len(pending) >= self.batch_size:
+                run_batch(pending[:self.batch_size])
+                pending = pending[self.batch_size:]
+        if len(pending) > 0:
+            run_batch(pending)
 
+        if run_benchmark:
+            return results
         results = self.merge_batch_result(results)
         if save_results:
             Path(self.output_dir).mkdir(exist_ok=True)
@@ -440,13 +466,153 @@ class Detector(object):
                 task_type=FLAGS.task_type)
         return results
 
-    def predict_video(self, video_file, camera_id):
+    def predict_image_pipeline(self,
+                               image_list,
+                               visual=True,
+                               save_results=False,
+                               num_workers=2,
+                               queue_size=4):
+        """
+        Overlapped version of predict_image. Decode and preprocess of the
+        next batches run in a thread pool while the current batch infers on
+        the main thread, and postprocess and visualization run on another
+        thread, the stages are connected by bounded queues. The busy time of
+        every stage and the wall time are recorded in det_times.
+
+        Args:
+            image_list (list): image files or np.ndarray images
+            num_workers (int): threads to decode and preprocess images
+            queue_size (int): max batches waiting between two stages
+        """
+        batch_loop_cnt = math.ceil(float(len(image_list)) / self.batch_size)
+        batches = [
+            image_list[i * self.batch_size:(i + 1) * self.batch_size]
+            for i in range(batch_loop_cnt)
+        ]
+        results = [None] * batch_loop_cnt
+        post_queue = queue.Queue(maxsize=queue_size)
+        post_errors = []
+
+        def prepare(batch_image_list):
+            start = time.time()
+            inputs = self.prepare_inputs(batch_image_list)
+            return inputs, time.time() - start
+
+        def postprocess_worker():
+            while True:
+                item = post_queue.get()
+                if item is None:
+                    break
+                if post_errors:
+                    continue
+                i, inputs, result = item
+                try:
+                    self.det_times.postprocess_time_s.start()
+                    result = self.postprocess(inputs, result)
+                    if visual:
+                        visualize(
+                            batches[i],
+                            result,
+                            self.pred_config.labels,
+                            output_dir=self.output_dir,
+                            threshold=self.threshold)
+                    self.det_times.postprocess_time_s.end()
+                    results[i] = result
+                    print('Test iter {}'.format(i))
+                except Exception as e:
+                    post_errors.append(e)
+
+        self.det_times.preprocess_workers = num_workers
+        self.det_times.pipeline_time_s.start()
+        post_thread = threading.Thread(target=postprocess_worker)
+        post_thread.start()
+        try:
+            with ThreadPoolExecutor(max_workers=num_workers) as pool:
+                futures = deque()
+                next_batch = 0
+                for i in range(batch_loop_cnt):
+                    # keep at most queue_size batches preprocessed ahead
+                    while next_batch < batch_loop_cnt and \
+                            len(futures) < queue_size:
+                        futures.append(
+                            pool.submit(prepare, batches[next_batch]))
+                        next_batch += 1
+                    inputs, preprocess_time = futures.popleft().result()
+                    self.det_times.preprocess_time_s.time += preprocess_time
+
+                    self.det_times.inference_time_s.start()
+                    self.set_inputs(inputs)
+                    result = self.predict()
+                    self.det_times.inference_time_s.end()
+                    self.det_times.img_num += len(batches[i])
+
+                    if post_errors:
+                        break
+                    post_queue.put((i, inputs, result))
+        finally:
+            post_queue.put(None)
+            post_thread.join()
+            self.det_times.pipeline_time_s.end()
+        if post_errors:
+            raise post_errors[0]
+
+        results = self.merge_batch_result(results)
+        if save_results:
+            Path(self.output_dir).mkdir(exist_ok=True)
+            self.save_coco_results(
+                image_list,
+                results,
+                use_coco_category=FLAGS.use_coco_category,
+                task_type=FLAGS.task_type)
+        return results
+
+    def split_batch_result(self, result, batch_num):
+        """
+        Split the result of a batch into the result of every image, the
+        arrays of all boxes are split by boxes_num.
+        """
+        if batch_num == 1:
+            return [result]
+        boxes_num = np.asarray(result['boxes_num'])
+        sections = np.cumsum(boxes_num)[:-1]
+        results = [{'boxes_num': boxes_num[i:i + 1]} for i in range(batch_num)]
+        for k, v in result.items():
+            if k == 'boxes_num':
+                continue
+            if isinstance(v, np.ndarray) and len(v) == boxes_num.sum():
+                for res, v_i in zip(results, np.split(v, sections)):
+                    res[k] = v_i
+            else:
+                for res in results:
+                    res[k] = v
+        return results
+
+    def predict_video(self,
+                      video_file,
+                      camera_id,
+                      queue_size=8,
+                      drop_frames=None):
+        """
+        Frames are read by a reader thread into a bounded queue, predicted
+        on the main thread in micro-batches of up to batch_size frames that
+        are already queued, then drawn and encoded by a writer thread.
+
+        Args:
+            video_file (str): path of the video file
+            camera_id (int): device id of the camera, -1 to read video_file
+            queue_size (int): max frames waiting to be predicted or written
+            drop_frames (bool): drop the oldest queued frame when the frame
+                queue is full instead of waiting, to keep real-time. Default
+                to True for camera and False for video file.
+        """
         video_out_name = 'output.mp4'
         if camera_id != -1:
             capture = cv2.VideoCapture(camera_id)
         else:
             capture = cv2.VideoCapture(video_file)
             video_out_name = os.path.split(video_file)[-1]
+        if drop_frames is None:
+            drop_frames = camera_id != -1
         # Get Video info : resolution, fps, frame count
         width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -459,27 +625,163 @@ class Detector(object):
         out_path = os.path.join(self.output_dir, video_out_name)
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         writer = cv2.VideoWriter(out_path, fourcc, fps, (width, height))
-        index = 1
-        while (1):
-            ret, frame = capture.read()
-            if not ret:
-                break
-            print('detect frame: %d' % (index))
-            index += 1
-            results = self.predict_image([frame[:, :, ::-1]], visual=False)
-
-            im = visualize_box_mask(
-                frame,
-                results,
-                self.pred_config.labels,
-                threshold=self.threshold)
-            im = np.array(im)
-            writer.write(im)
-            if camera_id != -1:
-                cv2.imshow('Mask Detection', im)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+
+        frame_queue = queue.Queue(maxsize=queue_size)
+        write_queue = queue.Queue(maxsize=queue_size)
+        # the last drawn frame, shown on the main thread
+        display = deque(maxlen=1)
+        stop = threading.Event()
+        errors = []
+        stats = {
+            'read': 0,
+            'dropped': 0,
+            'written': 0,
+            'read_time': 0.,
+            'write_time': 0.,
+            'latency': 0.
+        }
+
+        def put(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def reader():
+            index = 0
+            try:
+                while not stop.is_set():
+                    start = time.time()
+                    ret, frame = capture.read()
+                    stats['read_time'] += time.time() - start
+                    if not ret:
+                        break
+                    index += 1
+                    stats['read'] += 1
+                    item = (index, frame, start)
+                    if not drop_frames:
+                        put(frame_queue, item)
+                        continue
+                    try:
+                        frame_queue.put_nowait(item)
+                    except queue.Full:
+                        # drop the oldest frame, unless the main thread has
+                        # taken it meanwhile
+                        try:
+                            frame_queue.get_nowait()
+                            stats['dropped'] += 1
+                        except queue.Empty:
+                            pass
+                        put(frame_queue, item)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                # always end the main loop
+                put(frame_queue, None)
+
+        def encoder():
+            while True:
+                item = write_queue.get()
+                if item is None:
                     break
-        writer.release()
+                if errors:
+                    continue
+                index, frame, result, captured = item
+                start = time.time()
+                try:
+                    im = visualize_box_mask(
+                        frame,
+                        result,
+                        self.pred_config.labels,
+                        threshold=self.threshold)
+                    im = np.array(im)
+                    writer.write(im)
+                except Exception as e:
+                    errors.append(e)
+                    stop.set()
+                    continue
+                end = time.time()
+                stats['write_time'] += end - start
+                stats['latency'] += end - captured
+                stats['written'] += 1
+                if camera_id != -1:
+                    display.append(im)
+
+        read_thread = threading.Thread(target=reader)
+        write_thread = threading.Thread(target=encoder)
+        read_thread.start()
+        write_thread.start()
+        start_time = time.time()
+        try:
+            finished = False
+            while not finished and not stop.is_set():
+                try:
+                    item = frame_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    break
+                batch = [item]
+                while len(batch) < self.batch_size:
+                    try:
+                        item = frame_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        finished = True
+                        break
+                    batch.append(item)
+                print('detect frame: %d' % (batch[-1][0]))
+
+                self.det_times.preprocess_time_s.start()
+                inputs = self.preprocess(
+                    [frame[:, :, ::-1] for _, frame, _ in batch])
+                self.det_times.preprocess_time_s.end()
+
+                self.det_times.inference_time_s.start()
+                result = self.predict()
+                self.det_times.inference_time_s.end()
+
+                self.det_times.postprocess_time_s.start()
+                result = self.postprocess(inputs, result)
+                results = self.split_batch_result(result, len(batch))
+                self.det_times.postprocess_time_s.end()
+                self.det_times.img_num += len(batch)
+
+                for (index, frame, captured), res in zip(batch, results):
+                    write_queue.put((index, frame, res, captured))
+                if camera_id != -1 and len(display) > 0:
+                    cv2.imshow('Mask Detection', display.pop())
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+        finally:
+            stop.set()
+            write_queue.put(None)
+            write_thread.join()
+            read_thread.join()
+            writer.release()
+            capture.release()
+        if errors:
+            raise errors[0]
+
+        total_time = time.time() - start_time
+        infer_time = self.det_times.preprocess_time_s.time + \
+            self.det_times.inference_time_s.time + \
+            self.det_times.postprocess_time_s.time
+        print("read: {} frames, {:.2f} FPS, dropped: {}".format(
+            stats['read'], stats['read'] / max(stats['read_time'], 1e-6),
+            stats['dropped']))
+        print("predict: {} frames, {:.2f} FPS".format(
+            self.det_times.img_num,
+            self.det_times.img_num / max(infer_time, 1e-6)))
+        print("write: {} frames, {:.2f} FPS".format(
+            stats['written'], stats['written'] / max(stats['write_time'],
+                                                     1e-6)))
+        print("end to end: {:.2f} FPS, average latency(ms): {:.2f}".format(
+            stats['written'] / max(total_time, 1e-6),
+            stats['latency'] / max(stats['written'], 1) * 1000))
 
     def save_coco_results(self,
                           image_list,
@@ -1232,6 +1534,13 @@ def main():
                 FLAGS.match_metric,
                 visual=FLAGS.save_images,
                 save_results=FLAGS.save_results)
+        elif FLAGS.pipeline and not FLAGS.run_benchmark:
+            detector.predict_image_pipeline(
+                img_list,
+                visual=FLAGS.save_images,
+                save_results=FLAGS.save_results,
+                num_workers=FLAGS.pipeline_workers,
+                queue_size=FLAGS.pipeline_queue_size)
         else:
             detector.predict_image(
                 img_list,
@@ -15,6 +15,7 @@
 import time
 import os
 import ast
+import math
 import argparse
 import numpy as np
 
@@ -189,7 +190,7 @@ def argsparser():
         "--combine_method",
         type=str,
         default='nms',
-        help="Combine method of the sliced images' detection results, choose in ['nms', 'nmm', 'concat']."
+        help="Combine method of the sliced images' detection results, choose in ['nms', 'soft_nms', 'wbf', 'concat']."
     )
     parser.add_argument(
         "--match_threshold",
@@ -218,6 +219,22 @@ def argsparser():
         default='Detection',
         help="How to save the coco result, it only work with save_results==True.  Optional inputs are Rotate or Detection, default is Detection."
     )
+    parser.add_argument(
+        "--pipeline",
+        action='store_true',
+        default=False,
+        help="Whether to overlap decode/preprocess, inference and postprocess "
+        "of consecutive batches when predicting images.")
+    parser.add_argument(
+        "--pipeline_workers",
+        type=int,
+        default=2,
+        help="Num of threads to decode and preprocess images in pipeline mode.")
+    parser.add_argument(
+        "--pipeline_queue_size",
+        type=int,
+        default=4,
+        help="Max num of batches waiting between two stages in pipeline mode.")
     return parser
 
 
@@ -256,8 +273,27 @@ class Timer(Times):
         self.inference_time_s = Times()
         self.postprocess_time_s = Times()
         self.tracking_time_s = Times()
+        # wall time of the pipelined runs, in which the stages overlap
+        self.pipeline_time_s = Times()
+        self.preprocess_workers = 1
         self.img_num = 0
 
+    def occupancy(self):
+        """
+        Busy ratio of every stage over the wall time of the pipelined runs,
+        the stage close to 1 is the bottleneck. Preprocess time is summed
+        over all workers, so it is divided by the worker number.
+        """
+        wall_time = self.pipeline_time_s.time
+        if wall_time <= 0:
+            return {}
+        return {
+            'preprocess': round(self.preprocess_time_s.time / wall_time /
+                                max(1, self.preprocess_workers), 4),
+            'inference': round(self.inference_time_s.time / wall_time, 4),
+            'postprocess': round(self.postprocess_time_s.time / wall_time, 4),
+        }
+
     def info(self, average=False):
         pre_time = self.preprocess_time_s.value()
         infer_time = self.inference_time_s.value()
@@ -267,6 +303,8 @@ class Timer(Times):
         total_time = pre_time + infer_time + post_time
         if self.with_tracker:
             total_time = total_time + track_time
+        if self.pipeline_time_s.time > 0:
+            total_time = self.pipeline_time_s.value()
         total_time = round(total_time, 4)
         print("------------------ Inference Time Info ----------------------")
         print("total_time(ms): {}, img_num: {}".format(total_time * 1000,
@@ -296,6 +334,12 @@ class Timer(Times):
                 "preprocess_time(ms): {:.2f}, inference_time(ms): {:.2f}, postprocess_time(ms): {:.2f}".
                 format(preprocess_time * 1000, inference_time * 1000,
                        postprocess_time * 1000))
+        occupancy = self.occupancy()
+        if occupancy:
+            print(
+                "stage occupancy: preprocess({} workers): {:.2%}, inference: {:.2%}, postprocess: {:.2%}".
+                format(self.preprocess_workers, occupancy['preprocess'],
+                       occupancy['inference'], occupancy['postprocess']))
 
     def report(self, average=False):
         dic = {}
@@ -316,6 +360,9 @@ class Timer(Times):
             dic['tracking_time_s'] = round(track_time / max(1, self.img_num),
                                            4) if average else track_time
             total_time = total_time + track_time
+        if self.pipeline_time_s.time > 0:
+            total_time = self.pipeline_time_s.time
+            dic['occupancy'] = self.occupancy()
         dic['total_time_s'] = round(total_time, 4)
         return dic
 
@@ -346,69 +393,401 @@ def get_current_memory_mb():
     return round(cpu_mem, 4), round(gpu_mem, 4), round(gpu_percent, 4)
 
 
-def multiclass_nms(bboxs, num_classes, match_threshold=0.6, match_metric='iou'):
+def _pair_match(dets, areas, i, j, match_metric):
+    """
+    Match values of box pairs (i, j), dets is [N, 5] of [score, x1, y1, x2,
+    y2]. Follows the float arithmetic of the per-pair loop: coordinates and
+    areas in the dets dtype, intersections in float64.
+    """
+    xx1 = np.maximum(dets[i, 1], dets[j, 1])
+    yy1 = np.maximum(dets[i, 2], dets[j, 2])
+    xx2 = np.minimum(dets[i, 3], dets[j, 3])
+    yy2 = np.minimum(dets[i, 4], dets[j, 4])
+    w = np.maximum(0.0, (xx2 - xx1).astype(np.float64) + 1)
+    h = np.maximum(0.0, (yy2 - yy1).astype(np.float64) + 1)
+    inter = w * h
+    if match_metric == 'iou':
+        union = (areas[i] + areas[j]).astype(np.float64) - inter
+        return inter / union
+    elif match_metric == 'ios':
+        smaller = np.minimum(areas[i], areas[j]).astype(np.float64)
+        return inter / smaller
+    else:
+        raise ValueError(
+            "match_metric should be 'iou' or 'ios', but got {}".format(
+                match_metric))
+
+
+def _dense_pairs(boxes, block_size=1024):
+    """All pairs (i, j), i < j, of overlapping boxes, in row blocks."""
+    n = boxes.shape[0]
+    pairs_i, pairs_j = [], []
+    for st in range(0, n, block_size):
+        ed = min(st + block_size, n)
+        b = boxes[st:ed]
+        overlap = (np.maximum(b[:, None, 0], boxes[None, :, 0]) <=
+                   np.minimum(b[:, None, 2], boxes[None, :, 2]) + 1) & \
+                  (np.maximum(b[:, None, 1], boxes[None, :, 1]) <=
+                   np.minimum(b[:, None, 3], boxes[None, :, 3]) + 1)
+        overlap &= np.arange(st, ed)[:, None] < np.arange(n)[None]
+        i, j = np.nonzero(overlap)
+        pairs_i.append(i + st)
+        pairs_j.append(j)
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def _row_pairs(boxes, rows, max_block_elems=1 << 22):
+    """
+    Pairs (i, j), i < j, of overlapping boxes with i or j in rows, in blocks
+    of rows bounded to max_block_elems matrix elements.
+    """
+    n = boxes.shape[0]
+    block_size = max(1, max_block_elems // max(n, 1))
+    pairs_i, pairs_j = [np.zeros(0, dtype=np.int64)], [
+        np.zeros(0, dtype=np.int64)
+    ]
+    for st in range(0, len(rows), block_size):
+        r = rows[st:st + block_size]
+        b = boxes[r]
+        overlap = (np.maximum(b[:, None, 0], boxes[None, :, 0]) <=
+                   np.minimum(b[:, None, 2], boxes[None, :, 2]) + 1) & \
+                  (np.maximum(b[:, None, 1], boxes[None, :, 1]) <=
+                   np.minimum(b[:, None, 3], boxes[None, :, 3]) + 1)
+        k, j = np.nonzero(overlap)
+        i = r[k]
+        pairs_i.append(np.minimum(i, j)[i != j])
+        pairs_j.append(np.maximum(i, j)[i != j])
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def _binned_pairs(boxes, extent_percentile=95):
+    """
+    Pairs (i, j), i < j, of boxes sharing a cell of a spatial grid, a
+    superset of the overlapping pairs without the N x N matrix. The cell
+    size is a percentile of the box extents, so that one large box does not
+    put all boxes in one cell: the boxes up to it cover at most 2 x 2 cells,
+    the larger ones are paired with all boxes by _row_pairs.
+    """
+    n = boxes.shape[0]
+    extent = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+    cell = max(float(np.percentile(extent, extent_percentile)), 1.) + 2.
+    large = np.flatnonzero(extent > cell - 2.)
+    if len(large) > 0:
+        small = np.flatnonzero(extent <= cell - 2.)
+        i, j = _binned_pairs(boxes[small], extent_percentile=100)
+        large_i, large_j = _row_pairs(boxes, large)
+        pair_ids = np.unique(
+            np.concatenate([small[i] * n + small[j], large_i * n + large_j]))
+        return pair_ids // n, pair_ids % n
+
+    origin = boxes[:, :2].min(axis=0)
+    lo = np.floor((boxes[:, :2] - origin) / cell).astype(np.int64)
+    hi = np.floor((boxes[:, 2:4] + 1 - origin) / cell).astype(np.int64)
+    num_y = int(hi[:, 1].max()) + 1
+
+    # (cell id, box) entries for the up to 2 x 2 cells each box covers
+    entries_cell, entries_box = [], []
+    for dx in range(2):
+        for dy in range(2):
+            cx, cy = lo[:, 0] + dx, lo[:, 1] + dy
+            covered = (cx <= hi[:, 0]) & (cy <= hi[:, 1])
+            entries_cell.append((cx * num_y + cy)[covered])
+            entries_box.append(np.flatnonzero(covered))
+    entries_cell = np.concatenate(entries_cell)
+    entries_box = np.concatenate(entries_box)
+    order = np.argsort(entries_cell, kind='stable')
+    entries_cell, entries_box = entries_cell[order], entries_box[order]
+
+    # every pair of entries inside the same cell
+    starts = np.flatnonzero(np.r_[True, entries_cell[1:] != entries_cell[:-1]])
+    sizes = np.diff(np.r_[starts, len(entries_cell)])
+    entry_size = np.repeat(sizes, sizes)
+    entry_start = np.repeat(starts, sizes)
+    first = np.repeat(np.arange(len(entries_cell)), entry_size)
+    block_start = np.repeat(np.cumsum(entry_size) - entry_size, entry_size)
+    second = np.repeat(entry_start, entry_size) + \
+        np.arange(len(first)) - block_start
+    i, j = entries_box[first], entries_box[second]
+    keep = i < j
+    pair_ids = np.unique(i[keep] * n + j[keep])
+    return pair_ids // n, pair_ids % n
+
+
+def _candidate_pairs(dets, bin_threshold, classes=None):
+    """
+    Pairs (i, j), i < j, of overlapping candidate boxes. Boxes of different
+    classes are shifted apart so they never pair.
+    """
+    n = dets.shape[0]
+    boxes = dets[:, 1:5].astype(np.float64)
+    if classes is not None and n > 0:
+        span = boxes.max() - boxes.min() + 2
+        boxes = boxes + (classes.astype(np.float64) * span)[:, None]
+    if n > bin_threshold:
+        i, j = _binned_pairs(boxes)
+    else:
+        i, j = _dense_pairs(boxes)
+    if classes is not None:
+        same = classes[i] == classes[j]
+        i, j = i[same], j[same]
+    return i, j
+
+
+def _suppression_graph(dets, match_threshold, match_metric, bin_threshold,
+                       classes=None):
+    """
+    Directed pairs (i, j) where box i ranks before box j and matches it by
+    at least match_threshold, as CSR arrays over the rank order. Boxes of
+    different classes are shifted apart so they never match.
+    """
+    n = dets.shape[0]
+    i, j = _candidate_pairs(dets, bin_threshold, classes)
+    areas = (dets[:, 3] - dets[:, 1] + 1) * (dets[:, 4] - dets[:, 2] + 1)
+    matched = _pair_match(dets, areas, i, j, match_metric) >= match_threshold
+    i, j = i[matched], j[matched]
+
+    order = np.argsort(dets[:, 0], kind='stable')[::-1]
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
+    src = np.where(rank[i] < rank[j], rank[i], rank[j])
+    dst = np.where(rank[i] < rank[j], rank[j], rank[i])
+    sort = np.lexsort((dst, src))
+    src, dst = src[sort], dst[sort]
+    indptr = np.searchsorted(src, np.arange(n + 1))
+    return order, indptr, dst
+
+
+def _greedy_clusters(dets, match_threshold, match_metric, bin_threshold,
+                     classes=None):
+    """
+    Greedy NMS in rank order, return the cluster head of every box: a box
+    heads its own cluster if it is kept, else it belongs to the first kept
+    box that suppressed it.
+    """
+    n = dets.shape[0]
+    if n == 0:
+        return np.zeros((0, ), dtype=np.int64)
+    order, indptr, dst = _suppression_graph(dets, match_threshold,
+                                            match_metric, bin_threshold,
+                                            classes)
+    head = -np.ones(n, dtype=np.int64)
+    for r in range(n):
+        if head[r] >= 0:
+            continue
+        head[r] = r
+        nbrs = dst[indptr[r]:indptr[r + 1]]
+        nbrs = nbrs[head[nbrs] < 0]
+        head[nbrs] = r
+    # map ranks back to box indices
+    cluster = np.empty(n, dtype=np.int64)
+    cluster[order] = order[head]
+    return cluster
+
+
+def _soft_nms(dets, classes, match_metric, sigma, score_threshold,
+              bin_threshold):
+    """
+    Gaussian soft-NMS, boxes of different classes never decay others. Only
+    overlapping boxes decay each other, so an alive box ranking before all its
+    alive overlapping boxes is picked by the sequential loop before any of
+    them: such boxes are kept in rounds and decay their neighbours at once.
+    Returns the kept boxes in the order of the sequential loop, with the
+    same scores up to the float rounding of the decay products.
+    """
+    n = dets.shape[0]
+    scores = dets[:, 0].astype(np.float64).copy()
+    if n == 0:
+        return np.zeros((0, ), dtype=np.int64), scores
+    i, j = _candidate_pairs(dets, bin_threshold, classes)
+    areas = (dets[:, 3] - dets[:, 1] + 1) * (dets[:, 4] - dets[:, 2] + 1)
+    match = _pair_match(dets, areas, i, j, match_metric)
+    overlap = match > 0
+    decay = np.exp(-(match[overlap] * match[overlap]) / sigma)
+    # both directions of every overlapping pair, as CSR arrays by source
+    src = np.concatenate([i[overlap], j[overlap]])
+    dst = np.concatenate([j[overlap], i[overlap]])
+    decay = np.concatenate([decay, decay])
+    alive = scores >= score_threshold
+    keep = np.zeros(n, dtype=bool)
+    num_compact = 2 * n + 1
+    while alive.any():
+        if alive.sum() * 2 < num_compact:
+            # drop the edges of removed boxes
+            live = alive[src] & alive[dst]
+            src, dst, decay = src[live], dst[live], decay[live]
+            sort = np.argsort(src, kind='stable')
+            src, dst, decay = src[sort], dst[sort], decay[sort]
+            indptr = np.searchsorted(src, np.arange(n + 1))
+            num_compact = alive.sum()
+
+        # rank in the pick order of the sequential loop, ties go to the
+        # lower index as np.argmax
+        rank = np.empty(n, dtype=np.int64)
+        rank[np.lexsort((np.arange(n), -scores))] = np.arange(n)
+        best = np.full(n, n, dtype=np.int64)
+        has_edges = indptr[:-1] < indptr[1:]
+        if len(dst) > 0:
+            nbr_rank = np.where(alive[dst], rank[dst], n)
+            best[has_edges] = np.minimum.reduceat(nbr_rank,
+                                                  indptr[:-1][has_edges])
+        picked = alive & (rank < best)
+        keep |= picked
+        alive &= ~picked
+
+        # decay the neighbours of the picked boxes in their pick order
+        picked = np.flatnonzero(picked)
+        picked = picked[np.argsort(rank[picked])]
+        starts, counts = indptr[picked], indptr[picked + 1] - indptr[picked]
+        edges = np.repeat(starts - np.cumsum(counts) + counts, counts) + \
+            np.arange(counts.sum())
+        edges = edges[alive[dst[edges]]]
+        np.multiply.at(scores, dst[edges], decay[edges])
+        alive &= scores >= score_threshold
+    keep = np.flatnonzero(keep)
+    keep = keep[np.lexsort((keep, -scores[keep]))]
+    return keep, scores[keep]
+
+
+def multiclass_nms(bboxs,
+                   num_classes,
+                   match_threshold=0.6,
+                   match_metric='iou',
+                   method='nms',
+                   sigma=0.5,
+                   score_threshold=0.001,
+                   bin_threshold=512):
+    """
+    Merge detections of all classes at once. Boxes of different classes are
+    shifted apart (the coordinate-offset trick) so one suppression pass
+    handles every class, and above bin_threshold boxes the overlap candidates
+    come from a spatial grid instead of the N x N pairs.
+
+    Args:
+        bboxs (np.ndarray): shape [N, 6], [class, score, x1, y1, x2, y2]
+        num_classes (int): boxes of class out of [0, num_classes) are dropped
+        match_threshold (float): overlap thresh for match metric, not used
+            by 'soft_nms'.
+        match_metric (str): 'iou' or 'ios'
+        method (str): 'nms' keeps the best box of every cluster, 'soft_nms'
+            decays the scores of matched boxes with a gaussian of sigma,
+            'wbf' fuses every cluster into its score-weighted mean box.
+        sigma (float): gaussian sigma of 'soft_nms'.
+        score_threshold (float): boxes decayed below it are dropped by
+            'soft_nms'.
+        bin_threshold (int): box number above which spatial binning is used.
+    Returns:
+        final_boxes (list): [class, score, x1, y1, x2, y2] of each class
+    """
+    classes = bboxs[:, 0]
+    bboxs = bboxs[(classes >= 0) & (classes < num_classes)]
+    classes = bboxs[:, 0].astype(np.int64)
+    dets = bboxs[:, 1:]
+
+    if method == 'nms':
+        cluster = _greedy_clusters(dets, match_threshold, match_metric,
+                                   bin_threshold, classes)
+        keep = cluster == np.arange(dets.shape[0])
+        out_dets, out_classes = dets[keep], classes[keep]
+    elif method == 'wbf':
+        cluster = _greedy_clusters(dets, match_threshold, match_metric,
+                                   bin_threshold, classes)
+        heads, inverse, counts = np.unique(
+            cluster, return_inverse=True, return_counts=True)
+        scores = dets[:, 0].astype(np.float64)
+        weighted = np.zeros((len(heads), 4), dtype=np.float64)
+        np.add.at(weighted, inverse, dets[:, 1:5] * scores[:, None])
+        weights = np.bincount(inverse, weights=scores, minlength=len(heads))
+        out_dets = np.empty((len(heads), 5), dtype=dets.dtype)
+        out_dets[:, 0] = weights / counts
+        out_dets[:, 1:5] = weighted / np.maximum(weights, 1e-12)[:, None]
+        out_classes = classes[heads]
+    elif method == 'soft_nms':
+        keep, scores = _soft_nms(dets, classes, match_metric, sigma,
+                                 score_threshold, bin_threshold)
+        out_dets = dets[keep].copy()
+        out_dets[:, 0] = scores
+        out_classes = classes[keep]
+    else:
+        raise ValueError(
+            "method should be 'nms', 'soft_nms' or 'wbf', but got {}".format(
+                method))
+
     final_boxes = []
-    for c in range(num_classes):
-        idxs = bboxs[:, 0] == c
-        if np.count_nonzero(idxs) == 0: continue
-        r = nms(bboxs[idxs, 1:], match_threshold, match_metric)
+    for c in np.unique(out_classes):
+        r = out_dets[out_classes == c]
         final_boxes.append(np.concatenate([np.full((r.shape[0], 1), c), r], 1))
     return final_boxes
 
 
-def nms(dets, match_threshold=0.6, match_metric='iou'):
+def nms(dets, match_threshold=0.6, match_metric='iou', bin_threshold=512):
     """ Apply NMS to avoid detecting too many overlapping bounding boxes.
         Args:
             dets: shape [N, 5], [score, x1, y1, x2, y2]
             match_metric: 'iou' or 'ios'
             match_threshold: overlap thresh for match metric.
+            bin_threshold: box number above which spatial binning is used.
     """
     if dets.shape[0] == 0:
         return dets[[], :]
-    scores = dets[:, 0]
-    x1 = dets[:, 1]
-    y1 = dets[:, 2]
-    x2 = dets[:, 3]
-    y2 = dets[:, 4]
-    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-    order = scores.argsort()[::-1]
-
-    ndets = dets.shape[0]
-    suppressed = np.zeros((ndets), dtype=np.int32)
-
-    for _i in range(ndets):
-        i = order[_i]
-        if suppressed[i] == 1:
-            continue
-        ix1 = x1[i]
-        iy1 = y1[i]
-        ix2 = x2[i]
-        iy2 = y2[i]
-        iarea = areas[i]
-        for _j in range(_i + 1, ndets):
-            j = order[_j]
-            if suppressed[j] == 1:
-                continue
-            xx1 = max(ix1, x1[j])
-            yy1 = max(iy1, y1[j])
-            xx2 = min(ix2, x2[j])
-            yy2 = min(iy2, y2[j])
-            w = max(0.0, xx2 - xx1 + 1)
-            h = max(0.0, yy2 - yy1 + 1)
-            inter = w * h
-            if match_metric == 'iou':
-                union = iarea + areas[j] - inter
-                match_value = inter / union
-            elif match_metric == 'ios':
-                smaller = min(iarea, areas[j])
-                match_value = inter / smaller
-            else:
-                raise ValueError()
-            if match_value >= match_threshold:
-                suppressed[j] = 1
-    keep = np.where(suppressed == 0)[0]
-    dets = dets[keep, :]
-    return dets
+    cluster = _greedy_clusters(dets, match_threshold, match_metric,
+                               bin_threshold)
+    keep = np.flatnonzero(cluster == np.arange(dets.shape[0]))
+    return dets[keep, :]
+
+
+def _slice_axis_starts(length, size, overlap):
+    step = size - overlap
+    assert step > 0, 'overlap {} should be less than slice size {}'.format(
+        overlap, size)
+    num = max(0, int(math.ceil(float(length - size) / step))) + 1
+    starts = np.arange(num, dtype=np.int64) * step
+    # the last tile is moved back to end at the image border
+    return np.where(starts + size > length, max(0, length - size), starts)
+
+
+def get_slice_starts(im_h, im_w, slice_size, overlap_ratio):
+    """
+    Starting pixels [x, y] of the tiles of an image, rows of tiles from top
+    to bottom, the same grid as sahi.slicing.slice_image
+    Args:
+        im_h (int), im_w (int): image size
+        slice_size (list): [height, width] of a tile
+        overlap_ratio (list): overlap ratio of height and width
+    Returns:
+        starts (np.ndarray): shape [T, 2]
+    """
+    slice_h, slice_w = slice_size
+    ys = _slice_axis_starts(im_h, slice_h, int(overlap_ratio[0] * slice_h))
+    xs = _slice_axis_starts(im_w, slice_w, int(overlap_ratio[1] * slice_w))
+    grid_y, grid_x = np.meshgrid(ys, xs, indexing='ij')
+    return np.stack([grid_x.reshape(-1), grid_y.reshape(-1)], axis=1)
+
+
+def slice_image(im, slice_size, overlap_ratio):
+    """
+    Split an image into overlapping tiles, the tiles are views of the image
+    and share its memory.
+    Returns:
+        tiles (list): [h, w, c] views of the tiles
+        starts (np.ndarray): starting pixels [x, y] of the tiles
+    """
+    starts = get_slice_starts(im.shape[0], im.shape[1], slice_size,
+                              overlap_ratio)
+    slice_h, slice_w = slice_size
+    tiles = [im[y:y + slice_h, x:x + slice_w] for x, y in starts]
+    return tiles, starts
+
+
+def shift_tile_boxes(boxes, boxes_num, starts):
+    """
+    Shift [class, score, x1, y1, x2, y2] boxes predicted on tiles back to
+    image coordinates, boxes_num[i] boxes belong to the tile at starts[i].
+    """
+    offsets = np.repeat(starts, boxes_num, axis=0).astype(boxes.dtype)
+    boxes = boxes.copy()
+    boxes[:, 2:4] += offsets
+    boxes[:, 4:6] += offsets
+    return boxes
 
 
 coco_clsid2catid = {
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import copy
+import math
 import os
 import traceback
 import six
@@ -128,6 +129,46 @@ class BatchCompose(Compose):
         return batch_data
 
 
+class DistributedEvalBatchSampler(DistributedBatchSampler):
+    """
+    Shard evaluation across ranks. The batches are those of a single device
+    BatchSampler over the dataset, each rank takes a contiguous block of
+    them and no sample is padded or repeated, so the results gathered in
+    rank order are the same as evaluating on one device.
+
+    Args:
+        dataset (Dataset): dataset to evaluate.
+        batch_size (int): number of samples in a batch.
+        num_replicas (int): number of ranks, default the world size.
+        rank (int): rank of this process, default the current rank.
+    """
+
+    def __init__(self, dataset, batch_size, num_replicas=None, rank=None):
+        super(DistributedEvalBatchSampler, self).__init__(
+            dataset,
+            batch_size,
+            num_replicas=num_replicas,
+            rank=rank,
+            shuffle=False,
+            drop_last=False)
+        num_batches = int(math.ceil(len(dataset) / float(batch_size)))
+        per_rank, extra = divmod(num_batches, self.nranks)
+        self.batch_start = self.local_rank * per_rank + min(self.local_rank,
+                                                            extra)
+        self.batch_end = self.batch_start + per_rank + int(
+            self.local_rank < extra)
+
+    def __iter__(self):
+        num_samples = len(self.dataset)
+        for i in range(self.batch_start, self.batch_end):
+            yield list(
+                range(i * self.batch_size,
+                      min((i + 1) * self.batch_size, num_samples)))
+
+    def __len__(self):
+        return self.batch_end - self.batch_start
+
+
 class BaseDataLoader(object):
     """
     Base DataLoader implementation for detection models
@@ -20,6 +20,7 @@ from . import keypoint_coco
 from . import mot
 from . import sniper_coco
 from . import culane
+from . import packed
 
 from .coco import *
 from .voc import *
@@ -29,5 +30,7 @@ from .keypoint_coco import *
 from .mot import *
 from .sniper_coco import SniperCOCODataSet
 from .dataset import ImageFolder
+from .annotation_store import AnnotationStore
 from .pose3d_cmb import *
 from .culane import *
+from .packed import *
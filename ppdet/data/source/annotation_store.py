@@ -0,0 +1,363 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import copy
+import json
+import pickle
+import shutil
+import hashlib
+import numpy as np
+
+from ppdet.utils.logger import setup_logger
+logger = setup_logger(__name__)
+
+__all__ = ['AnnotationStore', 'AnnotationCache']
+
+# per-record string fields, stored as one utf-8 buffer plus offsets
+STRING_FIELDS = ['im_file', 'semantic']
+# per-record scalar fields and the dtype of their column
+SCALAR_FIELDS = {'im_id': np.int64, 'h': np.float64, 'w': np.float64}
+# per-instance array fields and the (dtype, width) of their column
+INSTANCE_FIELDS = {
+    'is_crowd': (np.int32, 1),
+    'gt_class': (np.int32, 1),
+    'gt_bbox': (np.float32, 4),
+    'gt_track_id': (np.int32, 1),
+}
+FIELD_ORDER = [
+    'im_file', 'im_id', 'h', 'w', 'is_crowd', 'gt_class', 'gt_bbox', 'gt_poly',
+    'gt_track_id', 'semantic'
+]
+
+# kinds of a gt_poly entry
+POLY_NONE = 0
+POLY_LIST = 1
+POLY_OBJECT = 2
+
+
+def _is_polygon_list(segm):
+    if not isinstance(segm, list):
+        return False
+    for poly in segm:
+        if not isinstance(poly, (list, tuple)):
+            return False
+        for v in poly:
+            if not isinstance(v, (int, float)):
+                return False
+    return True
+
+
+def _offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    if len(lengths) > 0:
+        np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+class AnnotationStore(object):
+    """
+    Columnar storage of dataset records (roidbs).
+
+    The records are kept as a handful of flat numpy arrays plus offset
+    indices instead of a list of dicts, so forked dataloader workers share
+    the pages read-only instead of touching (and copying) them through
+    Python reference counting. Indexing returns a freshly built record dict
+    whose arrays are copied out of the columns, transforms can modify it
+    in place without a deepcopy of the stored record.
+
+    Args:
+        records (list): list of record dicts as built by `parse_dataset`.
+    """
+
+    def __init__(self, records=None):
+        records = records or []
+        self._num = len(records)
+        self._arrays = {}
+        # python objects without a column: RLE segmentations and any
+        # record field the store does not know about
+        self._objects = {}
+        self._extras = {}
+        # optional remapping of record indices, see `select`
+        self._index = None
+
+        self._build_strings(records)
+        self._build_scalars(records)
+        self._build_instances(records)
+        self._build_polys(records)
+
+        known = set(FIELD_ORDER)
+        for i, rec in enumerate(records):
+            extra = {k: v for k, v in rec.items() if k not in known}
+            if extra:
+                self._extras[i] = extra
+
+    @classmethod
+    def from_records(cls, records):
+        return cls(records)
+
+    def _present(self, records, key):
+        present = np.array([key in rec for rec in records], dtype=bool)
+        if not present.any():
+            return False
+        self._arrays[key + '/present'] = present
+        return True
+
+    def _build_strings(self, records):
+        for key in STRING_FIELDS:
+            if not self._present(records, key):
+                continue
+            encoded = [
+                rec[key].encode('utf-8') if key in rec else b''
+                for rec in records
+            ]
+            self._arrays[key + '/data'] = np.frombuffer(
+                b''.join(encoded), dtype=np.uint8).copy()
+            self._arrays[key + '/offsets'] = _offsets(
+                [len(s) for s in encoded])
+
+    def _build_scalars(self, records):
+        for key, dtype in SCALAR_FIELDS.items():
+            if not self._present(records, key):
+                continue
+            values = np.zeros(self._num, dtype=dtype)
+            for i, rec in enumerate(records):
+                if key in rec:
+                    values[i] = np.asarray(rec[key]).reshape(-1)[0]
+            self._arrays[key + '/values'] = values
+
+    def _build_instances(self, records):
+        for key, (dtype, width) in INSTANCE_FIELDS.items():
+            if not self._present(records, key):
+                continue
+            arrays = [
+                np.asarray(
+                    rec[key], dtype=dtype).reshape(-1, width)
+                if key in rec else np.zeros(
+                    (0, width), dtype=dtype) for rec in records
+            ]
+            self._arrays[key + '/values'] = np.concatenate(arrays, axis=0)
+            self._arrays[key + '/offsets'] = _offsets([len(a) for a in arrays])
+
+    def _build_polys(self, records):
+        if not self._present(records, 'gt_poly'):
+            return
+
+        rec_lengths, kinds, inst_lengths = [], [], []
+        poly_lengths, coords = [], []
+        for rec in records:
+            segms = rec.get('gt_poly', [])
+            rec_lengths.append(len(segms))
+            for segm in segms:
+                if segm is None:
+                    kinds.append(POLY_NONE)
+                    inst_lengths.append(0)
+                elif _is_polygon_list(segm):
+                    kinds.append(POLY_LIST)
+                    inst_lengths.append(len(segm))
+                    for poly in segm:
+                        poly_lengths.append(len(poly))
+                        coords.extend(poly)
+                else:
+                    # RLE or other non-polygon segmentation
+                    self._objects[len(kinds)] = segm
+                    kinds.append(POLY_OBJECT)
+                    inst_lengths.append(0)
+
+        self._arrays['gt_poly/offsets'] = _offsets(rec_lengths)
+        self._arrays['gt_poly/kinds'] = np.array(kinds, dtype=np.int8)
+        self._arrays['gt_poly/inst_offsets'] = _offsets(inst_lengths)
+        self._arrays['gt_poly/poly_offsets'] = _offsets(poly_lengths)
+        self._arrays['gt_poly/coords'] = np.array(coords, dtype=np.float64)
+
+    def __len__(self):
+        return self._num if self._index is None else len(self._index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, idx):
+        num = len(self)
+        idx = int(idx)
+        if idx < 0:
+            idx += num
+        if idx < 0 or idx >= num:
+            raise IndexError('record index {} out of range [0, {})'.format(
+                idx, num))
+        if self._index is not None:
+            idx = int(self._index[idx])
+
+        arrays = self._arrays
+        rec = {}
+        for key in FIELD_ORDER:
+            present = arrays.get(key + '/present')
+            if present is None or not present[idx]:
+                continue
+            if key in STRING_FIELDS:
+                offsets = arrays[key + '/offsets']
+                data = arrays[key + '/data'][offsets[idx]:offsets[idx + 1]]
+                rec[key] = data.tobytes().decode('utf-8')
+            elif key in SCALAR_FIELDS:
+                values = arrays[key + '/values']
+                if key == 'im_id':
+                    rec[key] = np.array(values[idx:idx + 1])
+                else:
+                    rec[key] = float(values[idx])
+            elif key in INSTANCE_FIELDS:
+                offsets = arrays[key + '/offsets']
+                rec[key] = np.array(arrays[key + '/values'][offsets[idx]:
+                                                            offsets[idx + 1]])
+            else:
+                rec[key] = self._get_polys(idx)
+        if idx in self._extras:
+            rec.update(copy.deepcopy(self._extras[idx]))
+        return rec
+
+    def _get_polys(self, idx):
+        arrays = self._arrays
+        rec_offsets = arrays['gt_poly/offsets']
+        kinds = arrays['gt_poly/kinds']
+        inst_offsets = arrays['gt_poly/inst_offsets']
+        poly_offsets = arrays['gt_poly/poly_offsets']
+        coords = arrays['gt_poly/coords']
+        segms = []
+        for inst in range(rec_offsets[idx], rec_offsets[idx + 1]):
+            kind = kinds[inst]
+            if kind == POLY_NONE:
+                segms.append(None)
+            elif kind == POLY_OBJECT:
+                segms.append(copy.deepcopy(self._objects[inst]))
+            else:
+                segms.append([
+                    coords[poly_offsets[j]:poly_offsets[j + 1]].tolist()
+                    for j in range(inst_offsets[inst], inst_offsets[inst + 1])
+                ])
+        return segms
+
+    def select(self, indices):
+        """
+        Return a store holding the records at `indices`, the columns are
+        shared with this store rather than copied.
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        if self._index is not None:
+            indices = self._index[indices]
+        store = copy.copy(self)
+        store._index = indices
+        return store
+
+    def to_records(self):
+        return [self[i] for i in range(len(self))]
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self._arrays.values())
+
+    def save(self, path):
+        """
+        Save the columns as .npy files under directory `path`, so that
+        `load` can memory-map them.
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        names = sorted(self._arrays.keys())
+        for i, name in enumerate(names):
+            np.save(os.path.join(path, '{}.npy'.format(i)), self._arrays[name])
+        meta = {
+            'num': self._num,
+            'names': names,
+            'objects': self._objects,
+            'extras': self._extras,
+            'index': self._index,
+        }
+        with open(os.path.join(path, 'meta.pkl'), 'wb') as f:
+            pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, 'meta.pkl'), 'rb') as f:
+            meta = pickle.load(f)
+        store = cls()
+        store._num = meta['num']
+        store._objects = meta['objects']
+        store._extras = meta['extras']
+        store._index = meta['index']
+        mmap_mode = 'r' if mmap else None
+        for i, name in enumerate(meta['names']):
+            store._arrays[name] = np.load(
+                os.path.join(path, '{}.npy'.format(i)), mmap_mode=mmap_mode)
+        return store
+
+
+def _file_digest(path, chunk_size=1 << 20):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class AnnotationCache(object):
+    """
+    On-disk cache of parsed annotations.
+
+    Each entry is a saved `AnnotationStore` plus a small metadata dict, kept
+    in a sub-directory named by the md5 of the annotation file content and
+    the parse options, so editing the file or changing an option never hits
+    a stale entry. Entries are written to a temporary directory and renamed
+    into place, concurrent writers (e.g. several trainer ranks) are safe.
+
+    Args:
+        cache_root (str): directory to keep the cache entries in.
+    """
+
+    def __init__(self, cache_root):
+        self.cache_root = cache_root
+
+    def key(self, anno_path, options):
+        digest = _file_digest(anno_path)
+        options = json.dumps(options, sort_keys=True, default=str)
+        return hashlib.md5((digest + options).encode('utf-8')).hexdigest()
+
+    def load(self, key):
+        path = os.path.join(self.cache_root, key)
+        if not os.path.isfile(os.path.join(path, 'info.pkl')):
+            return None
+        try:
+            with open(os.path.join(path, 'info.pkl'), 'rb') as f:
+                info = pickle.load(f)
+            store = AnnotationStore.load(path)
+        except Exception as e:
+            logger.warning('Failed to load annotation cache {}: {}'.format(
+                path, str(e)))
+            return None
+        return store, info
+
+    def save(self, key, store, info):
+        path = os.path.join(self.cache_root, key)
+        tmp_path = '{}.tmp{}'.format(path, os.getpid())
+        try:
+            store.save(tmp_path)
+            with open(os.path.join(tmp_path, 'info.pkl'), 'wb') as f:
+                pickle.dump(info, f, protocol=pickle.HIGHEST_PROTOCOL)
+            if os.path.isdir(path):
+                # another process finished first
+                shutil.rmtree(tmp_path)
+            else:
+                os.rename(tmp_path, path)
+        except Exception as e:
+            logger.warning('Failed to save annotation cache {}: {}'.format(
+                path, str(e)))
+            shutil.rmtree(tmp_path, ignore_errors=True)
@@ -13,7 +13,6 @@
 # limitations under the License.
 
 import os
-import copy
 
 try:
     from collections.abc import Sequence
@@ -22,6 +21,7 @@ except Exception:
 import numpy as np
 from ppdet.core.workspace import register, serializable
 from .dataset import DetDataset
+from .annotation_store import AnnotationStore, AnnotationCache
 
 from ppdet.utils.logger import setup_logger
 
@@ -51,6 +51,11 @@ class COCODataSet(DetDataset):
             record's, if empty_ratio is out of [0. ,1.), do not sample the 
             records and use all the empty entries. 1. as default
         repeat (int): repeat times for dataset, use in benchmark.
+        anno_cache_root (str): directory to cache the parsed annotations in,
+            keyed by the annotation file content and the parse options.
+            Later runs memory-map the cache instead of parsing the file,
+            note that image files are not checked for existence then.
+            None as default, which disables the cache.
     """
 
     def __init__(self,
@@ -62,7 +67,8 @@ class COCODataSet(DetDataset):
                  load_crowd=False,
                  allow_empty=False,
                  empty_ratio=1.,
-                 repeat=1):
+                 repeat=1,
+                 anno_cache_root=None):
         super(COCODataSet, self).__init__(
             dataset_dir,
             image_dir,
@@ -75,6 +81,7 @@ class COCODataSet(DetDataset):
         self.load_crowd = load_crowd
         self.allow_empty = allow_empty
         self.empty_ratio = empty_ratio
+        self.anno_cache_root = anno_cache_root
 
     def _sample_empty(self, records, num):
         # if empty_ratio is out of [0. ,1.), do not sample the records
@@ -86,12 +93,51 @@ class COCODataSet(DetDataset):
         records = random.sample(records, sample_num)
         return records
 
+    def _image_exists(self, im_path):
+        return os.path.exists(im_path)
+
+    def _cache_options(self):
+        return {
+            'dataset': self.__class__.__name__,
+            'image_dir': os.path.join(self.dataset_dir, self.image_dir),
+            'data_fields': list(self.data_fields),
+            'sample_num': self.sample_num,
+            'load_crowd': self.load_crowd,
+            'allow_empty': self.allow_empty,
+            'empty_ratio': self.empty_ratio,
+            'load_semantic': self.load_semantic,
+        }
+
+    def _set_roidbs(self, store, num_records):
+        # empty records are stored after the others and sampled on every run
+        if self.allow_empty and len(store) > num_records:
+            empty_idxs = self._sample_empty(
+                list(range(num_records, len(store))), num_records)
+            store = store.select(list(range(num_records)) + empty_idxs)
+        self.roidbs = store
+
     def parse_dataset(self):
         anno_path = os.path.join(self.dataset_dir, self.anno_path)
         image_dir = os.path.join(self.dataset_dir, self.image_dir)
 
         assert anno_path.endswith('.json'), \
             'invalid coco annotation file: ' + anno_path
+
+        cache = None
+        if self.anno_cache_root is not None:
+            cache = AnnotationCache(self.anno_cache_root)
+            cache_key = cache.key(anno_path, self._cache_options())
+            cached = cache.load(cache_key)
+            if cached is not None:
+                store, info = cached
+                self.catid2clsid = info['catid2clsid']
+                self.cname2cid = info['cname2cid']
+                self.load_image_only = info['load_image_only']
+                self._set_roidbs(store, info['num_records'])
+                logger.info('Load {} samples from annotation cache of {}.'.
+                            format(len(self.roidbs), anno_path))
+                return
+
         from pycocotools.coco import COCO
         coco = COCO(anno_path)
         img_ids = coco.getImgIds()
@@ -121,7 +167,7 @@ class COCODataSet(DetDataset):
             im_path = os.path.join(image_dir,
                                    im_fname) if image_dir else im_fname
             is_empty = False
-            if not os.path.exists(im_path):
+            if not self._image_exists(im_path):
                 logger.warning('Illegal image file: {}, and it will be '
                                'ignored'.format(im_path))
                 continue
@@ -245,10 +291,15 @@ class COCODataSet(DetDataset):
         assert ct > 0, 'not found any coco record in %s' % (anno_path)
         logger.info('Load [{} samples valid, {} samples invalid] in file {}.'.
                     format(ct, len(img_ids) - ct, anno_path))
-        if self.allow_empty and len(empty_records) > 0:
-            empty_records = self._sample_empty(empty_records, len(records))
-            records += empty_records
-        self.roidbs = records
+        store = AnnotationStore(records + empty_records)
+        if cache is not None:
+            cache.save(cache_key, store, {
+                'catid2clsid': self.catid2clsid,
+                'cname2cid': self.cname2cid,
+                'load_image_only': self.load_image_only,
+                'num_records': len(records),
+            })
+        self._set_roidbs(store, len(records))
 
 
 @register
@@ -549,18 +600,17 @@ class SemiCOCODataSet(COCODataSet):
         if self.allow_empty and len(empty_records) > 0:
             empty_records = self._sample_empty(empty_records, len(records))
             records += empty_records
-        self.roidbs = records
+        self.roidbs = AnnotationStore(records)
 
         if self.supervised:
             logger.info(f'Use {len(self.roidbs)} sup_samples data as LABELED')
         else:
             if self.length > 0:  # unsup length will be decide by sup length
-                all_roidbs = self.roidbs.copy()
                 selected_idxs = [
-                    np.random.choice(len(all_roidbs))
+                    np.random.choice(len(self.roidbs))
                     for _ in range(self.length)
                 ]
-                self.roidbs = [all_roidbs[i] for i in selected_idxs]
+                self.roidbs = self.roidbs.select(selected_idxs)
             logger.info(
                 f'Use {len(self.roidbs)} unsup_samples data as UNLABELED')
 
@@ -569,17 +619,16 @@ class SemiCOCODataSet(COCODataSet):
         if self.repeat > 1:
             idx %= n
         # data batch
-        roidb = copy.deepcopy(self.roidbs[idx])
+        roidb = self._get_roidb(idx)
         if self.mixup_epoch == 0 or self._epoch < self.mixup_epoch:
             idx = np.random.randint(n)
-            roidb = [roidb, copy.deepcopy(self.roidbs[idx])]
+            roidb = [roidb, self._get_roidb(idx)]
         elif self.cutmix_epoch == 0 or self._epoch < self.cutmix_epoch:
             idx = np.random.randint(n)
-            roidb = [roidb, copy.deepcopy(self.roidbs[idx])]
+            roidb = [roidb, self._get_roidb(idx)]
         elif self.mosaic_epoch == 0 or self._epoch < self.mosaic_epoch:
             roidb = [roidb, ] + [
-                copy.deepcopy(self.roidbs[np.random.randint(n)])
-                for _ in range(4)
+                self._get_roidb(np.random.randint(n)) for _ in range(4)
             ]
         if isinstance(roidb, Sequence):
             for r in roidb:
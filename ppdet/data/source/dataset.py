@@ -24,6 +24,7 @@ from paddle.io import Dataset
 from ppdet.core.workspace import register, serializable
 from ppdet.utils.download import get_dataset_path
 from ppdet.data import source
+from .annotation_store import AnnotationStore
 
 from ppdet.utils.logger import setup_logger
 logger = setup_logger(__name__)
@@ -75,24 +76,23 @@ class DetDataset(Dataset):
         if self.repeat > 1:
             idx %= n
         # data batch
-        roidb = copy.deepcopy(self.roidbs[idx])
+        roidb = self._get_roidb(idx)
         if self.mixup_epoch == 0 or self._epoch < self.mixup_epoch:
             idx = np.random.randint(n)
-            roidb = [roidb, copy.deepcopy(self.roidbs[idx])]
+            roidb = [roidb, self._get_roidb(idx)]
         elif self.cutmix_epoch == 0 or self._epoch < self.cutmix_epoch:
             idx = np.random.randint(n)
-            roidb = [roidb, copy.deepcopy(self.roidbs[idx])]
+            roidb = [roidb, self._get_roidb(idx)]
         elif self.mosaic_epoch == 0 or self._epoch < self.mosaic_epoch:
             roidb = [roidb, ] + [
-                copy.deepcopy(self.roidbs[np.random.randint(n)])
-                for _ in range(4)
+                self._get_roidb(np.random.randint(n)) for _ in range(4)
             ]
         elif self.pre_img_epoch == 0 or self._epoch < self.pre_img_epoch:
             # Add previous image as input, only used in CenterTrack
             idx_pre_img = idx - 1
             if idx_pre_img < 0:
                 idx_pre_img = idx + 1
-            roidb = [roidb, ] + [copy.deepcopy(self.roidbs[idx_pre_img])]
+            roidb = [roidb, ] + [self._get_roidb(idx_pre_img)]
         if isinstance(roidb, Sequence):
             for r in roidb:
                 r['curr_iter'] = self._curr_iter
@@ -112,6 +112,13 @@ class DetDataset(Dataset):
         
         return self.transform(roidb)
 
+    def _get_roidb(self, idx):
+        # records of an AnnotationStore are built fresh on every access,
+        # plain list roidbs still need a copy to protect them from transforms
+        if isinstance(self.roidbs, AnnotationStore):
+            return self.roidbs[idx]
+        return copy.deepcopy(self.roidbs[idx])
+
     def check_or_download_dataset(self):
         self.dataset_dir = get_dataset_path(self.dataset_dir, self.anno_path,
                                             self.image_dir)
@@ -0,0 +1,250 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import numpy as np
+from ppdet.core.workspace import register, serializable
+from .coco import COCODataSet
+
+from ppdet.utils.logger import setup_logger
+logger = setup_logger(__name__)
+
+__all__ = [
+    'ImagePackWriter', 'ImagePackReader', 'PackedCOCODataSet', 'pack_key'
+]
+
+INDEX_FILE = 'index.npz'
+
+
+def _shard_name(shard_id):
+    return 'shard-{:05d}.bin'.format(shard_id)
+
+
+def pack_key(path):
+    """Normalize an image path relative to the packed image root."""
+    return os.path.normpath(path).replace(os.sep, '/')
+
+
+class ImagePackWriter(object):
+    """
+    Write encoded images into a few large shard files.
+
+    Every image is appended as raw bytes to the current shard, and a new
+    shard is started once `shard_size` bytes are written. The index with the
+    shard id, byte offset and length of every key is saved on `close`, keys
+    are sorted so that readers can look them up with a binary search.
+
+    Args:
+        pack_dir (str): output directory.
+        shard_size (int): max bytes of one shard file, 1GB as default.
+    """
+
+    def __init__(self, pack_dir, shard_size=1 << 30):
+        if not os.path.isdir(pack_dir):
+            os.makedirs(pack_dir)
+        self.pack_dir = pack_dir
+        self.shard_size = shard_size
+        self._keys, self._shards, self._offsets, self._lengths = [], [], [], []
+        self._shard_id = -1
+        self._shard_file = None
+        self._shard_bytes = 0
+        self._next_shard()
+
+    def _next_shard(self):
+        if self._shard_file is not None:
+            self._shard_file.close()
+        self._shard_id += 1
+        self._shard_file = open(
+            os.path.join(self.pack_dir, _shard_name(self._shard_id)), 'wb')
+        self._shard_bytes = 0
+
+    def add(self, key, data):
+        if self._shard_bytes > 0 and \
+                self._shard_bytes + len(data) > self.shard_size:
+            self._next_shard()
+        self._keys.append(pack_key(key))
+        self._shards.append(self._shard_id)
+        self._offsets.append(self._shard_bytes)
+        self._lengths.append(len(data))
+        self._shard_file.write(data)
+        self._shard_bytes += len(data)
+
+    def add_file(self, key, path):
+        with open(path, 'rb') as f:
+            self.add(key, f.read())
+
+    def close(self):
+        self._shard_file.close()
+        keys = np.array(self._keys)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        if len(sorted_keys) > 1:
+            dup = sorted_keys[1:] == sorted_keys[:-1]
+            assert not dup.any(), 'duplicated key {} in image pack'.format(
+                sorted_keys[1:][dup][0])
+        np.savez(
+            os.path.join(self.pack_dir, INDEX_FILE),
+            keys=sorted_keys,
+            shards=np.array(
+                self._shards, dtype=np.int32)[order],
+            offsets=np.array(
+                self._offsets, dtype=np.int64)[order],
+            lengths=np.array(
+                self._lengths, dtype=np.int64)[order],
+            num_shards=np.array(self._shard_id + 1))
+        logger.info('Packed {} images into {} shards in {}'.format(
+            len(keys), self._shard_id + 1, self.pack_dir))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ImagePackReader(object):
+    """
+    Read encoded images from shards written by `ImagePackWriter`.
+
+    Shards are memory-mapped lazily in each process, `read` returns a uint8
+    array viewing the mapped bytes, so no file is opened and nothing is
+    copied per sample.
+
+    Args:
+        pack_dir (str): directory of the image pack.
+    """
+
+    def __init__(self, pack_dir):
+        self.pack_dir = pack_dir
+        index = np.load(os.path.join(pack_dir, INDEX_FILE))
+        self.keys = index['keys']
+        self.shards = index['shards']
+        self.offsets = index['offsets']
+        self.lengths = index['lengths']
+        self.num_shards = int(index['num_shards'])
+        self._maps = {}
+
+    def __getstate__(self):
+        # memory maps are re-created in the receiving process
+        state = self.__dict__.copy()
+        state['_maps'] = {}
+        return state
+
+    def __len__(self):
+        return len(self.keys)
+
+    def index_of(self, key):
+        key = pack_key(key)
+        pos = int(np.searchsorted(self.keys, key))
+        if pos < len(self.keys) and self.keys[pos] == key:
+            return pos
+        return -1
+
+    def __contains__(self, key):
+        return self.index_of(key) >= 0
+
+    def _shard(self, shard_id):
+        if shard_id not in self._maps:
+            path = os.path.join(self.pack_dir, _shard_name(shard_id))
+            self._maps[shard_id] = np.memmap(path, dtype=np.uint8, mode='r')
+        return self._maps[shard_id]
+
+    def read(self, key):
+        pos = self.index_of(key)
+        if pos < 0:
+            raise KeyError('{} not found in image pack {}'.format(
+                key, self.pack_dir))
+        offset = self.offsets[pos]
+        return self._shard(int(self.shards[pos]))[offset:offset +
+                                                   self.lengths[pos]]
+
+
+@register
+@serializable
+class PackedCOCODataSet(COCODataSet):
+    """
+    COCODataSet reading images from an image pack instead of single files,
+    pack the images with `tools/pack_images.py` first. The encoded bytes are
+    set as sample['image'] and decoded by the `Decode` op as usual.
+
+    Args:
+        dataset_dir (str): root directory for dataset.
+        image_dir (str): directory the images were packed from, the keys of
+            the pack are the `file_name` of the annotation.
+        anno_path (str): coco annotation file path.
+        pack_dir (str): directory of the image pack, relative to
+            dataset_dir.
+        data_fields (list): key name of data dictionary, at least have 'image'.
+        sample_num (int): number of samples to load, -1 means all.
+        load_crowd (bool): whether to load crowded ground-truth.
+            False as default
+        allow_empty (bool): whether to load empty entry. False as default
+        empty_ratio (float): the ratio of empty record number to total
+            record's, if empty_ratio is out of [0. ,1.), do not sample the
+            records and use all the empty entries. 1. as default
+        repeat (int): repeat times for dataset, use in benchmark.
+        anno_cache_root (str): directory to cache the parsed annotations in.
+    """
+
+    def __init__(self,
+                 dataset_dir=None,
+                 image_dir=None,
+                 anno_path=None,
+                 pack_dir=None,
+                 data_fields=['image'],
+                 sample_num=-1,
+                 load_crowd=False,
+                 allow_empty=False,
+                 empty_ratio=1.,
+                 repeat=1,
+                 anno_cache_root=None):
+        super(PackedCOCODataSet, self).__init__(
+            dataset_dir,
+            image_dir,
+            anno_path,
+            data_fields,
+            sample_num,
+            load_crowd,
+            allow_empty,
+            empty_ratio,
+            repeat,
+            anno_cache_root=anno_cache_root)
+        assert pack_dir is not None, 'pack_dir should be set'
+        self.pack_dir = pack_dir
+        self._pack = None
+
+    @property
+    def pack(self):
+        if self._pack is None:
+            self._pack = ImagePackReader(
+                os.path.join(self.dataset_dir, self.pack_dir))
+        return self._pack
+
+    def _pack_key(self, im_path):
+        image_dir = os.path.join(self.dataset_dir, self.image_dir)
+        return os.path.relpath(im_path, image_dir) if image_dir else im_path
+
+    def _image_exists(self, im_path):
+        return self._pack_key(im_path) in self.pack
+
+    def _cache_options(self):
+        options = super(PackedCOCODataSet, self)._cache_options()
+        options['pack_dir'] = self.pack_dir
+        return options
+
+    def _get_roidb(self, idx):
+        roidb = super(PackedCOCODataSet, self)._get_roidb(idx)
+        if 'im_file' in roidb:
+            roidb['image'] = self.pack.read(self._pack_key(roidb['im_file']))
+        return roidb
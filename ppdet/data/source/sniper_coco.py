@@ -83,6 +83,8 @@ class SniperCOCODataSet(COCODataSet):
     def parse_dataset(self):
         if not hasattr(self, "roidbs"):
             super(SniperCOCODataSet, self).parse_dataset()
+            # chip generation edits the records, work on a plain list
+            self.roidbs = self.roidbs.to_records()
         if self.is_trainset:
             self._parse_proposals()
             self._merge_anno_proposals()
@@ -28,7 +28,7 @@ import copy
 import math
 import numpy as np
 from .operators import register_op, BaseOperator, Resize
-from .op_helper import jaccard_overlap, gaussian2D, gaussian_radius, draw_umich_gaussian
+from .op_helper import gaussian2D, gaussian_radius, draw_umich_gaussian
 from .atss_assigner import ATSSAssigner
 from scipy import ndimage
 
@@ -187,88 +187,114 @@ class Gt2YoloTarget(BaseOperator):
 
         h, w = samples[0]['image'].shape[1:3]
         an_hw = np.array(self.anchors) / np.array([[w, h]])
-        for sample in samples:
+
+        # gather the gt boxes of the whole batch, in sample order
+        sample_ids, gt_bboxes, gt_classes, gt_scores = [], [], [], []
+        for s, sample in enumerate(samples):
             gt_bbox = sample['gt_bbox']
-            gt_class = sample['gt_class']
             if 'gt_score' not in sample:
                 sample['gt_score'] = np.ones(
                     (gt_bbox.shape[0], 1), dtype=np.float32)
-            gt_score = sample['gt_score']
-            for i, (
-                    mask, downsample_ratio
-            ) in enumerate(zip(self.anchor_masks, self.downsample_ratios)):
-                grid_h = int(h / downsample_ratio)
-                grid_w = int(w / downsample_ratio)
-                target = np.zeros(
-                    (len(mask), 6 + self.num_classes, grid_h, grid_w),
-                    dtype=np.float32)
-                for b in range(gt_bbox.shape[0]):
-                    gx, gy, gw, gh = gt_bbox[b, :]
-                    cls = gt_class[b]
-                    score = gt_score[b]
-                    if gw <= 0. or gh <= 0. or score <= 0.:
-                        continue
+            sample_ids.append(np.full(gt_bbox.shape[0], s, dtype=np.int64))
+            gt_bboxes.append(gt_bbox.reshape(-1, 4))
+            gt_classes.append(sample['gt_class'].reshape(-1))
+            gt_scores.append(sample['gt_score'].reshape(-1))
+        sample_ids = np.concatenate(sample_ids)
+        gt_bbox = np.concatenate(gt_bboxes)
+        gt_class = np.concatenate(gt_classes).astype(np.int64)
+        gt_score = np.concatenate(gt_scores)
+
+        # filter invalid boxes, and keep the scalar float64 arithmetic of the
+        # per-box implementation so that the targets are bit-identical
+        valid = ~((gt_bbox[:, 2] <= 0.) | (gt_bbox[:, 3] <= 0.) |
+                  (gt_score <= 0.))
+        sample_ids, gt_class, gt_score = sample_ids[valid], gt_class[
+            valid], gt_score[valid]
+        gt_bbox = gt_bbox[valid]
+        # the scale target multiplies w and h in their own dtype
+        gwh = gt_bbox[:, 2] * gt_bbox[:, 3]
+        gx, gy, gw, gh = gt_bbox.astype(np.float64).T
+
+        # iou between gt box and anchors, both placed at the origin
+        an_w, an_h = an_hw[:, 0], an_hw[:, 1]
+        inter = np.minimum(gw[:, None], an_w[None]) * np.minimum(gh[:, None],
+                                                                 an_h[None])
+        iou = inter / (
+            (gw * gh)[:, None] + (an_w * an_h)[None] - inter)
+        best_idx = np.argmax(iou, axis=1)
+        best_idx[iou.max(axis=1, initial=0.) <= 0.] = -1
 
-                    # find best match anchor index
-                    best_iou = 0.
-                    best_idx = -1
-                    for an_idx in range(an_hw.shape[0]):
-                        iou = jaccard_overlap(
-                            [0., 0., gw, gh],
-                            [0., 0., an_hw[an_idx, 0], an_hw[an_idx, 1]])
-                        if iou > best_iou:
-                            best_iou = iou
-                            best_idx = an_idx
-
-                    gi = int(gx * grid_w)
-                    gj = int(gy * grid_h)
-
-                    # gtbox should be regresed in this layes if best match 
-                    # anchor index in anchor mask of this layer
-                    if best_idx in mask:
-                        best_n = mask.index(best_idx)
-
-                        # x, y, w, h, scale
-                        target[best_n, 0, gj, gi] = gx * grid_w - gi
-                        target[best_n, 1, gj, gi] = gy * grid_h - gj
-                        target[best_n, 2, gj, gi] = np.log(
-                            gw * w / self.anchors[best_idx][0])
-                        target[best_n, 3, gj, gi] = np.log(
-                            gh * h / self.anchors[best_idx][1])
-                        target[best_n, 4, gj, gi] = 2.0 - gw * gh
-
-                        # objectness record gt_score
-                        target[best_n, 5, gj, gi] = score
-
-                        # classification
-                        target[best_n, 6 + cls, gj, gi] = 1.
-
-                    # For non-matched anchors, calculate the target if the iou 
-                    # between anchor and gt is larger than iou_thresh
-                    if self.iou_thresh < 1:
-                        for idx, mask_i in enumerate(mask):
-                            if mask_i == best_idx: continue
-                            iou = jaccard_overlap(
-                                [0., 0., gw, gh],
-                                [0., 0., an_hw[mask_i, 0], an_hw[mask_i, 1]])
-                            if iou > self.iou_thresh and target[idx, 5, gj,
-                                                                gi] == 0.:
-                                # x, y, w, h, scale
-                                target[idx, 0, gj, gi] = gx * grid_w - gi
-                                target[idx, 1, gj, gi] = gy * grid_h - gj
-                                target[idx, 2, gj, gi] = np.log(
-                                    gw * w / self.anchors[mask_i][0])
-                                target[idx, 3, gj, gi] = np.log(
-                                    gh * h / self.anchors[mask_i][1])
-                                target[idx, 4, gj, gi] = 2.0 - gw * gh
-
-                                # objectness record gt_score
-                                target[idx, 5, gj, gi] = score
-
-                                # classification
-                                target[idx, 6 + cls, gj, gi] = 1.
-                sample['target{}'.format(i)] = target
+        for i, (
+                mask, downsample_ratio
+        ) in enumerate(zip(self.anchor_masks, self.downsample_ratios)):
+            grid_h = int(h / downsample_ratio)
+            grid_w = int(w / downsample_ratio)
+            target = np.zeros(
+                (len(samples), len(mask), 6 + self.num_classes, grid_h,
+                 grid_w),
+                dtype=np.float32)
+            gi = (gx * grid_w).astype(np.int64)
+            gj = (gy * grid_h).astype(np.int64)
+
+            # anchor index -> position in mask of this layer
+            an_pos = -np.ones(an_hw.shape[0], dtype=np.int64)
+            an_pos[mask] = np.arange(len(mask))
+
+            # match events (gt, anchor position), best matches first
+            best_pos = np.where(best_idx >= 0, an_pos[best_idx], -1)
+            ev_gt = np.flatnonzero(best_pos >= 0)
+            ev_pos = best_pos[ev_gt]
+            ev_best = np.ones(len(ev_gt), dtype=bool)
+            if self.iou_thresh < 1:
+                # non-best anchors of this layer with iou over iou_thresh
+                mask_iou = iou[:, mask]
+                extra = (mask_iou > self.iou_thresh) & (
+                    np.array(mask)[None] != best_idx[:, None])
+                extra_gt, extra_pos = np.nonzero(extra)
+                ev_gt = np.concatenate([ev_gt, extra_gt])
+                ev_pos = np.concatenate([ev_pos, extra_pos])
+                ev_best = np.concatenate(
+                    [ev_best, np.zeros(
+                        len(extra_gt), dtype=bool)])
+
+            # order events by target cell, then by gt order
+            cell = ((sample_ids[ev_gt] * len(mask) + ev_pos) * grid_h +
+                    gj[ev_gt]) * grid_w + gi[ev_gt]
+            order = np.lexsort((ev_gt, cell))
+            ev_gt, ev_pos, ev_best, cell = ev_gt[order], ev_pos[
+                order], ev_best[order], cell[order]
+            first = np.ones(len(cell), dtype=bool)
+            first[1:] = cell[1:] != cell[:-1]
+            # a non-best match only writes a cell nothing was written to
+            applied = ev_best | first
+            ev_gt, ev_pos, cell = ev_gt[applied], ev_pos[applied], cell[
+                applied]
+
+            # every applied match sets its class, the last one sets the rest
+            an_idx = np.array(mask, dtype=np.int64)[ev_pos]
+            s, g = sample_ids[ev_gt], ev_gt
+            target[s, ev_pos, 6 + gt_class[g], gj[g], gi[g]] = 1.
+            last = np.ones(len(cell), dtype=bool)
+            last[:-1] = cell[:-1] != cell[1:]
+            s, g, n, a = s[last], g[last], ev_pos[last], an_idx[last]
+            anchors = np.array(self.anchors, dtype=np.float64)
+            values = np.stack(
+                [
+                    gx[g] * grid_w - gi[g],
+                    gy[g] * grid_h - gj[g],
+                    np.log(gw[g] * w / anchors[a, 0]),
+                    np.log(gh[g] * h / anchors[a, 1]),
+                    2.0 - gwh[g].astype(np.float64),
+                    gt_score[g],
+                ],
+                axis=1)
+            target[s[:, None], n[:, None], np.arange(6)[None], gj[g][:, None],
+                   gi[g][:, None]] = values
+
+            for s, sample in enumerate(samples):
+                sample['target{}'.format(i)] = target[s]
 
+        for sample in samples:
             # remove useless gt_class and gt_score after target calculated
             sample.pop('gt_class')
             sample.pop('gt_score')
@@ -0,0 +1,430 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import hashlib
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from ppdet.utils.logger import setup_logger
+logger = setup_logger(__name__)
+
+__all__ = ['SharedImageCache']
+
+MAGIC = 0x70706465745f6963  # 'ppdet_ic'
+
+HEADER_DTYPE = np.dtype([
+    ('magic', np.uint64),
+    ('capacity', np.uint64),
+    ('max_entries', np.uint64),
+    ('clock', np.uint64),
+    ('hits', np.uint64),
+    ('misses', np.uint64),
+    ('evictions', np.uint64),
+    ('entries', np.uint64),
+    ('used', np.uint64),
+    ('cursor', np.uint64),
+    ('gap', np.uint64),
+])
+
+SLOT_DTYPE = np.dtype([
+    ('key0', np.uint64),
+    ('key1', np.uint64),
+    ('valid', np.uint8),
+    ('offset', np.uint64),
+    ('nbytes', np.uint64),
+    ('shape', np.int32, (3, )),
+])
+
+# gap buffers of the entries in the order of offset
+ORDER_FIELDS = ['starts', 'ends', 'order', 'last', 'freq']
+
+
+class _FileLock(object):
+    """Inter-process lock on a file, a thread lock where fcntl is missing."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._pid = None
+        self._thread_lock = threading.Lock()
+
+    def __enter__(self):
+        if fcntl is None:
+            self._thread_lock.acquire()
+            return self
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+            self._pid = os.getpid()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        if fcntl is None:
+            self._thread_lock.release()
+        else:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class SharedImageCache(object):
+    """
+    Decoded image cache shared by all dataloader workers.
+
+    Images are stored as raw uint8 arrays in one memory-mapped arena file of
+    `capacity` bytes, described by a memory-mapped slot table. Both files
+    live in `cache_root` (a tmpfs such as /dev/shm keeps them in shared
+    memory), every worker process maps the same pages, so an image decoded
+    by one worker is a hit for all others. Entries are keyed by the full
+    path and modification time of the image file, or by the encoded bytes
+    of images not read from a file (e.g. from an image pack), and evicted by
+    least recently used ('lru') or least frequently used ('lfu') order when
+    the arena or the slot table is full. The slot table is an open
+    addressing hash table on the key with linear probing, twice as large as
+    `max_entries`, so a lookup only reads a few slots. The arena ranges,
+    slots and usage of the entries are also kept sorted by offset in gap
+    buffers, whose gap follows the insertions and removals, so that free
+    gaps and victims are found without sorting the entries, and the
+    insertions next to the last one only move a few entries.
+
+    Args:
+        cache_root (str): directory of the arena and slot table files.
+        capacity (int): byte budget of the arena.
+        max_entries (int): max number of cached images.
+        policy (str): eviction policy, 'lru' or 'lfu'.
+    """
+
+    def __init__(self,
+                 cache_root,
+                 capacity=4 << 30,
+                 max_entries=200000,
+                 policy='lru'):
+        assert policy in ['lru', 'lfu'], \
+            'policy should be lru or lfu, but got {}'.format(policy)
+        if not os.path.isdir(cache_root):
+            os.makedirs(cache_root)
+        self.cache_root = cache_root
+        self.capacity = int(capacity)
+        self.max_entries = int(max_entries)
+        self.num_slots = 2 * self.max_entries
+        self.policy = policy
+        self._arena_path = os.path.join(cache_root, 'arena.bin')
+        self._table_path = os.path.join(cache_root, 'table.bin')
+        self._lock = _FileLock(os.path.join(cache_root, 'lock'))
+        self._pid = None
+        with self._lock:
+            self._init_files()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for k in [
+                '_pid', '_header', '_slots', '_arena', '_starts', '_ends',
+                '_order', '_last', '_freq', '_order_arrays'
+        ]:
+            state.pop(k, None)
+        state['_lock'] = _FileLock(self._lock.path)
+        return state
+
+    def _init_files(self):
+        table_size = HEADER_DTYPE.itemsize + \
+            SLOT_DTYPE.itemsize * self.num_slots + \
+            8 * len(ORDER_FIELDS) * self.max_entries
+        if os.path.exists(self._table_path) and \
+                os.path.getsize(self._table_path) == table_size and \
+                os.path.exists(self._arena_path) and \
+                os.path.getsize(self._arena_path) == self.capacity:
+            header = np.memmap(
+                self._table_path, dtype=HEADER_DTYPE, mode='r', shape=(1, ))
+            if header['magic'][0] == MAGIC and \
+                    header['capacity'][0] == self.capacity and \
+                    header['max_entries'][0] == self.max_entries:
+                return
+            del header
+        # (re)create the files, sparse until images are written
+        with open(self._arena_path, 'wb') as f:
+            f.truncate(self.capacity)
+        with open(self._table_path, 'wb') as f:
+            f.truncate(table_size)
+        header = np.memmap(
+            self._table_path, dtype=HEADER_DTYPE, mode='r+', shape=(1, ))
+        header['capacity'] = self.capacity
+        header['max_entries'] = self.max_entries
+        header['magic'] = MAGIC
+        header.flush()
+
+    def _attach(self):
+        # maps are created per process, pages of the files are shared
+        if self._pid == os.getpid():
+            return
+        # plain arrays viewing the maps, without the overhead of np.memmap
+        self._header = np.asarray(
+            np.memmap(
+                self._table_path, dtype=HEADER_DTYPE, mode='r+',
+                shape=(1, )))
+        self._slots = np.asarray(
+            np.memmap(
+                self._table_path,
+                dtype=SLOT_DTYPE,
+                mode='r+',
+                offset=HEADER_DTYPE.itemsize,
+                shape=(self.num_slots, )))
+        order = np.asarray(
+            np.memmap(
+                self._table_path,
+                dtype=np.int64,
+                mode='r+',
+                offset=HEADER_DTYPE.itemsize + SLOT_DTYPE.itemsize *
+                self.num_slots,
+                shape=(len(ORDER_FIELDS), self.max_entries)))
+        self._starts, self._ends, self._order, self._last, self._freq = order
+        self._order_arrays = list(order)
+        self._arena = np.memmap(
+            self._arena_path, dtype=np.uint8, mode='r+')
+        self._pid = os.getpid()
+
+    @staticmethod
+    def make_key(path, data=None):
+        """
+        Key of an image file from its full path and mtime. Images which are
+        not a file, such as the ones of `PackedCOCODataSet`, are keyed by
+        their encoded bytes `data`, None is returned if `data` is not given.
+        """
+        if os.path.isfile(path):
+            st = os.stat(path)
+            ident = '{}:{}:{}'.format(
+                os.path.abspath(path), st.st_mtime_ns,
+                st.st_size).encode('utf-8')
+        elif data is not None:
+            ident = np.frombuffer(data, dtype=np.uint8)
+        else:
+            return None
+        key = np.frombuffer(hashlib.md5(ident).digest(), dtype=np.uint64)
+        return key[0], key[1]
+
+    def _home(self, key0):
+        return int(key0) % self.num_slots
+
+    def _probe(self, key):
+        """Slot of `key`, or the empty slot ending its probe sequence."""
+        slots = self._slots
+        idx = self._home(key[0])
+        while slots['valid'][idx] == 1:
+            if slots['key0'][idx] == key[0] and slots['key1'][idx] == key[1]:
+                return idx, True
+            idx = (idx + 1) % self.num_slots
+        return idx, False
+
+    def _find(self, key):
+        idx, found = self._probe(key)
+        return idx if found else -1
+
+    def _gap(self):
+        """Start and length of the gap of the gap buffers."""
+        return int(self._header['gap'][0]), \
+            self.max_entries - int(self._header['entries'][0])
+
+    def _index(self, pos):
+        """Index in the gap buffers of the entry at position `pos`."""
+        gap, size = self._gap()
+        return pos if pos < gap else pos + size
+
+    def _live(self, array):
+        gap, size = self._gap()
+        return np.concatenate([array[:gap], array[gap + size:]])
+
+    def _position(self, offset):
+        """Position of the first entry at or after `offset`."""
+        gap, size = self._gap()
+        offset = int(offset)
+        pos = int(np.searchsorted(self._starts[:gap], offset))
+        if pos == gap:
+            pos += int(np.searchsorted(self._starts[gap + size:], offset))
+        return pos
+
+    def _move_gap(self, pos):
+        gap, size = self._gap()
+        for array in self._order_arrays:
+            if pos < gap:
+                array[pos + size:gap + size] = array[pos:gap]
+            elif pos > gap:
+                array[gap:pos] = array[gap + size:pos + size]
+        self._header['gap'] = pos
+
+    def _insert(self, idx):
+        offset = int(self._slots['offset'][idx])
+        nbytes = int(self._slots['nbytes'][idx])
+        pos = self._position(offset)
+        self._move_gap(pos)
+        self._starts[pos] = offset
+        self._ends[pos] = offset + nbytes
+        self._order[pos] = idx
+        self._last[pos] = self._tick()
+        self._freq[pos] = 1
+        self._header['gap'] = pos + 1
+        self._header['entries'] += 1
+        self._header['used'] += nbytes
+
+    def _remove(self, idx):
+        """Remove the entry of slot `idx`, return its position by offset."""
+        pos = self._position(self._slots['offset'][idx])
+        # the entry follows the gap, and becomes a part of it
+        self._move_gap(pos)
+        self._header['entries'] -= 1
+        self._header['used'] -= int(self._slots['nbytes'][idx])
+
+        # backward shift deletion, so that no probe sequence is broken
+        slots = self._slots
+        slots['valid'][idx] = 0
+        nxt = idx
+        while True:
+            nxt = (nxt + 1) % self.num_slots
+            if slots['valid'][nxt] == 0:
+                return pos
+            # entries whose home is cyclically in (idx, nxt] stay
+            home = self._home(slots['key0'][nxt])
+            if (idx < home <= nxt) if idx < nxt else (home > idx or
+                                                       home <= nxt):
+                continue
+            slots[idx] = slots[nxt]
+            slots['valid'][nxt] = 0
+            self._order[self._index(self._position(slots['offset'][
+                idx]))] = idx
+            idx = nxt
+
+    def _tick(self):
+        self._header['clock'] += 1
+        return self._header['clock'][0]
+
+    def get(self, key):
+        """Return a copy of the cached image of `key`, or None."""
+        self._attach()
+        with self._lock:
+            idx = self._find(key)
+            if idx < 0:
+                self._header['misses'] += 1
+                return None
+            slot = self._slots[idx]
+            offset, nbytes = int(slot['offset']), int(slot['nbytes'])
+            shape = tuple(int(s) for s in slot['shape'])
+            im = np.array(self._arena[offset:offset + nbytes]).reshape(shape)
+            index = self._index(self._position(offset))
+            self._last[index] = self._tick()
+            self._freq[index] += 1
+            self._header['hits'] += 1
+        return im
+
+    def put(self, key, im):
+        """Store image `im`, return False if it does not fit the arena."""
+        im = np.ascontiguousarray(im, dtype=np.uint8)
+        if im.ndim == 2:
+            im = im[:, :, None]
+        nbytes = im.nbytes
+        if nbytes == 0 or nbytes > self.capacity or im.ndim != 3:
+            return False
+        self._attach()
+        with self._lock:
+            if self._find(key) >= 0:
+                return True
+            offset = self._allocate(nbytes)
+            idx, _ = self._probe(key)
+            self._arena[offset:offset + nbytes] = im.reshape(-1)
+            slot = self._slots[idx:idx + 1]
+            slot['key0'], slot['key1'] = key
+            slot['offset'] = offset
+            slot['nbytes'] = nbytes
+            slot['shape'] = im.shape
+            slot['valid'] = 1
+            self._insert(idx)
+            self._header['cursor'] = offset + nbytes
+        return True
+
+    def _victim(self):
+        last = self._live(self._last)
+        if self.policy == 'lfu':
+            freq = self._live(self._freq)
+            least = np.flatnonzero(freq == freq.min())
+            pos = least[np.argmin(last[least])]
+        else:
+            pos = np.argmin(last)
+        return int(self._order[self._index(int(pos))])
+
+    def _fit(self, nbytes):
+        """First gap of `nbytes` from the end of the last insertion, or None."""
+        # the gap after the last insertion, free at the first fills of the
+        # arena and after the evictions of the entries that followed it
+        cursor = int(self._header['cursor'][0])
+        pos = self._position(cursor)
+        lo, hi = self._free_range(pos)
+        lo = max(cursor, lo)
+        if hi - lo >= nbytes:
+            return lo
+        # no gap is large enough if the free bytes are not
+        if self.capacity - int(self._header['used'][0]) < nbytes:
+            return None
+        starts, ends = self._live(self._starts), self._live(self._ends)
+        gap_starts = np.concatenate([[0], ends])
+        gap_ends = np.concatenate([starts, [self.capacity]])
+        fits = np.flatnonzero(gap_ends - gap_starts >= nbytes)
+        return int(gap_starts[fits[0]]) if len(fits) > 0 else None
+
+    def _free_range(self, pos):
+        """Free arena range before the entry at position `pos`."""
+        num = int(self._header['entries'][0])
+        lo = int(self._ends[self._index(pos - 1)]) if pos > 0 else 0
+        hi = int(self._starts[self._index(pos)]) if pos < num else \
+            self.capacity
+        return lo, hi
+
+    def _allocate(self, nbytes):
+        """Find a gap for `nbytes` and a free slot, evicting as needed."""
+        offset = self._fit(nbytes)
+        while offset is None or \
+                self._header['entries'][0] >= self.max_entries:
+            pos = self._remove(self._victim())
+            self._header['evictions'] += 1
+            if offset is None:
+                # the gap left by the victim, merged with its neighbours
+                lo, hi = self._free_range(pos)
+                if hi - lo >= nbytes:
+                    offset = lo
+        return offset
+
+    def stats(self):
+        self._attach()
+        header = self._header[0]
+        num = int(header['entries'])
+        hits, misses = int(header['hits']), int(header['misses'])
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / max(hits + misses, 1),
+            'evictions': int(header['evictions']),
+            'entries': num,
+            'bytes': int(header['used']),
+            'capacity': self.capacity,
+        }
+
+    def clear(self):
+        self._attach()
+        with self._lock:
+            self._slots['valid'] = 0
+            for k in [
+                    'hits', 'misses', 'evictions', 'entries', 'used',
+                    'cursor', 'gap'
+            ]:
+                self._header[k] = 0
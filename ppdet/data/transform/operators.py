@@ -37,14 +37,12 @@ import logging
 import cv2
 from PIL import Image, ImageDraw, ImageEnhance
 from pycocotools import mask
-import pickle
-import threading
-MUTEX = threading.Lock()
 
 import paddle
 from ppdet.core.workspace import serializable
 from ..reader import Compose
 
+from .image_cache import SharedImageCache
 from .op_helper import (satisfy_sample_constraint, filter_and_process,
                         generate_sample_bbox, clip_bbox, data_anchor_sampling,
                         satisfy_sample_constraint_coverage, crop_image_sampling,
@@ -171,25 +169,46 @@ def _make_dirs(dirname):
 
 @register_op
 class DecodeCache(BaseOperator):
-    def __init__(self, cache_root=None):
-        '''decode image and caching
+    def __init__(self,
+                 cache_root=None,
+                 cache_size=4096,
+                 max_entries=200000,
+                 policy='lru',
+                 log_interval=0):
+        '''decode image and cache the decoded image in a SharedImageCache
+        shared by all dataloader workers
+        Args:
+            cache_root (str): directory of the cache files, a tmpfs such as
+                /dev/shm is recommended. None means no caching.
+            cache_size (int): byte budget of the cache in MB.
+            max_entries (int): max number of cached images.
+            policy (str): eviction policy, 'lru' or 'lfu'.
+            log_interval (int): log the cache statistics every log_interval
+                samples of a worker, 0 means no logging.
         '''
         super(DecodeCache, self).__init__()
 
         self.use_cache = False if cache_root is None else True
         self.cache_root = cache_root
+        self.log_interval = log_interval
+        self._count = 0
 
+        self.cache = None
         if cache_root is not None:
-            _make_dirs(cache_root)
+            self.cache = SharedImageCache(
+                cache_root,
+                capacity=int(cache_size) << 20,
+                max_entries=max_entries,
+                policy=policy)
 
     def apply(self, sample, context=None):
+        key, im = None, None
+        if self.use_cache and 'im_file' in sample:
+            key = self.cache.make_key(sample['im_file'], sample.get('image'))
+            if key is not None:
+                im = self.cache.get(key)
 
-        if self.use_cache and os.path.exists(
-                self.cache_path(self.cache_root, sample['im_file'])):
-            path = self.cache_path(self.cache_root, sample['im_file'])
-            im = self.load(path)
-
-        else:
+        if im is None:
             if 'image' not in sample:
                 with open(sample['im_file'], 'rb') as f:
                     sample['image'] = f.read()
@@ -201,10 +220,16 @@ class DecodeCache(BaseOperator):
                 sample['ori_image'] = im
             im = cv2.cvtColor(im, cv2.COLOR_BGR2RGB)
 
-            if self.use_cache and not os.path.exists(
-                    self.cache_path(self.cache_root, sample['im_file'])):
-                path = self.cache_path(self.cache_root, sample['im_file'])
-                self.dump(im, path)
+            if key is not None:
+                self.cache.put(key, im)
+        elif 'keep_ori_im' in sample and sample['keep_ori_im']:
+            sample['ori_image'] = cv2.cvtColor(im, cv2.COLOR_RGB2BGR)
+
+        if self.use_cache and self.log_interval > 0:
+            self._count += 1
+            if self._count % self.log_interval == 0:
+                logger.info('DecodeCache stats: {}'.format(self.cache.stats(
+                )))
 
         sample['image'] = im
         sample['h'] = im.shape[0]
@@ -213,33 +238,10 @@ class DecodeCache(BaseOperator):
         sample['im_shape'] = np.array(im.shape[:2], dtype=np.float32)
         sample['scale_factor'] = np.array([1., 1.], dtype=np.float32)
 
-        sample.pop('im_file')
+        sample.pop('im_file', None)
 
         return sample
 
-    @staticmethod
-    def cache_path(dir_oot, im_file):
-        return os.path.join(dir_oot, os.path.basename(im_file) + '.pkl')
-
-    @staticmethod
-    def load(path):
-        with open(path, 'rb') as f:
-            im = pickle.load(f)
-        return im
-
-    @staticmethod
-    def dump(obj, path):
-        MUTEX.acquire()
-        try:
-            with open(path, 'wb') as f:
-                pickle.dump(obj, f)
-
-        except Exception as e:
-            logger.warning('dump {} occurs exception {}'.format(path, str(e)))
-
-        finally:
-            MUTEX.release()
-
 
 @register_op
 class SniperDecodeCrop(BaseOperator):
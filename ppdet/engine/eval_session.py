@@ -0,0 +1,108 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import paddle
+
+from ppdet.utils.logger import setup_logger
+logger = setup_logger('ppdet.engine')
+
+__all__ = ['EvalSession']
+
+
+def _to_numpy(data):
+    if isinstance(data, paddle.Tensor):
+        return data.numpy()
+    if isinstance(data, dict):
+        return {k: _to_numpy(v) for k, v in data.items()}
+    if isinstance(data, (list, tuple)):
+        return type(data)(_to_numpy(v) for v in data)
+    return data
+
+
+def _to_tensor(data):
+    if isinstance(data, np.ndarray):
+        return paddle.to_tensor(data)
+    if isinstance(data, dict):
+        return {k: _to_tensor(v) for k, v in data.items()}
+    if isinstance(data, (list, tuple)):
+        return type(data)(_to_tensor(v) for v in data)
+    return data
+
+
+def _nbytes(data):
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    if isinstance(data, dict):
+        return sum(_nbytes(v) for v in data.values())
+    if isinstance(data, (list, tuple)):
+        return sum(_nbytes(v) for v in data)
+    return 0
+
+
+class EvalSession(object):
+    """
+    Evaluation data of the validations during training, kept across epochs.
+    The first validation reads the batches from the loader, and if
+    `cache_size` > 0 keeps them in host memory as numpy arrays, so later
+    validations skip decoding and preprocessing of the images and only run
+    the model and the metrics. The loader is used in every validation if
+    the batches exceed `cache_size`.
+
+    Args:
+        loader (DataLoader): evaluation loader, of a fixed order of images.
+        cache_size (float): max MB of the cached batches, 0 to not cache.
+    """
+
+    def __init__(self, loader, cache_size=0):
+        self.loader = loader
+        self.cache_size = int(cache_size * 1024 * 1024)
+        self._batches = None
+
+    def __len__(self):
+        return len(self.loader)
+
+    @property
+    def cached(self):
+        return self._batches is not None
+
+    def __iter__(self):
+        if self._batches is not None:
+            for batch in self._batches:
+                yield _to_tensor(batch)
+            return
+
+        batches = [] if self.cache_size > 0 else None
+        nbytes = 0
+        for data in self.loader:
+            if batches is not None:
+                batch = _to_numpy(data)
+                nbytes += _nbytes(batch)
+                if nbytes > self.cache_size:
+                    logger.warning(
+                        'Evaluation data exceeds eval_cache_size {} MB, it '
+                        'is not cached.'.format(self.cache_size // 1024**2))
+                    self.cache_size = 0
+                    batches = None
+                else:
+                    batches.append(batch)
+            yield data
+        if batches is not None:
+            logger.info('Cached {} evaluation batches of {:.1f} MB.'.format(
+                len(batches), nbytes / 1024**2))
+            self._batches = batches
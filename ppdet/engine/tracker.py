@@ -96,7 +96,9 @@ class Tracker(object):
             return
 
         if self.cfg.metric == 'MOT':
-            self._metrics = [MOTMetric(), ]
+            self._metrics = [
+                MOTMetric(num_workers=self.cfg.get('eval_workers', 0))
+            ]
         elif self.cfg.metric == 'MCMOT':
             self._metrics = [MCMOTMetric(self.cfg.num_classes), ]
         elif self.cfg.metric == 'KITTI':
@@ -291,6 +293,9 @@ class Tracker(object):
 
             # forward
             timer.tic()
+            if isinstance(tracker, BOTSORTTracker) and tracker.camera_motion:
+                # estimate the camera motion while the detector runs
+                tracker.prefetch(ori_image.numpy())
             if not use_detector:
                 dets = dets_list[frame_id]
                 bbox_tlwh = np.array(dets['bbox'], dtype='float32')
@@ -480,6 +485,8 @@ class Tracker(object):
                 raise ValueError(tracker)
             frame_id += 1
 
+        if isinstance(tracker, BOTSORTTracker):
+            tracker.close()
         return results, frame_id, timer.average_time, timer.calls
 
     def mot_evaluate(self,
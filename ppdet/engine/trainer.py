@@ -41,6 +41,8 @@ from ppdet.utils.checkpoint import load_weight, load_pretrain_weight, convert_to
 from ppdet.utils.visualizer import visualize_results, save_result
 from ppdet.metrics import get_infer_results, KeyPointTopDownCOCOEval, KeyPointTopDownCOCOWholeBadyHandEval, KeyPointTopDownMPIIEval, Pose3DEval
 from ppdet.metrics import Metric, COCOMetric, VOCMetric, WiderFaceMetric, RBoxMetric, JDEDetMetric, SNIPERCOCOMetric, CULaneMetric
+from ppdet.metrics.dist_utils import gather_metrics
+from ppdet.data.reader import DistributedEvalBatchSampler
 from ppdet.data.source.sniper_coco import SniperCOCODataSet
 from ppdet.data.source.category import get_categories
 import ppdet.utils.stats as stats
@@ -50,6 +52,7 @@ from ppdet.modeling.post_process import multiclass_nms
 from ppdet.modeling.lane_utils import imshow_lanes
 
 from .callbacks import Callback, ComposeCallback, LogPrinter, Checkpointer, WiferFaceEval, VisualDLWriter, SniperProposalsGenerator, WandbCallback, SemiCheckpointer, SemiLogPrinter
+from .eval_session import EvalSession
 from .export_utils import _dump_infer_config, _prune_input_spec, apply_to_static
 from .naive_sync_bn import convert_syncbn
 
@@ -62,6 +65,13 @@ __all__ = ['Trainer']
 
 MOT_ARCH = ['JDE', 'FairMOT', 'DeepSORT', 'ByteTrack', 'CenterTrack']
 
+# metrics whose states can be gathered from all ranks to shard evaluation
+DISTRIBUTED_EVAL_METRICS = [
+    'COCO', 'SNIPERCOCO', 'VOC', 'RBOX', 'WiderFace',
+    'KeyPointTopDownCOCOEval', 'KeyPointTopDownCOCOWholeBadyHandEval',
+    'KeyPointTopDownMPIIEval'
+]
+
 
 class Trainer(object):
     def __init__(self, cfg, mode='train'):
@@ -163,8 +173,11 @@ class Trainer(object):
         else:
             self.model.load_meanstd(cfg['TestReader']['sample_transforms'])
 
-        # EvalDataset build with BatchSampler to evaluate in single device
-        # TODO: multi-device evaluate
+        # EvalDataset is sharded across devices if the metric states can be
+        # gathered, otherwise every device evaluates the whole dataset
+        self._distributed_eval = dist.get_world_size() > 1 and \
+            self.cfg.get('distributed_eval', True) and \
+            self.cfg.get('metric', None) in DISTRIBUTED_EVAL_METRICS
         if self.mode == 'eval':
             if cfg.architecture == 'FairMOT':
                 self.loader = create('EvalMOTReader')(self.dataset, 0)
@@ -172,8 +185,8 @@ class Trainer(object):
                 reader_name = '{}Reader'.format(self.mode.capitalize())
                 self.loader = create(reader_name)(self.dataset, cfg.worker_num)
             else:
-                self._eval_batch_sampler = paddle.io.BatchSampler(
-                    self.dataset, batch_size=self.cfg.EvalReader['batch_size'])
+                self._eval_batch_sampler = self._create_eval_batch_sampler(
+                    self.dataset)
                 reader_name = '{}Reader'.format(self.mode.capitalize())
                 # If metric is VOC, need to be set collate_batch=False.
                 if cfg.metric == 'VOC':
@@ -260,6 +273,12 @@ class Trainer(object):
         self._init_metrics()
         self._reset_metrics()
 
+    def _create_eval_batch_sampler(self, dataset):
+        batch_size = self.cfg.EvalReader['batch_size']
+        if self._distributed_eval:
+            return DistributedEvalBatchSampler(dataset, batch_size)
+        return paddle.io.BatchSampler(dataset, batch_size=batch_size)
+
     def _init_callbacks(self):
         if self.mode == 'train':
             if self.cfg.get('ssod_method',
@@ -327,7 +346,10 @@ class Trainer(object):
                         bias=bias,
                         IouType=IouType,
                         save_prediction_only=save_prediction_only,
-                        save_threshold=save_threshold)
+                        save_threshold=save_threshold,
+                        stream_eval=self.cfg.get('stream_eval', False),
+                        save_json=self.cfg.get('save_json', True),
+                        eval_workers=self.cfg.get('eval_workers', 0))
                 ]
             elif self.cfg.metric == "SNIPERCOCO":  # sniper
                 self._metrics = [
@@ -644,9 +666,15 @@ class Trainer(object):
             if self.cfg.get('unstructured_prune'):
                 self.pruner.update_params()
 
+            is_snapshot_epoch = (epoch_id + 1) % self.cfg.snapshot_epoch == 0 \
+                or epoch_id == self.end_epoch - 1
             is_snapshot = (self._nranks < 2 or (self._local_rank == 0 or self.cfg.metric == "Pose3DEval")) \
-                       and ((epoch_id + 1) % self.cfg.snapshot_epoch == 0 or epoch_id == self.end_epoch - 1)
-            if is_snapshot and self.use_ema:
+                       and is_snapshot_epoch
+            # all ranks take part in distributed evaluation
+            is_eval = validate and (is_snapshot or
+                                    self._distributed_eval and
+                                    is_snapshot_epoch)
+            if (is_snapshot or is_eval) and self.use_ema:
                 # apply ema weight on model
                 weight = copy.deepcopy(self.model.state_dict())
                 self.model.set_dict(self.ema.apply())
@@ -654,14 +682,12 @@ class Trainer(object):
 
             self._compose_callback.on_epoch_end(self.status)
 
-            if validate and is_snapshot:
+            if is_eval:
                 if not hasattr(self, '_eval_loader'):
                     # build evaluation dataset and loader
                     self._eval_dataset = self.cfg.EvalDataset
                     self._eval_batch_sampler = \
-                        paddle.io.BatchSampler(
-                            self._eval_dataset,
-                            batch_size=self.cfg.EvalReader['batch_size'])
+                        self._create_eval_batch_sampler(self._eval_dataset)
                     # If metric is VOC, need to be set collate_batch=False.
                     if self.cfg.metric == 'VOC':
                         self.cfg['EvalReader']['collate_batch'] = False
@@ -673,6 +699,11 @@ class Trainer(object):
                             self._eval_dataset,
                             self.cfg.worker_num,
                             batch_sampler=self._eval_batch_sampler)
+                    # batches and ground truth are kept for the validations
+                    # of all epochs
+                    self._eval_session = EvalSession(
+                        self._eval_loader,
+                        cache_size=self.cfg.get('eval_cache_size', 0))
                 # if validation in training is enabled, metrics should be re-init
                 # Init_mark makes sure this code will only execute once
                 if validate and Init_mark == False:
@@ -682,9 +713,9 @@ class Trainer(object):
 
                 with paddle.no_grad():
                     self.status['save_best_model'] = True
-                    self._eval_with_loader(self._eval_loader)
+                    self._eval_with_loader(self._eval_session)
 
-            if is_snapshot and self.use_ema:
+            if (is_snapshot or is_eval) and self.use_ema:
                 # reset original weight
                 self.model.set_dict(weight)
                 self.status.pop('weight')
@@ -728,13 +759,19 @@ class Trainer(object):
                 sample_num += data['im_id'].numpy().shape[0]
             self._compose_callback.on_step_end(self.status)
 
+        if self._distributed_eval:
+            sample_num = paddle.to_tensor(sample_num)
+            dist.all_reduce(sample_num)
+            sample_num = int(sample_num)
         self.status['sample_num'] = sample_num
         self.status['cost_time'] = time.time() - tic
 
-        # accumulate metric to log out
-        for metric in self._metrics:
-            metric.accumulate()
-            metric.log()
+        # accumulate metric to log out, on rank 0 with the metric states of
+        # all ranks if evaluation is distributed
+        if not self._distributed_eval or gather_metrics(self._metrics):
+            for metric in self._metrics:
+                metric.accumulate()
+                metric.log()
         self._compose_callback.on_epoch_end(self.status)
         # reset metric states for metric may performed multiple times
         self._reset_metrics()
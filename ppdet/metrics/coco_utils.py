@@ -85,7 +85,9 @@ def cocoapi_eval(jsonfile,
                  max_dets=(100, 300, 1000),
                  classwise=False,
                  sigmas=None,
-                 use_area=True):
+                 use_area=True,
+                 coco_eval=None,
+                 num_workers=0):
     """
     Args:
         jsonfile (str): Evaluation json file, eg: bbox.json, mask.json.
@@ -98,8 +100,12 @@ def cocoapi_eval(jsonfile,
         sigmas (nparray): keypoint labelling sigmas.
         use_area (bool): If gt annotations (eg. CrowdPose, AIC)
                          do not have 'area', please set use_area=False.
+        coco_eval (StreamingCOCOeval): evaluator already fed with the
+                 results, jsonfile, coco_gt and anno_file are not used.
+        num_workers (int): number of processes of FastCOCOeval to evaluate
+                 chunks of categories, 0 to evaluate in this process.
     """
-    assert coco_gt != None or anno_file != None
+    assert coco_gt != None or anno_file != None or coco_eval is not None
     if style == 'keypoints_crowd':
         #please install xtcocotools==1.6
         from xtcocotools.coco import COCO
@@ -111,18 +117,25 @@ def cocoapi_eval(jsonfile,
         except:
             from pycocotools.cocoeval import COCOeval
 
-    if coco_gt == None:
-        coco_gt = COCO(anno_file)
-    logger.info("Start evaluate...")
-    coco_dt = coco_gt.loadRes(jsonfile)
-    if style == 'proposal':
-        coco_eval = COCOeval(coco_gt, coco_dt, 'bbox')
-        coco_eval.params.useCats = 0
-        coco_eval.params.maxDets = list(max_dets)
-    elif style == 'keypoints_crowd':
-        coco_eval = COCOeval(coco_gt, coco_dt, style, sigmas, use_area)
+    if coco_eval is not None:
+        # results are already fed to the evaluator
+        coco_gt = coco_eval.cocoGt
+        logger.info("Start evaluate...")
     else:
-        coco_eval = COCOeval(coco_gt, coco_dt, style)
+        if coco_gt == None:
+            coco_gt = COCO(anno_file)
+        logger.info("Start evaluate...")
+        coco_dt = coco_gt.loadRes(jsonfile)
+        if style == 'proposal':
+            coco_eval = COCOeval(coco_gt, coco_dt, 'bbox')
+            coco_eval.params.useCats = 0
+            coco_eval.params.maxDets = list(max_dets)
+        elif style == 'keypoints_crowd':
+            coco_eval = COCOeval(coco_gt, coco_dt, style, sigmas, use_area)
+        else:
+            coco_eval = COCOeval(coco_gt, coco_dt, style)
+        if hasattr(coco_eval, 'num_workers'):
+            coco_eval.num_workers = num_workers
     coco_eval.evaluate()
     coco_eval.accumulate()
     coco_eval.summarize()
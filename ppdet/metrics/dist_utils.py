@@ -0,0 +1,84 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import paddle.distributed as dist
+
+__all__ = ['pack_results', 'unpack_results', 'gather_metrics']
+
+
+def _pack_column(values):
+    types = set(type(v) for v in values)
+    if types == {int}:
+        return np.array(values, dtype=np.int64)
+    if types == {float}:
+        return np.array(values, dtype=np.float64)
+    if types == {list}:
+        lengths = set(len(v) for v in values)
+        if len(lengths) == 1 and all(
+                type(x) is float for v in values for x in v):
+            return np.array(values, dtype=np.float64).reshape(
+                len(values), lengths.pop())
+    return values
+
+
+def pack_results(results):
+    """
+    Pack a list of result dicts, e.g. bbox results of `get_det_res`, to
+    columns to be sent to other ranks. Ints, floats and lists of floats of
+    the same length become numpy arrays, other values are kept as lists.
+    """
+    if len(results) == 0:
+        return []
+    keys = list(results[0].keys())
+    if any(list(res.keys()) != keys for res in results):
+        return results
+    return {k: _pack_column([res[k] for res in results]) for k in keys}
+
+
+def unpack_results(packed):
+    """Restore the list of result dicts packed by `pack_results`."""
+    if isinstance(packed, list):
+        return packed
+    columns = [
+        v.tolist() if isinstance(v, np.ndarray) else v
+        for v in packed.values()
+    ]
+    return [dict(zip(packed.keys(), values)) for values in zip(*columns)]
+
+
+def gather_metrics(metrics, group=None):
+    """
+    Gather the states of `metrics`, updated by every rank with its shard of
+    the dataset, to rank 0 in rank order, where the metrics are set to the
+    states of all ranks and can be accumulated.
+
+    Args:
+        metrics (list): metrics implementing `state` and `set_states`.
+        group (Group): communication group, default the global group.
+
+    Returns:
+        bool: whether this is rank 0 and the metrics are gathered.
+    """
+    local_states = [metric.state() for metric in metrics]
+    if dist.get_world_size() < 2:
+        states = [local_states]
+    else:
+        states = []
+        dist.all_gather_object(states, local_states, group=group)
+    if dist.get_rank() != 0:
+        return False
+    for i, metric in enumerate(metrics):
+        metric.set_states([rank_states[i] for rank_states in states])
+    return True
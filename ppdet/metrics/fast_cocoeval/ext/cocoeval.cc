@@ -520,5 +520,20 @@ PYBIND11_MODULE(cocoeval_ext, m) {
   py::class_<InstanceAnnotation>(m, "InstanceAnnotation")
       .def(py::init<uint64_t, double, double, bool, bool>());
   py::class_<ImageEvaluation>(m, "ImageEvaluation")
-      .def(py::init<>());
+      .def(py::init<>())
+      .def(py::pickle(
+          [](const ImageEvaluation& e) {
+            return py::make_tuple(e.detection_matches,
+                                  e.detection_scores,
+                                  e.ground_truth_ignores,
+                                  e.detection_ignores);
+          },
+          [](py::tuple t) {
+            ImageEvaluation e;
+            e.detection_matches = t[0].cast<std::vector<uint64_t>>();
+            e.detection_scores = t[1].cast<std::vector<double>>();
+            e.ground_truth_ignores = t[2].cast<std::vector<bool>>();
+            e.detection_ignores = t[3].cast<std::vector<bool>>();
+            return e;
+          }));
 }
\ No newline at end of file
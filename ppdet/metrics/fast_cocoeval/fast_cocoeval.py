@@ -18,20 +18,112 @@
 
 import copy
 import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
-from cocoeval_ext import InstanceAnnotation, COCOevalEvaluateImages, COCOevalAccumulate
+from cocoeval_ext import InstanceAnnotation, ImageEvaluation, COCOevalEvaluateImages, COCOevalAccumulate
+from pycocotools import mask as maskUtils
 from pycocotools.cocoeval import COCOeval
 
-__all__ = ['FastCOCOeval']
+__all__ = ['FastCOCOeval', 'StreamingCOCOeval']
+
+
+def _evaluate_pairs(iou_type, area_rng, max_det, iou_thrs, images):
+    """
+    Match the detections of (image, category) pairs to the ground truth by
+    the C++ kernel, the IoUs of all categories of an image are computed by
+    one call. Run in the worker processes of FastCOCOeval.
+
+    Args:
+        iou_type (str): 'bbox' or 'segm'.
+        area_rng (list): area ranges of params.
+        max_det (int): max number of detections of a pair.
+        iou_thrs (np.ndarray): IoU thresholds of params.
+        images (list): pairs of every image, a pair is (gts, dts), both are
+            lists of (id, score, area, iscrowd, ignore, geometry), geometry
+            is the xywh box or the RLE of the instance.
+
+    Returns:
+        list: ImageEvaluation of the k-th of P pairs and area range a at
+            index a * P + k.
+    """
+    ious, gt_instances, dt_instances = [], [], []
+    for pairs in images:
+        # same order and truncation of detections as COCOeval.computeIoU
+        pairs = [(gts, [
+            dts[k]
+            for k in np.argsort(
+                [-d[1] for d in dts], kind='mergesort')[:max_det]
+        ]) for gts, dts in pairs]
+        gts_all = [g for gts, _ in pairs for g in gts]
+        dts_all = [d for _, dts in pairs for d in dts]
+        if len(gts_all) > 0 and len(dts_all) > 0:
+            g_geoms = [g[5] for g in gts_all]
+            d_geoms = [d[5] for d in dts_all]
+            if iou_type == 'bbox':
+                g_geoms = np.array(g_geoms, dtype=np.float64)
+                d_geoms = np.array(d_geoms, dtype=np.float64)
+            image_ious = maskUtils.iou(d_geoms, g_geoms,
+                                       [int(g[3]) for g in gts_all])
+        g_start = d_start = 0
+        for gts, dts in pairs:
+            g_end, d_end = g_start + len(gts), d_start + len(dts)
+            if len(gts) > 0 and len(dts) > 0:
+                ious.append([image_ious[d_start:d_end, g_start:g_end]])
+            else:
+                ious.append([[]])
+            gt_instances.append([[InstanceAnnotation(*g[:5]) for g in gts]])
+            dt_instances.append([[InstanceAnnotation(*d[:5]) for d in dts]])
+            g_start, d_start = g_end, d_end
+    if len(ious) == 0:
+        return []
+    return COCOevalEvaluateImages(area_rng, max_det, iou_thrs, ious,
+                                  gt_instances, dt_instances)
+
+
+def _gather_pairs(evals, pairs, pair_evals, num_areas, num_imgs):
+    # ImageEvaluation of (category c, area a, image i) is at
+    # (c * num_areas + a) * num_imgs + i as of COCOevalEvaluateImages
+    num_pairs = len(pairs)
+    for k, (i, c) in enumerate(pairs):
+        for a in range(num_areas):
+            evals[(c * num_areas + a) * num_imgs + i] = \
+                pair_evals[a * num_pairs + k]
+
+
+def _evaluate_chunk(params, images, pairs):
+    """
+    Evaluate and accumulate a chunk of categories, `params.catIds` are the
+    categories of the chunk, `pairs` the (image, category) indices of the
+    pairs in `images`. Run in the worker processes of FastCOCOeval.
+
+    Returns:
+        tuple: ImageEvaluation of the pairs, precision, recall and scores of
+            the categories of the chunk.
+    """
+    num_imgs, num_areas = len(params.imgIds), len(params.areaRng)
+    pair_evals = _evaluate_pairs(params.iouType, params.areaRng,
+                                 params.maxDets[-1], params.iouThrs, images)
+    evals = [ImageEvaluation()] * (len(params.catIds) * num_areas * num_imgs)
+    _gather_pairs(evals, pairs, pair_evals, num_areas, num_imgs)
+    result = COCOevalAccumulate(params, evals)
+    counts = result['counts']
+    return (pair_evals, np.array(result['precision']).reshape(counts),
+            np.array(result['recall']).reshape(counts[:1] + counts[2:]),
+            np.array(result['scores']).reshape(counts))
 
 
 class FastCOCOeval(COCOeval):
     """
     This is a slightly modified version of the original COCO API, where the functions evaluateImg()
-    and accumulate() are implemented in C++ to speedup evaluation
+    and accumulate() are implemented in C++ to speedup evaluation.
+    With categories, only the non-empty (image, category) pairs are evaluated, in chunks of
+    categories run by `num_workers` processes, e.g. for LVIS or Objects365.
     """
 
+    num_workers = 0
+
     def evaluate(self):
         """
         Run per image evaluation on given images and store results in self.evalImgs_cpp, a
@@ -56,56 +148,60 @@ class FastCOCOeval(COCOeval):
 
         self._prepare()  # bottleneck
 
-        # loop through images, area range, max detection number
-        catIds = p.catIds if p.useCats else [-1]
-
-        if p.iouType == "segm" or p.iouType == "bbox":
-            computeIoU = self.computeIoU
-        elif p.iouType == "keypoints":
-            computeIoU = self.computeOks
-        self.ious = {
-            (imgId, catId): computeIoU(imgId, catId)
-            for imgId in p.imgIds for catId in catIds
-        }  # bottleneck
-
-        maxDet = p.maxDets[-1]
-
-        # <<<< Beginning of code differences with original COCO API
-        def convert_instances_to_cpp(instances, is_det=False):
-            # Convert annotations for a list of instances in an image to a format that's fast
-            # to access in C++
-            instances_cpp = []
-            for instance in instances:
-                instance_cpp = InstanceAnnotation(
-                    int(instance["id"]),
-                    instance["score"] if is_det else instance.get("score", 0.0),
-                    instance["area"],
-                    bool(instance.get("iscrowd", 0)),
-                    bool(instance.get("ignore", 0)),
-                )
-                instances_cpp.append(instance_cpp)
-            return instances_cpp
-
-        # Convert GT annotations, detections, and IOUs to a format that's fast to access in C++
-        ground_truth_instances = [
-            [convert_instances_to_cpp(self._gts[imgId, catId]) for catId in p.catIds]
-            for imgId in p.imgIds
-        ]
-        detected_instances = [
-            [convert_instances_to_cpp(self._dts[imgId, catId], is_det=True) for catId in p.catIds]
-            for imgId in p.imgIds
-        ]
-        ious = [[self.ious[imgId, catId] for catId in catIds] for imgId in p.imgIds]
+        self._accumulated = None
+        if p.useCats and p.iouType in ['segm', 'bbox']:
+            self._evalImgs_cpp = self._evaluate_categories()
+        else:
+            # loop through images, area range, max detection number
+            catIds = p.catIds if p.useCats else [-1]
 
-        if not p.useCats:
-            # For each image, flatten per-category lists into a single list
-            ground_truth_instances = [[[o for c in i for o in c]] for i in ground_truth_instances]
-            detected_instances = [[[o for c in i for o in c]] for i in detected_instances]
+            if p.iouType == "segm" or p.iouType == "bbox":
+                computeIoU = self.computeIoU
+            elif p.iouType == "keypoints":
+                computeIoU = self.computeOks
+            self.ious = {
+                (imgId, catId): computeIoU(imgId, catId)
+                for imgId in p.imgIds for catId in catIds
+            }  # bottleneck
 
-        # Call C++ implementation of self.evaluateImgs()
-        self._evalImgs_cpp = COCOevalEvaluateImages(
-            p.areaRng, maxDet, p.iouThrs, ious, ground_truth_instances, detected_instances
-        )
+            maxDet = p.maxDets[-1]
+
+            # <<<< Beginning of code differences with original COCO API
+            def convert_instances_to_cpp(instances, is_det=False):
+                # Convert annotations for a list of instances in an image to a format that's fast
+                # to access in C++
+                instances_cpp = []
+                for instance in instances:
+                    instance_cpp = InstanceAnnotation(
+                        int(instance["id"]),
+                        instance["score"] if is_det else instance.get("score", 0.0),
+                        instance["area"],
+                        bool(instance.get("iscrowd", 0)),
+                        bool(instance.get("ignore", 0)),
+                    )
+                    instances_cpp.append(instance_cpp)
+                return instances_cpp
+
+            # Convert GT annotations, detections, and IOUs to a format that's fast to access in C++
+            ground_truth_instances = [
+                [convert_instances_to_cpp(self._gts[imgId, catId]) for catId in p.catIds]
+                for imgId in p.imgIds
+            ]
+            detected_instances = [
+                [convert_instances_to_cpp(self._dts[imgId, catId], is_det=True) for catId in p.catIds]
+                for imgId in p.imgIds
+            ]
+            ious = [[self.ious[imgId, catId] for catId in catIds] for imgId in p.imgIds]
+
+            if not p.useCats:
+                # For each image, flatten per-category lists into a single list
+                ground_truth_instances = [[[o for c in i for o in c]] for i in ground_truth_instances]
+                detected_instances = [[[o for c in i for o in c]] for i in detected_instances]
+
+            # Call C++ implementation of self.evaluateImgs()
+            self._evalImgs_cpp = COCOevalEvaluateImages(
+                p.areaRng, maxDet, p.iouThrs, ious, ground_truth_instances, detected_instances
+            )
         self._evalImgs = None
 
         self._paramsEval = copy.deepcopy(self.params)
@@ -113,6 +209,63 @@ class FastCOCOeval(COCOeval):
         print('DONE (t={:0.2f}s).'.format(toc-tic))
         # >>>> End of code differences with original COCO API
 
+    def _instances(self, anns, is_det=False):
+        geometry = 'segmentation' if self.params.iouType == 'segm' else 'bbox'
+        return [(int(ann['id']), ann['score'] if is_det else
+                 ann.get('score', 0.0), ann['area'],
+                 bool(ann.get('iscrowd', 0)),
+                 bool(ann.get('ignore', 0)), ann[geometry]) for ann in anns]
+
+    def _evaluate_categories(self):
+        """
+        Evaluate and accumulate the (image, category) pairs with ground truth
+        or detections in chunks of categories, by a process pool if
+        `num_workers` > 0. Pairs without instances share an empty
+        ImageEvaluation.
+        """
+        p = self.params
+        num_imgs, num_cats = len(p.imgIds), len(p.catIds)
+        img_index = {img_id: i for i, img_id in enumerate(p.imgIds)}
+        cat_index = {cat_id: c for c, cat_id in enumerate(p.catIds)}
+        num_chunks = max(1, min(num_cats, self.num_workers * 4))
+        chunk_starts = [k * num_cats // num_chunks for k in range(num_chunks)]
+        chunk_of_cat = np.searchsorted(
+            chunk_starts, np.arange(num_cats), side='right') - 1
+        # pairs of every chunk grouped by image
+        chunks = [defaultdict(list) for _ in range(num_chunks)]
+        for img_id, cat_id in sorted(set(self._gts) | set(self._dts)):
+            if img_id not in img_index or cat_id not in cat_index:
+                continue
+            i, c = img_index[img_id], cat_index[cat_id]
+            chunks[chunk_of_cat[c]][i].append(
+                (c, self._instances(self._gts[img_id, cat_id]),
+                 self._instances(
+                     self._dts[img_id, cat_id], is_det=True)))
+
+        args = []
+        for k, chunk in enumerate(chunks):
+            params = copy.copy(p)
+            start = chunk_starts[k]
+            end = chunk_starts[k + 1] if k + 1 < num_chunks else num_cats
+            params.catIds = p.catIds[start:end]
+            images = [[(gts, dts) for _, gts, dts in cat_pairs]
+                      for cat_pairs in chunk.values()]
+            pairs = [(i, c - start) for i, cat_pairs in chunk.items()
+                     for c, _, _ in cat_pairs]
+            args.append((params, images, pairs))
+        if self.num_workers > 0:
+            with ProcessPoolExecutor(self.num_workers) as pool:
+                results = list(pool.map(_evaluate_chunk, *zip(*args)))
+        else:
+            results = [_evaluate_chunk(*arg) for arg in args]
+
+        evals = [ImageEvaluation()] * (num_cats * len(p.areaRng) * num_imgs)
+        for k, ((_, _, pairs), result) in enumerate(zip(args, results)):
+            pairs = [(i, c + chunk_starts[k]) for i, c in pairs]
+            _gather_pairs(evals, pairs, result[0], len(p.areaRng), num_imgs)
+        self._accumulated = [result[1:] for result in results]
+        return evals
+
     def accumulate(self, p=None):
         """
         Accumulate per image evaluation results and store the result in self.eval.  Does not
@@ -124,6 +277,11 @@ class FastCOCOeval(COCOeval):
             self, "_evalImgs_cpp"
         ), "evaluate() must be called before accmulate() is called."
 
+        if getattr(self, '_accumulated', None) and p is None:
+            # accumulated by chunks of categories in evaluate()
+            self.eval = self._merge_accumulated()
+            print('DONE (t={:0.2f}s).'.format(time.time() - tic))
+            return
         self.eval = COCOevalAccumulate(self._paramsEval, self._evalImgs_cpp)
 
         # recall is num_iou_thresholds X num_categories X num_area_ranges X num_max_detections
@@ -137,3 +295,182 @@ class FastCOCOeval(COCOeval):
         self.eval["scores"] = np.array(self.eval["scores"]).reshape(self.eval["counts"])
         toc = time.time()
         print('DONE (t={:0.2f}s).'.format( toc-tic))
+
+    def _merge_accumulated(self):
+        precision, recall, scores = [
+            np.concatenate(arrays, axis=axis) if len(arrays) > 1 else arrays[0]
+            for arrays, axis in zip(zip(*self._accumulated), [2, 1, 2])
+        ]
+        return {
+            'params': self._paramsEval,
+            'counts': list(precision.shape),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'precision': precision,
+            'recall': recall,
+            'scores': scores,
+        }
+
+
+class StreamingCOCOeval(FastCOCOeval):
+    """
+    FastCOCOeval fed with the detections of a few images at a time, e.g.
+    one batch of an evaluation loop, instead of a loaded result file. The
+    images of every `update` are matched against the ground truth right
+    away by the C++ kernel, only the compact per image matching results are
+    kept, so the detections of the whole dataset are never held in memory.
+    All detections of an image should be given in the same `update`.
+    Call `evaluate`, `accumulate` and `summarize` at the end as usual, and
+    `reset` to evaluate new detections of the same ground truth, e.g. in
+    the next validation during training, the converted ground truth of
+    images is cached across resets.
+
+    Args:
+        cocoGt (COCO): ground truth COCO api.
+        iouType (str): 'bbox' or 'segm'.
+    """
+
+    def __init__(self, cocoGt, iouType='bbox'):
+        assert iouType in ['bbox', 'segm'], \
+            'StreamingCOCOeval only supports bbox and segm'
+        super(StreamingCOCOeval, self).__init__(cocoGt, None, iouType)
+        p = self.params
+        p.imgIds = list(np.unique(p.imgIds))
+        p.catIds = list(np.unique(p.catIds))
+        p.maxDets = sorted(p.maxDets)
+        self._img_index = {img_id: i for i, img_id in enumerate(p.imgIds)}
+        self._cat_index = {cat_id: c for c, cat_id in enumerate(p.catIds)}
+        # ground truth instances of images by category index
+        self._gt_cache = {}
+        self.reset()
+
+    def reset(self):
+        """Clear the per image results, keep the cached ground truth."""
+        self._evaluated = np.zeros(len(self.params.imgIds), dtype=bool)
+        # (image index, category index) pairs and their ImageEvaluation
+        # of every area range, one item per evaluated chunk
+        self._chunks = []
+        self._num_dets = 0
+        self.eval = {}
+        self.stats = []
+
+    def __len__(self):
+        return self._num_dets
+
+    def state(self):
+        """Picklable per image results, to be merged by `merge_states`."""
+        return self._evaluated, self._chunks, self._num_dets
+
+    def merge_states(self, states):
+        """Add the per image results of evaluators of other images."""
+        for evaluated, chunks, num_dets in states:
+            if np.any(self._evaluated & evaluated):
+                raise ValueError('images are evaluated more than once')
+            self._evaluated |= evaluated
+            self._chunks.extend(chunks)
+            self._num_dets += num_dets
+
+    def _gt_instances(self, img_id):
+        if img_id in self._gt_cache:
+            return self._gt_cache[img_id]
+        gts = defaultdict(list)
+        for ann in self.cocoGt.imgToAnns[img_id]:
+            if ann['category_id'] not in self._cat_index:
+                continue
+            if self.params.iouType == 'segm':
+                geometry = self.cocoGt.annToRLE(ann)
+            else:
+                geometry = ann['bbox']
+            iscrowd = bool(ann.get('iscrowd', 0))
+            gts[self._cat_index[ann['category_id']]].append(
+                (int(ann['id']), ann.get('score', 0.0), ann['area'], iscrowd,
+                 iscrowd, geometry))
+        self._gt_cache[img_id] = gts
+        return gts
+
+    def update(self, im_ids, cat_ids, scores, boxes=None, segms=None):
+        """
+        Evaluate the detections of some images.
+
+        Args:
+            im_ids (np.ndarray): image id of every detection, shape [N].
+            cat_ids (np.ndarray): category id of every detection, shape [N].
+            scores (np.ndarray): score of every detection, shape [N].
+            boxes (np.ndarray): [x, y, w, h] boxes, shape [N, 4], for bbox.
+            segms (list): RLE of every detection, for segm.
+        """
+        im_ids = np.asarray(im_ids, dtype=np.int64).reshape(-1)
+        cat_ids = np.asarray(cat_ids, dtype=np.int64).reshape(-1)
+        scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+        if self.params.iouType == 'bbox':
+            boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        assert np.isin(im_ids, self.params.imgIds).all(), \
+            'Results do not correspond to current coco set'
+        keep = np.flatnonzero(np.isin(cat_ids, self.params.catIds))
+        self._num_dets += len(keep)
+
+        # stable sorts keep the result order within an image and category
+        keep = keep[np.argsort(im_ids[keep], kind='stable')]
+        img_ids, starts = np.unique(im_ids[keep], return_index=True)
+        images = []
+        for img_id, inds in zip(img_ids, np.split(keep, starts[1:])):
+            i = self._img_index[img_id]
+            if self._evaluated[i]:
+                raise ValueError('detections of image {} are given in more '
+                                 'than one update'.format(img_id))
+            self._evaluated[i] = True
+            cats = np.array([self._cat_index[c] for c in cat_ids[inds]])
+            order = np.argsort(cats, kind='stable')
+            inds, cats = inds[order], cats[order]
+            cat_set, cat_starts = np.unique(cats, return_index=True)
+            dets = dict(zip(cat_set, np.split(inds, cat_starts[1:])))
+            images.append((img_id, dets))
+        self._evaluate_images(images, scores, boxes, segms)
+
+    def _evaluate_images(self, images, scores=None, boxes=None, segms=None):
+        p = self.params
+        pairs, image_pairs = [], []
+        for img_id, dets in images:
+            gts = self._gt_instances(img_id)
+            cats = sorted(set(gts.keys()) | set(dets.keys()))
+            dts = {}
+            for c, inds in dets.items():
+                if p.iouType == 'segm':
+                    geoms = [segms[k] for k in inds]
+                    areas = maskUtils.area(geoms)
+                else:
+                    geoms = boxes[inds].tolist()
+                    areas = boxes[inds, 2] * boxes[inds, 3]
+                dts[c] = [(int(k) + 1, scores[k], area, False, False, geom)
+                          for k, area, geom in zip(inds, areas, geoms)]
+            pairs += [(self._img_index[img_id], c) for c in cats]
+            image_pairs.append([(gts.get(c, []), dts.get(c, []))
+                                for c in cats])
+        if len(pairs) == 0:
+            return
+        evals = _evaluate_pairs(p.iouType, p.areaRng, p.maxDets[-1],
+                                p.iouThrs, image_pairs)
+        self._chunks.append((np.array(pairs, dtype=np.int64), evals))
+
+    def evaluate(self):
+        """
+        Evaluate the ground truth of images without any detection, and
+        gather the per image results in the layout of FastCOCOeval.
+        """
+        tic = time.time()
+        print('Running per image evaluation...')
+        p = self.params
+        print('Evaluate annotation type *{}*'.format(p.iouType))
+        remaining = np.flatnonzero(~self._evaluated)
+        for start in range(0, len(remaining), 1000):
+            self._evaluate_images(
+                [(p.imgIds[i], {}) for i in remaining[start:start + 1000]])
+        self._evaluated[remaining] = True
+
+        num_imgs, num_areas = len(p.imgIds), len(p.areaRng)
+        evals = [ImageEvaluation()] * (len(p.catIds) * num_areas * num_imgs)
+        for pairs, pair_evals in self._chunks:
+            _gather_pairs(evals, pairs, pair_evals, num_areas, num_imgs)
+        self._evalImgs_cpp = evals
+        self._evalImgs = None
+        self._paramsEval = copy.deepcopy(self.params)
+        print('DONE (t={:0.2f}s).'.format(time.time() - tic))
@@ -82,25 +82,34 @@ def strip_mask(mask):
 
 
 def get_seg_res(masks, bboxes, mask_nums, image_id, label_to_cat_id_map):
+    """
+    masks are dense binary masks padded with -1, or the list of COCO RLE
+    of each mask given by `MaskPostProcess` with rle_output.
+    """
     import pycocotools.mask as mask_util
     seg_res = []
     k = 0
+    is_rle = isinstance(masks, list)
     for i in range(len(mask_nums)):
         cur_image_id = int(image_id[i][0])
         det_nums = mask_nums[i]
-        mask_i = masks[k:k + det_nums]
-        mask_i = strip_mask(mask_i)
+        if not is_rle:
+            mask_i = masks[k:k + det_nums]
+            mask_i = strip_mask(mask_i)
         for j in range(det_nums):
-            mask = mask_i[j].astype(np.uint8)
             score = float(bboxes[k][1])
             label = int(bboxes[k][0])
             k = k + 1
             if label == -1:
                 continue
             cat_id = label_to_cat_id_map[label]
-            rle = mask_util.encode(
-                np.array(
-                    mask[:, :, None], order="F", dtype="uint8"))[0]
+            if is_rle:
+                rle = dict(masks[k - 1])
+            else:
+                mask = mask_i[j].astype(np.uint8)
+                rle = mask_util.encode(
+                    np.array(
+                        mask[:, :, None], order="F", dtype="uint8"))[0]
             if six.PY3:
                 if 'counts' in rle:
                     rle['counts'] = rle['counts'].decode("utf8")
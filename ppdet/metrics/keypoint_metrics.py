@@ -14,12 +14,12 @@
 
 import os
 import json
-from collections import defaultdict, OrderedDict
+from collections import OrderedDict
 import numpy as np
 import paddle
 from pycocotools.coco import COCO
 from pycocotools.cocoeval import COCOeval
-from ..modeling.keypoint_utils import oks_nms, keypoint_pck_accuracy, keypoint_auc, keypoint_epe
+from ..modeling.keypoint_utils import oks_nms_batch, keypoint_pck_accuracy, keypoint_auc, keypoint_epe
 from scipy.io import loadmat, savemat
 from ppdet.utils.logger import setup_logger
 logger = setup_logger(__name__)
@@ -93,6 +93,22 @@ class KeyPointTopDownCOCOEval(object):
             self.results['image_path'].extend(inputs['im_id'])
         self.idx += num_images
 
+    def state(self):
+        return {
+            'all_preds': self.results['all_preds'][:self.idx],
+            'all_boxes': self.results['all_boxes'][:self.idx],
+            'image_path': self.results['image_path']
+        }
+
+    def set_states(self, states):
+        self.reset()
+        for state in states:
+            num_images = len(state['all_preds'])
+            for k in ['all_preds', 'all_boxes']:
+                self.results[k][self.idx:self.idx + num_images] = state[k]
+            self.results['image_path'].extend(state['image_path'])
+            self.idx += num_images
+
     def _write_coco_keypoint_results(self, keypoints):
         data_pack = [{
             'cat_id': 1,
@@ -104,91 +120,109 @@ class KeyPointTopDownCOCOEval(object):
         if not os.path.exists(self.output_eval):
             os.makedirs(self.output_eval)
         with open(self.res_file, 'w') as f:
-            json.dump(results, f, sort_keys=True, indent=4)
+            f.write(json.dumps(results, sort_keys=True))
             logger.info(f'The keypoint result is saved to {self.res_file}.')
-        try:
-            json.load(open(self.res_file))
-        except Exception:
-            content = []
-            with open(self.res_file, 'r') as f:
-                for line in f:
-                    content.append(line)
-            content[-1] = ']'
-            with open(self.res_file, 'w') as f:
-                for c in content:
-                    f.write(c)
+        # evaluated without reading the file back
+        self.coco_results = results
 
     def _coco_keypoint_results_one_category_kernel(self, data_pack):
         cat_id = data_pack['cat_id']
         keypoints = data_pack['keypoints']
-        cat_results = []
-
-        for img_kpts in keypoints:
-            if len(img_kpts) == 0:
-                continue
-
-            _key_points = np.array(
-                [img_kpts[k]['keypoints'] for k in range(len(img_kpts))])
-            _key_points = _key_points.reshape(_key_points.shape[0], -1)
-
-            result = [{
-                'image_id': img_kpts[k]['image'],
-                'category_id': cat_id,
-                'keypoints': _key_points[k].tolist(),
-                'score': img_kpts[k]['score'],
-                'center': list(img_kpts[k]['center']),
-                'scale': list(img_kpts[k]['scale'])
-            } for k in range(len(img_kpts))]
-            cat_results.extend(result)
-
-        return cat_results
+        num_results = len(keypoints['image_id'])
+
+        return [{
+            'image_id': image_id,
+            'category_id': cat_id,
+            'keypoints': kpts,
+            'score': score,
+            'center': center,
+            'scale': scale
+        } for image_id, kpts, score, center, scale in zip(
+            keypoints['image_id'].tolist(), keypoints['keypoints'].reshape(
+                num_results, -1).tolist(), keypoints['score'].tolist(),
+            keypoints['center'].tolist(), keypoints['scale'].tolist())]
 
     def get_final_results(self, preds, all_boxes, img_path):
-        _kpts = []
-        for idx, kpt in enumerate(preds):
-            _kpts.append({
-                'keypoints': kpt,
-                'center': all_boxes[idx][0:2],
-                'scale': all_boxes[idx][2:4],
-                'area': all_boxes[idx][4],
-                'score': all_boxes[idx][5],
-                'image': int(img_path[idx])
-            })
-        # image x person x (keypoints)
-        kpts = defaultdict(list)
-        for kpt in _kpts:
-            kpts[kpt['image']].append(kpt)
-
-        # rescoring and oks nms
-        num_joints = preds.shape[1]
+        """
+        Rescore the persons by their keypoints, then run oks nms on the
+        persons of every image, in batches of images padded to the same
+        number of persons, and write the kept persons by image and score.
+        """
+        num_persons, num_joints = preds.shape[:2]
+        image_ids = np.asarray(img_path).reshape(-1)[:num_persons].astype(
+            np.int64)
+
+        # rescoring
         in_vis_thre = self.in_vis_thre
         oks_thre = self.oks_thre
-        oks_nmsed_kpts = []
-        for img in kpts.keys():
-            img_kpts = kpts[img]
-            for n_p in img_kpts:
-                box_score = n_p['score']
-                kpt_score = 0
-                valid_num = 0
-                for n_jt in range(0, num_joints):
-                    t_s = n_p['keypoints'][n_jt][2]
-                    if t_s > in_vis_thre:
-                        kpt_score = kpt_score + t_s
-                        valid_num = valid_num + 1
-                if valid_num != 0:
-                    kpt_score = kpt_score / valid_num
-                # rescoring
-                n_p['score'] = kpt_score * box_score
-
-            keep = oks_nms([img_kpts[i] for i in range(len(img_kpts))],
-                           oks_thre)
-
-            if len(keep) == 0:
-                oks_nmsed_kpts.append(img_kpts)
-            else:
-                oks_nmsed_kpts.append([img_kpts[_keep] for _keep in keep])
-
-        self._write_coco_keypoint_results(oks_nmsed_kpts)
+        kpt_scores = preds[:, :, 2]
+        is_vis = kpt_scores > in_vis_thre
+        valid_num = is_vis.sum(axis=1)
+        # summed one by one as float64
+        kpt_score = np.cumsum(
+            np.where(is_vis, kpt_scores, 0).astype(np.float64), axis=1)[:, -1]
+        kpt_score = np.where(valid_num != 0,
+                             kpt_score / np.maximum(valid_num, 1), 0)
+        scores = kpt_score * all_boxes[:, 5]
+        areas = all_boxes[:, 4]
+        kpts = preds.reshape(num_persons, -1)
+
+        # image x person, images in the order they appear
+        _, first, image_idx = np.unique(
+            image_ids, return_index=True, return_inverse=True)
+        image_rank = np.empty(len(first), dtype=np.int64)
+        image_rank[np.argsort(first)] = np.arange(len(first))
+        image_idx = image_rank[image_idx.reshape(-1)]
+        num_images = len(first)
+        counts = np.bincount(image_idx, minlength=num_images)
+        order = np.argsort(image_idx, kind='stable')
+        person_pos = np.empty(num_persons, dtype=np.int64)
+        person_pos[order] = np.arange(num_persons) - np.repeat(
+            np.cumsum(counts) - counts, counts)
+
+        # oks nms of images with similar number of persons at once, the
+        # [images, persons, persons, joints] oks terms are bounded
+        max_elements = 1 << 21
+        keep = np.full((num_images, max(counts, default=0)), -1)
+        by_count = np.argsort(-counts, kind='stable')
+        chunk_idx = np.full(num_images, -1)
+        start = 0
+        while start < num_images:
+            max_persons = counts[by_count[start]]
+            chunk_size = max(1, max_elements //
+                             (max_persons * max_persons * num_joints))
+            chunk = by_count[start:start + chunk_size]
+            chunk_idx[chunk] = np.arange(len(chunk))
+            in_chunk = np.flatnonzero(chunk_idx[image_idx] >= 0)
+            rows = chunk_idx[image_idx[in_chunk]]
+            cols = person_pos[in_chunk]
+            persons = np.full((len(chunk), max_persons), -1)
+            persons[rows, cols] = in_chunk
+            chunk_kpts = np.zeros(
+                (len(chunk), max_persons, kpts.shape[1]), dtype=kpts.dtype)
+            chunk_kpts[rows, cols] = kpts[in_chunk]
+            chunk_scores = np.zeros((len(chunk), max_persons))
+            chunk_scores[rows, cols] = scores[in_chunk]
+            chunk_areas = np.zeros((len(chunk), max_persons))
+            chunk_areas[rows, cols] = areas[in_chunk]
+
+            chunk_keep = oks_nms_batch(chunk_kpts, chunk_scores, chunk_areas,
+                                       counts[chunk], oks_thre)
+            keep[chunk, :max_persons] = np.where(
+                chunk_keep >= 0,
+                np.take_along_axis(persons, np.maximum(chunk_keep, 0), axis=1),
+                -1)
+            chunk_idx[chunk] = -1
+            start += len(chunk)
+
+        keep = keep[keep >= 0]
+        self._write_coco_keypoint_results({
+            'image_id': image_ids[keep],
+            'keypoints': preds[keep],
+            'score': scores[keep],
+            'center': all_boxes[keep, 0:2],
+            'scale': all_boxes[keep, 2:4]
+        })
 
     def accumulate(self):
         self.get_final_results(self.results['all_preds'],
@@ -198,7 +232,7 @@ class KeyPointTopDownCOCOEval(object):
             logger.info(f'The keypoint result is saved to {self.res_file} '
                         'and do not evaluate the mAP.')
             return
-        coco_dt = self.coco.loadRes(self.res_file)
+        coco_dt = self.coco.loadRes(self.coco_results)
         coco_eval = COCOeval(self.coco, coco_dt, 'keypoints')
         coco_eval.params.useSegm = None
         coco_eval.evaluate()
@@ -290,6 +324,15 @@ class KeyPointTopDownCOCOWholeBadyHandEval(object):
                               3] = kpts[:, :, 0:3]
         self.idx += num_images
 
+    def state(self):
+        return self.results['preds'][:self.idx]
+
+    def set_states(self, states):
+        self.reset()
+        for preds in states:
+            self.results['preds'][self.idx:self.idx + len(preds)] = preds
+            self.idx += len(preds)
+
     def accumulate(self):
         self.get_final_results(self.results['preds'])
         if self.save_prediction_only:
@@ -421,6 +464,14 @@ class KeyPointTopDownMPIIEval(object):
 
         self.results.append(results)
 
+    def state(self):
+        return self.results
+
+    def set_states(self, states):
+        self.reset()
+        for results in states:
+            self.results += results
+
     def accumulate(self):
         self._mpii_keypoint_results_save()
         if self.save_prediction_only:
@@ -31,6 +31,8 @@ __all__ = [
     'draw_pr_curve',
     'bbox_area',
     'jaccard_overlap',
+    'jaccard_overlap_matrix',
+    'rbox_iou_matrix',
     'prune_zero_padding',
     'DetectionMAP',
     'ap_per_class',
@@ -128,6 +130,86 @@ def calc_rbox_iou(pred, gt_poly):
     return iou[0][0]
 
 
+def jaccard_overlap_matrix(preds, gts, is_bbox_normalized=False):
+    """
+    Calculate jaccard overlap ratio between every pair of bounding boxes,
+    same as `jaccard_overlap` on each pair
+
+    Args:
+        preds (np.ndarray): prediction boxes with shape [P, 4].
+        gts (np.ndarray): ground truth boxes with shape [G, 4].
+        is_bbox_normalized (bool): whether boxes are normalized.
+
+    Returns:
+        overlaps (np.ndarray): overlaps with shape [P, G].
+    """
+    preds = np.asarray(preds, dtype=np.float64).reshape(-1, 4)
+    gts = np.asarray(gts, dtype=np.float64).reshape(-1, 4)
+    norm = 1. - float(is_bbox_normalized)
+    inter_w = np.minimum(preds[:, None, 2], gts[None, :, 2]) - \
+              np.maximum(preds[:, None, 0], gts[None, :, 0])
+    inter_h = np.minimum(preds[:, None, 3], gts[None, :, 3]) - \
+              np.maximum(preds[:, None, 1], gts[None, :, 1])
+    overlapped = (inter_w > 0) & (inter_h > 0)
+    inter_size = (inter_w + norm) * (inter_h + norm)
+    pred_size = (preds[:, 2] - preds[:, 0] + norm) * \
+                (preds[:, 3] - preds[:, 1] + norm)
+    gt_size = (gts[:, 2] - gts[:, 0] + norm) * (gts[:, 3] - gts[:, 1] + norm)
+    union = pred_size[:, None] + gt_size[None, :] - inter_size
+    overlaps = np.zeros(overlapped.shape, dtype=np.float64)
+    overlaps[overlapped] = inter_size[overlapped] / union[overlapped]
+    return overlaps
+
+
+def rbox_iou_matrix(preds, gt_polys):
+    """
+    Calculate iou between every pair of rotated bboxes, same as
+    `calc_rbox_iou` on each pair. The rotated iou is only computed by the
+    ext_op kernel for pairs whose bounding rects overlap, in one call.
+
+    Args:
+        preds (np.ndarray): prediction polygons with shape [P, 8].
+        gt_polys (np.ndarray): ground truth polygons with shape [G, 8].
+
+    Returns:
+        ious (np.ndarray): ious with shape [P, G].
+    """
+    preds = np.asarray(preds, dtype=np.float32).reshape(-1, 8)
+    gt_polys = np.asarray(gt_polys, dtype=np.float32).reshape(-1, 8)
+
+    # calc iou of bounding box for speedup
+    def _rect(polys):
+        return np.stack(
+            [
+                polys[:, 0::2].min(axis=1), polys[:, 1::2].min(axis=1),
+                polys[:, 0::2].max(axis=1), polys[:, 1::2].max(axis=1)
+            ],
+            axis=1)
+
+    ious = jaccard_overlap_matrix(_rect(preds), _rect(gt_polys), False)
+    pred_idx, gt_idx = np.nonzero(ious > 0)
+    if len(pred_idx) == 0:
+        return ious
+
+    # calc rbox iou of the overlapped pairs
+    pred_uniq, pred_inv = np.unique(pred_idx, return_inverse=True)
+    gt_uniq, gt_inv = np.unique(gt_idx, return_inverse=True)
+    pred_rbox = poly2rbox_np(preds[pred_uniq]).reshape(-1, 5)
+    gt_rbox = poly2rbox_np(gt_polys[gt_uniq]).reshape(-1, 5)
+    try:
+        from ext_op import rbox_iou
+    except Exception as e:
+        print("import custom_ops error, try install ext_op " \
+                  "following ppdet/ext_op/README.md", e)
+        sys.stdout.flush()
+        sys.exit(-1)
+    pd_gt_rbox = paddle.to_tensor(gt_rbox, dtype='float32')
+    pd_pred_rbox = paddle.to_tensor(pred_rbox, dtype='float32')
+    rious = rbox_iou(pd_gt_rbox, pd_pred_rbox).numpy()
+    ious[pred_idx, gt_idx] = rious[gt_inv, pred_inv]
+    return ious
+
+
 def prune_zero_padding(gt_box, gt_label, difficult=None):
     valid_cnt = 0
     for i in range(len(gt_box)):
@@ -188,50 +270,111 @@ class DetectionMAP(object):
         Update metric statics from given prediction and ground
         truth infomations.
         """
+        gt_box = np.asarray(gt_box, dtype=np.float64)
+        gt_label = np.asarray(gt_label).reshape(-1).astype(np.int64)
         if difficult is None:
             difficult = np.zeros_like(gt_label)
+        difficult = np.asarray(difficult).reshape(-1).astype(np.int64)
 
         # record class gt count
-        for gtl, diff in zip(gt_label, difficult):
-            if self.evaluate_difficult or int(diff) == 0:
-                self.class_gt_counts[int(np.array(gtl))] += 1
-
-        # record class score positive
-        visited = [False] * len(gt_label)
-        for b, s, l in zip(bbox, score, label):
-            pred = b.tolist() if isinstance(b, np.ndarray) else b
-            max_idx = -1
-            max_overlap = -1.0
-            for i, gl in enumerate(gt_label):
-                if int(gl) == int(l):
-                    if len(gt_box[i]) == 8:
-                        overlap = calc_rbox_iou(pred, gt_box[i])
-                    else:
-                        overlap = jaccard_overlap(pred, gt_box[i],
-                                                  self.is_bbox_normalized)
-                    if overlap > max_overlap:
-                        max_overlap = overlap
-                        max_idx = i
-
-            if max_overlap > self.overlap_thresh:
-                if self.evaluate_difficult or \
-                        int(np.array(difficult[max_idx])) == 0:
-                    if not visited[max_idx]:
-                        self.class_score_poss[int(l)].append([s, 1.0])
-                        visited[max_idx] = True
-                    else:
-                        self.class_score_poss[int(l)].append([s, 0.0])
-            else:
-                self.class_score_poss[int(l)].append([s, 0.0])
+        counted = gt_label if self.evaluate_difficult \
+            else gt_label[difficult == 0]
+        self.class_gt_counts += np.bincount(
+            counted, minlength=self.class_num)[:self.class_num]
+
+        score = np.asarray(score, dtype=np.float64).reshape(-1)
+        label = np.asarray(label).reshape(-1).astype(np.int64)
+        if len(score) == 0:
+            return
+        if len(gt_label) == 0:
+            self._append(score, np.zeros_like(score), label)
+            return
+
+        # overlaps of each prediction with the gts of its class, every
+        # prediction matches its max overlap gt, the first one on ties
+        if gt_box.shape[-1] == 8:
+            overlaps = rbox_iou_matrix(bbox, gt_box)
+        else:
+            overlaps = jaccard_overlap_matrix(bbox, gt_box,
+                                              self.is_bbox_normalized)
+        overlaps[label[:, None] != gt_label[None, :]] = -1.
+        max_idx = overlaps.argmax(axis=1)
+        max_overlap = overlaps[np.arange(len(label)), max_idx]
+
+        # matched difficult gts are ignored, otherwise the first prediction
+        # matching a gt is the positive one
+        matched = max_overlap > self.overlap_thresh
+        if not self.evaluate_difficult:
+            keep = ~matched | (difficult[max_idx] == 0)
+        else:
+            keep = np.ones_like(matched)
+        matched_idx = np.nonzero(matched & keep)[0]
+        _, first = np.unique(max_idx[matched_idx], return_index=True)
+        pos = np.zeros(len(label), dtype=np.float64)
+        pos[matched_idx[first]] = 1.
+        self._append(score[keep], pos[keep], label[keep])
+
+    def _append(self, score, pos, label):
+        size = self._num + len(score)
+        if size > len(self._scores):
+            capacity = max(size, 2 * len(self._scores))
+            for name in ['_scores', '_pos', '_labels']:
+                buf = getattr(self, name)
+                new_buf = np.empty(capacity, dtype=buf.dtype)
+                new_buf[:self._num] = buf[:self._num]
+                setattr(self, name, new_buf)
+        self._scores[self._num:size] = score
+        self._pos[self._num:size] = pos
+        self._labels[self._num:size] = label
+        self._num = size
 
     def reset(self):
         """
         Reset metric statics
         """
-        self.class_score_poss = [[] for _ in range(self.class_num)]
-        self.class_gt_counts = [0] * self.class_num
+        self._num = 0
+        self._scores = np.empty(1024, dtype=np.float64)
+        self._pos = np.empty(1024, dtype=np.float64)
+        self._labels = np.empty(1024, dtype=np.int64)
+        self.class_gt_counts = np.zeros(self.class_num, dtype=np.int64)
         self.mAP = 0.0
 
+    @property
+    def class_score_poss(self):
+        """
+        [score, pos] records of every class
+        """
+        scores, pos, labels = self._records()
+        return [
+            np.stack(
+                [scores[labels == i], pos[labels == i]], axis=1)
+            for i in range(self.class_num)
+        ]
+
+    def _records(self):
+        return (self._scores[:self._num], self._pos[:self._num],
+                self._labels[:self._num])
+
+    def state(self):
+        """
+        Metric statics as arrays, to be merged by `merge_states`
+        """
+        scores, pos, labels = self._records()
+        return {
+            'scores': scores.copy(),
+            'pos': pos.copy(),
+            'labels': labels.copy(),
+            'class_gt_counts': self.class_gt_counts.copy()
+        }
+
+    def merge_states(self, states):
+        """
+        Append metric statics of other updates, e.g. of other ranks
+        """
+        for state in states:
+            self._append(state['scores'], state['pos'], state['labels'])
+            self.class_gt_counts += state['class_gt_counts']
+
     def accumulate(self):
         """
         Accumulate metric results and calculate mAP
@@ -239,24 +382,28 @@ class DetectionMAP(object):
         mAP = 0.
         valid_cnt = 0
         eval_results = []
-        for score_pos, count in zip(self.class_score_poss,
-                                    self.class_gt_counts):
+        # sort records by class, then by score in descending order, records
+        # of the same score keep the order they were updated in
+        scores, pos, labels = self._records()
+        order = np.lexsort((-scores, labels))
+        pos = pos[order]
+        ends = np.cumsum(np.bincount(labels, minlength=self.class_num))
+        for cls_id, count in enumerate(self.class_gt_counts):
             if count == 0: continue
-            if len(score_pos) == 0:
+            start = ends[cls_id - 1] if cls_id > 0 else 0
+            if ends[cls_id] == start:
                 valid_cnt += 1
                 continue
 
-            accum_tp_list, accum_fp_list = \
-                    self._get_tp_fp_accum(score_pos)
-            precision = []
-            recall = []
-            for ac_tp, ac_fp in zip(accum_tp_list, accum_fp_list):
-                precision.append(float(ac_tp) / (ac_tp + ac_fp))
-                recall.append(float(ac_tp) / count)
+            accum_tp, accum_fp = self._get_tp_fp_accum(
+                pos[start:ends[cls_id]])
+            precision = accum_tp / (accum_tp + accum_fp)
+            recall = accum_tp / float(count)
 
             one_class_ap = 0.0
             if self.map_type == '11point':
                 max_precisions = [0.] * 11
+                precision, recall = precision.tolist(), recall.tolist()
                 start_idx = len(precision) - 1
                 for j in range(10, -1, -1):
                     for i in range(start_idx, -1, -1):
@@ -272,13 +419,11 @@ class DetectionMAP(object):
                 mAP += one_class_ap
                 valid_cnt += 1
             elif self.map_type == 'integral':
-                import math
-                prev_recall = 0.
-                for i in range(len(precision)):
-                    recall_gap = math.fabs(recall[i] - prev_recall)
-                    if recall_gap > 1e-6:
-                        one_class_ap += precision[i] * recall_gap
-                        prev_recall = recall[i]
+                # recall grows by at least 1 / count at each true positive
+                recall_gap = np.diff(recall, prepend=0.)
+                steps = recall_gap > 1e-6
+                one_class_ap = float(
+                    np.dot(precision[steps], recall_gap[steps]))
                 mAP += one_class_ap
                 valid_cnt += 1
             else:
@@ -334,22 +479,14 @@ class DetectionMAP(object):
                 "per-category PR curve has output to voc_pr_curve folder.")
         return self.mAP
 
-    def _get_tp_fp_accum(self, score_pos_list):
+    def _get_tp_fp_accum(self, pos):
         """
         Calculate accumulating true/false positive results from
-        [score, pos] records
+        positive flags sorted by score
         """
-        sorted_list = sorted(score_pos_list, key=lambda s: s[0], reverse=True)
-        accum_tp = 0
-        accum_fp = 0
-        accum_tp_list = []
-        accum_fp_list = []
-        for (score, pos) in sorted_list:
-            accum_tp += int(pos)
-            accum_tp_list.append(accum_tp)
-            accum_fp += 1 - int(pos)
-            accum_fp_list.append(accum_fp)
-        return accum_tp_list, accum_fp_list
+        accum_tp = np.cumsum(pos)
+        accum_fp = np.cumsum(1. - pos)
+        return accum_tp, accum_fp
 
 
 def ap_per_class(tp, conf, pred_cls, target_cls):
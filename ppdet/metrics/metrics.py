@@ -27,6 +27,7 @@ from pathlib import Path
 
 from .map_utils import prune_zero_padding, DetectionMAP
 from .coco_utils import get_infer_results, cocoapi_eval
+from .dist_utils import pack_results, unpack_results
 from .widerface_utils import (face_eval_run, image_eval, img_pr_info,
                               dataset_pr_info, voc_ap)
 from ppdet.data.source.category import get_categories
@@ -70,6 +71,40 @@ class Metric(paddle.metric.Metric):
     def get_results(self):
         pass
 
+    # distributed evaluation: every rank updates the metric with a shard of
+    # the dataset, then the states of all ranks are gathered to rank 0 by
+    # `gather_metrics` and set in rank order before :meth:`accumulate`
+
+    # abstract method returning the picklable state of the updates, None if
+    # distributed evaluation is not supported
+    def state(self):
+        return None
+
+    # abstract method setting the states of all ranks in rank order
+    def set_states(self, states):
+        raise NotImplementedError
+
+
+class _JsonListWriter(object):
+    """Write a json list item by item, same as json.dump of the list."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open(path, 'w')
+        self._file.write('[')
+
+    def write(self, items):
+        for item in items:
+            if self.count > 0:
+                self._file.write(', ')
+            json.dump(item, self._file)
+            self.count += 1
+
+    def close(self):
+        self._file.write(']')
+        self._file.close()
+
 
 class COCOMetric(Metric):
     def __init__(self, anno_file, **kwargs):
@@ -92,6 +127,31 @@ class COCOMetric(Metric):
             Path(self.output_eval).mkdir(exist_ok=True)
 
         self.save_threshold = kwargs.get('save_threshold', 0)
+        # processes of FastCOCOeval for datasets of many categories
+        self.eval_workers = kwargs.get('eval_workers', 0)
+
+        # evaluate bbox and mask results batch by batch in memory instead
+        # of loading them back from the saved json files
+        self.stream_eval = kwargs.get('stream_eval', False) and \
+            not self.save_prediction_only
+        self.save_json = kwargs.get('save_json', True)
+        # results of ranks are saved by rank 0 after gathered
+        self._keep_results = self.save_json and \
+            paddle.distributed.get_world_size() > 1
+        self.evaluators, self.writers = {}, {}
+        self._catid_table = None
+        # ground truth loaded once for the evaluations of all epochs
+        self.coco_gt = None
+        if self.stream_eval:
+            try:
+                from pycocotools.coco import COCO
+                from .fast_cocoeval import StreamingCOCOeval
+                self._evaluator_class = StreamingCOCOeval
+                self.coco_gt = COCO(anno_file)
+            except Exception as e:
+                logger.warning('stream_eval is disabled as fast_cocoeval is '
+                               'not available: {}'.format(e))
+                self.stream_eval = False
 
         self.reset()
 
@@ -99,6 +159,23 @@ class COCOMetric(Metric):
         # only bbox and mask evaluation support currently
         self.results = {'bbox': [], 'mask': [], 'segm': [], 'keypoint': []}
         self.eval_results = {}
+        if getattr(self, 'stream_eval', False):
+            self._close_writers()
+            if self.evaluators:
+                # reuse the evaluators and their cached ground truth
+                for evaluator in self.evaluators.values():
+                    evaluator.reset()
+            else:
+                self.evaluators = {
+                    'bbox': self._evaluator_class(self.coco_gt, 'bbox'),
+                    'mask': self._evaluator_class(self.coco_gt, 'segm'),
+                }
+
+    def _load_coco_gt(self):
+        if self.coco_gt is None:
+            from pycocotools.coco import COCO
+            self.coco_gt = COCO(self.anno_file)
+        return self.coco_gt
 
     def update(self, inputs, outputs):
         outs = {}
@@ -116,6 +193,9 @@ class COCOMetric(Metric):
         if 'im_file' in inputs:
             outs['im_file'] = inputs['im_file']
 
+        if self.stream_eval:
+            self._stream_update(outs)
+            return
         infer_results = get_infer_results(
             outs,
             self.clsid2catid,
@@ -130,8 +210,98 @@ class COCOMetric(Metric):
         self.results['keypoint'] += infer_results[
             'keypoint'] if 'keypoint' in infer_results else []
 
+    def _stream_bbox(self, outs):
+        """
+        Feed the bbox evaluator the detection arrays of the outputs, with
+        the filtering and the [x, y, w, h] boxes of `get_det_res`.
+        """
+        bbox_num = np.asarray(outs['bbox_num']).reshape(-1)
+        bbox = np.asarray(outs['bbox'])[:int(bbox_num.sum())]
+        if len(bbox) == 0:
+            return
+        im_ids = np.repeat(np.asarray(outs['im_id']).reshape(-1), bbox_num)
+        labels = bbox[:, 0].astype(np.int64)
+        keep = (labels >= 0) & (bbox[:, 1] >= self.save_threshold)
+        if self._catid_table is None:
+            self._catid_table = np.zeros(
+                max(self.clsid2catid.keys()) + 1, dtype=np.int64)
+            for clsid, catid in self.clsid2catid.items():
+                self._catid_table[clsid] = catid
+        boxes = bbox[keep, 2:6].astype(np.float64)
+        boxes[:, 2:] = boxes[:, 2:] - boxes[:, :2] + self.bias
+        self.evaluators['bbox'].update(
+            im_ids[keep],
+            self._catid_table[labels[keep]],
+            bbox[keep, 1],
+            boxes=boxes)
+
+    def _stream_update(self, outs):
+        # result dicts are only built to be saved, or for masks
+        save = self._keep_results or self.save_json
+        infer_results = {}
+        if save or any(k in outs for k in ['mask', 'segm', 'keypoint']):
+            infer_results = get_infer_results(
+                outs,
+                self.clsid2catid,
+                bias=self.bias,
+                save_threshold=self.save_threshold)
+        if 'bbox' in outs:
+            self._stream_bbox(outs)
+        for key in ['bbox', 'mask', 'segm']:
+            results = infer_results.get(key, [])
+            if len(results) == 0:
+                continue
+            if self._keep_results:
+                self.results[key] += results
+            elif self.save_json:
+                if key not in self.writers:
+                    output = '{}.json'.format(key)
+                    if self.output_eval:
+                        output = os.path.join(self.output_eval, output)
+                    self.writers[key] = _JsonListWriter(output)
+                self.writers[key].write(results)
+            if key != 'bbox':
+                self.evaluators['mask'].update(
+                    [res['image_id'] for res in results],
+                    [res['category_id'] for res in results],
+                    [res['score'] for res in results],
+                    segms=[res['segmentation'] for res in results])
+        self.results['keypoint'] += infer_results[
+            'keypoint'] if 'keypoint' in infer_results else []
+
+    def _close_writers(self):
+        for key, writer in self.writers.items():
+            writer.close()
+            logger.info('The {} result is saved to {}.'.format(key,
+                                                               writer.path))
+        self.writers = {}
+
+    def _accumulate_stream(self):
+        self._close_writers()
+        for key in ['bbox', 'mask', 'segm']:
+            if len(self.results[key]) > 0:
+                output = '{}.json'.format(key)
+                if self.output_eval:
+                    output = os.path.join(self.output_eval, output)
+                with open(output, 'w') as f:
+                    json.dump(self.results[key], f)
+                logger.info('The {} result is saved to {}.'.format(key,
+                                                                   output))
+        for key, style in [('bbox', 'bbox'), ('mask', 'segm')]:
+            if len(self.evaluators[key]) == 0:
+                continue
+            self.eval_results[key] = cocoapi_eval(
+                None,
+                style,
+                classwise=self.classwise,
+                coco_eval=self.evaluators[key])
+            sys.stdout.flush()
+
     def accumulate(self):
-        if len(self.results['bbox']) > 0:
+        if self.stream_eval:
+            self._accumulate_stream()
+
+        if len(self.results['bbox']) > 0 and not self.stream_eval:
             output = "bbox.json"
             if self.output_eval:
                 output = os.path.join(self.output_eval, output)
@@ -146,12 +316,13 @@ class COCOMetric(Metric):
                 bbox_stats = cocoapi_eval(
                     output,
                     'bbox',
-                    anno_file=self.anno_file,
-                    classwise=self.classwise)
+                    coco_gt=self._load_coco_gt(),
+                    classwise=self.classwise,
+                    num_workers=self.eval_workers)
                 self.eval_results['bbox'] = bbox_stats
                 sys.stdout.flush()
 
-        if len(self.results['mask']) > 0:
+        if len(self.results['mask']) > 0 and not self.stream_eval:
             output = "mask.json"
             if self.output_eval:
                 output = os.path.join(self.output_eval, output)
@@ -166,12 +337,13 @@ class COCOMetric(Metric):
                 seg_stats = cocoapi_eval(
                     output,
                     'segm',
-                    anno_file=self.anno_file,
-                    classwise=self.classwise)
+                    coco_gt=self._load_coco_gt(),
+                    classwise=self.classwise,
+                    num_workers=self.eval_workers)
                 self.eval_results['mask'] = seg_stats
                 sys.stdout.flush()
 
-        if len(self.results['segm']) > 0:
+        if len(self.results['segm']) > 0 and not self.stream_eval:
             output = "segm.json"
             if self.output_eval:
                 output = os.path.join(self.output_eval, output)
@@ -186,8 +358,9 @@ class COCOMetric(Metric):
                 seg_stats = cocoapi_eval(
                     output,
                     'segm',
-                    anno_file=self.anno_file,
-                    classwise=self.classwise)
+                    coco_gt=self._load_coco_gt(),
+                    classwise=self.classwise,
+                    num_workers=self.eval_workers)
                 self.eval_results['mask'] = seg_stats
                 sys.stdout.flush()
 
@@ -226,6 +399,28 @@ class COCOMetric(Metric):
     def get_results(self):
         return self.eval_results
 
+    def state(self):
+        state = {
+            'results':
+            {k: pack_results(v)
+             for k, v in self.results.items()}
+        }
+        if self.stream_eval:
+            state['evaluators'] = {
+                k: v.state()
+                for k, v in self.evaluators.items()
+            }
+        return state
+
+    def set_states(self, states):
+        self.reset()
+        for state in states:
+            for k, v in state['results'].items():
+                self.results[k] += unpack_results(v)
+            if self.stream_eval:
+                for k, v in state['evaluators'].items():
+                    self.evaluators[k].merge_states([v])
+
 
 class VOCMetric(Metric):
     def __init__(self,
@@ -336,6 +531,20 @@ class VOCMetric(Metric):
     def get_results(self):
         return {'bbox': [self.detection_map.get_map()]}
 
+    def state(self):
+        return {
+            'results': self.results,
+            'detection_map': self.detection_map.state()
+        }
+
+    def set_states(self, states):
+        self.reset()
+        for state in states:
+            for k, v in state['results'].items():
+                self.results[k] += v
+        self.detection_map.merge_states(
+            [state['detection_map'] for state in states])
+
 
 class WiderFaceMetric(Metric):
     def __init__(self, iou_thresh=0.5):
@@ -426,6 +635,21 @@ class WiderFaceMetric(Metric):
             'medium_ap': self.aps[1],
             'hard_ap': self.aps[2]}
 
+    def state(self):
+        return [
+            self.pred_boxes_list, self.gt_boxes_list, self.hard_ignore_list,
+            self.medium_ignore_list, self.easy_ignore_list
+        ]
+
+    def set_states(self, states):
+        self.reset()
+        for state in states:
+            self.pred_boxes_list += state[0]
+            self.gt_boxes_list += state[1]
+            self.hard_ignore_list += state[2]
+            self.medium_ignore_list += state[3]
+            self.easy_ignore_list += state[4]
+
 class RBoxMetric(Metric):
     def __init__(self, anno_file, **kwargs):
         self.anno_file = anno_file
@@ -480,6 +704,10 @@ class RBoxMetric(Metric):
         else:
             scale_factor = np.ones((gt_boxes.shape[0], 2)).astype('float32')
 
+        im_results = defaultdict(list)
+        for res in infer_results:
+            im_results[int(res['image_id'])].append(res)
+
         for i in range(len(gt_boxes)):
             gt_box = gt_boxes[i].numpy() if isinstance(
                 gt_boxes[i], paddle.Tensor) else gt_boxes[i]
@@ -488,18 +716,11 @@ class RBoxMetric(Metric):
             gt_label = gt_labels[i].numpy() if isinstance(
                 gt_labels[i], paddle.Tensor) else gt_labels[i]
             gt_box, gt_label, _ = prune_zero_padding(gt_box, gt_label)
-            bbox = [
-                res['bbox'] for res in infer_results
-                if int(res['image_id']) == int(im_id[i])
-            ]
-            score = [
-                res['score'] for res in infer_results
-                if int(res['image_id']) == int(im_id[i])
-            ]
+            results = im_results[int(im_id[i])]
+            bbox = [res['bbox'] for res in results]
+            score = [res['score'] for res in results]
             label = [
-                self.catid2clsid[int(res['category_id'])]
-                for res in infer_results
-                if int(res['image_id']) == int(im_id[i])
+                self.catid2clsid[int(res['category_id'])] for res in results
             ]
             self.detection_map.update(bbox, score, label, gt_box, gt_label)
 
@@ -547,6 +768,19 @@ class RBoxMetric(Metric):
     def get_results(self):
         return {'bbox': [self.detection_map.get_map()]}
 
+    def state(self):
+        return {
+            'results': pack_results(self.results),
+            'detection_map': self.detection_map.state()
+        }
+
+    def set_states(self, states):
+        self.reset()
+        for state in states:
+            self.results += unpack_results(state['results'])
+        self.detection_map.merge_states(
+            [state['detection_map'] for state in states])
+
 
 class SNIPERCOCOMetric(COCOMetric):
     def __init__(self, anno_file, **kwargs):
@@ -555,9 +789,7 @@ class SNIPERCOCOMetric(COCOMetric):
         self.chip_results = []
 
     def reset(self):
-        # only bbox and mask evaluation support currently
-        self.results = {'bbox': [], 'mask': [], 'segm': [], 'keypoint': []}
-        self.eval_results = {}
+        super(SNIPERCOCOMetric, self).reset()
         self.chip_results = []
 
     def update(self, inputs, outputs):
@@ -572,10 +804,22 @@ class SNIPERCOCOMetric(COCOMetric):
 
         self.chip_results.append(outs)
 
+    def state(self):
+        return self.chip_results
+
+    def set_states(self, states):
+        self.reset()
+        for state in states:
+            self.chip_results += state
+
     def accumulate(self):
         results = self.dataset.anno_cropper.aggregate_chips_detections(
             self.chip_results)
         for outs in results:
+            if self.stream_eval:
+                # the evaluators are fed by the aggregated detections
+                self._stream_update(outs)
+                continue
             infer_results = get_infer_results(
                 outs, self.clsid2catid, bias=self.bias)
             self.results['bbox'] += infer_results[
@@ -21,17 +21,19 @@ import copy
 import sys
 import math
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 
 from ppdet.modeling.bbox_utils import bbox_iou_np_expand
+from ppdet.modeling.mot.utils import load_mot_results
 from .map_utils import ap_per_class
 from .metrics import Metric
-from .munkres import Munkres
 
 try:
     import motmetrics as mm
     mm.lap.default_solver = 'lap'
 except:
+    mm = None
     print(
         'Warning: Unable to use MOT metric, please install motmetrics, for example: `pip install motmetrics`, see https://github.com/longcw/py-motmetrics'
     )
@@ -45,46 +47,22 @@ __all__ = ['MOTEvaluator', 'MOTMetric', 'JDEDetMetric', 'KITTIMOTMetric']
 
 def read_mot_results(filename, is_gt=False, is_ignore=False):
     valid_label = [1]
-    ignore_labels = [2, 7, 8, 12]  # only in motchallenge datasets like 'MOT16'
     if is_gt:
         logger.info(
             "In MOT16/17 dataset the valid_label of ground truth is '{}', "
             "in other dataset it should be '0' for single classs MOT.".format(
                 valid_label[0]))
-    results_dict = dict()
-    if os.path.isfile(filename):
-        with open(filename, 'r') as f:
-            for line in f.readlines():
-                linelist = line.split(',')
-                if len(linelist) < 7:
-                    continue
-                fid = int(linelist[0])
-                if fid < 1:
-                    continue
-                results_dict.setdefault(fid, list())
-
-                if is_gt:
-                    label = int(float(linelist[7]))
-                    mark = int(float(linelist[6]))
-                    if mark == 0 or label not in valid_label:
-                        continue
-                    score = 1
-                elif is_ignore:
-                    if 'MOT16-' in filename or 'MOT17-' in filename or 'MOT15-' in filename or 'MOT20-' in filename:
-                        label = int(float(linelist[7]))
-                        vis_ratio = float(linelist[8])
-                        if label not in ignore_labels and vis_ratio >= 0:
-                            continue
-                    else:
-                        continue
-                    score = 1
-                else:
-                    score = float(linelist[6])
-
-                tlwh = tuple(map(float, linelist[2:6]))
-                target_id = int(linelist[1])
-
-                results_dict[fid].append((tlwh, target_id, score))
+    data = _read_mot_txt(filename)
+    # frames of all rows are kept even if their boxes are filtered out
+    results_dict = {
+        fid: list()
+        for fid in np.unique(data[:, 0].astype(int)).tolist() if fid >= 1
+    }
+    results = read_mot_arrays(filename, is_gt, is_ignore, data=data)
+    for fid, tlwh, target_id, score in zip(
+            results['frame'].tolist(), results['tlwh'].tolist(),
+            results['id'].tolist(), results['score'].tolist()):
+        results_dict[fid].append((tuple(tlwh), target_id, score))
     return results_dict
 
 
@@ -116,20 +94,441 @@ def unzip_objs(objs):
     return tlwhs, ids, scores
 
 
+def _read_mot_txt(filename):
+    # rows of at least 7 fields as [N, 9] array, missing fields are nan
+    if not os.path.isfile(filename):
+        return np.zeros((0, 9))
+    with open(filename, 'r') as f:
+        lines = [line.strip() for line in f.read().splitlines()]
+    lines = [line for line in lines if line]
+    num_fields = set(line.count(',') + 1 for line in lines)
+    if len(num_fields) == 1 and min(num_fields) >= 9:
+        # all rows have the same fields, parse them at once
+        data = np.fromstring(','.join(lines), sep=',')
+        return data.reshape(len(lines), -1)[:, :9]
+    rows = []
+    for line in lines:
+        linelist = line.split(',')
+        if len(linelist) < 7:
+            continue
+        linelist = linelist[:9]
+        rows.append(','.join(linelist + ['nan'] * (9 - len(linelist))))
+    return np.fromstring(','.join(rows), sep=',').reshape(-1, 9)
+
+
+def read_mot_arrays(filename, is_gt=False, is_ignore=False, data=None):
+    """
+    Read the same boxes as `read_mot_results`, as arrays of all frames.
+    Results saved with a `.npy` array by `write_mot_results` are loaded
+    from the array without parsing the txt file.
+
+    Args:
+        data (np.ndarray): rows already read from the file, optional.
+
+    Returns:
+        results (dict): 'frame' [N], 'tlwh' [N, 4], 'id' [N] and 'score' [N]
+            arrays, sorted by frame id and in file order in each frame.
+    """
+    valid_label = [1]
+    ignore_labels = [2, 7, 8, 12]  # only in motchallenge datasets like 'MOT16'
+    if data is None and not is_gt and not is_ignore:
+        array = load_mot_results(filename)
+        if array is not None:
+            array = array[array['frame'] >= 1]
+            return {
+                'frame': array['frame'],
+                'tlwh': array['tlwh'],
+                'id': array['id'],
+                'score': array['score']
+            }
+    if data is None:
+        data = _read_mot_txt(filename)
+    keep = data[:, 0] >= 1
+    if is_gt:
+        label = data[:, 7].astype(int)
+        mark = data[:, 6].astype(int)
+        keep &= (mark != 0) & np.isin(label, valid_label)
+    elif is_ignore:
+        if 'MOT16-' in filename or 'MOT17-' in filename or 'MOT15-' in filename or 'MOT20-' in filename:
+            label = data[:, 7].astype(int)
+            keep &= np.isin(label, ignore_labels) | (data[:, 8] < 0)
+        else:
+            keep[:] = False
+    data = data[keep]
+    data = data[np.argsort(data[:, 0], kind='stable')]
+    score = np.ones(len(data)) if is_gt or is_ignore else data[:, 6]
+    return {
+        'frame': data[:, 0].astype(int),
+        'tlwh': data[:, 2:6],
+        'id': data[:, 1].astype(int),
+        'score': score
+    }
+
+
+def iou_distance(objs, hyps, max_iou=0.5):
+    """
+    IoU distance between tlwh boxes, same as `mm.distances.iou_matrix`,
+    pairs with distance larger than max_iou are nan.
+    """
+    objs = np.asarray(objs, dtype=float).reshape(-1, 1, 4)
+    hyps = np.asarray(hyps, dtype=float).reshape(1, -1, 4)
+    o_min, o_max = objs[..., :2], objs[..., :2] + objs[..., 2:]
+    h_min, h_max = hyps[..., :2], hyps[..., :2] + hyps[..., 2:]
+    i_size = np.maximum(np.minimum(o_max, h_max) - np.maximum(o_min, h_min),
+                        0)
+    i_vol = np.prod(i_size, axis=-1)
+    o_vol = np.prod(np.maximum(o_max - o_min, 0), axis=-1)
+    h_vol = np.prod(np.maximum(h_max - h_min, 0), axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        iou = np.where(i_vol == 0, 0., i_vol / (o_vol + h_vol - i_vol))
+    dist = 1 - iou
+    return np.where(dist > max_iou, np.nan, dist)
+
+
+def linear_sum_assignment(costs):
+    """
+    Min cost assignment ignoring nan costs, same as
+    `mm.lap.linear_sum_assignment` with the lap or scipy solver.
+    """
+    costs = np.asarray(costs, dtype=float)
+    if costs.size == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    valid = np.isfinite(costs)
+    if valid.all():
+        finite_costs = costs
+    elif not valid.any():
+        finite_costs = np.zeros_like(costs)
+    else:
+        # an invalid edge costs more than any assignment of valid edges
+        c = np.abs(costs[valid]).max() + 1
+        finite_costs = np.where(valid, costs, 2 * min(costs.shape) * c + 1)
+    try:
+        import lap
+        row_to_col = lap.lapjv(
+            finite_costs, return_cost=False, extend_cost=True)[0]
+        rids = np.flatnonzero(row_to_col != -1)
+        cids = row_to_col[rids]
+    except ImportError:
+        from scipy.optimize import linear_sum_assignment as scipy_solve
+        rids, cids = scipy_solve(finite_costs)
+    rids, cids = np.asarray(rids, dtype=int), np.asarray(cids, dtype=int)
+    keep = valid[rids, cids]
+    return rids[keep], cids[keep]
+
+
+MOT_METRICS = [
+    'idf1', 'idp', 'idr', 'recall', 'precision', 'num_unique_objects',
+    'mostly_tracked', 'partially_tracked', 'mostly_lost',
+    'num_false_positives', 'num_misses', 'num_switches', 'num_fragmentations',
+    'mota', 'motp', 'num_transfer', 'num_ascend', 'num_migrate'
+]
+
+MOT_METRIC_NAMES = {
+    'idf1': 'IDF1',
+    'idp': 'IDP',
+    'idr': 'IDR',
+    'recall': 'Rcll',
+    'precision': 'Prcn',
+    'num_unique_objects': 'GT',
+    'mostly_tracked': 'MT',
+    'partially_tracked': 'PT',
+    'mostly_lost': 'ML',
+    'num_false_positives': 'FP',
+    'num_misses': 'FN',
+    'num_switches': 'IDs',
+    'num_fragmentations': 'FM',
+    'mota': 'MOTA',
+    'motp': 'MOTP',
+    'num_transfer': 'IDt',
+    'num_ascend': 'IDa',
+    'num_migrate': 'IDm',
+}
+
+# counters summed over sequences in the overall summary
+MOT_COUNTERS = [
+    'num_frames', 'num_matches', 'num_switches', 'num_transfer', 'num_ascend',
+    'num_migrate', 'num_false_positives', 'num_misses', 'num_detections',
+    'num_objects', 'num_predictions', 'num_unique_objects', 'mostly_tracked',
+    'partially_tracked', 'mostly_lost', 'num_fragmentations', 'idfp', 'idfn',
+    'idtp'
+]
+
+
+def _quiet_divide(a, b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.true_divide(a, b)
+
+
+def compute_mot_ratios(counters):
+    """
+    Add the ratio metrics of the counters, same as motmetrics.
+    """
+    counters['motp'] = _quiet_divide(counters['sum_distance'],
+                                     counters['num_detections'])
+    counters['mota'] = 1. - _quiet_divide(
+        counters['num_misses'] + counters['num_switches'] +
+        counters['num_false_positives'], counters['num_objects'])
+    counters['precision'] = _quiet_divide(
+        counters['num_detections'],
+        counters['num_false_positives'] + counters['num_detections'])
+    counters['recall'] = _quiet_divide(counters['num_detections'],
+                                       counters['num_objects'])
+    counters['idp'] = _quiet_divide(counters['idtp'],
+                                    counters['idtp'] + counters['idfp'])
+    counters['idr'] = _quiet_divide(counters['idtp'],
+                                    counters['idtp'] + counters['idfn'])
+    counters['idf1'] = _quiet_divide(
+        2 * counters['idtp'],
+        counters['num_objects'] + counters['num_predictions'])
+    return counters
+
+
+class MOTSequenceAccumulator(object):
+    """
+    CLEAR-MOT and ID metrics of one sequence without pandas, the frames are
+    matched the same way as `mm.MOTAccumulator.update` but the events are
+    only counted. The state of the objects and hypotheses is kept in
+    arrays indexed by id, allocated once for the sequence.
+
+    Args:
+        gt_ids (np.ndarray): all object ids of the sequence.
+        hyp_ids (np.ndarray): all hypothesis ids of the sequence.
+    """
+
+    def __init__(self, gt_ids, hyp_ids):
+        self.gt_ids = np.unique(gt_ids)
+        self.hyp_ids = np.unique(hyp_ids)
+        num_gt, num_hyp = len(self.gt_ids), len(self.hyp_ids)
+        # last matched hypothesis of each object and the reverse
+        self.matched_hyp = np.full(num_gt, -1, dtype=int)
+        self.matched_gt = np.full(num_hyp, -1, dtype=int)
+        self.gt_matched_once = np.zeros(num_gt, dtype=bool)
+        self.hyp_matched_once = np.zeros(num_hyp, dtype=bool)
+        # frames each id is present in, and frames a pair is within max_iou
+        self.gt_frames = np.zeros(num_gt, dtype=int)
+        self.hyp_frames = np.zeros(num_hyp, dtype=int)
+        self.pair_codes = []
+        # (object, tracked) of the object events of all frames in order
+        self.gt_events = []
+        self.tracked_events = []
+        self.counts = defaultdict(int)
+        self.sum_distance = 0.
+
+    def update(self, gt_ids, hyp_ids, dists):
+        """
+        Match the objects and hypotheses of the next frame.
+        """
+        oids = np.searchsorted(self.gt_ids, gt_ids)
+        hids = np.searchsorted(self.hyp_ids, hyp_ids)
+        no, nh = len(oids), len(hids)
+        dists = np.asarray(dists, dtype=float).reshape(no, nh)
+        self.counts['num_frames'] += 1
+
+        self.gt_frames[np.unique(oids)] += 1
+        self.hyp_frames[np.unique(hids)] += 1
+        valid_i, valid_j = np.nonzero(np.isfinite(dists))
+        self.pair_codes.append(oids[valid_i] * len(self.hyp_ids) +
+                               hids[valid_j])
+
+        if len(np.unique(oids)) == no and len(np.unique(hids)) == nh:
+            o_mask, h_mask = self._match(oids, hids, dists)
+        else:
+            o_mask, h_mask = self._match_loop(oids, hids, dists)
+
+        self.counts['num_misses'] += int(no - o_mask.sum())
+        self.counts['num_false_positives'] += int(nh - h_mask.sum())
+        self.counts['num_objects'] += no
+        self.counts['num_predictions'] += nh
+
+    def _add_matches(self, dists, is_switch):
+        self.counts['num_switches'] += int(is_switch.sum())
+        self.counts['num_matches'] += int(len(is_switch) - is_switch.sum())
+        self.sum_distance += float(dists.sum())
+
+    def _match(self, oids, hids, dists):
+        # ids are unique in the frame, so every match is independent
+        no, nh = len(oids), len(hids)
+        o_mask = np.zeros(no, dtype=bool)
+        h_mask = np.zeros(nh, dtype=bool)
+        if no * nh > 0:
+            # 1. keep the previous matches of the objects
+            hyp_pos = np.full(len(self.hyp_ids), -1, dtype=int)
+            hyp_pos[hids] = np.arange(nh)
+            prev = self.matched_hyp[oids]
+            rows = np.flatnonzero(prev >= 0)
+            cols = hyp_pos[prev[rows]]
+            rows, cols = rows[cols >= 0], cols[cols >= 0]
+            finite = np.isfinite(dists[rows, cols])
+            rows, cols = rows[finite], cols[finite]
+            # an hypothesis is kept by the first object of it
+            cols, first = np.unique(cols, return_index=True)
+            rows = rows[first]
+            o_mask[rows] = True
+            h_mask[cols] = True
+            self.gt_matched_once[oids[rows]] = True
+            self.hyp_matched_once[hids[cols]] = True
+            self._add_matches(dists[rows, cols],
+                              np.zeros(
+                                  len(rows), dtype=bool))
+
+            # 2. match the others by min cost assignment
+            dists = dists.copy()
+            dists[o_mask, :] = np.nan
+            dists[:, h_mask] = np.nan
+            rows, cols = linear_sum_assignment(dists)
+            o, h = oids[rows], hids[cols]
+            prev_hyp, prev_gt = self.matched_hyp[o], self.matched_gt[h]
+            is_switch = (prev_hyp >= 0) & (prev_hyp != h)
+            is_transfer = (prev_gt >= 0) & (prev_gt != o)
+            self.counts['num_ascend'] += int(
+                (is_switch & ~self.hyp_matched_once[h]).sum())
+            self.counts['num_migrate'] += int(
+                (is_transfer & ~self.gt_matched_once[o]).sum())
+            self.counts['num_transfer'] += int(is_transfer.sum())
+            self._add_matches(dists[rows, cols], is_switch)
+            self.hyp_matched_once[h] = True
+            self.gt_matched_once[o] = True
+            self.matched_hyp[o] = h
+            self.matched_gt[h] = o
+            o_mask[rows] = True
+            h_mask[cols] = True
+        self.gt_events.append(oids)
+        self.tracked_events.append(o_mask)
+        return o_mask, h_mask
+
+    def _match_loop(self, oids, hids, dists):
+        # same as `mm.MOTAccumulator.update` for frames with duplicated ids
+        no, nh = len(oids), len(hids)
+        o_mask = np.zeros(no, dtype=bool)
+        h_mask = np.zeros(nh, dtype=bool)
+        events = []
+        if no * nh > 0:
+            for i in range(no):
+                o = oids[i]
+                if self.matched_hyp[o] < 0:
+                    continue
+                j = np.flatnonzero(~h_mask & (hids == self.matched_hyp[o]))
+                if len(j) == 0 or not np.isfinite(dists[i, j[0]]):
+                    continue
+                j = j[0]
+                o_mask[i] = h_mask[j] = True
+                self.gt_matched_once[o] = self.hyp_matched_once[hids[j]] = True
+                self._add_matches(dists[i, j], np.zeros(1, bool))
+                events.append((o, True))
+
+            dists = dists.copy()
+            dists[o_mask, :] = np.nan
+            dists[:, h_mask] = np.nan
+            for i, j in zip(*linear_sum_assignment(dists)):
+                o, h = oids[i], hids[j]
+                is_switch = self.matched_hyp[o] >= 0 and \
+                    self.matched_hyp[o] != h
+                if is_switch and not self.hyp_matched_once[h]:
+                    self.counts['num_ascend'] += 1
+                if self.matched_gt[h] >= 0 and self.matched_gt[h] != o:
+                    if not self.gt_matched_once[o]:
+                        self.counts['num_migrate'] += 1
+                    self.counts['num_transfer'] += 1
+                self.hyp_matched_once[h] = self.gt_matched_once[o] = True
+                self._add_matches(dists[i, j], np.array([is_switch]))
+                events.append((o, True))
+                o_mask[i] = h_mask[j] = True
+                self.matched_hyp[o] = h
+                self.matched_gt[h] = o
+        events += [(o, False) for o in oids[~o_mask]]
+        self.gt_events.append(np.array([e[0] for e in events], dtype=int))
+        self.tracked_events.append(np.array([e[1] for e in events], bool))
+        return o_mask, h_mask
+
+    def _track_stats(self):
+        gt = np.concatenate(self.gt_events + [np.zeros(0, dtype=int)])
+        tracked = np.concatenate(self.tracked_events + [np.zeros(0, bool)])
+        num_gt = len(self.gt_ids)
+        frequencies = np.bincount(gt, minlength=num_gt)
+        present = frequencies > 0
+        ratios = np.bincount(
+            gt, weights=tracked, minlength=num_gt)[present] / \
+            frequencies[present]
+        self.counts['num_unique_objects'] = int(present.sum())
+        self.counts['mostly_tracked'] = int((ratios >= 0.8).sum())
+        self.counts['partially_tracked'] = int(
+            ((ratios >= 0.2) & (ratios < 0.8)).sum())
+        self.counts['mostly_lost'] = int((ratios < 0.2).sum())
+
+        # fragmentations: tracked to missed changes of an object that is
+        # tracked again later
+        order = np.argsort(gt, kind='stable')
+        gt, tracked = gt[order], tracked[order]
+        pos = np.arange(len(gt))
+        last_tracked = np.full(num_gt, -1)
+        np.maximum.at(last_tracked, gt[tracked], pos[tracked])
+        frag = np.zeros(len(gt), dtype=bool)
+        frag[1:] = (gt[1:] == gt[:-1]) & tracked[:-1] & ~tracked[1:]
+        self.counts['num_fragmentations'] = int(
+            (frag & (pos < last_tracked[gt])).sum())
+
+    def _id_stats(self):
+        gt_frames = self.gt_frames[self.gt_frames > 0]
+        hyp_frames = self.hyp_frames[self.hyp_frames > 0]
+        gt_idx = np.cumsum(self.gt_frames > 0) - 1
+        hyp_idx = np.cumsum(self.hyp_frames > 0) - 1
+        no, nh = len(gt_frames), len(hyp_frames)
+
+        fpmatrix = np.zeros((no + nh, no + nh))
+        fnmatrix = np.zeros((no + nh, no + nh))
+        fpmatrix[no:, :nh] = np.nan
+        fnmatrix[:no, nh:] = np.nan
+        fnmatrix[:no, :nh] = gt_frames[:, None]
+        fnmatrix[np.arange(no), nh + np.arange(no)] = gt_frames
+        fpmatrix[:no, :nh] = hyp_frames[None, :]
+        fpmatrix[no + np.arange(nh), np.arange(nh)] = hyp_frames
+
+        codes, tps = np.unique(
+            np.concatenate(self.pair_codes + [np.zeros(0, dtype=int)]),
+            return_counts=True)
+        rows = gt_idx[codes // len(self.hyp_ids)]
+        cols = hyp_idx[codes % len(self.hyp_ids)]
+        fpmatrix[rows, cols] -= tps
+        fnmatrix[rows, cols] -= tps
+
+        rids, cids = linear_sum_assignment(fpmatrix + fnmatrix)
+        self.counts['idfp'] = fpmatrix[rids, cids].sum()
+        self.counts['idfn'] = fnmatrix[rids, cids].sum()
+        self.counts['idtp'] = self.counts['num_objects'] - self.counts['idfn']
+
+    def summary(self):
+        """
+        Counters and metrics of the sequence, see `MOT_COUNTERS`.
+        """
+        self._track_stats()
+        self._id_stats()
+        counters = dict(self.counts)
+        counters['num_detections'] = counters.get(
+            'num_matches', 0) + counters.get('num_switches', 0)
+        for key in MOT_COUNTERS:
+            counters.setdefault(key, 0)
+        counters['sum_distance'] = self.sum_distance
+        return compute_mot_ratios(counters)
+
+
+def _frame_bounds(frames, frame_ids):
+    return (np.searchsorted(frames, frame_ids, 'left'),
+            np.searchsorted(frames, frame_ids, 'right'))
+
+
 class MOTEvaluator(object):
+    """
+    Evaluate the tracking results of one sequence. `eval_file` computes
+    the metrics natively with `MOTSequenceAccumulator`, `eval_frame` feeds
+    a motmetrics `MOTAccumulator` frame by frame.
+    """
+
     def __init__(self, data_root, seq_name, data_type):
         self.data_root = data_root
         self.seq_name = seq_name
         self.data_type = data_type
 
         self.load_annotations()
-        try:
-            import motmetrics as mm
-            mm.lap.default_solver = 'lap'
-        except Exception as e:
-            raise RuntimeError(
-                'Unable to use MOT metric, please install motmetrics, for example: `pip install motmetrics`, see https://github.com/longcw/py-motmetrics'
-            )
         self.reset_accumulator()
 
     def load_annotations(self):
@@ -140,25 +539,31 @@ class MOTEvaluator(object):
             logger.warning(
                 "gt_filename '{}' of MOTEvaluator is not exist, so the MOTA will be -INF."
             )
-        self.gt_frame_dict = read_mot_results(gt_filename, is_gt=True)
-        self.gt_ignore_frame_dict = read_mot_results(
-            gt_filename, is_ignore=True)
+        data = _read_mot_txt(gt_filename)
+        self.gt = read_mot_arrays(gt_filename, is_gt=True, data=data)
+        self.gt_ignore = read_mot_arrays(
+            gt_filename, is_ignore=True, data=data)
 
     def reset_accumulator(self):
-        self.acc = mm.MOTAccumulator(auto_id=True)
+        self.acc = mm.MOTAccumulator(auto_id=True) if mm is not None else None
 
     def eval_frame(self, frame_id, trk_tlwhs, trk_ids, rtn_events=False):
+        if mm is None:
+            raise RuntimeError(
+                'Unable to use MOT metric, please install motmetrics, for example: `pip install motmetrics`, see https://github.com/longcw/py-motmetrics'
+            )
         # results
         trk_tlwhs = np.copy(trk_tlwhs)
         trk_ids = np.copy(trk_ids)
 
         # gts
-        gt_objs = self.gt_frame_dict.get(frame_id, [])
-        gt_tlwhs, gt_ids = unzip_objs(gt_objs)[:2]
+        start, end = _frame_bounds(self.gt['frame'], frame_id)
+        gt_tlwhs = self.gt['tlwh'][start:end]
+        gt_ids = self.gt['id'][start:end]
 
         # ignore boxes
-        ignore_objs = self.gt_ignore_frame_dict.get(frame_id, [])
-        ignore_tlwhs = unzip_objs(ignore_objs)[0]
+        start, end = _frame_bounds(self.gt_ignore['frame'], frame_id)
+        ignore_tlwhs = self.gt_ignore['tlwh'][start:end]
 
         # remove ignored results
         keep = np.ones(len(trk_tlwhs), dtype=bool)
@@ -189,31 +594,84 @@ class MOTEvaluator(object):
         return events
 
     def eval_file(self, filename):
-        self.reset_accumulator()
-
-        result_frame_dict = read_mot_results(filename, is_gt=False)
-        frames = sorted(list(set(result_frame_dict.keys())))
-        for frame_id in frames:
-            trk_objs = result_frame_dict.get(frame_id, [])
-            trk_tlwhs, trk_ids = unzip_objs(trk_objs)[:2]
-            self.eval_frame(frame_id, trk_tlwhs, trk_ids, rtn_events=False)
-
-        return self.acc
+        """
+        Evaluate the frames of the result file, returns the counters and
+        metrics of the sequence given by `MOTSequenceAccumulator.summary`.
+        """
+        results = read_mot_arrays(filename, is_gt=False)
+        frames = np.unique(results['frame'])
+        acc = MOTSequenceAccumulator(self.gt['id'], results['id'])
+        res_start, res_end = _frame_bounds(results['frame'], frames)
+        gt_start, gt_end = _frame_bounds(self.gt['frame'], frames)
+        ign_start, ign_end = _frame_bounds(self.gt_ignore['frame'], frames)
+        for k in range(len(frames)):
+            trk_tlwhs = results['tlwh'][res_start[k]:res_end[k]]
+            trk_ids = results['id'][res_start[k]:res_end[k]]
+
+            # remove results matched to ignored boxes
+            ignore_tlwhs = self.gt_ignore['tlwh'][ign_start[k]:ign_end[k]]
+            if len(ignore_tlwhs) > 0 and len(trk_tlwhs) > 0:
+                match_is, match_js = linear_sum_assignment(
+                    iou_distance(ignore_tlwhs, trk_tlwhs, max_iou=0.5))
+                keep = np.ones(len(trk_tlwhs), dtype=bool)
+                keep[match_js] = False
+                trk_tlwhs, trk_ids = trk_tlwhs[keep], trk_ids[keep]
+
+            gt_tlwhs = self.gt['tlwh'][gt_start[k]:gt_end[k]]
+            gt_ids = self.gt['id'][gt_start[k]:gt_end[k]]
+            acc.update(gt_ids, trk_ids,
+                       iou_distance(
+                           gt_tlwhs, trk_tlwhs, max_iou=0.5))
+        return acc.summary()
 
     @staticmethod
     def get_summary(accs,
                     names,
                     metrics=('mota', 'num_switches', 'idp', 'idr', 'idf1',
                              'precision', 'recall')):
+        """
+        Summary of the sequences and the overall row, accs are the results
+        of `eval_file`, or motmetrics accumulators.
+        """
         names = copy.deepcopy(names)
         if metrics is None:
-            metrics = mm.metrics.motchallenge_metrics
+            metrics = MOT_METRICS
         metrics = copy.deepcopy(metrics)
 
-        mh = mm.metrics.create()
-        summary = mh.compute_many(
-            accs, metrics=metrics, names=names, generate_overall=True)
-        return summary
+        if not all(isinstance(acc, dict) for acc in accs):
+            mh = mm.metrics.create()
+            return mh.compute_many(
+                accs, metrics=metrics, names=names, generate_overall=True)
+
+        import pandas as pd
+        overall = {key: sum(acc[key] for acc in accs) for key in MOT_COUNTERS}
+        # motp of the overall is weighted by the detections of sequences
+        overall['sum_distance'] = sum(acc['motp'] * acc['num_detections']
+                                      for acc in accs)
+        rows = list(accs) + [compute_mot_ratios(overall)]
+        return pd.DataFrame(
+            [[row[m] for m in metrics] for row in rows],
+            index=list(names) + ['OVERALL'],
+            columns=list(metrics))
+
+    @staticmethod
+    def render_summary(summary):
+        formatters = {
+            m: '{:.1%}'.format
+            for m in [
+                'idf1', 'idp', 'idr', 'recall', 'precision', 'mota'
+            ]
+        }
+        formatters['motp'] = '{:.3f}'.format
+        for m in MOT_COUNTERS:
+            if m not in ['num_fragmentations', 'idfp', 'idfn', 'idtp']:
+                formatters[m] = '{:d}'.format
+        formatters = {
+            MOT_METRIC_NAMES.get(m, m): f
+            for m, f in formatters.items()
+        }
+        return summary.rename(columns=MOT_METRIC_NAMES).to_string(
+            formatters=formatters)
 
     @staticmethod
     def save_summary(summary, filename):
@@ -223,11 +681,25 @@ class MOTEvaluator(object):
         writer.save()
 
 
+def eval_mot_sequence(data_root, seq, data_type, result_filename):
+    return MOTEvaluator(data_root, seq, data_type).eval_file(result_filename)
+
+
 class MOTMetric(Metric):
-    def __init__(self, save_summary=False):
+    """
+    Args:
+        save_summary (bool): whether save the summary to summary.xlsx.
+        num_workers (int): number of processes to evaluate sequences in, the
+            sequences are evaluated in the background while the next ones
+            are tracked. 0 to evaluate each sequence in `update`.
+    """
+
+    def __init__(self, save_summary=False, num_workers=0):
         self.save_summary = save_summary
+        self.num_workers = num_workers
         self.MOTEvaluator = MOTEvaluator
         self.result_root = None
+        self._executor = None
         self.reset()
 
     def reset(self):
@@ -235,19 +707,26 @@ class MOTMetric(Metric):
         self.seqs = []
 
     def update(self, data_root, seq, data_type, result_root, result_filename):
-        evaluator = self.MOTEvaluator(data_root, seq, data_type)
-        self.accs.append(evaluator.eval_file(result_filename))
+        if self.num_workers > 0:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.num_workers)
+            self.accs.append(
+                self._executor.submit(eval_mot_sequence, data_root, seq,
+                                      data_type, result_filename))
+        else:
+            evaluator = self.MOTEvaluator(data_root, seq, data_type)
+            self.accs.append(evaluator.eval_file(result_filename))
         self.seqs.append(seq)
         self.result_root = result_root
 
     def accumulate(self):
-        metrics = mm.metrics.motchallenge_metrics
-        mh = mm.metrics.create()
-        summary = self.MOTEvaluator.get_summary(self.accs, self.seqs, metrics)
-        self.strsummary = mm.io.render_summary(
-            summary,
-            formatters=mh.formatters,
-            namemap=mm.io.motchallenge_metric_names)
+        if self._executor is not None:
+            self.accs = [acc.result() for acc in self.accs]
+            self._executor.shutdown()
+            self._executor = None
+        summary = self.MOTEvaluator.get_summary(self.accs, self.seqs,
+                                                MOT_METRICS)
+        self.strsummary = self.MOTEvaluator.render_summary(summary)
         if self.save_summary:
             self.MOTEvaluator.save_summary(
                 summary, os.path.join(self.result_root, 'summary.xlsx'))
@@ -328,41 +807,17 @@ Following code is borrow from https://github.com/xingyizhou/CenterTrack/blob/mas
 """
 
 
-class tData:
-    """
-        Utility class to load data.
-    """
-    def __init__(self,frame=-1,obj_type="unset",truncation=-1,occlusion=-1,\
-                 obs_angle=-10,x1=-1,y1=-1,x2=-1,y2=-1,w=-1,h=-1,l=-1,\
-                 X=-1000,Y=-1000,Z=-1000,yaw=-10,score=-1000,track_id=-1):
-        """
-            Constructor, initializes the object given the parameters.
-        """
-        self.frame = frame
-        self.track_id = track_id
-        self.obj_type = obj_type
-        self.truncation = truncation
-        self.occlusion = occlusion
-        self.obs_angle = obs_angle
-        self.x1 = x1
-        self.y1 = y1
-        self.x2 = x2
-        self.y2 = y2
-        self.w = w
-        self.h = h
-        self.l = l
-        self.X = X
-        self.Y = Y
-        self.Z = Z
-        self.yaw = yaw
-        self.score = score
-        self.ignored = False
-        self.valid = False
-        self.tracker = -1
-
-    def __str__(self):
-        attrs = vars(self)
-        return '\n'.join("%s: %s" % item for item in attrs.items())
+# fields of the KITTI tracking format, except the object type at index 2:
+# frame, tracklet_id, truncation, occlusion, alpha, x1, y1, x2, y2, h, w, l, X,
+# Y, Z, ry
+KITTI_NUMERIC_FIELDS = [0, 1] + list(range(3, 17))
+
+
+def _select_rows(data, mask):
+    return {
+        k: v[mask] if isinstance(v, np.ndarray) else v
+        for k, v in data.items()
+    }
 
 
 class KITTIEvaluation(object):
@@ -381,6 +836,10 @@ class KITTIEvaluation(object):
              FAR		    - number of false alarms per frame
              falsepositives - number of false positives (FP)
              missed         - number of missed targets (FN)
+
+    The detections of a sequence are kept as arrays sorted by frame, frames
+    are associated by `linear_sum_assignment` on the IoU cost matrix and the
+    trajectory statistics are computed with array ops over all trajectories.
     """
     def __init__(self, result_path, gt_path, min_overlap=0.5, max_truncation = 0,\
                 min_height = 25, max_occlusion = 2, cls="car",\
@@ -453,11 +912,6 @@ class KITTIEvaluation(object):
         self.min_height = min_height  # minimum height of an object for evaluation
         self.n_sample_points = 500
 
-        # this should be enough to hold all groundtruth trajectories
-        # is expanded if necessary and reduced in any case
-        self.gt_trajectories = [[] for x in range(self.n_sequences)]
-        self.ign_trajectories = [[] for x in range(self.n_sequences)]
-
     def loadGroundtruth(self):
         try:
             self._loadData(self.gt_path, cls=self.cls, loading_groundtruth=True)
@@ -482,119 +936,105 @@ class KITTIEvaluation(object):
         """
             Generic loader for ground truth and tracking data.
             Use loadGroundtruth() or loadTracker() to load this data.
-            Loads detections in KITTI format from textfiles.
+            Loads detections in KITTI format from textfiles, the detections
+            of every sequence are a dict of arrays sorted by frame.
         """
-        # construct objectDetections object to hold detection data
-        t_data = tData()
-        data = []
+        # classes that should be loaded (ignored neighboring classes)
+        if "car" in cls.lower():
+            classes = ["car", "van"]
+        elif "pedestrian" in cls.lower():
+            classes = ["pedestrian", "person_sitting"]
+        else:
+            classes = [cls.lower()]
+        classes += ["dontcare"]
+
         eval_2d = True
         eval_3d = True
-
         seq_data = []
         n_trajectories = 0
         n_trajectories_seq = []
         for seq, s_name in enumerate(self.sequence_name):
-            i = 0
             filename = os.path.join(root_dir, "%s.txt" % s_name)
-            f = open(filename, "r")
-
-            f_data = [
-                [] for x in range(self.n_frames[seq])
-            ]  # current set has only 1059 entries, sufficient length is checked anyway
-            ids = []
-            n_in_seq = 0
-            id_frame_cache = []
-            for line in f:
-                # KITTI tracking benchmark data format:
-                # (frame,tracklet_id,objectType,truncation,occlusion,alpha,x1,y1,x2,y2,h,w,l,X,Y,Z,ry)
-                line = line.strip()
-                fields = line.split(" ")
-                # classes that should be loaded (ignored neighboring classes)
-                if "car" in cls.lower():
-                    classes = ["car", "van"]
-                elif "pedestrian" in cls.lower():
-                    classes = ["pedestrian", "person_sitting"]
-                else:
-                    classes = [cls.lower()]
-                classes += ["dontcare"]
-                if not any([s for s in classes if s in fields[2].lower()]):
-                    continue
-                # get fields from table
-                t_data.frame = int(float(fields[0]))  # frame
-                t_data.track_id = int(float(fields[1]))  # id
-                t_data.obj_type = fields[
-                    2].lower()  # object type [car, pedestrian, cyclist, ...]
-                t_data.truncation = int(
-                    float(fields[3]))  # truncation [-1,0,1,2]
-                t_data.occlusion = int(
-                    float(fields[4]))  # occlusion  [-1,0,1,2]
-                t_data.obs_angle = float(fields[5])  # observation angle [rad]
-                t_data.x1 = float(fields[6])  # left   [px]
-                t_data.y1 = float(fields[7])  # top    [px]
-                t_data.x2 = float(fields[8])  # right  [px]
-                t_data.y2 = float(fields[9])  # bottom [px]
-                t_data.h = float(fields[10])  # height [m]
-                t_data.w = float(fields[11])  # width  [m]
-                t_data.l = float(fields[12])  # length [m]
-                t_data.X = float(fields[13])  # X [m]
-                t_data.Y = float(fields[14])  # Y [m]
-                t_data.Z = float(fields[15])  # Z [m]
-                t_data.yaw = float(fields[16])  # yaw angle [rad]
-                if not loading_groundtruth:
-                    if len(fields) == 17:
-                        t_data.score = -1
-                    elif len(fields) == 18:
-                        t_data.score = float(fields[17])  # detection score
-                    else:
-                        logger.info("file is not in KITTI format")
-                        return
-
-                # do not consider objects marked as invalid
-                if t_data.track_id is -1 and t_data.obj_type != "dontcare":
-                    continue
-
-                idx = t_data.frame
-                # check if length for frame data is sufficient
-                if idx >= len(f_data):
-                    print("extend f_data", idx, len(f_data))
-                    f_data += [[] for x in range(max(500, idx - len(f_data)))]
-                try:
-                    id_frame = (t_data.frame, t_data.track_id)
-                    if id_frame in id_frame_cache and not loading_groundtruth:
-                        logger.info(
-                            "track ids are not unique for sequence %d: frame %d"
-                            % (seq, t_data.frame))
-                        logger.info(
-                            "track id %d occurred at least twice for this frame"
-                            % t_data.track_id)
-                        logger.info("Exiting...")
-                        #continue # this allows to evaluate non-unique result files
-                        return False
-                    id_frame_cache.append(id_frame)
-                    f_data[t_data.frame].append(copy.copy(t_data))
-                except:
-                    print(len(f_data), idx)
-                    raise
-
-                if t_data.track_id not in ids and t_data.obj_type != "dontcare":
-                    ids.append(t_data.track_id)
-                    n_trajectories += 1
-                    n_in_seq += 1
-
-                # check if uploaded data provides information for 2D and 3D evaluation
-                if not loading_groundtruth and eval_2d is True and (
-                        t_data.x1 == -1 or t_data.x2 == -1 or t_data.y1 == -1 or
-                        t_data.y2 == -1):
-                    eval_2d = False
-                if not loading_groundtruth and eval_3d is True and (
-                        t_data.X == -1000 or t_data.Y == -1000 or
-                        t_data.Z == -1000):
-                    eval_3d = False
+            with open(filename, "r") as f:
+                rows = [line.strip().split(" ") for line in f]
+            rows = [fields for fields in rows if len(fields) > 2]
+            obj_type = np.array(
+                [fields[2].lower() for fields in rows], dtype=str)
+            types, type_idx = np.unique(obj_type, return_inverse=True)
+            keep = np.array(
+                [any([s for s in classes if s in t]) for t in types],
+                dtype=bool)[type_idx]
+            rows = [fields for fields, k in zip(rows, keep) if k]
+            obj_type = obj_type[keep]
+
+            if not loading_groundtruth and any(
+                    len(fields) not in [17, 18] for fields in rows):
+                logger.info("file is not in KITTI format")
+                return
+            values = np.array(
+                [[fields[i] for i in KITTI_NUMERIC_FIELDS] for fields in rows],
+                dtype=float).reshape(-1, len(KITTI_NUMERIC_FIELDS))
+            data = {
+                'frame': values[:, 0].astype(int),
+                'track_id': values[:, 1].astype(int),
+                'obj_type': obj_type,
+                'truncation': values[:, 2].astype(int),
+                'occlusion': values[:, 3].astype(int),
+                'box': values[:, 5:9],
+            }
+            if not loading_groundtruth:
+                data['score'] = np.array(
+                    [
+                        float(fields[17]) if len(fields) == 18 else -1
+                        for fields in rows
+                    ],
+                    dtype=float)
+
+            # do not consider objects marked as invalid
+            is_valid = (data['track_id'] != -1) | (obj_type == "dontcare")
+            data = _select_rows(data, is_valid)
+            values = values[is_valid]
+
+            # the frames of the sequence are extended if necessary
+            num_frames = self.n_frames[seq]
+            for frame in data['frame'][data['frame'] >= num_frames]:
+                if frame >= num_frames:
+                    print("extend f_data", frame, num_frames)
+                    num_frames += max(500, frame - num_frames)
+                if frame >= num_frames:
+                    raise IndexError(frame)
+            data['num_frames'] = num_frames
+
+            if not loading_groundtruth:
+                id_frame, counts = np.unique(
+                    np.stack([data['frame'], data['track_id']], axis=1),
+                    axis=0,
+                    return_counts=True)
+                if np.any(counts > 1):
+                    frame, track_id = id_frame[np.argmax(counts > 1)]
+                    logger.info(
+                        "track ids are not unique for sequence %d: frame %d" %
+                        (seq, frame))
+                    logger.info(
+                        "track id %d occurred at least twice for this frame" %
+                        track_id)
+                    logger.info("Exiting...")
+                    return False
+
+            n_in_seq = len(
+                np.unique(data['track_id'][data['obj_type'] != "dontcare"]))
+            n_trajectories += n_in_seq
+
+            # check if uploaded data provides information for 2D and 3D evaluation
+            if not loading_groundtruth and np.any(values[:, 5:9] == -1):
+                eval_2d = False
+            if not loading_groundtruth and np.any(values[:, 12:15] == -1000):
+                eval_3d = False
 
             # only add existing frames
             n_trajectories_seq.append(n_in_seq)
-            seq_data.append(f_data)
-            f.close()
+            order = np.argsort(data['frame'], kind='stable')
+            seq_data.append(_select_rows(data, order))
 
         if not loading_groundtruth:
             self.tracker = seq_data
@@ -608,52 +1048,114 @@ class KITTIEvaluation(object):
             # split ground truth and DontCare areas
             self.dcareas = []
             self.groundtruth = []
-            for seq_idx in range(len(seq_data)):
-                seq_gt = seq_data[seq_idx]
-                s_g, s_dc = [], []
-                for f in range(len(seq_gt)):
-                    all_gt = seq_gt[f]
-                    g, dc = [], []
-                    for gg in all_gt:
-                        if gg.obj_type == "dontcare":
-                            dc.append(gg)
-                        else:
-                            g.append(gg)
-                    s_g.append(g)
-                    s_dc.append(dc)
-                self.dcareas.append(s_dc)
-                self.groundtruth.append(s_g)
+            for data in seq_data:
+                is_dc = data['obj_type'] == "dontcare"
+                self.dcareas.append(_select_rows(data, is_dc))
+                self.groundtruth.append(_select_rows(data, ~is_dc))
             self.n_gt_seq = n_trajectories_seq
             self.n_gt_trajectories = n_trajectories
         return True
 
     def boxoverlap(self, a, b, criterion="union"):
         """
-            boxoverlap computes intersection over union for bbox a and b in KITTI format.
+            boxoverlap computes intersection over union for the boxes a and b
+            in KITTI format, [..., 4] arrays broadcasted against each other.
             If the criterion is 'union', overlap = (a inter b) / a union b).
             If the criterion is 'a', overlap = (a inter b) / a, where b should be a dontcare area.
         """
-        x1 = max(a.x1, b.x1)
-        y1 = max(a.y1, b.y1)
-        x2 = min(a.x2, b.x2)
-        y2 = min(a.y2, b.y2)
+        a = np.asarray(a, dtype=float)
+        b = np.asarray(b, dtype=float)
+        x1 = np.maximum(a[..., 0], b[..., 0])
+        y1 = np.maximum(a[..., 1], b[..., 1])
+        x2 = np.minimum(a[..., 2], b[..., 2])
+        y2 = np.minimum(a[..., 3], b[..., 3])
 
         w = x2 - x1
         h = y2 - y1
 
-        if w <= 0. or h <= 0.:
-            return 0.
         inter = w * h
-        aarea = (a.x2 - a.x1) * (a.y2 - a.y1)
-        barea = (b.x2 - b.x1) * (b.y2 - b.y1)
+        aarea = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+        barea = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
         # intersection over union overlap
         if criterion.lower() == "union":
-            o = inter / float(aarea + barea - inter)
+            area = aarea + barea - inter
         elif criterion.lower() == "a":
-            o = float(inter) / float(aarea)
+            area = aarea * np.ones_like(inter)
         else:
             raise TypeError("Unkown type for criterion")
-        return o
+        return np.divide(
+            inter, area, out=np.zeros_like(inter), where=(w > 0.) & (h > 0.))
+
+    def _framePairs(self, a_start, a_end, b_start, b_end):
+        """
+            Indices of all pairs of detections a and b in the same frame,
+            ordered by frame, a and b, and the offsets of the frames.
+        """
+        n_a, n_b = a_end - a_start, b_end - b_start
+        n_pairs = n_a * n_b
+        offsets = np.concatenate([[0], np.cumsum(n_pairs)])
+        frame = np.repeat(np.arange(len(n_pairs)), n_pairs)
+        k = np.arange(offsets[-1]) - offsets[frame]
+        a_idx = a_start[frame] + k // n_b[frame]
+        b_idx = b_start[frame] + k % n_b[frame]
+        return a_idx, b_idx, offsets
+
+    def _trajectoryStatistics(self, gt_ids, assigned, ignored):
+        """
+            Computes MT/PT/ML, id switches and fragmentations of the ground
+            truth trajectories, given the assigned tracker id (-1 if not
+            assigned) and the ignored flag of every gt detection in frame
+            order. Returns the counts of (ignored trajectories, MT, PT, ML,
+            id switches, fragmentations).
+        """
+        if len(gt_ids) == 0:
+            return 0, 0, 0, 0, 0, 0
+        order = np.argsort(gt_ids, kind='stable')
+        gt_ids, g, ign = gt_ids[order], assigned[order], ignored[order]
+        n = len(g)
+        first = np.ones(n, dtype=bool)
+        first[1:] = gt_ids[1:] != gt_ids[:-1]
+        last = np.ones(n, dtype=bool)
+        last[:-1] = first[1:]
+        traj = np.cumsum(first) - 1
+        n_traj = traj[-1] + 1
+        length = np.bincount(traj, minlength=n_traj)
+        n_ign = np.bincount(traj, ign, minlength=n_traj)
+
+        # the last tracker id seen before every detection, which is reset
+        # by ignored detections and kept over unassigned ones
+        last_id = np.where(ign & ~first, -1, g)
+        is_set = first | ign | (g != -1)
+        last_id = last_id[np.maximum.accumulate(
+            np.where(is_set, np.arange(n), 0))]
+        last_id = np.concatenate([[-1], last_id[:-1]])
+        prev_g = np.concatenate([[-1], g[:-1]])
+        next_g = np.concatenate([g[1:], [-1]])
+
+        active = ~first & ~ign
+        id_switch = active & (last_id != g) & (last_id != -1) & (g != -1) & (
+            prev_g != -1)
+        fragment = active & ~last & (prev_g != g) & (last_id != -1) & (
+            g != -1) & (next_g != -1)
+        # the last frame is a fragmentation if it starts a new tracked part
+        fragment |= active & last & (prev_g != g) & (g != -1)
+        # first detection (necessary to be in gt_trajectories) is always tracked
+        tracked = (first & (g >= 0)) | (active & (g != -1))
+
+        # all frames of this gt trajectory are ignored
+        all_ignored = n_ign == length
+        # all frames of this gt trajectory are not assigned to any detections
+        all_lost = ~all_ignored & (np.bincount(
+            traj, g == -1, minlength=n_traj) == length)
+        evaluated = ~all_ignored & ~all_lost
+        tracking_ratio = np.bincount(
+            traj, tracked, minlength=n_traj)[evaluated] / (
+                length - n_ign)[evaluated]
+        return (int(all_ignored.sum()), int((tracking_ratio > 0.8).sum()),
+                int(((tracking_ratio >= 0.2) & (tracking_ratio <= 0.8)).sum()),
+                int(all_lost.sum() + (tracking_ratio < 0.2).sum()),
+                int(id_switch[evaluated[traj]].sum()),
+                int(fragment[evaluated[traj]].sum()))
 
     def compute3rdPartyMetrics(self):
         """
@@ -663,364 +1165,162 @@ class KITTIEvaluation(object):
                 - Nevatia 2008: Global Data Association for Multi-Object Tracking Using Network Flows
                   MT/PT/ML
         """
-        # construct Munkres object for Hungarian Method association
-        hm = Munkres()
-        max_cost = 1e9
+        # detections of the neighboring class are ignored
+        neighbor_cls = {'car': 'van', 'pedestrian': 'person_sitting'}.get(
+            self.cls, '')
 
-        # go through all frames and associate ground truth and tracker results
-        # groundtruth and tracker contain lists for every single frame containing lists of KITTI format detections
-        fr, ids = 0, 0
+        # overlaps of all true positives in association order
+        tp_overlaps = []
+        n_ignored_tr_total = 0
         for seq_idx in range(len(self.groundtruth)):
             seq_gt = self.groundtruth[seq_idx]
             seq_dc = self.dcareas[seq_idx]  # don't care areas
-            seq_tracker = self.tracker[seq_idx]
-            seq_trajectories = defaultdict(list)
-            seq_ignored = defaultdict(list)
-
-            # statistics over the current sequence, check the corresponding
-            # variable comments in __init__ to get their meaning
-            seqtp = 0
-            seqitp = 0
-            seqfn = 0
-            seqifn = 0
-            seqfp = 0
-            seqigt = 0
-            seqitr = 0
-
-            last_ids = [[], []]
-            n_gts = 0
-            n_trs = 0
-
-            for f in range(len(seq_gt)):
-                g = seq_gt[f]
-                dc = seq_dc[f]
-
-                t = seq_tracker[f]
-                # counting total number of ground truth and tracker objects
-                self.n_gt += len(g)
-                self.n_tr += len(t)
-
-                n_gts += len(g)
-                n_trs += len(t)
-
-                # use hungarian method to associate, using boxoverlap 0..1 as cost
-                # build cost matrix
-                cost_matrix = []
-                this_ids = [[], []]
-                for gg in g:
-                    # save current ids
-                    this_ids[0].append(gg.track_id)
-                    this_ids[1].append(-1)
-                    gg.tracker = -1
-                    gg.id_switch = 0
-                    gg.fragmentation = 0
-                    cost_row = []
-                    for tt in t:
-                        # overlap == 1 is cost ==0
-                        c = 1 - self.boxoverlap(gg, tt)
-                        # gating for boxoverlap
-                        if c <= self.min_overlap:
-                            cost_row.append(c)
-                        else:
-                            cost_row.append(max_cost)  # = 1e9
-                    cost_matrix.append(cost_row)
-                    # all ground truth trajectories are initially not associated
-                    # extend groundtruth trajectories lists (merge lists)
-                    seq_trajectories[gg.track_id].append(-1)
-                    seq_ignored[gg.track_id].append(False)
-
-                if len(g) is 0:
-                    cost_matrix = [[]]
-                # associate
-                association_matrix = hm.compute(cost_matrix)
-
-                # tmp variables for sanity checks and MODP computation
-                tmptp = 0
-                tmpfp = 0
-                tmpfn = 0
-                tmpc = 0  # this will sum up the overlaps for all true positives
-                tmpcs = [0] * len(
-                    g)  # this will save the overlaps for all true positives
-                # the reason is that some true positives might be ignored
-                # later such that the corrsponding overlaps can
-                # be subtracted from tmpc for MODP computation
-
-                # mapping for tracker ids and ground truth ids
-                for row, col in association_matrix:
-                    # apply gating on boxoverlap
-                    c = cost_matrix[row][col]
-                    if c < max_cost:
-                        g[row].tracker = t[col].track_id
-                        this_ids[1][row] = t[col].track_id
-                        t[col].valid = True
-                        g[row].distance = c
-                        self.total_cost += 1 - c
-                        tmpc += 1 - c
-                        tmpcs[row] = 1 - c
-                        seq_trajectories[g[row].track_id][-1] = t[col].track_id
-
-                        # true positives are only valid associations
-                        self.tp += 1
-                        tmptp += 1
-                    else:
-                        g[row].tracker = -1
-                        self.fn += 1
-                        tmpfn += 1
-
-                # associate tracker and DontCare areas
-                # ignore tracker in neighboring classes
-                nignoredtracker = 0  # number of ignored tracker detections
-                ignoredtrackers = dict()  # will associate the track_id with -1
-                # if it is not ignored and 1 if it is
-                # ignored;
-                # this is used to avoid double counting ignored
-                # cases, see the next loop
-
-                for tt in t:
-                    ignoredtrackers[tt.track_id] = -1
-                    # ignore detection if it belongs to a neighboring class or is
-                    # smaller or equal to the minimum height
-
-                    tt_height = abs(tt.y1 - tt.y2)
-                    if ((self.cls == "car" and tt.obj_type == "van") or
-                        (self.cls == "pedestrian" and
-                         tt.obj_type == "person_sitting") or
-                            tt_height <= self.min_height) and not tt.valid:
-                        nignoredtracker += 1
-                        tt.ignored = True
-                        ignoredtrackers[tt.track_id] = 1
-                        continue
-                    for d in dc:
-                        overlap = self.boxoverlap(tt, d, "a")
-                        if overlap > 0.5 and not tt.valid:
-                            tt.ignored = True
-                            nignoredtracker += 1
-                            ignoredtrackers[tt.track_id] = 1
-                            break
-
-                # check for ignored FN/TP (truncation or neighboring object class)
-                ignoredfn = 0  # the number of ignored false negatives
-                nignoredtp = 0  # the number of ignored true positives
-                nignoredpairs = 0  # the number of ignored pairs, i.e. a true positive
-                # which is ignored but where the associated tracker
-                # detection has already been ignored
-
-                gi = 0
-                for gg in g:
-                    if gg.tracker < 0:
-                        if gg.occlusion>self.max_occlusion or gg.truncation>self.max_truncation\
-                                or (self.cls=="car" and gg.obj_type=="van") or (self.cls=="pedestrian" and gg.obj_type=="person_sitting"):
-                            seq_ignored[gg.track_id][-1] = True
-                            gg.ignored = True
-                            ignoredfn += 1
-
-                    elif gg.tracker >= 0:
-                        if gg.occlusion>self.max_occlusion or gg.truncation>self.max_truncation\
-                                or (self.cls=="car" and gg.obj_type=="van") or (self.cls=="pedestrian" and gg.obj_type=="person_sitting"):
-
-                            seq_ignored[gg.track_id][-1] = True
-                            gg.ignored = True
-                            nignoredtp += 1
-
-                            # if the associated tracker detection is already ignored,
-                            # we want to avoid double counting ignored detections
-                            if ignoredtrackers[gg.tracker] > 0:
-                                nignoredpairs += 1
-
-                            # for computing MODP, the overlaps from ignored detections
-                            # are subtracted
-                            tmpc -= tmpcs[gi]
-                    gi += 1
-
-                # the below might be confusion, check the comments in __init__
-                # to see what the individual statistics represent
-
-                # correct TP by number of ignored TP due to truncation
-                # ignored TP are shown as tracked in visualization
-                tmptp -= nignoredtp
-
-                # count the number of ignored true positives
-                self.itp += nignoredtp
-
-                # adjust the number of ground truth objects considered
-                self.n_gt -= (ignoredfn + nignoredtp)
-
-                # count the number of ignored ground truth objects
-                self.n_igt += ignoredfn + nignoredtp
-
-                # count the number of ignored tracker objects
-                self.n_itr += nignoredtracker
-
-                # count the number of ignored pairs, i.e. associated tracker and
-                # ground truth objects that are both ignored
-                self.n_igttr += nignoredpairs
-
-                # false negatives = associated gt bboxes exceding association threshold + non-associated gt bboxes
-                tmpfn += len(g) - len(association_matrix) - ignoredfn
-                self.fn += len(g) - len(association_matrix) - ignoredfn
-                self.ifn += ignoredfn
-
-                # false positives = tracker bboxes - associated tracker bboxes
-                # mismatches (mme_t)
-                tmpfp += len(
-                    t) - tmptp - nignoredtracker - nignoredtp + nignoredpairs
-                self.fp += len(
-                    t) - tmptp - nignoredtracker - nignoredtp + nignoredpairs
-
-                # update sequence data
-                seqtp += tmptp
-                seqitp += nignoredtp
-                seqfp += tmpfp
-                seqfn += tmpfn
-                seqifn += ignoredfn
-                seqigt += ignoredfn + nignoredtp
-                seqitr += nignoredtracker
-
-                # sanity checks
-                # - the number of true positives minues ignored true positives
-                #   should be greater or equal to 0
-                # - the number of false negatives should be greater or equal to 0
-                # - the number of false positives needs to be greater or equal to 0
-                #   otherwise ignored detections might be counted double
-                # - the number of counted true positives (plus ignored ones)
-                #   and the number of counted false negatives (plus ignored ones)
-                #   should match the total number of ground truth objects
-                # - the number of counted true positives (plus ignored ones)
-                #   and the number of counted false positives
-                #   plus the number of ignored tracker detections should
-                #   match the total number of tracker detections; note that
-                #   nignoredpairs is subtracted here to avoid double counting
-                #   of ignored detection sin nignoredtp and nignoredtracker
-                if tmptp < 0:
-                    print(tmptp, nignoredtp)
-                    raise NameError("Something went wrong! TP is negative")
-                if tmpfn < 0:
-                    print(tmpfn,
-                          len(g),
-                          len(association_matrix), ignoredfn, nignoredpairs)
-                    raise NameError("Something went wrong! FN is negative")
-                if tmpfp < 0:
-                    print(tmpfp,
-                          len(t), tmptp, nignoredtracker, nignoredtp,
-                          nignoredpairs)
-                    raise NameError("Something went wrong! FP is negative")
-                if tmptp + tmpfn is not len(g) - ignoredfn - nignoredtp:
-                    print("seqidx", seq_idx)
-                    print("frame ", f)
-                    print("TP    ", tmptp)
-                    print("FN    ", tmpfn)
-                    print("FP    ", tmpfp)
-                    print("nGT   ", len(g))
-                    print("nAss  ", len(association_matrix))
-                    print("ign GT", ignoredfn)
-                    print("ign TP", nignoredtp)
-                    raise NameError(
-                        "Something went wrong! nGroundtruth is not TP+FN")
-                if tmptp + tmpfp + nignoredtp + nignoredtracker - nignoredpairs is not len(
-                        t):
-                    print(seq_idx, f, len(t), tmptp, tmpfp)
-                    print(len(association_matrix), association_matrix)
-                    raise NameError(
-                        "Something went wrong! nTracker is not TP+FP")
-
-                # check for id switches or fragmentations
-                for i, tt in enumerate(this_ids[0]):
-                    if tt in last_ids[0]:
-                        idx = last_ids[0].index(tt)
-                        tid = this_ids[1][i]
-                        lid = last_ids[1][idx]
-                        if tid != lid and lid != -1 and tid != -1:
-                            if g[i].truncation < self.max_truncation:
-                                g[i].id_switch = 1
-                                ids += 1
-                        if tid != lid and lid != -1:
-                            if g[i].truncation < self.max_truncation:
-                                g[i].fragmentation = 1
-                                fr += 1
-
-                # save current index
-                last_ids = this_ids
-                # compute MOTP_t
-                MODP_t = 1
+            num_frames = seq_gt['num_frames']
+            seq_tracker = _select_rows(self.tracker[seq_idx],
+                                       self.tracker[seq_idx]['frame'] <
+                                       num_frames)
+            frame_ids = np.arange(num_frames)
+            gt_start, gt_end = _frame_bounds(seq_gt['frame'], frame_ids)
+            tr_start, tr_end = _frame_bounds(seq_tracker['frame'], frame_ids)
+            dc_start, dc_end = _frame_bounds(seq_dc['frame'], frame_ids)
+            n_g, n_t = len(seq_gt['frame']), len(seq_tracker['frame'])
+
+            # the associated tracker detection of every gt detection
+            assigned_col = np.full(n_g, -1)
+            overlap = np.zeros(n_g)
+            valid = np.zeros(n_t, dtype=bool)
+            gt_ignored = (seq_gt['occlusion'] > self.max_occlusion) | (
+                seq_gt['truncation'] > self.max_truncation) | (
+                    seq_gt['obj_type'] == neighbor_cls)
+
+            # the tracker detections of a neighboring class or smaller or
+            # equal to the minimum height are ignored if not associated
+            tracker_ignored = (seq_tracker['obj_type'] == neighbor_cls) | (
+                np.abs(seq_tracker['box'][:, 1] - seq_tracker['box'][:, 3]) <=
+                self.min_height)
+
+            # use hungarian method to associate, using boxoverlap 0..1 as cost,
+            # the costs of all pairs in the same frame are computed at once
+            g_idx, t_idx, offsets = self._framePairs(gt_start, gt_end,
+                                                     tr_start, tr_end)
+            costs = 1 - self.boxoverlap(seq_gt['box'][g_idx],
+                                        seq_tracker['box'][t_idx])
+            # gating for boxoverlap
+            costs[costs > self.min_overlap] = np.nan
+            # frames without any pair within the gating are not associated
+            has_valid = np.bincount(
+                seq_gt['frame'][g_idx][costs <= self.min_overlap],
+                minlength=num_frames) > 0
+
+            MODP_t = np.ones(num_frames)
+            for f in np.flatnonzero(has_valid):
+                cost_matrix = costs[offsets[f]:offsets[f + 1]].reshape(
+                    gt_end[f] - gt_start[f], -1)
+                r, c = linear_sum_assignment(cost_matrix)
+                rows, cols = gt_start[f] + r, tr_start[f] + c
+                assigned_col[rows] = cols
+                overlap[rows] = 1 - cost_matrix[r, c]
+                valid[cols] = True
+                tp_overlaps.append(overlap[rows])
+
+                # for computing MODP, the overlaps from ignored detections
+                # are subtracted
+                ignored_tp = gt_ignored[rows] & (
+                    seq_tracker['track_id'][cols] >= 0)
+                tmptp = len(rows) - ignored_tp.sum()
                 if tmptp != 0:
-                    MODP_t = tmpc / float(tmptp)
-                self.MODP_t.append(MODP_t)
-
-            # remove empty lists for current gt trajectories
-            self.gt_trajectories[seq_idx] = seq_trajectories
-            self.ign_trajectories[seq_idx] = seq_ignored
-
-            # gather statistics for "per sequence" statistics.
-            self.n_gts.append(n_gts)
-            self.n_trs.append(n_trs)
-            self.tps.append(seqtp)
+                    tmpc = np.cumsum(
+                        np.concatenate(
+                            [overlap[rows], -overlap[rows][ignored_tp]]))[-1]
+                    MODP_t[f] = tmpc / float(tmptp)
+            self.MODP_t.extend(MODP_t.tolist())
+
+            # associate tracker and DontCare areas
+            t_idx, dc_idx, _ = self._framePairs(tr_start, tr_end, dc_start,
+                                                dc_end)
+            dc_overlap = self.boxoverlap(seq_tracker['box'][t_idx],
+                                         seq_dc['box'][dc_idx], "a")
+            tracker_ignored[t_idx[dc_overlap > 0.5]] = True
+            tracker_ignored &= ~valid
+
+            # check for ignored FN/TP (truncation or neighboring object class)
+            assigned = np.full(n_g, -1)
+            is_tp = assigned_col >= 0
+            assigned[is_tp] = seq_tracker['track_id'][assigned_col[is_tp]]
+            ignoredfn = gt_ignored & (assigned < 0)
+            nignoredtp = gt_ignored & (assigned >= 0)
+            # if the associated tracker detection is already ignored,
+            # we want to avoid double counting ignored detections
+            nignoredpairs = nignoredtp.copy()
+            nignoredpairs[nignoredtp] = tracker_ignored[assigned_col[
+                nignoredtp]]
+
+            # the below might be confusion, check the comments in __init__
+            # to see what the individual statistics represent
+            seqtp = int(is_tp.sum())
+            seqitp = int(nignoredtp.sum())
+            seqifn = int(ignoredfn.sum())
+            seqitr = int(tracker_ignored.sum())
+            seqigttr = int(nignoredpairs.sum())
+            # false negatives = non-associated gt bboxes
+            seqfn = n_g - seqtp - seqifn
+            # false positives = tracker bboxes - associated tracker bboxes
+            seqfp = n_t - seqtp - seqitr + seqigttr
+
+            self.n_gt += n_g - seqifn - seqitp
+            self.n_tr += n_t
+            self.tp += seqtp
+            self.itp += seqitp
+            self.n_igt += seqifn + seqitp
+            self.n_itr += seqitr
+            self.n_igttr += seqigttr
+            self.fn += seqfn
+            self.ifn += seqifn
+            self.fp += seqfp
+
+            # update sequence data
+            self.n_gts.append(n_g)
+            self.n_trs.append(n_t)
+            self.tps.append(seqtp - seqitp)
             self.itps.append(seqitp)
             self.fps.append(seqfp)
             self.fns.append(seqfn)
             self.ifns.append(seqifn)
-            self.n_igts.append(seqigt)
+            self.n_igts.append(seqifn + seqitp)
             self.n_itrs.append(seqitr)
 
-        # compute MT/PT/ML, fragments, idswitches for all groundtruth trajectories
-        n_ignored_tr_total = 0
-        for seq_idx, (
-                seq_trajectories, seq_ignored
-        ) in enumerate(zip(self.gt_trajectories, self.ign_trajectories)):
-            if len(seq_trajectories) == 0:
-                continue
-            tmpMT, tmpML, tmpPT, tmpId_switches, tmpFragments = [0] * 5
-            n_ignored_tr = 0
-            for g, ign_g in zip(seq_trajectories.values(),
-                                seq_ignored.values()):
-                # all frames of this gt trajectory are ignored
-                if all(ign_g):
-                    n_ignored_tr += 1
-                    n_ignored_tr_total += 1
-                    continue
-                # all frames of this gt trajectory are not assigned to any detections
-                if all([this == -1 for this in g]):
-                    tmpML += 1
-                    self.ML += 1
-                    continue
-                # compute tracked frames in trajectory
-                last_id = g[0]
-                # first detection (necessary to be in gt_trajectories) is always tracked
-                tracked = 1 if g[0] >= 0 else 0
-                lgt = 0 if ign_g[0] else 1
-                for f in range(1, len(g)):
-                    if ign_g[f]:
-                        last_id = -1
-                        continue
-                    lgt += 1
-                    if last_id != g[f] and last_id != -1 and g[f] != -1 and g[
-                            f - 1] != -1:
-                        tmpId_switches += 1
-                        self.id_switches += 1
-                    if f < len(g) - 1 and g[f - 1] != g[
-                            f] and last_id != -1 and g[f] != -1 and g[f +
-                                                                      1] != -1:
-                        tmpFragments += 1
-                        self.fragments += 1
-                    if g[f] != -1:
-                        tracked += 1
-                        last_id = g[f]
-                # handle last frame; tracked state is handled in for loop (g[f]!=-1)
-                if len(g) > 1 and g[f - 1] != g[f] and last_id != -1 and g[
-                        f] != -1 and not ign_g[f]:
-                    tmpFragments += 1
-                    self.fragments += 1
-
-                # compute MT/PT/ML
-                tracking_ratio = tracked / float(len(g) - sum(ign_g))
-                if tracking_ratio > 0.8:
-                    tmpMT += 1
-                    self.MT += 1
-                elif tracking_ratio < 0.2:
-                    tmpML += 1
-                    self.ML += 1
-                else:  # 0.2 <= tracking_ratio <= 0.8
-                    tmpPT += 1
-                    self.PT += 1
+            # compute MT/PT/ML, fragments, idswitches for all groundtruth trajectories,
+            # a gt trajectory has a detection of every frame it appears in,
+            # duplicated ids in a frame are associated to the last one
+            frame_id = np.stack([seq_gt['frame'], seq_gt['track_id']], axis=1)
+            if n_g > 0:
+                _, key = np.unique(frame_id, axis=0, return_inverse=True)
+                key = key.reshape(-1)
+                entry = np.zeros(key.max() + 1, dtype=int)
+                np.maximum.at(entry, key, np.arange(n_g))
+                writer = np.full(len(entry), -1)
+                np.maximum.at(writer, key[is_tp], np.flatnonzero(is_tp))
+                trajectory = np.full(n_g, -1)
+                trajectory[entry[writer >= 0]] = assigned[writer[writer >= 0]]
+                trajectory_ignored = np.zeros(n_g, dtype=bool)
+                trajectory_ignored[entry[key[gt_ignored]]] = True
+            else:
+                trajectory = np.zeros(0, dtype=int)
+                trajectory_ignored = np.zeros(0, dtype=bool)
+            n_ignored_tr, MT, PT, ML, id_switches, fragments = \
+                self._trajectoryStatistics(seq_gt['track_id'], trajectory,
+                                           trajectory_ignored)
+            n_ignored_tr_total += n_ignored_tr
+            self.MT += MT
+            self.PT += PT
+            self.ML += ML
+            self.id_switches += id_switches
+            self.fragments += fragments
+
+        # summed one by one in association order
+        tp_overlaps = np.concatenate([np.zeros(0)] + tp_overlaps)
+        if len(tp_overlaps) > 0:
+            self.total_cost = float(np.cumsum(tp_overlaps)[-1])
 
         if (self.n_gt_trajectories - n_ignored_tr_total) == 0:
             self.MT = 0.
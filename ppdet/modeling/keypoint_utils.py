@@ -280,6 +280,80 @@ def oks_nms(kpts_db, thresh, sigmas=None, in_vis_thre=None):
     return keep
 
 
+def oks_iou_batch(kpts, areas, sigmas=None):
+    """OKS between all pairs of persons of every image, same as `oks_iou`
+    without in_vis_thre
+
+    Args:
+        kpts (np.ndarray): [B, P, K * 3] keypoints of P persons of B images
+        areas (np.ndarray): [B, P] areas of the persons
+        sigmas (np.array): The variance to calculate the oks iou
+            Default: None
+
+    Return:
+        ious (np.ndarray): [B, P, P] oks ious
+    """
+    if not isinstance(sigmas, np.ndarray):
+        sigmas = np.array([
+            .26, .25, .25, .35, .35, .79, .79, .72, .72, .62, .62, 1.07, 1.07,
+            .87, .87, .89, .89
+        ]) / 10.0
+    vars = (sigmas * 2)**2
+    x = kpts[..., 0::3]
+    y = kpts[..., 1::3]
+    dx = x[:, :, None, :] - x[:, None, :, :]
+    dy = y[:, :, None, :] - y[:, None, :, :]
+    a = (areas[:, :, None] + areas[:, None, :]) / 2 + np.spacing(1)
+    # e = (dx**2 + dy**2) / vars / a / 2 in place
+    dx *= dx
+    dy *= dy
+    dx += dy
+    e = dx / vars
+    e /= a[..., None]
+    e /= 2
+    np.negative(e, out=e)
+    np.exp(e, out=e)
+    return np.sum(e, axis=-1) / e.shape[-1]
+
+
+def oks_nms_batch(kpts, scores, areas, num_persons, thresh, sigmas=None):
+    """greedy oks nms of the persons of several images at once, same as
+    `oks_nms` on every image
+
+    Args:
+        kpts (np.ndarray): [B, P, K * 3] keypoints of the images, padded to
+            P persons
+        scores (np.ndarray): [B, P] scores of the persons
+        areas (np.ndarray): [B, P] areas of the persons
+        num_persons (np.ndarray): [B] number of persons of every image
+        thresh (float): The threshold to select the boxes
+        sigmas (np.array): The variance to calculate the oks iou
+            Default: None
+
+    Return:
+        keep (np.ndarray): [B, P] indexes to keep of every image by score,
+            the suppressed persons and the padding are -1
+    """
+    batch_size, max_persons = scores.shape
+    is_valid = np.arange(max_persons)[None] < np.asarray(num_persons)[:, None]
+    scores = np.where(is_valid, scores, -np.inf)
+    # same order as argsort()[::-1] of the scores of every image
+    order = np.argsort(scores, axis=1, kind='stable')[:, ::-1]
+    is_valid = np.take_along_axis(is_valid, order, axis=1)
+    ious = oks_iou_batch(kpts, areas, sigmas)
+    ious = np.take_along_axis(ious, order[:, :, None], axis=1)
+    ious = np.take_along_axis(ious, order[:, None, :], axis=2)
+
+    suppressed = ~is_valid
+    keep = np.full((batch_size, max_persons), -1, dtype=order.dtype)
+    for i in range(max_persons):
+        is_keep = ~suppressed[:, i]
+        keep[is_keep, i] = order[is_keep, i]
+        # rule out overlap > thresh of the remaining persons
+        suppressed[is_keep, i + 1:] |= ~(ious[is_keep, i, i + 1:] <= thresh)
+    return keep
+
+
 def rescore(overlap, scores, thresh, type='gaussian'):
     assert overlap.shape[0] == scores.shape[0]
     if type == 'linear':
@@ -33,10 +33,13 @@ warnings.filterwarnings("ignore")
 __all__ = [
     'merge_matches',
     'linear_assignment',
+    'box_overlaps',
     'bbox_ious',
+    'tracks_tlbr',
     'iou_distance',
     'embedding_distance',
     'fuse_motion',
+    'fuse_gating',
 ]
 
 
@@ -70,42 +73,84 @@ def linear_assignment(cost_matrix, thresh):
         return np.empty(
             (0, 2), dtype=int), tuple(range(cost_matrix.shape[0])), tuple(
                 range(cost_matrix.shape[1]))
-    matches, unmatched_a, unmatched_b = [], [], []
     cost, x, y = lap.lapjv(cost_matrix, extend_cost=True, cost_limit=thresh)
-    for ix, mx in enumerate(x):
-        if mx >= 0:
-            matches.append([ix, mx])
+    matched = np.flatnonzero(x >= 0)
+    matches = np.stack([matched, x[matched]], axis=1)
     unmatched_a = np.where(x < 0)[0]
     unmatched_b = np.where(y < 0)[0]
-    matches = np.asarray(matches)
     return matches, unmatched_a, unmatched_b
 
 
-def bbox_ious(atlbrs, btlbrs):
-    boxes = np.ascontiguousarray(atlbrs, dtype=np.float32)
-    query_boxes = np.ascontiguousarray(btlbrs, dtype=np.float32)
-    N = boxes.shape[0]
-    K = query_boxes.shape[0]
-    ious = np.zeros((N, K), dtype=boxes.dtype)
-    if N * K == 0:
+def box_overlaps(atlbrs, btlbrs, offset=0., dtype=None):
+    """
+    IoU of every pair of boxes by broadcasting, shared by the
+    association of the JDE, ByteTrack, BoT-SORT and OC-SORT trackers.
+    Pairs without intersection have an IoU of 0.
+
+    Args:
+        atlbrs (np.ndarray): boxes of (x1, y1, x2, y2), shape [N, 4].
+        btlbrs (np.ndarray): boxes of (x1, y1, x2, y2), shape [K, 4].
+        offset (float): added to widths and heights, 1 for the pixel
+            convention of JDE.
+        dtype (np.dtype): dtype of the arithmetic after the differences of
+            coordinates, the dtype of the boxes by default.
+
+    Returns:
+        np.ndarray: overlaps of shape [N, K], of the dtype of the boxes.
+    """
+    boxes = np.asarray(atlbrs)
+    query_boxes = np.asarray(btlbrs)
+    ious = np.zeros(
+        (len(boxes), len(query_boxes)),
+        dtype=np.result_type(boxes, query_boxes, np.float32))
+    if ious.size == 0:
         return ious
-
-    for k in range(K):
-        box_area = ((query_boxes[k, 2] - query_boxes[k, 0] + 1) *
-                    (query_boxes[k, 3] - query_boxes[k, 1] + 1))
-        for n in range(N):
-            iw = (min(boxes[n, 2], query_boxes[k, 2]) - max(
-                boxes[n, 0], query_boxes[k, 0]) + 1)
-            if iw > 0:
-                ih = (min(boxes[n, 3], query_boxes[k, 3]) - max(
-                    boxes[n, 1], query_boxes[k, 1]) + 1)
-                if ih > 0:
-                    ua = float((boxes[n, 2] - boxes[n, 0] + 1) * (boxes[
-                        n, 3] - boxes[n, 1] + 1) + box_area - iw * ih)
-                    ious[n, k] = iw * ih / ua
+    boxes = boxes[:, None, :]
+    query_boxes = query_boxes[None, :, :]
+
+    def extent(end, start):
+        diff = end - start
+        return (diff if dtype is None else diff.astype(dtype)) + offset
+
+    iw = extent(
+        np.minimum(boxes[..., 2], query_boxes[..., 2]),
+        np.maximum(boxes[..., 0], query_boxes[..., 0]))
+    ih = extent(
+        np.minimum(boxes[..., 3], query_boxes[..., 3]),
+        np.maximum(boxes[..., 1], query_boxes[..., 1]))
+    overlap = (iw > 0) & (ih > 0)
+    inter = np.where(overlap, iw * ih, 0)
+    areas = extent(boxes[..., 2], boxes[..., 0]) * extent(boxes[..., 3],
+                                                         boxes[..., 1])
+    query_areas = extent(query_boxes[..., 2], query_boxes[..., 0]) * extent(
+        query_boxes[..., 3], query_boxes[..., 1])
+    union = areas + query_areas - inter
+    overlaps = np.divide(
+        inter, union, out=np.zeros_like(union), where=overlap)
+    ious[...] = overlaps
     return ious
 
 
+def bbox_ious(atlbrs, btlbrs):
+    boxes = np.ascontiguousarray(atlbrs, dtype=np.float32).reshape(-1, 4)
+    query_boxes = np.ascontiguousarray(btlbrs, dtype=np.float32).reshape(-1, 4)
+    # float64 as the scalar arithmetic of the original loops
+    return box_overlaps(boxes, query_boxes, offset=1, dtype=np.float64)
+
+
+def tracks_tlbr(tracks):
+    """
+    Gather the (x1, y1, x2, y2) boxes of a list[STrack] into an array of
+    shape [N, 4], by `multi_tlbr` of the track class if it has one.
+    """
+    if len(tracks) > 0 and isinstance(tracks[0], np.ndarray):
+        return np.ascontiguousarray(tracks, dtype=np.float32)
+    if len(tracks) > 0 and hasattr(tracks[0], 'multi_tlbr'):
+        return tracks[0].multi_tlbr(tracks)
+    return np.asarray(
+        [track.tlbr for track in tracks], dtype=np.float32).reshape(-1, 4)
+
+
 def iou_distance(atracks, btracks):
     """
     Compute cost based on IoU between two list[STrack].
@@ -115,8 +160,8 @@ def iou_distance(atracks, btracks):
         atlbrs = atracks
         btlbrs = btracks
     else:
-        atlbrs = [track.tlbr for track in atracks]
-        btlbrs = [track.tlbr for track in btracks]
+        atlbrs = tracks_tlbr(atracks)
+        btlbrs = tracks_tlbr(btracks)
     _ious = bbox_ious(atlbrs, btlbrs)
     cost_matrix = 1 - _ious
 
@@ -125,15 +170,22 @@ def iou_distance(atracks, btracks):
 
 def embedding_distance(tracks, detections, metric='euclidean'):
     """
-    Compute cost based on features between two list[STrack].
+    Compute cost based on features between two list[STrack], or the
+    features of shape [N, D] and [K, D].
     """
     cost_matrix = np.zeros((len(tracks), len(detections)), dtype=np.float32)
     if cost_matrix.size == 0:
         return cost_matrix
-    det_features = np.asarray(
-        [track.curr_feat for track in detections], dtype=np.float32)
-    track_features = np.asarray(
-        [track.smooth_feat for track in tracks], dtype=np.float32)
+    if isinstance(detections, np.ndarray):
+        det_features = np.asarray(detections, dtype=np.float32)
+    else:
+        det_features = np.asarray(
+            [track.curr_feat for track in detections], dtype=np.float32)
+    if isinstance(tracks, np.ndarray):
+        track_features = np.asarray(tracks, dtype=np.float32)
+    else:
+        track_features = np.asarray(
+            [track.smooth_feat for track in tracks], dtype=np.float32)
     cost_matrix = np.maximum(0.0, cdist(track_features, det_features,
                                         metric))  # Nomalized features
     return cost_matrix
@@ -145,19 +197,28 @@ def fuse_motion(kf,
                 detections,
                 only_position=False,
                 lambda_=0.98):
+    if cost_matrix.size == 0:
+        return cost_matrix
+    measurements = np.asarray([det.to_xyah() for det in detections])
+    gating_distance = kf.multi_gating_distance(
+        np.asarray([track.mean for track in tracks]),
+        np.asarray([track.covariance for track in tracks]),
+        measurements,
+        only_position,
+        metric='maha')
+    return fuse_gating(cost_matrix, gating_distance, only_position, lambda_)
+
+
+def fuse_gating(cost_matrix, gating_distance, only_position=False,
+                lambda_=0.98):
+    """
+    Gate and blend a cost matrix in place with the squared Mahalanobis
+    distances of shape [N, K] between the tracks and the measurements.
+    """
     if cost_matrix.size == 0:
         return cost_matrix
     gating_dim = 2 if only_position else 4
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
-    measurements = np.asarray([det.to_xyah() for det in detections])
-    for row, track in enumerate(tracks):
-        gating_distance = kf.gating_distance(
-            track.mean,
-            track.covariance,
-            measurements,
-            only_position,
-            metric='maha')
-        cost_matrix[row, gating_distance > gating_threshold] = np.inf
-        cost_matrix[row] = lambda_ * cost_matrix[row] + (1 - lambda_
-                                                         ) * gating_distance
+    cost_matrix[gating_distance > gating_threshold] = np.inf
+    cost_matrix[...] = lambda_ * cost_matrix + (1 - lambda_) * gating_distance
     return cost_matrix
@@ -17,24 +17,11 @@ This code is based on https://github.com/noahcao/OC_SORT/blob/master/trackers/oc
 
 import os
 import numpy as np
+from .jde_matching import box_overlaps
 
 
 def iou_batch(bboxes1, bboxes2):
-    bboxes2 = np.expand_dims(bboxes2, 0)
-    bboxes1 = np.expand_dims(bboxes1, 1)
-
-    xx1 = np.maximum(bboxes1[..., 0], bboxes2[..., 0])
-    yy1 = np.maximum(bboxes1[..., 1], bboxes2[..., 1])
-    xx2 = np.minimum(bboxes1[..., 2], bboxes2[..., 2])
-    yy2 = np.minimum(bboxes1[..., 3], bboxes2[..., 3])
-    w = np.maximum(0., xx2 - xx1)
-    h = np.maximum(0., yy2 - yy1)
-    area = w * h
-    iou_matrix = area / ((bboxes1[..., 2] - bboxes1[..., 0]) *
-                         (bboxes1[..., 3] - bboxes1[..., 1]) +
-                         (bboxes2[..., 2] - bboxes2[..., 0]) *
-                         (bboxes2[..., 3] - bboxes2[..., 1]) - area)
-    return iou_matrix
+    return box_overlaps(bboxes1, bboxes2)
 
 
 def speed_direction_batch(dets, tracks):
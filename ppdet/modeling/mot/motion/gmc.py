@@ -19,18 +19,55 @@ import cv2
 import matplotlib.pyplot as plt
 import numpy as np
 import copy
-import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from ppdet.core.workspace import register, serializable
+from ppdet.utils.logger import setup_logger
+logger = setup_logger(__name__)
 
 
 @register
 @serializable
 class GMC:
-    def __init__(self, method='sparseOptFlow', downscale=2, verbose=None):
+    """
+    Global motion compensation, estimate the camera motion between frames.
+
+    The motion can be estimated synchronously by `apply`, or in a background
+    worker one frame ahead: `submit` a frame as soon as it is read, so its
+    motion is estimated while the detector runs, and get the homography by
+    `result` in the tracker. Frames should be submitted in order.
+
+    Args:
+        method (str): 'sparseOptFlow', 'orb', 'sift', 'ecc', 'file' or 'none'.
+        downscale (int): downscale of the frames, larger is faster and less
+            accurate.
+        verbose (list): sequence name and ablation flag of the 'file' method.
+        max_corners (int): max keypoints of sparseOptFlow.
+        min_keypoints (int): sparseOptFlow reuses the keypoints tracked into
+            the previous frame while at least `min_keypoints` of them are
+            left, instead of detecting keypoints in every frame. 0 to detect
+            keypoints in every frame.
+        mask_detections (bool): whether to exclude the keypoints in the
+            detected boxes of sparseOptFlow, the boxes of the previous frame
+            mask its keypoints.
+        timeout (float): max seconds `result` waits for a submitted frame,
+            the motion is identity if late. None to always wait.
+    """
+
+    def __init__(self,
+                 method='sparseOptFlow',
+                 downscale=2,
+                 verbose=None,
+                 max_corners=1000,
+                 min_keypoints=0,
+                 mask_detections=False,
+                 timeout=None):
         super(GMC, self).__init__()
 
         self.method = method
         self.downscale = max(1, int(downscale))
+        self.min_keypoints = min_keypoints
+        self.mask_detections = mask_detections
+        self.timeout = timeout
 
         if self.method == 'orb':
             self.detector = cv2.FastFeatureDetector_create(20)
@@ -53,7 +90,7 @@ class GMC:
 
         elif self.method == 'sparseOptFlow':
             self.feature_params = dict(
-                maxCorners=1000,
+                maxCorners=max_corners,
                 qualityLevel=0.01,
                 minDistance=1,
                 blockSize=3,
@@ -89,8 +126,63 @@ class GMC:
         self.prevFrame = None
         self.prevKeyPoints = None
         self.prevDescriptors = None
+        self.prevDetections = None
 
         self.initializedFirstFrame = False
+        self._executor = None
+
+    def submit(self, raw_frame):
+        """
+        Start the motion estimation of a frame in the background worker.
+
+        Returns:
+            A future of the frame to get the homography by `result`.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='GMC')
+        return self._executor.submit(self._apply_prev, raw_frame,
+                                     self.prevDetections)
+
+    def result(self, future, detections=None):
+        """
+        Get the homography of a submitted frame.
+
+        Args:
+            future (Future): the return of `submit`.
+            detections (np.ndarray): [N, 4] boxes detected in the frame, to
+                mask the keypoints of the frame in the next motion estimation.
+        """
+        self.prevDetections = detections
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            logger.warning('GMC exceeds the timeout {}s, set warp as '
+                           'identity'.format(self.timeout))
+            return np.eye(2, 3)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _apply_prev(self, raw_frame, prev_detections):
+        # the detections of the frame are not known in the worker, the
+        # methods masking the frame use the ones of the previous frame
+        if self.method == 'sparseOptFlow':
+            return self._sparse_opt_flow(raw_frame, prev_detections)
+        return self.apply(raw_frame, prev_detections)
+
+    def _detections_mask(self, shape, detections):
+        if not self.mask_detections or detections is None or len(
+                detections) == 0:
+            return None
+        mask = np.full(shape, 255, dtype=np.uint8)
+        for det in detections:
+            tlbr = (np.asarray(det[:4]) / self.downscale).astype(np.int_)
+            tlbr = np.maximum(tlbr, 0)
+            mask[tlbr[1]:tlbr[3], tlbr[0]:tlbr[2]] = 0
+        return mask
 
     def apply(self, raw_frame, detections=None):
         if self.method == 'orb' or self.method == 'sift':
@@ -279,8 +371,11 @@ class GMC:
         return H
 
     def applySparseOptFlow(self, raw_frame, detections=None):
+        H = self._sparse_opt_flow(raw_frame, self.prevDetections)
+        self.prevDetections = detections
+        return H
 
-        t0 = time.time()
+    def _sparse_opt_flow(self, raw_frame, prev_detections=None):
 
         # Initialize
         height, width, _ = raw_frame.shape
@@ -293,45 +388,45 @@ class GMC:
             frame = cv2.resize(frame, (width // self.downscale,
                                        height // self.downscale))
 
-        # find the keypoints
-        keypoints = cv2.goodFeaturesToTrack(
-            frame, mask=None, **self.feature_params)
-
-        # Handle first frame
-        if not self.initializedFirstFrame:
+        # Handle first frame, and frames of a new size
+        if not self.initializedFirstFrame or \
+                self.prevFrame.shape != frame.shape:
             # Initialize data
-            self.prevFrame = frame.copy()
-            self.prevKeyPoints = copy.copy(keypoints)
+            self.prevFrame = frame
+            self.prevKeyPoints = None
 
             # Initialization done
             self.initializedFirstFrame = True
 
             return H
 
-        if self.prevFrame.shape != frame.shape:
-            self.prevFrame = frame.copy()
-            self.prevKeyPoints = copy.copy(keypoints)
+        # find the keypoints of the previous frame, or reuse the keypoints
+        # tracked into it
+        mask = self._detections_mask(self.prevFrame.shape, prev_detections)
+        keypoints = self.prevKeyPoints
+        if keypoints is not None and mask is not None:
+            xy = keypoints[:, 0].astype(np.int_)
+            keypoints = keypoints[mask[xy[:, 1], xy[:, 0]] > 0]
+        if keypoints is None or len(keypoints) < max(self.min_keypoints, 1):
+            keypoints = cv2.goodFeaturesToTrack(
+                self.prevFrame, mask=mask, **self.feature_params)
+
+        if keypoints is None:
+            print('Warning: not enough matching points')
+            self.prevFrame = frame
             return H
 
         # find correspondences
         matchedKeypoints, status, err = cv2.calcOpticalFlowPyrLK(
-            self.prevFrame, frame, self.prevKeyPoints, None)
+            self.prevFrame, frame, keypoints, None)
 
         # leave good correspondences only
-        prevPoints = []
-        currPoints = []
-
-        for i in range(len(status)):
-            if status[i]:
-                prevPoints.append(self.prevKeyPoints[i])
-                currPoints.append(matchedKeypoints[i])
-
-        prevPoints = np.array(prevPoints)
-        currPoints = np.array(currPoints)
+        good = status[:, 0] == 1
+        prevPoints = keypoints[good]
+        currPoints = matchedKeypoints[good]
 
         # Find rigid matrix
-        if (np.size(prevPoints, 0) > 4) and (
-                np.size(prevPoints, 0) == np.size(prevPoints, 0)):
+        if np.size(prevPoints, 0) > 4:
             H, inliesrs = cv2.estimateAffinePartial2D(prevPoints, currPoints,
                                                       cv2.RANSAC)
 
@@ -343,14 +438,15 @@ class GMC:
             print('Warning: not enough matching points')
 
         # Store to next iteration
-        self.prevFrame = frame.copy()
-        self.prevKeyPoints = copy.copy(keypoints)
-
-        t1 = time.time()
-
-        # gmc_line = str(1000 * (t1 - t0)) + "\t" + str(H[0, 0]) + "\t" + str(H[0, 1]) + "\t" + str(
-        #     H[0, 2]) + "\t" + str(H[1, 0]) + "\t" + str(H[1, 1]) + "\t" + str(H[1, 2]) + "\n"
-        # self.gmc_file.write(gmc_line)
+        self.prevFrame = frame
+        inside = np.all(
+            (currPoints[:, 0] >= 0) &
+            (currPoints[:, 0] < frame.shape[::-1]), axis=1)
+        currPoints = currPoints[inside]
+        if self.min_keypoints > 0 and len(currPoints) >= self.min_keypoints:
+            self.prevKeyPoints = currPoints
+        else:
+            self.prevKeyPoints = None
 
         return H
 
@@ -44,6 +44,36 @@ try:
         covariance = covariance - kalman_gain @proj_cov @kalman_gain.T
         return mean, covariance
 
+    @nb.njit(fastmath=True, cache=True)
+    def nb_multi_update(mean, covariance, proj_mean, proj_cov, measurement,
+                        meas_mat):
+        new_mean = np.empty_like(mean)
+        new_covariance = np.empty_like(covariance)
+        for i in range(len(mean)):
+            new_mean[i], new_covariance[i] = nb_update(
+                mean[i], covariance[i], proj_mean[i], proj_cov[i],
+                measurement[i], meas_mat)
+        return new_mean, new_covariance
+
+    @nb.njit(fastmath=True, cache=True)
+    def nb_multi_maha(proj_mean, proj_cov, measurements):
+        ndim = proj_mean.shape[1]
+        squared_maha = np.empty((len(proj_mean), len(measurements)))
+        z = np.empty(ndim)
+        for i in range(len(proj_mean)):
+            cholesky_factor = np.linalg.cholesky(proj_cov[i])
+            for j in range(len(measurements)):
+                # forward substitution of L * z = d
+                dist = 0.
+                for r in range(ndim):
+                    v = measurements[j, r] - proj_mean[i, r]
+                    for c in range(r):
+                        v -= cholesky_factor[r, c] * z[c]
+                    z[r] = v / cholesky_factor[r, r]
+                    dist += z[r] * z[r]
+                squared_maha[i, j] = dist
+        return squared_maha
+
 except:
     use_numba = False
     print(
@@ -131,6 +161,37 @@ class KalmanFilter(object):
         covariance = np.diag(np.square(std))
         return mean, np.float32(covariance)
 
+    def multi_initiate(self, measurement):
+        """
+        Create tracks from unassociated measurements (Vectorized version).
+
+        Args:
+            measurement (ndarray): The Nx4 dimensional matrix of bounding box
+                coordinates (x, y, a, h).
+
+        Returns:
+            The Nx8 dimensional mean matrix and Nx8x8 dimensional covariance
+            matrices of the new tracks.
+        """
+        mean = np.concatenate(
+            [measurement, np.zeros_like(measurement)], axis=1)
+        height = np.asarray(measurement[:, 3], dtype=np.float64)
+        std = np.stack(
+            [
+                2 * self._std_weight_position * height,
+                2 * self._std_weight_position * height,
+                np.full_like(height, 1e-2),
+                2 * self._std_weight_position * height,
+                10 * self._std_weight_velocity * height,
+                10 * self._std_weight_velocity * height,
+                np.full_like(height, 1e-5),
+                10 * self._std_weight_velocity * height,
+            ],
+            axis=1)
+        covariance = np.zeros((len(mean), 8, 8), dtype=np.float32)
+        covariance[:, np.arange(8), np.arange(8)] = np.square(std)
+        return mean, covariance
+
     def predict(self, mean, covariance):
         """
         Run Kalman filter prediction step.
@@ -190,6 +251,27 @@ class KalmanFilter(object):
                                           self._update_mat.T))
         return mean, covariance + innovation_cov
 
+    def multi_project(self, mean, covariance):
+        """
+        Project state distributions to measurement space (Vectorized version).
+
+        Args:
+            mean (ndarray): The Nx8 dimensional mean matrix of the states.
+            covariance (ndarray): The Nx8x8 dimensional covariance matrices.
+
+        Returns:
+            The Nx4 dimensional projected means and Nx4x4 dimensional
+            projected covariance matrices.
+        """
+        std = (self._std_weight_position * np.asarray(
+            mean[:, 3], dtype=np.float64)).astype(np.float32)
+        std = np.stack([std, std, np.full_like(std, 1e-1), std], axis=1)
+        # the observation matrix selects the first 4 dimensions
+        projected_mean = mean[:, :4].copy()
+        projected_cov = covariance[:, :4, :4].copy()
+        projected_cov[:, np.arange(4), np.arange(4)] += np.square(std)
+        return projected_mean, projected_cov
+
     def multi_predict(self, mean, covariance):
         """
         Run Kalman filter prediction step (Vectorized version).
@@ -217,12 +299,17 @@ class KalmanFilter(object):
         sqr = np.square(np.r_[std_pos, std_vel]).T
 
         if use_numba:
+            # e.g. the states warped by camera motion are float64
+            dtype = np.result_type(mean, covariance)
+            mean = np.asarray(mean, dtype=dtype)
+            covariance = np.asarray(covariance, dtype=dtype)
+            motion_mat = self._motion_mat.astype(dtype)
 
             means = []
             covariances = []
             for i in range(len(mean)):
                 a, b = nb_multi_predict(mean[i], covariance[i],
-                                        np.diag(sqr[i]), self._motion_mat)
+                                        np.diag(sqr[i]), motion_mat)
                 means.append(a)
                 covariances.append(b)
             return np.asarray(means), np.asarray(covariances)
@@ -266,6 +353,95 @@ class KalmanFilter(object):
         covariance = covariance - kalman_gain @projected_cov @kalman_gain.T
         return mean, covariance
 
+    def multi_update(self, mean, covariance, measurement):
+        """
+        Run Kalman filter correction step (Vectorized version).
+
+        Args:
+            mean (ndarray): The Nx8 dimensional mean matrix of the predicted
+                states.
+            covariance (ndarray): The Nx8x8 dimensional covariance matrices.
+            measurement (ndarray): The Nx4 dimensional measurements
+                (x, y, a, h) of the states.
+
+        Returns:
+            The measurement-corrected mean matrix and covariance matrices.
+        """
+        if len(mean) == 0:
+            return mean.copy(), covariance.copy()
+        projected_mean, projected_cov = self.multi_project(mean, covariance)
+
+        if use_numba:
+            dtype = np.result_type(mean, covariance, measurement)
+            return nb_multi_update(
+                np.ascontiguousarray(mean, dtype=dtype),
+                np.ascontiguousarray(covariance, dtype=dtype),
+                np.ascontiguousarray(projected_mean, dtype=dtype),
+                np.ascontiguousarray(projected_cov, dtype=dtype),
+                np.ascontiguousarray(measurement, dtype=dtype),
+                self._update_mat.astype(dtype))
+
+        # P * H^T is the first 4 columns of the covariance
+        kalman_gain = np.swapaxes(
+            np.linalg.solve(projected_cov,
+                            np.swapaxes(covariance[:, :, :4], 1, 2)), 1, 2)
+        innovation = measurement - projected_mean
+        mean = mean + np.matmul(kalman_gain, innovation[:, :, None])[:, :, 0]
+        covariance = covariance - np.matmul(
+            np.matmul(kalman_gain, projected_cov), np.swapaxes(kalman_gain,
+                                                               1, 2))
+        return mean, covariance
+
+    def multi_gating_distance(self,
+                              mean,
+                              covariance,
+                              measurements,
+                              only_position=False,
+                              metric='maha'):
+        """
+        Compute gating distance between state distributions and measurements
+        (Vectorized version).
+
+        Args:
+            mean (ndarray): The Nx8 dimensional mean matrix of the states.
+            covariance (ndarray): The Nx8x8 dimensional covariance matrices.
+            measurements (ndarray): An Mx4 dimensional matrix of M
+                measurements (x, y, a, h).
+            only_position (Optional[bool]): If True, distance computation is 
+                done with respect to the bounding box center position only.
+            metric (str): Metric type, 'gaussian' or 'maha'.
+
+        Returns
+            An NxM dimensional matrix, where the (i, j) element is the
+            squared Mahalanobis distance between the i-th state and
+            `measurements[j]`.
+        """
+        measurements = np.asarray(measurements).reshape(-1, 4)
+        if len(mean) == 0 or len(measurements) == 0:
+            return np.zeros((len(mean), len(measurements)))
+        mean, covariance = self.multi_project(mean, covariance)
+        if only_position:
+            mean, covariance = mean[:, :2], covariance[:, :2, :2]
+            measurements = measurements[:, :2]
+
+        if metric == 'gaussian':
+            d = measurements[None, :, :] - mean[:, None, :]
+            return np.sum(d * d, axis=2)
+        elif metric == 'maha':
+            if use_numba:
+                dtype = np.result_type(covariance, measurements)
+                return nb_multi_maha(
+                    np.ascontiguousarray(mean, dtype=dtype),
+                    np.ascontiguousarray(covariance, dtype=dtype),
+                    np.ascontiguousarray(measurements, dtype=dtype))
+
+            d = measurements[None, :, :] - mean[:, None, :]
+            cholesky_factor = np.linalg.cholesky(covariance)
+            z = np.linalg.solve(cholesky_factor, np.swapaxes(d, 1, 2))
+            return np.sum(z * z, axis=1)
+        else:
+            raise ValueError('invalid distance metric')
+
     def gating_distance(self,
                         mean,
                         covariance,
@@ -43,6 +43,14 @@ try:
         I_KH = _I - dot(K, H)
         P = dot(dot(I_KH, P), I_KH.T) + dot(dot(K, R), K.T)
         return x, P
+
+    @nb.njit(fastmath=True, cache=True)
+    def nb_multi_update(x, z, H, P, R, _I):
+        new_x = np.empty_like(x)
+        new_P = np.empty_like(P)
+        for i in range(len(x)):
+            new_x[i], new_P[i] = nb_update(x[i], z[i], H, P[i], R, _I)
+        return new_x, new_P
 except:
     use_numba = False
     print(
@@ -91,3 +99,37 @@ class OCSORTKalmanFilter:
 
             I_KH = self._I - dot(K, self.H)
             self.P = dot(dot(I_KH, self.P), I_KH.T) + dot(dot(K, self.R), K.T)
+
+    @staticmethod
+    def multi_update(filters, zs):
+        """
+        Update the filters by their measurements with one batched call, the
+        filters should share the same H and R.
+
+        Args:
+            filters (list[OCSORTKalmanFilter]): filters to update.
+            zs (list[np.ndarray]): measurements of shape [dim_z, 1].
+        """
+        if len(filters) == 0:
+            return
+        H, R, _I = filters[0].H, filters[0].R, filters[0]._I
+        x = np.stack([f.x for f in filters]).astype(np.float64)
+        P = np.stack([f.P for f in filters]).astype(np.float64)
+        z = np.stack(zs).astype(np.float64)
+
+        if use_numba:
+            x, P = nb_multi_update(x, z, H, P, R, _I)
+        else:
+            y = z - np.matmul(H, x)
+            PHT = np.matmul(P, H.T)
+            S = np.matmul(H, PHT) + R
+            K = np.matmul(PHT, inv(S))
+
+            x = x + np.matmul(K, y)
+
+            I_KH = _I - np.matmul(K, H)
+            P = np.matmul(np.matmul(I_KH, P), np.swapaxes(
+                I_KH, 1, 2)) + np.matmul(np.matmul(K, R), np.swapaxes(K, 1, 2))
+
+        for f, f_x, f_P in zip(filters, x, P):
+            f.x, f.P = f_x, f_P
@@ -18,11 +18,13 @@ from . import base_sde_tracker
 from .base_jde_tracker import *
 from .base_sde_tracker import *
 
+from . import track_table
 from . import jde_tracker
 from . import deepsort_tracker
 from . import ocsort_tracker
 from . import center_tracker
 
+from .track_table import *
 from .jde_tracker import *
 from .deepsort_tracker import *
 from .ocsort_tracker import *
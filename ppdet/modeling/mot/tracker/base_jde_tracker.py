@@ -192,9 +192,39 @@ class STrack(BaseTrack):
         self.frame_id = frame_id
         self.start_frame = frame_id
 
+    @staticmethod
+    def multi_update(stracks, new_tracks, frame_id):
+        """
+        Update the matched stracks by the new tracks with one Kalman filter
+        call, as `update` for the tracked stracks and `re_activate` for the
+        others. Return the lists of the updated and the re-activated stracks.
+        """
+        activated, refind = [], []
+        if len(stracks) == 0:
+            return activated, refind
+        multi_mean, multi_covariance = stracks[0].kalman_filter.multi_update(
+            np.asarray([st.mean for st in stracks]),
+            np.asarray([st.covariance for st in stracks]),
+            np.asarray([
+                STrack.tlwh_to_xyah(track.tlwh) for track in new_tracks
+            ]))
+        for st, new_track, mean, cov in zip(stracks, new_tracks, multi_mean,
+                                            multi_covariance):
+            st.mean, st.covariance = mean, cov
+            if st.state == TrackState.Tracked:
+                st._update_state(new_track, frame_id)
+                activated.append(st)
+            else:
+                st._re_activate_state(new_track, frame_id)
+                refind.append(st)
+        return activated, refind
+
     def re_activate(self, new_track, frame_id, new_id=False):
         self.mean, self.covariance = self.kalman_filter.update(
             self.mean, self.covariance, self.tlwh_to_xyah(new_track.tlwh))
+        self._re_activate_state(new_track, frame_id, new_id)
+
+    def _re_activate_state(self, new_track, frame_id, new_id=False):
         if self.use_reid:
             self.update_features(new_track.curr_feat)
         self.track_len = 0
@@ -205,12 +235,14 @@ class STrack(BaseTrack):
             self.track_id = self.next_id(self.cls_id)
 
     def update(self, new_track, frame_id, update_feature=True):
-        self.frame_id = frame_id
-        self.track_len += 1
-
         new_tlwh = new_track.tlwh
         self.mean, self.covariance = self.kalman_filter.update(
             self.mean, self.covariance, self.tlwh_to_xyah(new_tlwh))
+        self._update_state(new_track, frame_id, update_feature)
+
+    def _update_state(self, new_track, frame_id, update_feature=True):
+        self.frame_id = frame_id
+        self.track_len += 1
         self.state = TrackState.Tracked  # set flag 'tracked'
         self.is_activated = True  # set flag 'activated'
 
@@ -240,6 +272,31 @@ class STrack(BaseTrack):
         ret[2:] += ret[:2]
         return ret
 
+    @staticmethod
+    def multi_tlbr(stracks):
+        """
+        The `tlbr` of stracks as an array of shape [N, 4]. The Kalman means
+        of the activated tracks are stacked into one array and converted at
+        once, the tracks not activated yet use their detected boxes.
+        """
+        tlbrs = np.zeros((len(stracks), 4), dtype=np.float32)
+        means = [st.mean for st in stracks]
+        has_mean = np.array([m is not None for m in means], dtype=bool)
+        if has_mean.any():
+            # the common case of the predicted tracks needs no filtering
+            ret = np.array(means if has_mean.all() else
+                           [m for m in means if m is not None])[:, :4]
+            ret[:, 2] *= ret[:, 3]
+            ret[:, :2] -= ret[:, 2:] / 2
+            ret[:, 2:] += ret[:, :2]
+            tlbrs[has_mean] = ret
+        if not has_mean.all():
+            ret = np.array(
+                [st._tlwh for st, m in zip(stracks, has_mean) if not m])
+            ret[:, 2:] += ret[:, :2]
+            tlbrs[~has_mean] = ret
+        return tlbrs
+
     @staticmethod
     def tlwh_to_xyah(tlwh):
         """Convert bounding box to format `(center x, center y, aspect ratio,
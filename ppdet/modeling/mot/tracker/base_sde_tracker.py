@@ -16,6 +16,7 @@ This code is based on https://github.com/nwojke/deep_sort/blob/master/deep_sort/
 """
 
 import datetime
+import numpy as np
 from ppdet.core.workspace import register, serializable
 
 __all__ = ['TrackState', 'Track']
@@ -125,6 +126,26 @@ class Track(object):
         self.mean, self.covariance = kalman_filter.update(self.mean,
                                                           self.covariance,
                                                           detection.to_xyah())
+        self._update_state(detection)
+
+    @staticmethod
+    def multi_update(tracks, kalman_filter, detections):
+        """
+        Perform the measurement update of the matched tracks with one Kalman
+        filter call, and update their detection feature caches.
+        """
+        if len(tracks) == 0:
+            return
+        multi_mean, multi_covariance = kalman_filter.multi_update(
+            np.asarray([track.mean for track in tracks]),
+            np.asarray([track.covariance for track in tracks]),
+            np.asarray([detection.to_xyah() for detection in detections]))
+        for track, detection, mean, cov in zip(tracks, detections, multi_mean,
+                                               multi_covariance):
+            track.mean, track.covariance = mean, cov
+            track._update_state(detection)
+
+    def _update_state(self, detection):
         self.features.append(detection.feature)
         self.feat = detection.feature
         self.cls_id = detection.cls_id
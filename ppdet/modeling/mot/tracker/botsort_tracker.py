@@ -45,6 +45,14 @@ class BOTSORTTracker(object):
         camera_motion (bool): Whether use camera motion, default False
         cmc_method (str): camera motion method,defalut sparseOptFlow
         frame_rate (int): fps buffer_size=int(frame_rate / 30.0 * track_buffer)
+        cmc_downscale (int): downscale of the frames of camera motion
+        cmc_max_corners (int): max keypoints of sparseOptFlow
+        cmc_min_keypoints (int): reuse the tracked keypoints of sparseOptFlow
+            while at least this number are left, 0 to detect in every frame
+        cmc_mask_detections (bool): whether to exclude the keypoints in the
+            detected boxes of sparseOptFlow
+        cmc_timeout (float): max seconds to wait for the camera motion of a
+            frame given by `prefetch`, None to always wait
     """
 
     def __init__(self,
@@ -56,7 +64,12 @@ class BOTSORTTracker(object):
                  min_box_area=0,
                  camera_motion=False,
                  cmc_method='sparseOptFlow',
-                 frame_rate=30):
+                 frame_rate=30,
+                 cmc_downscale=2,
+                 cmc_max_corners=1000,
+                 cmc_min_keypoints=0,
+                 cmc_mask_detections=False,
+                 cmc_timeout=None):
 
         self.tracked_stracks = []  # type: list[STrack]
         self.lost_stracks = []  # type: list[STrack]
@@ -74,7 +87,30 @@ class BOTSORTTracker(object):
         self.min_box_area = min_box_area
 
         self.camera_motion = camera_motion
-        self.gmc = GMC(method=cmc_method)
+        self.gmc = GMC(
+            method=cmc_method,
+            downscale=cmc_downscale,
+            max_corners=cmc_max_corners,
+            min_keypoints=cmc_min_keypoints,
+            mask_detections=cmc_mask_detections,
+            timeout=cmc_timeout)
+        # camera motions of the prefetched frames, in order
+        self.gmc_futures = deque()
+
+    def prefetch(self, img):
+        """
+        Start the camera motion estimation of the next frame in background,
+        e.g. before running the detector on it, `update` of the frame gets
+        the motion. The motions of the prefetched frames not updated, e.g.
+        of no detections, are composed into the motion of the next update.
+        """
+        if self.camera_motion:
+            self.gmc_futures.append(self.gmc.submit(img[0]))
+
+    def close(self):
+        """Stop the camera motion worker, e.g. at the end of a sequence."""
+        self.gmc_futures.clear()
+        self.gmc.close()
 
     def update(self, output_results, img=None):
         self.frame_id += 1
@@ -132,7 +168,16 @@ class BOTSORTTracker(object):
 
         # Fix camera motion
         if self.camera_motion:
-            warp = self.gmc.apply(img[0], dets)
+            if self.gmc_futures:
+                # compose the motions of the frames prefetched since the last
+                # update, the frames without update are skipped
+                warp = np.eye(3)
+                while self.gmc_futures:
+                    H = self.gmc.result(self.gmc_futures.popleft(), dets)
+                    warp = np.vstack([H, [0, 0, 1]]).dot(warp)
+                warp = warp[:2]
+            else:
+                warp = self.gmc.apply(img[0], dets)
             STrack.multi_gmc(strack_pool, warp)
             STrack.multi_gmc(unconfirmed, warp)
 
@@ -141,15 +186,11 @@ class BOTSORTTracker(object):
         matches, u_track, u_detection = matching.linear_assignment(
             ious_dists, thresh=self.match_thresh)
 
-        for itracked, idet in matches:
-            track = strack_pool[itracked]
-            det = detections[idet]
-            if track.state == TrackState.Tracked:
-                track.update(detections[idet], self.frame_id)
-                activated_starcks.append(track)
-            else:
-                track.re_activate(det, self.frame_id, new_id=False)
-                refind_stracks.append(track)
+        activated, refind = STrack.multi_update(
+            [strack_pool[i] for i in matches[:, 0]],
+            [detections[i] for i in matches[:, 1]], self.frame_id)
+        activated_starcks.extend(activated)
+        refind_stracks.extend(refind)
         ''' Step 3: Second association, with low score detection boxes'''
         if len(scores):
             inds_high = scores < self.track_high_thresh
@@ -180,15 +221,11 @@ class BOTSORTTracker(object):
         dists = matching.iou_distance(r_tracked_stracks, detections_second)
         matches, u_track, u_detection_second = matching.linear_assignment(
             dists, thresh=0.5)
-        for itracked, idet in matches:
-            track = r_tracked_stracks[itracked]
-            det = detections_second[idet]
-            if track.state == TrackState.Tracked:
-                track.update(det, self.frame_id)
-                activated_starcks.append(track)
-            else:
-                track.re_activate(det, self.frame_id, new_id=False)
-                refind_stracks.append(track)
+        activated, refind = STrack.multi_update(
+            [r_tracked_stracks[i] for i in matches[:, 0]],
+            [detections_second[i] for i in matches[:, 1]], self.frame_id)
+        activated_starcks.extend(activated)
+        refind_stracks.extend(refind)
 
         for it in u_track:
             track = r_tracked_stracks[it]
@@ -201,9 +238,10 @@ class BOTSORTTracker(object):
 
         matches, u_unconfirmed, u_detection = matching.linear_assignment(
             dists, thresh=0.7)
-        for itracked, idet in matches:
-            unconfirmed[itracked].update(detections[idet], self.frame_id)
-            activated_starcks.append(unconfirmed[itracked])
+        activated, _ = STrack.multi_update(
+            [unconfirmed[i] for i in matches[:, 0]],
+            [detections[i] for i in matches[:, 1]], self.frame_id)
+        activated_starcks.extend(activated)
         for it in u_unconfirmed:
             track = unconfirmed[it]
             track.mark_removed()
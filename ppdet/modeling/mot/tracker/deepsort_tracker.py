@@ -116,9 +116,8 @@ class DeepSORTTracker(object):
             self._match(detections)
 
         # Update track set.
-        for track_idx, detection_idx in matches:
-            self.tracks[track_idx].update(self.motion,
-                                          detections[detection_idx])
+        Track.multi_update([self.tracks[i] for i, _ in matches], self.motion,
+                           [detections[i] for _, i in matches])
         for track_idx in unmatched_tracks:
             self.tracks[track_idx].mark_missed()
         for detection_idx in unmatched_detections:
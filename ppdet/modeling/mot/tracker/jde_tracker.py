@@ -21,7 +21,7 @@ from collections import defaultdict
 from ..matching import jde_matching as matching
 from ..motion import KalmanFilter
 from .base_jde_tracker import TrackState, STrack
-from .base_jde_tracker import joint_stracks, sub_stracks, remove_duplicate_stracks
+from .track_table import Detections, TrackTable
 
 from ppdet.core.workspace import register, serializable
 from ppdet.utils.logger import setup_logger
@@ -101,9 +101,8 @@ class JDETracker(object):
         self.metric_type = metric_type
 
         self.frame_id = 0
-        self.tracked_tracks_dict = defaultdict(list)  # dict(list[STrack])
-        self.lost_tracks_dict = defaultdict(list)  # dict(list[STrack])
-        self.removed_tracks_dict = defaultdict(list)  # dict(list[STrack])
+        # tracked and lost tracks of every class
+        self.track_tables = {}
 
         self.max_time_lost = 0
         # max_time_lost will be calculated: int(frame_rate / 30.0 * track_buffer)
@@ -127,227 +126,127 @@ class JDETracker(object):
         self.frame_id += 1
         if self.frame_id == 1:
             STrack.init_count(self.num_classes)
-        activated_tracks_dict = defaultdict(list)
-        refined_tracks_dict = defaultdict(list)
-        lost_tracks_dict = defaultdict(list)
-        removed_tracks_dict = defaultdict(list)
         output_tracks_dict = defaultdict(list)
 
-        pred_dets_dict = defaultdict(list)
-        pred_embs_dict = defaultdict(list)
-
-        # unify single and multi classes detection and embedding results
-        for cls_id in range(self.num_classes):
-            cls_idx = (pred_dets[:, 0:1] == cls_id).squeeze(-1)
-            pred_dets_dict[cls_id] = pred_dets[cls_idx]
-            if pred_embs is not None:
-                pred_embs_dict[cls_id] = pred_embs[cls_idx]
-            else:
-                pred_embs_dict[cls_id] = None
-
         for cls_id in range(self.num_classes):
             """ Step 1: Get detections by class"""
-            pred_dets_cls = pred_dets_dict[cls_id]
-            pred_embs_cls = pred_embs_dict[cls_id]
-            remain_inds = (pred_dets_cls[:, 1:2] > self.conf_thres).squeeze(-1)
-            if remain_inds.sum() > 0:
-                pred_dets_cls = pred_dets_cls[remain_inds]
-                if pred_embs_cls is None:
-                    # in original ByteTrack
-                    detections = [
-                        STrack(
-                            STrack.tlbr_to_tlwh(tlbrs[2:6]),
-                            tlbrs[1],
-                            cls_id,
-                            30,
-                            temp_feat=None) for tlbrs in pred_dets_cls
-                    ]
-                else:
-                    pred_embs_cls = pred_embs_cls[remain_inds]
-                    detections = [
-                        STrack(
-                            STrack.tlbr_to_tlwh(tlbrs[2:6]), tlbrs[1], cls_id,
-                            30, temp_feat) for (tlbrs, temp_feat) in
-                        zip(pred_dets_cls, pred_embs_cls)
-                    ]
-            else:
-                detections = []
+            cls_idx = pred_dets[:, 0] == cls_id
+            pred_dets_cls = pred_dets[cls_idx]
+            pred_embs_cls = pred_embs[cls_idx] if pred_embs is not None else None
+            remain_inds = pred_dets_cls[:, 1] > self.conf_thres
+            detections = Detections(pred_dets_cls[remain_inds],
+                                    pred_embs_cls[remain_inds]
+                                    if pred_embs_cls is not None else None)
+
+            if cls_id not in self.track_tables:
+                self.track_tables[cls_id] = TrackTable(self.motion, cls_id)
+            table = self.track_tables[cls_id]
+            activated, refined = [], []
             ''' Add newly detected tracklets to tracked_stracks'''
-            unconfirmed_dict = defaultdict(list)
-            tracked_tracks_dict = defaultdict(list)
-            for track in self.tracked_tracks_dict[cls_id]:
-                if not track.is_activated:
-                    # previous tracks which are not active in the current frame are added in unconfirmed list
-                    unconfirmed_dict[cls_id].append(track)
-                else:
-                    # Active tracks are added to the local list 'tracked_stracks'
-                    tracked_tracks_dict[cls_id].append(track)
+            # previous tracks which are not active in the current frame are
+            # unconfirmed, the others are tracked
+            is_activated = table.is_activated[table.tracked]
+            unconfirmed = table.tracked[~is_activated]
+            tracked = table.tracked[is_activated]
             """ Step 2: First association, with embedding"""
             # building tracking pool for the current frame
-            track_pool_dict = defaultdict(list)
-            track_pool_dict[cls_id] = joint_stracks(
-                tracked_tracks_dict[cls_id], self.lost_tracks_dict[cls_id])
+            track_pool = np.concatenate(
+                [tracked, table.lost[~np.isin(table.lost, tracked)]])
 
             # Predict the current location with KalmanFilter
-            STrack.multi_predict(track_pool_dict[cls_id], self.motion)
+            table.predict(track_pool)
 
             if pred_embs_cls is None:
                 # in original ByteTrack
-                dists = matching.iou_distance(track_pool_dict[cls_id],
-                                              detections)
+                dists = matching.iou_distance(
+                    table.tlbr(track_pool), detections.tlbr)
                 matches, u_track, u_detection = matching.linear_assignment(
                     dists, thresh=self.match_thres)  # not self.tracked_thresh
             else:
                 dists = matching.embedding_distance(
-                    track_pool_dict[cls_id],
-                    detections,
+                    table.features(track_pool),
+                    detections.feat,
                     metric=self.metric_type)
-                dists = matching.fuse_motion(
-                    self.motion, dists, track_pool_dict[cls_id], detections)
+                dists = matching.fuse_gating(
+                    dists, table.gating_distance(track_pool, detections.xyah))
                 matches, u_track, u_detection = matching.linear_assignment(
                     dists, thresh=self.tracked_thresh)
 
-            for i_tracked, idet in matches:
-                # i_tracked is the id of the track and idet is the detection
-                track = track_pool_dict[cls_id][i_tracked]
-                det = detections[idet]
-                if track.state == TrackState.Tracked:
-                    # If the track is active, add the detection to the track
-                    track.update(detections[idet], self.frame_id)
-                    activated_tracks_dict[cls_id].append(track)
-                else:
-                    # We have obtained a detection from a track which is not active,
-                    # hence put the track in refind_stracks list
-                    track.re_activate(det, self.frame_id, new_id=False)
-                    refined_tracks_dict[cls_id].append(track)
+            # active tracks are updated by the detections, the others are
+            # re-activated
+            act, ref = table.update(track_pool[matches[:, 0]],
+                                    detections.subset(matches[:, 1]),
+                                    self.frame_id)
+            activated.append(act)
+            refined.append(ref)
 
             # None of the steps below happen if there are no undetected tracks.
             """ Step 3: Second association, with IOU"""
+            r_tracked = track_pool[_indices(u_track)]
+            r_tracked = r_tracked[table.state[r_tracked] == TrackState.Tracked]
             if self.use_byte:
-                inds_low = pred_dets_dict[cls_id][:, 1:2] > self.low_conf_thres
-                inds_high = pred_dets_dict[cls_id][:, 1:2] < self.conf_thres
-                inds_second = np.logical_and(inds_low, inds_high).squeeze(-1)
-                pred_dets_cls_second = pred_dets_dict[cls_id][inds_second]
-
+                inds_second = (pred_dets_cls[:, 1] > self.low_conf_thres) & (
+                    pred_dets_cls[:, 1] < self.conf_thres)
                 # association the untrack to the low score detections
-                if len(pred_dets_cls_second) > 0:
-                    if pred_embs_dict[cls_id] is None:
-                        # in original ByteTrack
-                        detections_second = [
-                            STrack(
-                                STrack.tlbr_to_tlwh(tlbrs[2:6]),
-                                tlbrs[1],
-                                cls_id,
-                                30,
-                                temp_feat=None)
-                            for tlbrs in pred_dets_cls_second
-                        ]
-                    else:
-                        pred_embs_cls_second = pred_embs_dict[cls_id][
-                            inds_second]
-                        detections_second = [
-                            STrack(
-                                STrack.tlbr_to_tlwh(tlbrs[2:6]), tlbrs[1],
-                                cls_id, 30, temp_feat) for (tlbrs, temp_feat) in
-                            zip(pred_dets_cls_second, pred_embs_cls_second)
-                        ]
-                else:
-                    detections_second = []
-                r_tracked_stracks = [
-                    track_pool_dict[cls_id][i] for i in u_track
-                    if track_pool_dict[cls_id][i].state == TrackState.Tracked
-                ]
-                dists = matching.iou_distance(r_tracked_stracks,
-                                              detections_second)
+                detections_second = Detections(
+                    pred_dets_cls[inds_second], pred_embs_cls[inds_second]
+                    if pred_embs_cls is not None else None)
+                dists = matching.iou_distance(
+                    table.tlbr(r_tracked), detections_second.tlbr)
                 matches, u_track, u_detection_second = matching.linear_assignment(
                     dists, thresh=0.4)  # not r_tracked_thresh
             else:
-                detections = [detections[i] for i in u_detection]
-                r_tracked_stracks = []
-                for i in u_track:
-                    if track_pool_dict[cls_id][i].state == TrackState.Tracked:
-                        r_tracked_stracks.append(track_pool_dict[cls_id][i])
-                dists = matching.iou_distance(r_tracked_stracks, detections)
-
+                detections = detections.subset(_indices(u_detection))
+                detections_second = detections
+                dists = matching.iou_distance(
+                    table.tlbr(r_tracked), detections.tlbr)
                 matches, u_track, u_detection = matching.linear_assignment(
                     dists, thresh=self.r_tracked_thresh)
 
-            for i_tracked, idet in matches:
-                track = r_tracked_stracks[i_tracked]
-                det = detections[
-                    idet] if not self.use_byte else detections_second[idet]
-                if track.state == TrackState.Tracked:
-                    track.update(det, self.frame_id)
-                    activated_tracks_dict[cls_id].append(track)
-                else:
-                    track.re_activate(det, self.frame_id, new_id=False)
-                    refined_tracks_dict[cls_id].append(track)
+            act, ref = table.update(r_tracked[matches[:, 0]],
+                                    detections_second.subset(matches[:, 1]),
+                                    self.frame_id)
+            activated.append(act)
+            refined.append(ref)
 
-            for it in u_track:
-                track = r_tracked_stracks[it]
-                if not track.state == TrackState.Lost:
-                    track.mark_lost()
-                    lost_tracks_dict[cls_id].append(track)
+            lost = r_tracked[_indices(u_track)]
+            lost = lost[table.state[lost] != TrackState.Lost]
+            table.state[lost] = TrackState.Lost
             '''Deal with unconfirmed tracks, usually tracks with only one beginning frame'''
-            detections = [detections[i] for i in u_detection]
-            dists = matching.iou_distance(unconfirmed_dict[cls_id], detections)
+            detections = detections.subset(_indices(u_detection))
+            dists = matching.iou_distance(
+                table.tlbr(unconfirmed), detections.tlbr)
             matches, u_unconfirmed, u_detection = matching.linear_assignment(
                 dists, thresh=self.unconfirmed_thresh)
-            for i_tracked, idet in matches:
-                unconfirmed_dict[cls_id][i_tracked].update(detections[idet],
-                                                           self.frame_id)
-                activated_tracks_dict[cls_id].append(unconfirmed_dict[cls_id][
-                    i_tracked])
-            for it in u_unconfirmed:
-                track = unconfirmed_dict[cls_id][it]
-                track.mark_removed()
-                removed_tracks_dict[cls_id].append(track)
+            act, ref = table.update(unconfirmed[matches[:, 0]],
+                                    detections.subset(matches[:, 1]),
+                                    self.frame_id)
+            activated += [act, ref]
+            removed = unconfirmed[_indices(u_unconfirmed)]
+            table.state[removed] = TrackState.Removed
             """ Step 4: Init new stracks"""
-            for inew in u_detection:
-                track = detections[inew]
-                if track.score < self.det_thresh:
-                    continue
-                track.activate(self.motion, self.frame_id)
-                activated_tracks_dict[cls_id].append(track)
+            detections = detections.subset(_indices(u_detection))
+            detections = detections.subset(
+                detections.score >= self.det_thresh)
+            activated.append(table.activate(detections, self.frame_id))
             """ Step 5: Update state"""
-            for track in self.lost_tracks_dict[cls_id]:
-                if self.frame_id - track.end_frame > self.max_time_lost:
-                    track.mark_removed()
-                    removed_tracks_dict[cls_id].append(track)
-
-            self.tracked_tracks_dict[cls_id] = [
-                t for t in self.tracked_tracks_dict[cls_id]
-                if t.state == TrackState.Tracked
-            ]
-            self.tracked_tracks_dict[cls_id] = joint_stracks(
-                self.tracked_tracks_dict[cls_id], activated_tracks_dict[cls_id])
-            self.tracked_tracks_dict[cls_id] = joint_stracks(
-                self.tracked_tracks_dict[cls_id], refined_tracks_dict[cls_id])
-            self.lost_tracks_dict[cls_id] = sub_stracks(
-                self.lost_tracks_dict[cls_id], self.tracked_tracks_dict[cls_id])
-            self.lost_tracks_dict[cls_id].extend(lost_tracks_dict[cls_id])
-            self.lost_tracks_dict[cls_id] = sub_stracks(
-                self.lost_tracks_dict[cls_id], self.removed_tracks_dict[cls_id])
-            self.removed_tracks_dict[cls_id].extend(removed_tracks_dict[cls_id])
-            self.tracked_tracks_dict[cls_id], self.lost_tracks_dict[
-                cls_id] = remove_duplicate_stracks(
-                    self.tracked_tracks_dict[cls_id],
-                    self.lost_tracks_dict[cls_id])
+            activated = np.concatenate(activated)
+            refined = np.concatenate(refined)
+            removed = table.step(activated, refined, lost, removed,
+                                 self.frame_id, self.max_time_lost)
 
             # get scores of lost tracks
-            output_tracks_dict[cls_id] = [
-                track for track in self.tracked_tracks_dict[cls_id]
-                if track.is_activated
-            ]
+            output_tracks_dict[cls_id] = table.outputs()
 
             logger.debug('===========Frame {}=========='.format(self.frame_id))
             logger.debug('Activated: {}'.format(
-                [track.track_id for track in activated_tracks_dict[cls_id]]))
-            logger.debug('Refind: {}'.format(
-                [track.track_id for track in refined_tracks_dict[cls_id]]))
-            logger.debug('Lost: {}'.format(
-                [track.track_id for track in lost_tracks_dict[cls_id]]))
-            logger.debug('Removed: {}'.format(
-                [track.track_id for track in removed_tracks_dict[cls_id]]))
+                list(table.track_id[activated])))
+            logger.debug('Refind: {}'.format(list(table.track_id[refined])))
+            logger.debug('Lost: {}'.format(list(table.track_id[lost])))
+            logger.debug('Removed: {}'.format(list(table.track_id[removed])))
 
         return output_tracks_dict
+
+
+def _indices(inds):
+    return np.asarray(inds, dtype=np.int64).reshape(-1)
@@ -124,36 +124,50 @@ class KalmanBoxTracker(object):
         Updates the state vector with observed bbox.
         """
         if bbox is not None:
-            if angle_cost and self.last_observation.sum(
-            ) >= 0:  # no previous observation
-                previous_box = None
-                for i in range(self.delta_t):
-                    dt = self.delta_t - i
-                    if self.age - dt in self.observations:
-                        previous_box = self.observations[self.age - dt]
-                        break
-                if previous_box is None:
-                    previous_box = self.last_observation
-                """
-                  Estimate the track speed direction with observations \Delta t steps away
-                """
-                self.velocity = speed_direction(previous_box, bbox)
-            """
-              Insert new observations. This is a ugly way to maintain both self.observations
-              and self.history_observations. Bear it for the moment.
-            """
-            self.last_observation = bbox
-            self.observations[self.age] = bbox
-            self.history_observations.append(bbox)
-
-            self.time_since_update = 0
-            self.history = []
-            self.hits += 1
-            self.hit_streak += 1
+            self._observe(bbox, angle_cost)
             self.kf.update(convert_bbox_to_z(bbox))
         else:
             self.kf.update(bbox)
 
+    @staticmethod
+    def multi_update(trackers, bboxes, angle_cost=False):
+        """
+        Updates the state vectors of the trackers with their observed bboxes
+        by one batched Kalman filter update.
+        """
+        for trk, bbox in zip(trackers, bboxes):
+            trk._observe(bbox, angle_cost)
+        OCSORTKalmanFilter.multi_update([trk.kf for trk in trackers],
+                                        [convert_bbox_to_z(b) for b in bboxes])
+
+    def _observe(self, bbox, angle_cost=False):
+        if angle_cost and self.last_observation.sum(
+        ) >= 0:  # no previous observation
+            previous_box = None
+            for i in range(self.delta_t):
+                dt = self.delta_t - i
+                if self.age - dt in self.observations:
+                    previous_box = self.observations[self.age - dt]
+                    break
+            if previous_box is None:
+                previous_box = self.last_observation
+            """
+              Estimate the track speed direction with observations \Delta t steps away
+            """
+            self.velocity = speed_direction(previous_box, bbox)
+        """
+          Insert new observations. This is a ugly way to maintain both self.observations
+          and self.history_observations. Bear it for the moment.
+        """
+        self.last_observation = bbox
+        self.observations[self.age] = bbox
+        self.history_observations.append(bbox)
+
+        self.time_since_update = 0
+        self.history = []
+        self.hits += 1
+        self.hit_streak += 1
+
     def predict(self):
         """
         Advances the state vector and returns the predicted bounding box estimate.
@@ -283,9 +297,10 @@ class OCSORTTracker(object):
             matched, unmatched_dets, unmatched_trks = associate_only_iou(
                 dets, trks, self.iou_threshold)
 
-        for m in matched:
-            self.trackers[m[1]].update(
-                dets[m[0], :], angle_cost=self.use_angle_cost)
+        # the matched trackers of all rounds are updated at once, the
+        # associations only read the states predicted above
+        update_trks = [self.trackers[m[1]] for m in matched]
+        update_boxes = [dets[m[0], :] for m in matched]
         """
             Second round of associaton by OCR
         """
@@ -309,8 +324,8 @@ class OCSORTTracker(object):
                     det_ind, trk_ind = m[0], unmatched_trks[m[1]]
                     if iou_left[m[0], m[1]] < self.iou_threshold:
                         continue
-                    self.trackers[trk_ind].update(
-                        dets_second[det_ind, :], angle_cost=self.use_angle_cost)
+                    update_trks.append(self.trackers[trk_ind])
+                    update_boxes.append(dets_second[det_ind, :])
                     to_remove_trk_indices.append(trk_ind)
                 unmatched_trks = np.setdiff1d(unmatched_trks,
                                               np.array(to_remove_trk_indices))
@@ -334,8 +349,8 @@ class OCSORTTracker(object):
                         1]]
                     if iou_left[m[0], m[1]] < self.iou_threshold:
                         continue
-                    self.trackers[trk_ind].update(
-                        dets[det_ind, :], angle_cost=self.use_angle_cost)
+                    update_trks.append(self.trackers[trk_ind])
+                    update_boxes.append(dets[det_ind, :])
                     to_remove_det_indices.append(det_ind)
                     to_remove_trk_indices.append(trk_ind)
                 unmatched_dets = np.setdiff1d(unmatched_dets,
@@ -343,6 +358,8 @@ class OCSORTTracker(object):
                 unmatched_trks = np.setdiff1d(unmatched_trks,
                                               np.array(to_remove_trk_indices))
 
+        KalmanBoxTracker.multi_update(
+            update_trks, update_boxes, angle_cost=self.use_angle_cost)
         for m in unmatched_trks:
             self.trackers[m].update(None)
 
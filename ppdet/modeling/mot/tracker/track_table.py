@@ -0,0 +1,310 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Struct-of-arrays state of the tracks of JDETracker.
+"""
+
+import numpy as np
+
+from ..matching import jde_matching as matching
+from .base_jde_tracker import BaseTrack, TrackState
+
+__all__ = ['TrackView', 'Detections', 'TrackTable']
+
+
+def tlwh_to_tlbr(tlwh):
+    ret = tlwh.copy()
+    ret[:, 2:] += ret[:, :2]
+    return ret
+
+
+def tlwh_to_xyah(tlwh):
+    ret = tlwh.copy()
+    ret[:, :2] += ret[:, 2:] / 2
+    ret[:, 2] /= ret[:, 3]
+    return ret
+
+
+def mean_to_tlwh(mean):
+    ret = mean[:, :4].copy()
+    ret[:, 2] *= ret[:, 3]
+    ret[:, :2] -= ret[:, 2:] / 2
+    return ret
+
+
+def normalize(feat):
+    return feat / np.linalg.norm(feat, axis=1, keepdims=True)
+
+
+class TrackView(object):
+    """
+    A track of a TrackTable at a frame, with the attributes of STrack read
+    by the users of the tracker outputs.
+    """
+    __slots__ = ['track_id', 'cls_id', 'score', 'tlwh', 'start_frame',
+                 'frame_id', 'track_len', 'is_activated', 'state']
+
+    def __init__(self, track_id, cls_id, score, tlwh, start_frame, frame_id,
+                 track_len, is_activated, state):
+        self.track_id = track_id
+        self.cls_id = cls_id
+        self.score = score
+        self.tlwh = tlwh
+        self.start_frame = start_frame
+        self.frame_id = frame_id
+        self.track_len = track_len
+        self.is_activated = is_activated
+        self.state = state
+
+    @property
+    def end_frame(self):
+        return self.frame_id
+
+    @property
+    def tlbr(self):
+        ret = self.tlwh.copy()
+        ret[2:] += ret[:2]
+        return ret
+
+    def __repr__(self):
+        return 'OT_({}-{})_({}-{})'.format(self.cls_id, self.track_id,
+                                           self.start_frame, self.end_frame)
+
+
+class Detections(object):
+    """
+    Detections of a class at a frame, as arrays.
+
+    Args:
+        dets (np.ndarray): [N, 6] of 'cls_id, score, x0, y0, x1, y1'.
+        embs (np.ndarray): [N, D] embeddings, or None.
+    """
+
+    def __init__(self, dets, embs=None):
+        self.score = dets[:, 1]
+        self.tlwh = np.asarray(dets[:, 2:6], dtype=np.float32).copy()
+        self.tlwh[:, 2:] -= self.tlwh[:, :2]
+        self.tlbr = tlwh_to_tlbr(self.tlwh)
+        self.xyah = tlwh_to_xyah(self.tlwh)
+        # normalized twice as STrack.update_features with a new smooth_feat
+        self.feat = None if embs is None else normalize(
+            normalize(np.asarray(embs, dtype=np.float32)))
+
+    def __len__(self):
+        return len(self.score)
+
+    def subset(self, inds):
+        sub = Detections.__new__(Detections)
+        sub.score = self.score[inds]
+        sub.tlwh = self.tlwh[inds]
+        sub.tlbr = self.tlbr[inds]
+        sub.xyah = self.xyah[inds]
+        sub.feat = None if self.feat is None else self.feat[inds]
+        return sub
+
+
+class TrackTable(object):
+    """
+    Tracks of a class of JDETracker. The Kalman states, features, states and
+    ages of the tracks live in preallocated arrays indexed by slot, the slots
+    of removed tracks are reused. The tracked and lost tracks are arrays of
+    slots in the order of the lists of STrack of the original tracker, so
+    that the associations are the same.
+
+    Args:
+        kalman_filter (KalmanFilter): motion model of the tracks.
+        cls_id (int): class of the tracks.
+        capacity (int): initial number of slots, grown when full.
+        alpha (float): momentum of the smoothed features.
+    """
+
+    def __init__(self, kalman_filter, cls_id=0, capacity=64, alpha=0.9):
+        self.kalman_filter = kalman_filter
+        self.cls_id = cls_id
+        self.alpha = alpha
+        self.mean = np.zeros((capacity, 8), dtype=np.float32)
+        self.covariance = np.zeros((capacity, 8, 8), dtype=np.float32)
+        self.smooth_feat = None
+        self.track_id = np.zeros(capacity, dtype=np.int64)
+        self.state = np.zeros(capacity, dtype=np.int8)
+        self.is_activated = np.zeros(capacity, dtype=bool)
+        # whether the track was given to the removed tracks once
+        self.removed = np.zeros(capacity, dtype=bool)
+        self.score = np.zeros(capacity, dtype=np.float32)
+        self.start_frame = np.zeros(capacity, dtype=np.int64)
+        self.frame_id = np.zeros(capacity, dtype=np.int64)
+        self.track_len = np.zeros(capacity, dtype=np.int64)
+        self._free = list(range(capacity - 1, -1, -1))
+
+        self.tracked = np.zeros(0, dtype=np.int64)
+        self.lost = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.tracked) + len(self.lost)
+
+    def _grow(self, num):
+        capacity = len(self.mean)
+        new_capacity = max(capacity * 2, capacity + num)
+        for name in [
+                'mean', 'covariance', 'smooth_feat', 'track_id', 'state',
+                'is_activated', 'removed', 'score', 'start_frame', 'frame_id',
+                'track_len'
+        ]:
+            array = getattr(self, name)
+            if array is None:
+                continue
+            grown = np.zeros(
+                (new_capacity, ) + array.shape[1:], dtype=array.dtype)
+            grown[:capacity] = array
+            setattr(self, name, grown)
+        self._free = list(range(new_capacity - 1, capacity - 1,
+                                -1)) + self._free
+
+    def _alloc(self, num):
+        if num > len(self._free):
+            self._grow(num - len(self._free))
+        slots = self._free[len(self._free) - num:][::-1]
+        del self._free[len(self._free) - num:]
+        return np.array(slots, dtype=np.int64)
+
+    def tlbr(self, slots):
+        return tlwh_to_tlbr(mean_to_tlwh(self.mean[slots]))
+
+    def features(self, slots):
+        if self.smooth_feat is None:
+            return np.zeros((len(slots), 0), dtype=np.float32)
+        return self.smooth_feat[slots]
+
+    def predict(self, slots):
+        if len(slots) == 0:
+            return
+        mean = self.mean[slots]
+        mean[self.state[slots] != TrackState.Tracked, 7] = 0
+        self.mean[slots], self.covariance[
+            slots] = self.kalman_filter.multi_predict(mean,
+                                                      self.covariance[slots])
+
+    def gating_distance(self, slots, measurements):
+        return self.kalman_filter.multi_gating_distance(
+            self.mean[slots],
+            self.covariance[slots],
+            measurements,
+            metric='maha')
+
+    def activate(self, dets, frame_id):
+        """Start new tracks of the detections, return their slots."""
+        slots = self._alloc(len(dets))
+        if len(slots) == 0:
+            return slots
+        self.mean[slots], self.covariance[
+            slots] = self.kalman_filter.multi_initiate(dets.xyah)
+        if dets.feat is not None:
+            if self.smooth_feat is None:
+                self.smooth_feat = np.zeros(
+                    (len(self.mean), dets.feat.shape[1]), dtype=np.float32)
+            self.smooth_feat[slots] = dets.feat
+        self.track_id[slots] = [
+            BaseTrack.next_id(self.cls_id) for _ in range(len(slots))
+        ]
+        self.state[slots] = TrackState.Tracked
+        self.is_activated[slots] = frame_id == 1
+        self.removed[slots] = False
+        self.score[slots] = dets.score
+        self.start_frame[slots] = frame_id
+        self.frame_id[slots] = frame_id
+        self.track_len[slots] = 0
+        return slots
+
+    def update(self, slots, dets, frame_id):
+        """
+        Update the tracks by their matched detections, as `STrack.update`
+        for tracked tracks and `STrack.re_activate` for the others. Return
+        the slots of the tracked and re-activated tracks.
+        """
+        tracked = self.state[slots] == TrackState.Tracked
+        self.mean[slots], self.covariance[
+            slots] = self.kalman_filter.multi_update(
+                self.mean[slots], self.covariance[slots], dets.xyah)
+        if dets.feat is not None and self.smooth_feat is not None:
+            smooth_feat = self.alpha * self.smooth_feat[slots] + (
+                1.0 - self.alpha) * normalize(dets.feat)
+            self.smooth_feat[slots] = normalize(smooth_feat)
+        self.score[slots[tracked]] = dets.score[tracked]
+        self.track_len[slots] = np.where(tracked,
+                                         self.track_len[slots] + 1, 0)
+        self.state[slots] = TrackState.Tracked
+        self.is_activated[slots] = True
+        self.frame_id[slots] = frame_id
+        return slots[tracked], slots[~tracked]
+
+    def step(self, activated, refined, lost, removed, frame_id,
+             max_time_lost):
+        """
+        Update the tracked and lost tracks at the end of a frame, with the
+        same orders and quirks as the lists of STrack of the original
+        tracker, and free the slots of the tracks left.
+
+        Args:
+            activated (np.ndarray): slots of the updated and new tracks.
+            refined (np.ndarray): slots of the re-activated tracks.
+            lost (np.ndarray): slots of the tracks lost in this frame.
+            removed (np.ndarray): slots of the unconfirmed tracks removed in
+                this frame.
+            frame_id (int): the current frame.
+            max_time_lost (int): frames to keep the lost tracks.
+
+        Returns:
+            The slots of the tracks removed in this frame.
+        """
+        alive = np.concatenate([self.tracked, self.lost, activated])
+        timeout = self.lost[frame_id - self.frame_id[self.lost] >
+                            max_time_lost]
+        self.state[timeout] = TrackState.Removed
+        removed = np.concatenate([removed, timeout])
+
+        tracked = self.tracked[self.state[self.tracked] == TrackState.Tracked]
+        tracked = np.concatenate(
+            [tracked, activated[~np.isin(activated, tracked)]])
+        tracked = np.concatenate(
+            [tracked, refined[~np.isin(refined, tracked)]])
+        lost = np.concatenate([self.lost[~np.isin(self.lost, tracked)], lost])
+        # tracks are dropped from lost tracks by the removed tracks of the
+        # previous frames
+        lost = lost[~self.removed[lost]]
+        self.removed[removed] = True
+
+        # remove duplicate tracks
+        dists = matching.iou_distance(self.tlbr(tracked), self.tlbr(lost))
+        p, q = np.nonzero(dists < 0.15)
+        age = self.frame_id - self.start_frame
+        longer = age[tracked[p]] > age[lost[q]]
+        tracked = np.delete(tracked, p[~longer])
+        lost = np.delete(lost, q[longer])
+
+        self.tracked, self.lost = tracked, lost
+        dead = np.setdiff1d(alive, np.concatenate([tracked, lost]))
+        self._free.extend(dead[::-1].tolist())
+        return removed
+
+    def outputs(self):
+        """Views of the activated tracked tracks."""
+        slots = self.tracked[self.is_activated[self.tracked]]
+        tlwhs = mean_to_tlwh(self.mean[slots])
+        return [
+            TrackView(
+                int(self.track_id[slot]), self.cls_id, self.score[slot], tlwh,
+                int(self.start_frame[slot]), int(self.frame_id[slot]),
+                int(self.track_len[slot]), True, int(self.state[slot]))
+            for slot, tlwh in zip(slots, tlwhs)
+        ]
@@ -21,7 +21,12 @@ from .visualization import plot_tracking_dict, plot_tracking
 __all__ = [
     'MOTTimer',
     'Detection',
+    'MOT_RESULT_DTYPE',
+    'mot_results_to_array',
+    'mot_frame_index',
+    'mot_array_filename',
     'write_mot_results',
+    'load_mot_results',
     'save_vis_results',
     'load_det_results',
     'preprocess_reid',
@@ -108,7 +113,68 @@ class Detection(object):
         return ret
 
 
-def write_mot_results(filename, results, data_type='mot', num_classes=1):
+# one row of the columnar MOT results, see `mot_results_to_array`
+MOT_RESULT_DTYPE = np.dtype([('frame', np.int64), ('id', np.int64),
+                             ('tlwh', np.float64, (4, )),
+                             ('score', np.float64), ('cls_id', np.int64)])
+
+
+def mot_results_to_array(results, data_type='mot', num_classes=1):
+    """
+    Convert the tracking results of a sequence to a structured array of
+    `MOT_RESULT_DTYPE`, rows are the ones written by `write_mot_results`
+    with the same frame ids, stably sorted by frame.
+
+    Args:
+        results (dict): for each class id, a list of (frame_id, tlwhs,
+            scores, track_ids) of the frames.
+        data_type (str): 'mot', 'mcmot' or 'kitti'.
+        num_classes (int): number of classes in results.
+    """
+    chunks = []
+    for cls_id in range(num_classes):
+        for frame_id, tlwhs, tscores, track_ids in results[cls_id]:
+            track_ids = np.asarray(track_ids, dtype=np.int64).reshape(-1)
+            if len(track_ids) == 0:
+                continue
+            rows = np.zeros(len(track_ids), dtype=MOT_RESULT_DTYPE)
+            rows['frame'] = frame_id - 1 if data_type == 'kitti' else frame_id
+            rows['id'] = track_ids
+            rows['tlwh'] = np.asarray(tlwhs, dtype=np.float64).reshape(-1, 4)
+            rows['score'] = np.asarray(tscores, dtype=np.float64).reshape(-1)
+            rows['cls_id'] = -1 if data_type == 'mot' else cls_id
+            chunks.append(rows[track_ids >= 0])
+    if len(chunks) == 0:
+        return np.zeros(0, dtype=MOT_RESULT_DTYPE)
+    array = np.concatenate(chunks)
+    return array[np.argsort(array['frame'], kind='stable')]
+
+
+def mot_frame_index(array):
+    """
+    Frame offset index of a result array sorted by frame, rows of frame
+    `frame_ids[k]` are `array[offsets[k]:offsets[k + 1]]`.
+    """
+    frame_ids, starts = np.unique(array['frame'], return_index=True)
+    offsets = np.append(starts, len(array))
+    return frame_ids, offsets
+
+
+def mot_array_filename(filename):
+    # binary results saved next to the txt file
+    return os.path.splitext(filename)[0] + '.npy'
+
+
+def write_mot_results(filename,
+                      results,
+                      data_type='mot',
+                      num_classes=1,
+                      save_array=True):
+    """
+    Write the tracking results of a sequence to a txt file, and the rows as
+    a `MOT_RESULT_DTYPE` array to the `.npy` file next to it if save_array,
+    which is read by `load_mot_results` without parsing the txt.
+    """
     # support single and multi classes
     if data_type in ['mot', 'mcmot']:
         save_format = '{frame},{id},{x1},{y1},{w},{h},{score},{cls_id},-1,-1\n'
@@ -117,33 +183,53 @@ def write_mot_results(filename, results, data_type='mot', num_classes=1):
     else:
         raise ValueError(data_type)
 
-    f = open(filename, 'w')
+    lines = []
     for cls_id in range(num_classes):
+        save_cls_id = -1 if data_type == 'mot' else cls_id
         for frame_id, tlwhs, tscores, track_ids in results[cls_id]:
             if data_type == 'kitti':
                 frame_id -= 1
-            for tlwh, score, track_id in zip(tlwhs, tscores, track_ids):
-                if track_id < 0: continue
-                if data_type == 'mot':
-                    cls_id = -1
-
-                x1, y1, w, h = tlwh
-                x2, y2 = x1 + w, y1 + h
-                line = save_format.format(
+            lines.extend(
+                save_format.format(
                     frame=frame_id,
                     id=track_id,
-                    x1=x1,
-                    y1=y1,
-                    x2=x2,
-                    y2=y2,
-                    w=w,
-                    h=h,
+                    x1=tlwh[0],
+                    y1=tlwh[1],
+                    x2=tlwh[0] + tlwh[2],
+                    y2=tlwh[1] + tlwh[3],
+                    w=tlwh[2],
+                    h=tlwh[3],
                     score=score,
-                    cls_id=cls_id)
-                f.write(line)
+                    cls_id=save_cls_id)
+                for tlwh, score, track_id in zip(tlwhs, tscores, track_ids)
+                if track_id >= 0)
+    with open(filename, 'w') as f:
+        f.write(''.join(lines))
+    if save_array:
+        np.save(
+            mot_array_filename(filename),
+            mot_results_to_array(results, data_type, num_classes))
     print('MOT results save in {}'.format(filename))
 
 
+def load_mot_results(filename, mmap_mode='r'):
+    """
+    Load the `MOT_RESULT_DTYPE` array saved with the txt result file by
+    `write_mot_results`, memory-mapped by default. Returns None if there is
+    no array or the txt file is newer, e.g. written by other tools.
+    """
+    array_file = mot_array_filename(filename)
+    if not os.path.isfile(array_file):
+        return None
+    if os.path.isfile(filename) and \
+            os.path.getmtime(filename) > os.path.getmtime(array_file):
+        return None
+    array = np.load(array_file, mmap_mode=mmap_mode)
+    if array.dtype != MOT_RESULT_DTYPE:
+        return None
+    return array
+
+
 def save_vis_results(data,
                      frame_id,
                      online_ids,
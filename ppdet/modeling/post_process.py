@@ -201,16 +201,31 @@ class MaskPostProcess(object):
     https://github.com/facebookresearch/detectron2/layers/mask_ops.py
 
     Get Mask output according to the output from model
+
+    Args:
+        binary_thresh (float): threshold to binarize the pasted masks.
+        export_onnx (bool): whether export model to onnx.
+        assign_on_cpu (bool): whether paste masks on cpu.
+        rle_output (bool): whether output COCO RLE of each mask instead of
+            dense [N, h, w] masks, each mask is pasted only inside its box
+            and encoded without building the full image mask. Only used in
+            dynamic mode, exported models always output dense masks.
+        paste_batch_size (int): max number of masks pasted together when
+            rle_output is True.
     """
 
     def __init__(self,
                  binary_thresh=0.5,
                  export_onnx=False,
-                 assign_on_cpu=False):
+                 assign_on_cpu=False,
+                 rle_output=False,
+                 paste_batch_size=16):
         super(MaskPostProcess, self).__init__()
         self.binary_thresh = binary_thresh
         self.export_onnx = export_onnx
         self.assign_on_cpu = assign_on_cpu
+        self.rle_output = rle_output
+        self.paste_batch_size = paste_batch_size
 
     def __call__(self, mask_out, bboxes, bbox_num, origin_shape):
         """
@@ -225,14 +240,29 @@ class MaskPostProcess(object):
             origin_shape (Tensor): The origin shape of the input image, the tensor
                 shape is [N, 2], and each row is [h, w].
         Returns:
-            pred_result (Tensor): The final prediction mask results with shape
-                [N, h, w] in binary mask style.
+            pred_result (Tensor|list): The final prediction mask results with
+                shape [N, h, w] in binary mask style, or the list of COCO RLE
+                of the N masks if rle_output is True.
         """
         num_mask = mask_out.shape[0]
         origin_shape = paddle.cast(origin_shape, 'int32')
         device = paddle.device.get_device()
 
-        if self.export_onnx:
+        if self.rle_output and not self.export_onnx and \
+                paddle.in_dynamic_mode():
+            pred_result = []
+            id_start = 0
+            for i in range(bbox_num.shape[0]):
+                num = int(bbox_num[i])
+                pred_result += paste_mask_rle(
+                    mask_out[id_start:id_start + num, None, :, :],
+                    bboxes[id_start:id_start + num, 2:],
+                    int(origin_shape[i, 0]),
+                    int(origin_shape[i, 1]), self.binary_thresh,
+                    self.paste_batch_size, self.assign_on_cpu)
+                id_start += num
+
+        elif self.export_onnx:
             h, w = origin_shape[0][0], origin_shape[0][1]
             mask_onnx = paste_mask(mask_out[:, None, :, :], bboxes[:, 2:], h, w,
                                    self.assign_on_cpu)
@@ -693,6 +723,119 @@ def paste_mask(masks, boxes, im_h, im_w, assign_on_cpu=False):
     return img_masks[:, 0]
 
 
+def paste_mask_rle(masks,
+                   boxes,
+                   im_h,
+                   im_w,
+                   binary_thresh=0.5,
+                   batch_size=16,
+                   assign_on_cpu=False):
+    """
+    Paste the mask prediction to the original image like `paste_mask`, but
+    only inside the box of each mask, and encode the binarized masks to
+    COCO RLE without building the full image masks.
+
+    Args:
+        masks (Tensor): mask predictions with shape [N, 1, M, M].
+        boxes (Tensor): boxes on the original image with shape [N, 4].
+        im_h (int): height of the original image.
+        im_w (int): width of the original image.
+        binary_thresh (float): threshold to binarize the pasted masks.
+        batch_size (int): max number of masks pasted together.
+        assign_on_cpu (bool): whether paste masks on cpu.
+
+    Returns:
+        rles (list): COCO RLE of the N masks.
+    """
+    num_mask = masks.shape[0]
+    if num_mask == 0:
+        return []
+    boxes_np = boxes.numpy().astype('float64')
+    # bilinear sampling pastes a pixel out of the box by d mask cells with a
+    # value below 0.5 - d, and zero for d >= 0.5, so the masks are the same
+    # as the full image paste with 1 pixel of margin if binary_thresh >= 0.5,
+    # half a mask cell more below, and the full image if binary_thresh <= 0
+    if binary_thresh >= 0.5:
+        margin_x = margin_y = 1
+    elif binary_thresh > 0:
+        margin_x = np.ceil(0.5 * (boxes_np[:, 2] - boxes_np[:, 0]) /
+                           masks.shape[3]) + 1
+        margin_y = np.ceil(0.5 * (boxes_np[:, 3] - boxes_np[:, 1]) /
+                           masks.shape[2]) + 1
+    else:
+        margin_x = margin_y = np.inf
+    x0_int = np.clip(np.floor(boxes_np[:, 0]) - margin_x, 0,
+                     im_w).astype('int64')
+    y0_int = np.clip(np.floor(boxes_np[:, 1]) - margin_y, 0,
+                     im_h).astype('int64')
+    x1_int = np.clip(np.ceil(boxes_np[:, 2]) + margin_x, 0,
+                     im_w).astype('int64')
+    y1_int = np.clip(np.ceil(boxes_np[:, 3]) + margin_y, 0,
+                     im_h).astype('int64')
+    x1_int = np.maximum(x1_int, x0_int)
+    y1_int = np.maximum(y1_int, y0_int)
+
+    if assign_on_cpu:
+        paddle.set_device('cpu')
+    rles = []
+    for start in range(0, num_mask, batch_size):
+        end = min(start + batch_size, num_mask)
+        crop_h = int((y1_int[start:end] - y0_int[start:end]).max())
+        crop_w = int((x1_int[start:end] - x0_int[start:end]).max())
+        if crop_h == 0 or crop_w == 0:
+            crops = np.zeros((end - start, crop_h, crop_w), dtype=bool)
+        else:
+            x0, y0, x1, y1 = paddle.split(boxes[start:end], 4, axis=1)
+            img_y = paddle.to_tensor(
+                y0_int[start:end, None] + np.arange(crop_h) + 0.5,
+                dtype='float32')
+            img_x = paddle.to_tensor(
+                x0_int[start:end, None] + np.arange(crop_w) + 0.5,
+                dtype='float32')
+            img_y = (img_y - y0) / (y1 - y0) * 2 - 1
+            img_x = (img_x - x0) / (x1 - x0) * 2 - 1
+            gx = img_x[:, None, :].expand([end - start, crop_h, crop_w])
+            gy = img_y[:, :, None].expand([end - start, crop_h, crop_w])
+            grid = paddle.stack([gx, gy], axis=3)
+            crops = F.grid_sample(
+                masks[start:end], grid, align_corners=False)[:, 0]
+            crops = (crops >= binary_thresh).numpy()
+        for i in range(start, end):
+            crop = crops[i - start, :y1_int[i] - y0_int[i], :x1_int[i] -
+                         x0_int[i]]
+            rles.append(
+                crop_mask_to_rle(crop, x0_int[i], y0_int[i], im_h, im_w))
+    return rles
+
+
+def crop_mask_to_rle(crop, x0, y0, im_h, im_w):
+    """
+    Encode a binary mask which is zero out of the region [y0:y0 + h,
+    x0:x0 + w] of the image to COCO RLE, given the mask crop of the region
+    with shape [h, w].
+    """
+    import pycocotools.mask as mask_util
+    crop_h = crop.shape[0]
+    # positions of the foreground pixels in the column major image
+    idx = np.flatnonzero(crop.T)
+    pos = (x0 + idx // crop_h) * im_h + y0 + idx % crop_h
+    if len(pos) == 0:
+        counts = [im_h * im_w]
+    else:
+        breaks = np.flatnonzero(np.diff(pos) != 1)
+        run_starts = pos[np.concatenate([[0], breaks + 1])]
+        run_ends = pos[np.concatenate([breaks, [len(pos) - 1]])] + 1
+        # zeros before each run and the run of ones, then the last zeros
+        bounds = np.stack([run_starts, run_ends], axis=1).reshape(-1)
+        counts = np.diff(np.concatenate([[0], bounds])).tolist()
+        if run_ends[-1] < im_h * im_w:
+            counts.append(im_h * im_w - int(run_ends[-1]))
+    return mask_util.frPyObjects({
+        'size': [im_h, im_w],
+        'counts': counts
+    }, im_h, im_w)
+
+
 def multiclass_nms(bboxs, num_classes, match_threshold=0.6, match_metric='iou'):
     final_boxes = []
     for c in range(num_classes):
@@ -0,0 +1,128 @@
+#   Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+
+import unittest
+
+# add python path of PaddleDetection to sys.path
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import numpy as np
+from ppdet.metrics.map_utils import (DetectionMAP, jaccard_overlap,
+                                     jaccard_overlap_matrix)
+
+
+def random_boxes(rng, num, size=100.):
+    xy = rng.rand(num, 2) * size
+    wh = rng.rand(num, 2) * size / 4
+    return np.concatenate([xy, xy + wh], axis=1).astype('float32')
+
+
+class TestJaccardOverlapMatrix(unittest.TestCase):
+    def test_same_as_jaccard_overlap(self):
+        rng = np.random.RandomState(0)
+        preds, gts = random_boxes(rng, 30), random_boxes(rng, 20)
+        # boxes sharing an edge do not overlap
+        gts[0] = [preds[0][2], preds[0][1], preds[0][2] + 5, preds[0][3]]
+        for normalized in [False, True]:
+            overlaps = jaccard_overlap_matrix(preds, gts, normalized)
+            expect = [[jaccard_overlap(p, g, normalized) for g in gts]
+                      for p in preds]
+            np.testing.assert_allclose(overlaps, expect, rtol=1e-6)
+
+
+class TestDetectionMAP(unittest.TestCase):
+    def create_map(self, **kwargs):
+        return DetectionMAP(
+            3, catid2name={i: str(i)
+                           for i in range(3)}, **kwargs)
+
+    def test_match(self):
+        gt_box = np.array(
+            [[0, 0, 10, 10], [20, 20, 30, 30], [40, 40, 50, 50]], 'float32')
+        gt_label = np.array([0, 0, 1])
+        difficult = np.array([0, 0, 1])
+        bbox = np.array(
+            [[0, 0, 10, 10], [1, 1, 10, 10], [20, 20, 30, 30],
+             [40, 40, 50, 50], [60, 60, 70, 70]], 'float32')
+        score = np.array([0.5, 0.9, 0.8, 0.7, 0.6])
+        label = np.array([0, 0, 0, 1, 2])
+        for evaluate_difficult in [False, True]:
+            detection_map = self.create_map(
+                evaluate_difficult=evaluate_difficult)
+            detection_map.update(bbox, score, label, gt_box, gt_label,
+                                 difficult)
+            score_poss = detection_map.class_score_poss
+            # the first prediction of a gt is positive, not the best scored
+            np.testing.assert_equal(score_poss[0],
+                                    [[0.5, 1.], [0.9, 0.], [0.8, 1.]])
+            if evaluate_difficult:
+                np.testing.assert_equal(score_poss[1], [[0.7, 1.]])
+                np.testing.assert_equal(detection_map.class_gt_counts,
+                                        [2, 1, 0])
+            else:
+                # predictions of difficult gts are ignored
+                self.assertEqual(len(score_poss[1]), 0)
+                np.testing.assert_equal(detection_map.class_gt_counts,
+                                        [2, 0, 0])
+            np.testing.assert_equal(score_poss[2], [[0.6, 0.]])
+
+    def test_accumulate(self):
+        gt_box = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], 'float32')
+        gt_label = np.array([0, 0])
+        bbox = np.array(
+            [[0, 0, 10, 10], [50, 50, 60, 60], [20, 20, 30, 30]], 'float32')
+        score = np.array([0.9, 0.8, 0.7])
+        label = np.array([0, 0, 0])
+        # precision 1, 1/2, 2/3 at recall 1/2, 1/2, 1
+        for map_type, expect in [('11point', (6 + 5 * 2 / 3) / 11),
+                                 ('integral', 0.5 + 0.5 * 2 / 3)]:
+            detection_map = self.create_map(map_type=map_type)
+            detection_map.update(bbox, score, label, gt_box, gt_label)
+            detection_map.accumulate()
+            self.assertAlmostEqual(detection_map.get_map(), expect)
+
+    def test_merge_states(self):
+        rng = np.random.RandomState(0)
+        updates = []
+        for _ in range(6):
+            gt_box = random_boxes(rng, 5)
+            bbox = gt_box[rng.randint(0, 5, 8)] + rng.randn(8, 4) * 3
+            updates.append((bbox, rng.rand(8), rng.randint(0, 3, 8), gt_box,
+                            rng.randint(0, 3, 5)))
+
+        detection_map = self.create_map()
+        for update in updates:
+            detection_map.update(*update)
+        detection_map.accumulate()
+
+        merged = self.create_map()
+        states = []
+        for i in range(0, len(updates), 2):
+            part = self.create_map()
+            for update in updates[i:i + 2]:
+                part.update(*update)
+            states.append(part.state())
+        merged.merge_states(states)
+        merged.accumulate()
+        self.assertEqual(merged.get_map(), detection_map.get_map())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+#   Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+
+import pickle
+import shutil
+import tempfile
+import unittest
+
+# add python path of PaddleDetection to sys.path
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import numpy as np
+import paddle
+from ppdet.data.reader import DistributedEvalBatchSampler
+from ppdet.metrics import COCOMetric, VOCMetric
+from ppdet.modeling.tests.test_stream_coco_eval import (
+    NUM_CLASSES, StreamingCOCOeval, random_batches, random_coco)
+
+
+def shard_batches(batches, nranks):
+    # batches of every rank of DistributedEvalBatchSampler
+    return [[
+        batches[i]
+        for i, in DistributedEvalBatchSampler(
+            batches, 1, num_replicas=nranks, rank=rank)
+    ] for rank in range(nranks)]
+
+
+def run_sharded(create_metric, batches, nranks=3):
+    """Update one metric per rank, gather the states as all_gather_object."""
+    states = []
+    for rank_batches in shard_batches(batches, nranks):
+        metric = create_metric()
+        for inputs, outputs in rank_batches:
+            metric.update(inputs, outputs)
+        states.append(pickle.loads(pickle.dumps(metric.state())))
+    metric = create_metric()
+    metric.set_states(states)
+    metric.accumulate()
+    return metric
+
+
+class TestDistributedEvalBatchSampler(unittest.TestCase):
+    def test_same_batches(self):
+        for num_samples in [1, 7, 23, 64]:
+            dataset = list(range(num_samples))
+            for batch_size in [1, 4, 8]:
+                for nranks in [2, 3, 8]:
+                    batches = []
+                    for rank in range(nranks):
+                        sampler = DistributedEvalBatchSampler(
+                            dataset,
+                            batch_size,
+                            num_replicas=nranks,
+                            rank=rank)
+                        rank_batches = list(sampler)
+                        self.assertEqual(len(rank_batches), len(sampler))
+                        batches += rank_batches
+                    ref = paddle.io.BatchSampler(
+                        dataset, batch_size=batch_size)
+                    self.assertEqual(batches, list(ref))
+
+
+class TestGatherCOCOMetric(unittest.TestCase):
+    stream_eval = False
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.anno_file = os.path.join(self.tmp_dir, 'anno.json')
+        random_coco(self.anno_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def create_metric(self, name):
+        metric = COCOMetric(
+            self.anno_file,
+            clsid2catid={i: i + 1
+                         for i in range(NUM_CLASSES)},
+            output_eval=os.path.join(self.tmp_dir, name),
+            stream_eval=self.stream_eval)
+        # keep results to be saved by rank 0 as on several devices
+        metric._keep_results = True
+        return metric
+
+    def read_json(self, name):
+        with open(os.path.join(self.tmp_dir, name, 'bbox.json')) as f:
+            return f.read()
+
+    def test_same_as_one_device(self):
+        batches = random_batches(batch_size=2)
+        ref = self.create_metric('ref')
+        for inputs, outputs in batches:
+            ref.update(inputs, outputs)
+        ref.accumulate()
+        out = run_sharded(lambda: self.create_metric('out'), batches)
+        self.assertTrue(
+            np.array_equal(ref.get_results()['bbox'], out.get_results()[
+                'bbox']))
+        self.assertEqual(self.read_json('ref'), self.read_json('out'))
+
+
+@unittest.skipIf(StreamingCOCOeval is None, 'cocoeval_ext is not available')
+class TestGatherStreamCOCOMetric(TestGatherCOCOMetric):
+    stream_eval = True
+
+
+class TestGatherVOCMetric(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.label_list = os.path.join(self.tmp_dir, 'label_list.txt')
+        with open(self.label_list, 'w') as f:
+            f.write('\n'.join(str(i) for i in range(NUM_CLASSES)))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def create_metric(self):
+        return VOCMetric(
+            self.label_list, class_num=NUM_CLASSES, map_type='integral')
+
+    def random_batches(self, seed=0):
+        rng = np.random.RandomState(seed)
+        batches = []
+        for inputs, outputs in random_batches(batch_size=2, seed=seed):
+            num_images = len(inputs['im_id'])
+            # VOC labels are not negative
+            outputs['bbox'][:, 0] = np.abs(outputs['bbox'][:, 0])
+            # ground truth near some of the detections
+            gt_boxes, gt_labels, difficults = [], [], []
+            starts = np.cumsum(outputs['bbox_num']) - outputs['bbox_num']
+            for start, num in zip(starts, outputs['bbox_num']):
+                dets = outputs['bbox'][start:start + num]
+                dets = dets[rng.rand(num) < 0.7]
+                n = len(dets) + 1
+                xy = rng.uniform(0, 60, (1, 2))
+                boxes = np.concatenate(
+                    [dets[:, 2:], np.concatenate(
+                        [xy, xy + 20], axis=1)])
+                gt_boxes.append(boxes + rng.uniform(-3, 3, (n, 4)))
+                gt_labels.append(
+                    np.concatenate([dets[:, :1], [[0]]]).astype(np.int32))
+                difficults.append(rng.randint(0, 2, (n, 1)))
+            inputs.update({
+                'gt_bbox': gt_boxes,
+                'gt_class': gt_labels,
+                'difficult': difficults,
+                'scale_factor': np.ones((num_images, 2), dtype=np.float32)
+            })
+            batches.append((inputs, outputs))
+        return batches
+
+    def test_same_as_one_device(self):
+        batches = self.random_batches()
+        ref = self.create_metric()
+        for inputs, outputs in batches:
+            ref.update(inputs, outputs)
+        ref.accumulate()
+        out = run_sharded(self.create_metric, batches)
+        self.assertEqual(ref.get_results(), out.get_results())
+        self.assertEqual(ref.results, out.results)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#   Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+
+import unittest
+
+# add python path of PaddleDetection to sys.path
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import numpy as np
+import paddle
+from ppdet.engine.eval_session import EvalSession
+
+
+class CountingLoader(object):
+    def __init__(self, num_batches=3):
+        self.num_batches = num_batches
+        self.num_reads = 0
+
+    def __len__(self):
+        return self.num_batches
+
+    def __iter__(self):
+        self.num_reads += 1
+        for i in range(self.num_batches):
+            yield {
+                'image': paddle.full([2, 3, 8, 8], i, dtype='float32'),
+                'im_id': paddle.to_tensor([[2 * i], [2 * i + 1]]),
+                'im_file': ['{}.jpg'.format(2 * i), '{}.jpg'.format(2 * i + 1)]
+            }
+
+
+class TestEvalSession(unittest.TestCase):
+    def check_batches(self, batches):
+        self.assertEqual(len(batches), 3)
+        for i, batch in enumerate(batches):
+            self.assertIsInstance(batch['image'], paddle.Tensor)
+            self.assertEqual(batch['image'].dtype, paddle.float32)
+            self.assertTrue(np.all(batch['image'].numpy() == i))
+            self.assertEqual(batch['im_id'].numpy().tolist(),
+                             [[2 * i], [2 * i + 1]])
+            self.assertEqual(batch['im_file'][1], '{}.jpg'.format(2 * i + 1))
+
+    def test_cache(self):
+        loader = CountingLoader()
+        session = EvalSession(loader, cache_size=1)
+        for _ in range(3):
+            self.check_batches(list(session))
+        self.assertTrue(session.cached)
+        self.assertEqual(loader.num_reads, 1)
+
+    def test_no_cache(self):
+        for cache_size in [0, 1e-3]:
+            loader = CountingLoader()
+            session = EvalSession(loader, cache_size=cache_size)
+            for _ in range(3):
+                self.check_batches(list(session))
+            self.assertFalse(session.cached)
+            self.assertEqual(loader.num_reads, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+#   Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+
+import unittest
+
+# add python path of PaddleDetection to sys.path
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import cv2
+import numpy as np
+from ppdet.modeling.mot.motion import GMC
+from ppdet.modeling.mot.tracker import BOTSORTTracker
+from ppdet.modeling.mot.tracker.base_jde_tracker import BaseTrack
+
+
+def panning_frames(num=8, height=360, width=640, step=(3, 2)):
+    # a camera moving by `step` pixels per frame over a textured scene
+    rng = np.random.RandomState(0)
+    scene = (rng.rand(height + 100, width + 100, 3) * 255).astype(np.uint8)
+    scene = cv2.GaussianBlur(scene, (7, 7), 2)
+    return [
+        np.ascontiguousarray(scene[i * step[1]:i * step[1] + height, i * step[
+            0]:i * step[0] + width]) for i in range(num)
+    ]
+
+
+class TestGMC(unittest.TestCase):
+    def setUp(self):
+        self.frames = panning_frames()
+        self.dets = np.array([[50, 50, 150, 250], [300, 100, 400, 300]])
+
+    def test_sparse_opt_flow(self):
+        gmc = GMC(min_keypoints=100, mask_detections=True)
+        warps = [gmc.apply(frame, self.dets) for frame in self.frames]
+        np.testing.assert_allclose(warps[0], np.eye(2, 3))
+        for H in warps[1:]:
+            np.testing.assert_allclose(H[:, :2], np.eye(2), atol=1e-3)
+            np.testing.assert_allclose(H[:, 2], [-3, -2], atol=0.1)
+
+    def test_async(self):
+        sync_gmc = GMC(min_keypoints=100, mask_detections=True)
+        async_gmc = GMC(min_keypoints=100, mask_detections=True)
+        for frame in self.frames:
+            future = async_gmc.submit(frame)
+            np.testing.assert_allclose(
+                async_gmc.result(future, self.dets),
+                sync_gmc.apply(frame, self.dets))
+        async_gmc.close()
+
+    def test_tracker_prefetch(self):
+        outputs = []
+        for prefetch in [False, True]:
+            BaseTrack.init_count(1)
+            tracker = BOTSORTTracker(camera_motion=True)
+            boxes = []
+            for i, frame in enumerate(self.frames):
+                if prefetch:
+                    tracker.prefetch(frame[None])
+                # no detections in the third frame, its motion is composed
+                # into the motion of the next update
+                if i == 2:
+                    continue
+                dets = np.array(
+                    [[0, 0.9, 200 - 3 * i, 100 - 2 * i, 260 - 3 * i,
+                      220 - 2 * i]],
+                    dtype=np.float32)
+                tracks = tracker.update(dets, img=frame[None])
+                boxes.append([(t.track_id, t.tlwh) for t in tracks])
+            tracker.close()
+            outputs.append(boxes)
+        for sync, prefetched in zip(*outputs):
+            self.assertEqual(len(sync), len(prefetched))
+            for (id0, tlwh0), (id1, tlwh1) in zip(sync, prefetched):
+                self.assertEqual(id0, id1)
+                np.testing.assert_allclose(tlwh0, tlwh1, atol=1.)
+
+
+if __name__ == '__main__':
+    unittest.main()
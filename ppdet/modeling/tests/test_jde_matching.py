@@ -0,0 +1,95 @@
+#   Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+
+import unittest
+
+# add python path of PaddleDetection to sys.path
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import numpy as np
+from ppdet.modeling.mot.matching import jde_matching as matching
+from ppdet.modeling.mot.matching.ocsort_matching import iou_batch
+from ppdet.modeling.mot.motion import KalmanFilter
+from ppdet.modeling.mot.tracker.base_jde_tracker import STrack
+
+
+def loop_bbox_ious(boxes, query_boxes):
+    # the per pair loops of the original JDE matching
+    boxes = np.asarray(boxes, dtype=np.float32)
+    query_boxes = np.asarray(query_boxes, dtype=np.float32)
+    ious = np.zeros((len(boxes), len(query_boxes)), dtype=np.float32)
+    for k in range(len(query_boxes)):
+        box_area = ((query_boxes[k, 2] - query_boxes[k, 0] + 1) *
+                    (query_boxes[k, 3] - query_boxes[k, 1] + 1))
+        for n in range(len(boxes)):
+            iw = (min(boxes[n, 2], query_boxes[k, 2]) - max(
+                boxes[n, 0], query_boxes[k, 0]) + 1)
+            if iw > 0:
+                ih = (min(boxes[n, 3], query_boxes[k, 3]) - max(
+                    boxes[n, 1], query_boxes[k, 1]) + 1)
+                if ih > 0:
+                    ua = float((boxes[n, 2] - boxes[n, 0] + 1) * (boxes[
+                        n, 3] - boxes[n, 1] + 1) + box_area - iw * ih)
+                    ious[n, k] = iw * ih / ua
+    return ious
+
+
+def random_boxes(rng, num):
+    xy = rng.uniform(0, 100, (num, 2))
+    wh = rng.uniform(-3, 40, (num, 2))
+    return np.concatenate([xy, xy + wh], axis=1)
+
+
+class TestJDEMatching(unittest.TestCase):
+    def test_bbox_ious(self):
+        rng = np.random.RandomState(0)
+        for n, k in [(0, 5), (5, 0), (1, 1), (17, 23), (40, 40)]:
+            boxes, query_boxes = random_boxes(rng, n), random_boxes(rng, k)
+            ious = matching.bbox_ious(boxes, query_boxes)
+            self.assertEqual(ious.dtype, np.float32)
+            self.assertTrue(
+                np.array_equal(ious, loop_bbox_ious(boxes, query_boxes)))
+
+    def test_iou_batch(self):
+        rng = np.random.RandomState(2)
+        dets = np.abs(random_boxes(rng, 20)).astype(np.float32)
+        trks = np.abs(random_boxes(rng, 10))
+        ious = iou_batch(dets, trks)
+        self.assertEqual(ious.shape, (20, 10))
+        self.assertTrue(np.all(np.isfinite(ious)))
+
+    def test_tracks_tlbr(self):
+        rng = np.random.RandomState(3)
+        tlwhs = rng.uniform(1, 50, (6, 4))
+        tracks = [STrack(tlwh, 0.9, 0) for tlwh in tlwhs]
+        kalman_filter = KalmanFilter()
+        for track in tracks[:4]:
+            track.activate(kalman_filter, 1)
+        STrack.multi_predict(tracks[:4], kalman_filter)
+        ref = np.asarray([track.tlbr for track in tracks], dtype=np.float32)
+        self.assertTrue(np.array_equal(matching.tracks_tlbr(tracks), ref))
+        self.assertTrue(
+            np.array_equal(
+                matching.iou_distance(tracks, tracks[::-1]),
+                1 - loop_bbox_ious(ref, ref[::-1])))
+
+
+if __name__ == '__main__':
+    unittest.main()
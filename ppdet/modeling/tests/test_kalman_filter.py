@@ -0,0 +1,99 @@
+#   Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+
+import unittest
+
+# add python path of PaddleDetection to sys.path
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import numpy as np
+from ppdet.modeling.mot.motion import KalmanFilter
+from ppdet.modeling.mot.motion.ocsort_kalman_filter import OCSORTKalmanFilter
+from ppdet.modeling.mot.tracker.ocsort_tracker import KalmanBoxTracker
+
+
+class TestKalmanFilterBatch(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.kf = KalmanFilter()
+        self.measurement = np.concatenate(
+            [rng.uniform(0, 500, (6, 2)), rng.uniform(0.3, 0.6, (6, 1)),
+             rng.uniform(50, 150, (6, 1))], 1).astype(np.float32)
+
+    def test_multi_initiate(self):
+        mean, covariance = self.kf.multi_initiate(self.measurement)
+        for i, m in enumerate(self.measurement):
+            m0, c0 = self.kf.initiate(m)
+            np.testing.assert_allclose(mean[i], m0)
+            np.testing.assert_allclose(covariance[i], c0)
+
+    def test_multi_update(self):
+        mean, covariance = self.kf.multi_initiate(self.measurement)
+        mean, covariance = self.kf.multi_predict(mean, covariance)
+        measurement = self.measurement + np.float32(2.)
+        new_mean, new_covariance = self.kf.multi_update(mean, covariance,
+                                                        measurement)
+        for i in range(len(measurement)):
+            m0, c0 = self.kf.update(mean[i], covariance[i], measurement[i])
+            np.testing.assert_allclose(new_mean[i], m0, rtol=1e-5)
+            np.testing.assert_allclose(
+                new_covariance[i], c0, rtol=1e-4, atol=1e-4)
+
+    def test_multi_gating_distance(self):
+        mean, covariance = self.kf.multi_initiate(self.measurement)
+        measurement = self.measurement[::-1] + np.float32(5.)
+        for only_position in [False, True]:
+            for metric in ['maha', 'gaussian']:
+                dist = self.kf.multi_gating_distance(
+                    mean, covariance, measurement, only_position, metric)
+                for i in range(len(mean)):
+                    d0 = self.kf.gating_distance(mean[i], covariance[i],
+                                                 measurement, only_position,
+                                                 metric)
+                    np.testing.assert_allclose(dist[i], d0, rtol=1e-4)
+        self.assertEqual(
+            self.kf.multi_gating_distance(mean, covariance,
+                                          np.zeros((0, 4))).shape, (6, 0))
+
+
+class TestOCSORTKalmanFilterBatch(unittest.TestCase):
+    def test_multi_update(self):
+        rng = np.random.RandomState(0)
+        xy = rng.uniform(0, 500, (5, 2))
+        bboxes = np.concatenate([xy, xy + 50, np.ones((5, 1))], 1)
+        trackers = [KalmanBoxTracker(bbox) for bbox in bboxes]
+        refs = [KalmanBoxTracker(bbox) for bbox in bboxes]
+        for trk in trackers + refs:
+            trk.predict()
+        bboxes += rng.randn(5, 5)
+        KalmanBoxTracker.multi_update(trackers, bboxes)
+        for trk, ref, bbox in zip(trackers, refs, bboxes):
+            ref.update(bbox)
+            np.testing.assert_allclose(trk.kf.x, ref.kf.x, rtol=1e-6)
+            np.testing.assert_allclose(trk.kf.P, ref.kf.P, rtol=1e-6)
+            self.assertEqual(trk.hits, ref.hits)
+        # no filter to update
+        OCSORTKalmanFilter.multi_update([], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
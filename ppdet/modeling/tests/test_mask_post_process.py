@@ -0,0 +1,87 @@
+#   Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+
+import unittest
+
+# add python path of PaddleDetection to sys.path
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import numpy as np
+import paddle
+from ppdet.metrics.json_results import get_seg_res
+from ppdet.modeling.post_process import MaskPostProcess
+
+
+class TestMaskPostProcessRLE(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.origin_shape = np.array([[60, 80], [90, 50]], 'int32')
+        self.bbox_num = np.array([7, 5], 'int32')
+        bboxes = []
+        for (h, w), num in zip(self.origin_shape, self.bbox_num):
+            xy = rng.rand(num, 2) * [w, h] - 5
+            wh = rng.rand(num, 2) * [w, h] * 0.7
+            boxes = np.concatenate([xy, xy + wh], axis=1)
+            # box of the whole image and empty box
+            boxes[0] = [0, 0, w, h]
+            boxes[1] = [3, 3, 3, 3]
+            labels = rng.randint(0, 3, (num, 1))
+            scores = rng.rand(num, 1)
+            bboxes.append(np.concatenate([labels, scores, boxes], axis=1))
+        self.bboxes = np.concatenate(bboxes).astype('float32')
+        mask_out = rng.rand(len(self.bboxes), 28, 28)
+        # saturated mask probabilities
+        mask_out[mask_out > 0.9] = 1.
+        self.mask_out = mask_out.astype('float32')
+
+    def post_process(self, **kwargs):
+        masks = MaskPostProcess(**kwargs)(
+            paddle.to_tensor(self.mask_out),
+            paddle.to_tensor(self.bboxes),
+            paddle.to_tensor(self.bbox_num),
+            paddle.to_tensor(self.origin_shape))
+        if isinstance(masks, paddle.Tensor):
+            masks = masks.numpy()
+        return get_seg_res(masks, self.bboxes, self.bbox_num,
+                           np.array([[1], [2]]), {0: 1,
+                                                  1: 2,
+                                                  2: 3})
+
+    def test_same_as_dense(self):
+        expect = self.post_process()
+        for batch_size in [1, 3, 16]:
+            results = self.post_process(
+                rle_output=True, paste_batch_size=batch_size)
+            self.assertEqual(results, expect)
+
+    def test_low_thresh_large_boxes(self):
+        # boxes much larger than the masks, so that half a mask cell spans
+        # several pixels out of the box
+        self.origin_shape = self.origin_shape * 6
+        self.bboxes[:, 2:] *= 6
+        for binary_thresh in [0.3, 0.5, 0.7]:
+            expect = self.post_process(binary_thresh=binary_thresh)
+            results = self.post_process(
+                binary_thresh=binary_thresh, rle_output=True)
+            self.assertEqual(results, expect)
+
+
+if __name__ == '__main__':
+    unittest.main()
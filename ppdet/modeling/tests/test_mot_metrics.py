@@ -0,0 +1,217 @@
+#   Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+
+import shutil
+import tempfile
+import unittest
+
+# add python path of PaddleDetection to sys.path
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import numpy as np
+from ppdet.metrics.mot_metrics import (
+    MOT_METRICS, KITTIEvaluation, MOTEvaluator, MOTMetric, mm, read_mot_arrays,
+    read_mot_results, unzip_objs)
+from ppdet.modeling.mot.utils import (load_mot_results, mot_frame_index,
+                                      write_mot_results)
+
+
+def write_sequence(data_root, seq, seed, num_frames=60, num_objs=12,
+                   duplicate_ids=False):
+    """
+    Write gt.txt of a random sequence and the results of a noisy tracker
+    with misses, false positives and id switches, returns the result file.
+    """
+    rng = np.random.RandomState(seed)
+    os.makedirs(os.path.join(data_root, seq, 'gt'))
+    pos = rng.rand(num_objs, 2) * 500
+    vel = rng.randn(num_objs, 2) * 3
+    size = rng.rand(num_objs, 2) * 50 + 20
+    start = rng.randint(1, num_frames, num_objs)
+    hyp_ids = np.arange(num_objs) + 100
+    gt_lines, res_lines = [], []
+    for frame in range(1, num_frames + 1):
+        if rng.rand() < 0.05:
+            # frame without results
+            continue
+        for i in np.flatnonzero(start <= frame):
+            x, y = pos[i] + vel[i] * frame
+            label = 1 if rng.rand() > 0.1 else rng.choice([2, 3, 7])
+            gt_lines.append('{},{},{:.2f},{:.2f},{:.2f},{:.2f},{},{},{:.2f}'.
+                            format(frame, i + 1, x, y, size[i][0], size[i][
+                                1], int(rng.rand() > 0.03), label, rng.rand()))
+            if rng.rand() < 0.15:
+                continue
+            if rng.rand() < 0.03:
+                hyp_ids[i] = rng.randint(1000, 2000)
+            if duplicate_ids and rng.rand() < 0.03:
+                hyp_ids[i] = hyp_ids[rng.randint(num_objs)]
+            x, y = np.array([x, y]) + rng.randn(2) * 4
+            res_lines.append('{},{},{:.2f},{:.2f},{:.2f},{:.2f},1,-1,-1,-1'.
+                             format(frame, hyp_ids[i], x, y, size[i][0],
+                                    size[i][1]))
+        for k in range(rng.poisson(1.)):
+            x, y = rng.rand(2) * 500
+            res_lines.append('{},{},{:.2f},{:.2f},30,60,1,-1,-1,-1'.format(
+                frame, 5000 + frame * 10 + k, x, y))
+    with open(os.path.join(data_root, seq, 'gt', 'gt.txt'), 'w') as f:
+        f.write('\n'.join(gt_lines))
+    result_filename = os.path.join(data_root, seq + '.txt')
+    with open(result_filename, 'w') as f:
+        f.write('\n'.join(res_lines))
+    return result_filename
+
+
+class TestMOTEvaluator(unittest.TestCase):
+    def setUp(self):
+        self.data_root = tempfile.mkdtemp()
+        self.seqs = ['MOT17-02', 'MOT17-04', 'other']
+        self.result_files = [
+            write_sequence(
+                self.data_root, seq, seed, duplicate_ids=seed == 1)
+            for seed, seq in enumerate(self.seqs)
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.data_root)
+
+    def evaluate(self):
+        accs = [
+            MOTEvaluator(self.data_root, seq, 'mot').eval_file(result_file)
+            for seq, result_file in zip(self.seqs, self.result_files)
+        ]
+        return MOTEvaluator.get_summary(accs, self.seqs, MOT_METRICS)
+
+    @unittest.skipIf(mm is None, 'motmetrics is not installed')
+    def test_same_as_motmetrics(self):
+        accs = []
+        for seq, result_file in zip(self.seqs, self.result_files):
+            evaluator = MOTEvaluator(self.data_root, seq, 'mot')
+            results = read_mot_results(result_file)
+            for frame_id in sorted(results.keys()):
+                tlwhs, ids = unzip_objs(results[frame_id])[:2]
+                evaluator.eval_frame(frame_id, tlwhs, np.array(ids))
+            accs.append(evaluator.acc)
+        expect = MOTEvaluator.get_summary(accs, self.seqs, MOT_METRICS)
+        summary = self.evaluate()
+        np.testing.assert_allclose(
+            summary.values.astype(float),
+            expect.values.astype(float),
+            atol=1e-6)
+        mh = mm.metrics.create()
+        self.assertEqual(
+            MOTEvaluator.render_summary(summary),
+            mm.io.render_summary(
+                expect,
+                formatters=mh.formatters,
+                namemap=mm.io.motchallenge_metric_names))
+
+    def test_workers(self):
+        summaries = []
+        for num_workers in [0, 2]:
+            metric = MOTMetric(num_workers=num_workers)
+            for seq, result_file in zip(self.seqs, self.result_files):
+                metric.update(self.data_root, seq, 'mot', self.data_root,
+                              result_file)
+            metric.accumulate()
+            summaries.append(metric.get_results())
+        self.assertEqual(summaries[0], summaries[1])
+        self.assertEqual(summaries[0],
+                         MOTEvaluator.render_summary(self.evaluate()))
+
+    def test_result_array(self):
+        for seq, result_file in zip(self.seqs, self.result_files):
+            results = {0: []}
+            for frame_id, objs in sorted(read_mot_results(result_file).items()):
+                tlwhs, ids, scores = unzip_objs(objs)
+                results[0].append((frame_id, tlwhs, scores, ids))
+            filename = os.path.join(self.data_root, seq + '_bulk.txt')
+            write_mot_results(filename, results)
+
+            array = load_mot_results(filename)
+            self.assertIsNotNone(array)
+            expect = read_mot_arrays(result_file)
+            np.testing.assert_array_equal(array['frame'], expect['frame'])
+            np.testing.assert_array_equal(array['id'], expect['id'])
+            np.testing.assert_array_equal(array['tlwh'], expect['tlwh'])
+            frame_ids, offsets = mot_frame_index(array)
+            for k, frame_id in enumerate(frame_ids):
+                rows = array[offsets[k]:offsets[k + 1]]
+                self.assertTrue(np.all(rows['frame'] == frame_id))
+
+            evaluator = MOTEvaluator(self.data_root, seq, 'mot')
+            self.assertEqual(
+                evaluator.eval_file(filename), evaluator.eval_file(result_file))
+
+
+class TestKITTIEvaluation(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for sub in ['images', 'labels', 'results']:
+            os.makedirs(os.path.join(self.root, sub))
+        gt_format = '{} {} {} 0 0 -1 {} {} {} {} 1 1 1 0 0 0 0'
+        res_format = '{} {} car 0 0 -10 {} {} {} {} -10 -10 -10 -1000 -1000 -1000 -10'
+        box0, box1 = [0, 0, 100, 100], [500, 0, 600, 100]
+        gt_lines = [gt_format.format(f, 0, 'Car', *box0) for f in range(5)]
+        gt_lines += [gt_format.format(f, 1, 'Car', *box1) for f in range(3)]
+        gt_lines.append(gt_format.format(1, -1, 'DontCare', 300, 300, 400,
+                                         400))
+        # object 0 is missed in frame 2 and tracked by id 2 after it,
+        # object 1 switches from id 7 to 8 in frame 2
+        res_lines = [
+            res_format.format(f, tid, *box0)
+            for f, tid in [(0, 1), (1, 1), (3, 2), (4, 2)]
+        ]
+        res_lines += [
+            res_format.format(f, tid, *box1)
+            for f, tid in [(0, 7), (1, 7), (2, 8)]
+        ]
+        # a false positive, one in the DontCare area and one too small
+        res_lines.append(res_format.format(0, 20, 700, 700, 800, 800))
+        res_lines.append(res_format.format(1, 21, 310, 310, 390, 390))
+        res_lines.append(res_format.format(2, 22, 700, 700, 800, 710))
+        with open(os.path.join(self.root, 'labels', '0000.txt'), 'w') as f:
+            f.write('\n'.join(gt_lines))
+        with open(os.path.join(self.root, 'results', '0000.txt'), 'w') as f:
+            f.write('\n'.join(res_lines))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_metrics(self):
+        e = KITTIEvaluation(
+            result_path=os.path.join(self.root, 'results'),
+            gt_path=os.path.join(self.root, 'images'),
+            n_frames=[5],
+            seqs=['0000'],
+            n_sequences=1)
+        self.assertTrue(e.loadTracker())
+        self.assertTrue(e.loadGroundtruth())
+        self.assertTrue(e.compute3rdPartyMetrics())
+        self.assertEqual((e.tp, e.fp, e.fn, e.n_itr), (7, 1, 1, 2))
+        self.assertEqual((e.id_switches, e.fragments), (1, 2))
+        self.assertEqual((e.MT, e.PT, e.ML), (0.5, 0.5, 0.))
+        self.assertAlmostEqual(e.MOTA, 1 - 3 / 8.)
+        self.assertAlmostEqual(e.MOTP, 1.)
+        self.assertIn('Fragmentations', e.createSummary())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+#   Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+
+import unittest
+
+# add python path of PaddleDetection to sys.path
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import numpy as np
+from ppdet.modeling.keypoint_utils import (oks_iou, oks_iou_batch, oks_nms,
+                                           oks_nms_batch)
+
+
+def random_persons(rng, num_persons, num_joints=17):
+    """
+    Keypoints of persons around a few centers, so that some of them are
+    duplicates with high oks.
+    """
+    centers = rng.rand(max(num_persons // 3, 1), num_joints, 3) * 200
+    kpts = centers[rng.randint(len(centers), size=num_persons)]
+    kpts = kpts + rng.randn(num_persons, num_joints, 3) * rng.choice(
+        [0.5, 5., 20.], size=(num_persons, 1, 1))
+    kpts[..., 2] = rng.rand(num_persons, num_joints)
+    return kpts.astype('float32'), rng.rand(num_persons), rng.uniform(
+        2000, 8000, size=num_persons)
+
+
+class TestOKSNMS(unittest.TestCase):
+    def test_oks_iou_batch(self):
+        rng = np.random.RandomState(0)
+        kpts, _, areas = random_persons(rng, 12)
+        kpts = kpts.reshape(1, 12, -1)
+        ious = oks_iou_batch(kpts, areas[None])
+        for i in range(12):
+            np.testing.assert_array_equal(
+                ious[0, i], oks_iou(kpts[0, i], kpts[0], areas[i], areas))
+
+    def test_same_as_oks_nms(self):
+        rng = np.random.RandomState(1)
+        num_persons = rng.randint(0, 20, size=16)
+        max_persons = num_persons.max()
+        kpts = np.zeros((16, max_persons, 17 * 3), dtype='float32')
+        scores = np.zeros((16, max_persons))
+        areas = np.zeros((16, max_persons))
+        expects = []
+        for i, n in enumerate(num_persons):
+            img_kpts, img_scores, img_areas = random_persons(rng, n)
+            kpts[i, :n] = img_kpts.reshape(n, 17 * 3)
+            scores[i, :n] = img_scores
+            areas[i, :n] = img_areas
+            expects.append(
+                oks_nms([{
+                    'keypoints': img_kpts[k],
+                    'score': img_scores[k],
+                    'area': img_areas[k]
+                } for k in range(n)], 0.9))
+
+        keep = oks_nms_batch(kpts, scores, areas, num_persons, 0.9)
+        for i, expect in enumerate(expects):
+            self.assertEqual(keep[i][keep[i] >= 0].tolist(), list(expect))
+        self.assertLess(sum(map(len, expects)), num_persons.sum())
+
+
+if __name__ == '__main__':
+    unittest.main()
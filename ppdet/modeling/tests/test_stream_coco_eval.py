@@ -0,0 +1,271 @@
+#   Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import unittest
+
+# add python path of PaddleDetection to sys.path
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import numpy as np
+from pycocotools.coco import COCO
+from pycocotools.cocoeval import COCOeval
+from ppdet.metrics import COCOMetric
+from ppdet.metrics.metrics import SNIPERCOCOMetric
+
+try:
+    from ppdet.metrics.fast_cocoeval import FastCOCOeval, StreamingCOCOeval
+except ImportError:
+    FastCOCOeval = StreamingCOCOeval = None
+
+NUM_IMAGES = 24
+NUM_CLASSES = 3
+
+
+def random_coco(anno_file, seed=0):
+    rng = np.random.RandomState(seed)
+    images = [{
+        'id': i + 1,
+        'file_name': '{}.jpg'.format(i + 1),
+        'width': 100,
+        'height': 100
+    } for i in range(NUM_IMAGES)]
+    annotations = []
+    for image in images:
+        for _ in range(rng.randint(0, 6)):
+            x, y = rng.uniform(0, 60, 2)
+            w, h = rng.uniform(5, 40, 2)
+            annotations.append({
+                'id': len(annotations) + 1,
+                'image_id': image['id'],
+                'category_id': int(rng.randint(1, NUM_CLASSES + 1)),
+                'bbox': [x, y, w, h],
+                'area': w * h,
+                'iscrowd': int(rng.rand() < 0.1),
+                'segmentation': [[x, y, x + w, y, x + w, y + h, x, y + h]],
+            })
+    categories = [{
+        'id': i + 1,
+        'name': str(i + 1)
+    } for i in range(NUM_CLASSES)]
+    with open(anno_file, 'w') as f:
+        json.dump({
+            'images': images,
+            'annotations': annotations,
+            'categories': categories
+        }, f)
+
+
+def random_batches(batch_size=4, seed=0):
+    rng = np.random.RandomState(seed)
+    batches = []
+    for start in range(1, NUM_IMAGES + 1, batch_size):
+        im_id = np.arange(start, start + batch_size).reshape(-1, 1)
+        bbox_num = rng.randint(0, 8, batch_size)
+        n = int(bbox_num.sum())
+        xy = rng.uniform(0, 60, (n, 2))
+        wh = rng.uniform(5, 40, (n, 2))
+        bbox = np.concatenate(
+            [
+                rng.randint(-1, NUM_CLASSES, (n, 1)),
+                rng.choice([0.5, 0.7, 0.9], (n, 1)), xy, xy + wh
+            ],
+            axis=1).astype(np.float32)
+        batches.append(({
+            'im_id': im_id
+        }, {
+            'bbox': bbox,
+            'bbox_num': bbox_num
+        }))
+    return batches
+
+
+def jittered_batches(anno_file, batch_size=4, seed=0):
+    # detections near the ground truth, for non-zero AP
+    rng = np.random.RandomState(seed)
+    with open(anno_file) as f:
+        annotations = json.load(f)['annotations']
+    batches = []
+    for start in range(1, NUM_IMAGES + 1, batch_size):
+        im_id = np.arange(start, start + batch_size).reshape(-1, 1)
+        anns = [[ann for ann in annotations if ann['image_id'] == i]
+                for i in im_id.reshape(-1)]
+        bbox_num = np.array([len(a) for a in anns])
+        bbox = [[
+            ann['category_id'] - 1, rng.rand(), ann['bbox'][0],
+            ann['bbox'][1], ann['bbox'][0] + ann['bbox'][2],
+            ann['bbox'][1] + ann['bbox'][3]
+        ] for a in anns for ann in a]
+        bbox = np.array(bbox, dtype=np.float32).reshape(-1, 6)
+        bbox[:, 2:] += rng.uniform(-4, 4, (len(bbox), 4))
+        batches.append(({
+            'im_id': im_id
+        }, {
+            'bbox': bbox,
+            'bbox_num': bbox_num
+        }))
+    return batches
+
+
+@unittest.skipIf(StreamingCOCOeval is None, 'cocoeval_ext is not available')
+class TestStreamCOCOEval(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.anno_file = os.path.join(self.tmp_dir, 'anno.json')
+        random_coco(self.anno_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_metric(self, stream_eval):
+        output_eval = os.path.join(self.tmp_dir, str(stream_eval))
+        metric = COCOMetric(
+            self.anno_file,
+            clsid2catid={i: i + 1
+                         for i in range(NUM_CLASSES)},
+            output_eval=output_eval,
+            stream_eval=stream_eval)
+        for inputs, outputs in random_batches():
+            metric.update(inputs, outputs)
+        metric.accumulate()
+        with open(os.path.join(output_eval, 'bbox.json')) as f:
+            saved = f.read()
+        return metric.get_results(), saved
+
+    def test_same_as_json_eval(self):
+        ref, ref_saved = self.run_metric(False)
+        out, out_saved = self.run_metric(True)
+        self.assertTrue(np.array_equal(ref['bbox'], out['bbox']))
+        self.assertEqual(ref_saved, out_saved)
+
+    def test_no_saved_results(self):
+        ref, _ = self.run_metric(False)
+        metric = COCOMetric(
+            self.anno_file,
+            clsid2catid={i: i + 1
+                         for i in range(NUM_CLASSES)},
+            output_eval=os.path.join(self.tmp_dir, 'unsaved'),
+            stream_eval=True,
+            save_json=False)
+        for inputs, outputs in random_batches():
+            metric.update(inputs, outputs)
+        metric.accumulate()
+        self.assertTrue(np.array_equal(ref['bbox'], metric.get_results()[
+            'bbox']))
+        self.assertFalse(
+            os.path.exists(
+                os.path.join(self.tmp_dir, 'unsaved', 'bbox.json')))
+
+    def test_sniper(self):
+        class Cropper(object):
+            # the chips are the whole images
+            def aggregate_chips_detections(self, results):
+                return results
+
+        class Dataset(object):
+            anno_cropper = Cropper()
+
+        ref, _ = self.run_metric(False)
+        for stream_eval in [False, True]:
+            metric = SNIPERCOCOMetric(
+                self.anno_file,
+                clsid2catid={i: i + 1
+                             for i in range(NUM_CLASSES)},
+                output_eval=os.path.join(self.tmp_dir, 'sniper'),
+                stream_eval=stream_eval,
+                dataset=Dataset())
+            for inputs, outputs in random_batches():
+                metric.update(inputs, outputs)
+            metric.accumulate()
+            self.assertTrue(
+                np.array_equal(ref['bbox'], metric.get_results()['bbox']))
+
+    def test_repeated_eval(self):
+        # evaluations of several epochs by one metric, as in training
+        results = []
+        for stream_eval in [False, True]:
+            metric = COCOMetric(
+                self.anno_file,
+                clsid2catid={i: i + 1
+                             for i in range(NUM_CLASSES)},
+                output_eval=os.path.join(self.tmp_dir, str(stream_eval)),
+                stream_eval=stream_eval)
+            stats = []
+            for seed in [0, 1, 0]:
+                for inputs, outputs in jittered_batches(
+                        self.anno_file, seed=seed):
+                    metric.update(inputs, outputs)
+                metric.accumulate()
+                stats.append(metric.get_results()['bbox'])
+                coco_gt = metric.coco_gt
+                metric.reset()
+            self.assertIs(metric.coco_gt, coco_gt)
+            self.assertGreater(stats[0][0], 0)
+            self.assertFalse(np.array_equal(stats[0], stats[1]))
+            self.assertTrue(np.array_equal(stats[0], stats[2]))
+            results.append(stats)
+        self.assertTrue(np.array_equal(results[0], results[1]))
+
+
+@unittest.skipIf(FastCOCOeval is None, 'cocoeval_ext is not available')
+class TestFastCOCOeval(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        anno_file = os.path.join(self.tmp_dir, 'anno.json')
+        random_coco(anno_file)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.coco_gt = COCO(anno_file)
+        rng = np.random.RandomState(1)
+        self.results = []
+        for ann in self.coco_gt.dataset['annotations']:
+            box = np.array(ann['bbox']) + rng.uniform(-3, 3, 4)
+            self.results.append({
+                'image_id': ann['image_id'],
+                'category_id': int(rng.randint(1, NUM_CLASSES + 1)),
+                'bbox': np.abs(box).tolist(),
+                'score': float(rng.choice([0.5, rng.rand()]))
+            })
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_eval(self, eval_class, num_workers=0):
+        with contextlib.redirect_stdout(io.StringIO()):
+            coco_dt = self.coco_gt.loadRes(self.results)
+            coco_eval = eval_class(self.coco_gt, coco_dt, 'bbox')
+            coco_eval.num_workers = num_workers
+            coco_eval.evaluate()
+            coco_eval.accumulate()
+            coco_eval.summarize()
+        return coco_eval.stats
+
+    def test_same_as_cocoeval(self):
+        ref = self.run_eval(COCOeval)
+        for num_workers in [0, 2]:
+            stats = self.run_eval(FastCOCOeval, num_workers)
+            self.assertTrue(np.allclose(ref, stats, rtol=0, atol=1e-12))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+#   Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+
+import unittest
+
+# add python path of PaddleDetection to sys.path
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import numpy as np
+from ppdet.modeling.mot.tracker import JDETracker
+from ppdet.modeling.mot.tracker.base_jde_tracker import BaseTrack
+
+
+def moving_scene(seed, frames=20, objs=30, emb_dim=16):
+    rng = np.random.RandomState(seed)
+    pos = rng.uniform(0, 1000, (objs, 2))
+    vel = rng.uniform(-3, 3, (objs, 2))
+    size = rng.uniform(30, 80, (objs, 2))
+    feat = rng.randn(objs, emb_dim)
+    for _ in range(frames):
+        pos += vel
+        vis = rng.rand(objs) > 0.1
+        num = vis.sum()
+        xy = pos[vis] + rng.randn(num, 2)
+        wh = size[vis]
+        score = rng.uniform(0.5, 1.0, num)
+        dets = np.concatenate(
+            [np.zeros((num, 1)), score[:, None], xy, xy + wh], 1)
+        embs = feat[vis] + rng.randn(num, emb_dim) * 0.1
+        yield dets.astype(np.float32), embs.astype(np.float32)
+
+
+def crossing_scene(seed, frames=12, objs=8, num_classes=1, emb_dim=8):
+    rng = np.random.RandomState(seed)
+    pos = rng.uniform(0, 300, (objs, 2))
+    vel = rng.uniform(-8, 8, (objs, 2))
+    size = rng.uniform(30, 60, (objs, 2))
+    cls = np.arange(objs) % num_classes
+    feat = rng.randn(objs, emb_dim)
+    for _ in range(frames):
+        pos += vel
+        vis = rng.rand(objs) > 0.2
+        num = vis.sum()
+        xy = pos[vis] + rng.randn(num, 2)
+        score = rng.uniform(0.1, 1.0, num)
+        dets = np.concatenate(
+            [cls[vis, None], score[:, None], xy, xy + size[vis]], 1)
+        embs = feat[vis] + rng.randn(num, emb_dim) * 0.3
+        yield dets.astype(np.float32), embs.astype(np.float32)
+
+
+# outputs of the JDETracker on lists of STrack, before the track table: the
+# ids of every frame and class, and the (id, tlwh) of the last frame
+FROZEN_SCENES = {
+    'jde': {
+        'use_byte': False,
+        'use_emb': True,
+        'num_classes': 1,
+        'seed': 0,
+        'ids': [[[1, 2, 3, 4, 5, 6]],
+                [[1, 4, 5, 6]],
+                [[4, 5, 6, 7, 2, 3]],
+                [[4, 5, 6, 7, 2, 3]],
+                [[5, 6, 7, 2, 1]],
+                [[1]],
+                [[4, 3, 5, 7, 2]],
+                [[4, 3, 6, 1]],
+                [[4, 1, 5, 7, 2]],
+                [[4, 5, 7, 2, 6]],
+                [[4, 7, 2, 6, 1]],
+                [[7, 6, 5]]],
+        'boxes': [[(7, [-23.77, 80.05, 36.31, 33.87]),
+                   (6, [173.71, 262.34, 50.0, 50.12]),
+                   (5, [169.17, 243.81, 50.93, 31.81])]],
+    },
+    'byte': {
+        'use_byte': True,
+        'use_emb': False,
+        'num_classes': 1,
+        'seed': 1,
+        'ids': [[[1, 2, 3, 4, 5]],
+                [[1, 2, 3, 4]],
+                [[1, 2, 3, 4, 8, 5]],
+                [[1, 2, 4, 8]],
+                [[1, 2, 4, 3, 5]],
+                [[2, 4, 3, 8]],
+                [[2, 3, 9]],
+                [[3, 9, 1, 4]],
+                [[3, 9, 1, 5, 2]],
+                [[9, 1, 10, 8, 4]],
+                [[10, 8, 4]],
+                [[10, 8, 2, 9, 1]]],
+        'boxes': [[(10, [101.26, 115.71, 50.6, 55.04]),
+                   (8, [-69.78, 185.14, 57.26, 38.81]),
+                   (2, [-69.85, 33.98, 50.76, 39.47]),
+                   (9, [20.82, 140.52, 30.55, 52.5]),
+                   (1, [109.49, 227.33, 58.74, 45.99])]],
+    },
+    'byte_emb': {
+        'use_byte': True,
+        'use_emb': True,
+        'num_classes': 1,
+        'seed': 2,
+        'ids': [[[1, 2, 3]],
+                [[1, 3]],
+                [[3, 4, 6]],
+                [[3]],
+                [[3, 8, 2, 1, 4, 6]],
+                [[8, 10, 1, 4, 6]],
+                [[10, 1, 3, 2]],
+                [[3, 2, 6]],
+                [[3, 2, 8]],
+                [[2, 8, 1]],
+                [[2, 8, 1, 4, 6, 3]],
+                [[2, 1, 3]]],
+        'boxes': [[(2, [47.9, 107.77, 34.87, 51.02]),
+                   (1, [230.5, 50.71, 45.16, 41.61]),
+                   (3, [18.37, 98.79, 58.94, 45.0])]],
+    },
+    'two_classes': {
+        'use_byte': False,
+        'use_emb': True,
+        'num_classes': 2,
+        'seed': 3,
+        'ids': [[[1, 2], [1, 2]],
+                [[1, 2], [2]],
+                [[], [2]],
+                [[1, 2], [2]],
+                [[1], [2]],
+                [[], []],
+                [[], [2]],
+                [[6, 1], [5, 7]],
+                [[6, 8], []],
+                [[6, 8], [7]],
+                [[6, 8, 1], [2, 5]],
+                [[6, 1], [9, 2, 5]]],
+        'boxes': [[(6, [74.66, 223.9, 57.08, 55.37]),
+                   (1, [224.56, 305.97, 49.6, 46.74])],
+                  [(9, [27.32, -1.94, 40.85, 36.75]),
+                   (2, [294.59, 211.23, 47.59, 38.5]),
+                   (5, [41.77, 136.49, 41.34, 32.77])]],
+    },
+}
+
+
+class TestJDETrackerTable(unittest.TestCase):
+    def test_tracks(self):
+        BaseTrack.init_count(1)
+        tracker = JDETracker(num_classes=1, conf_thres=0.4)
+        tracker.max_time_lost = 5
+        for dets, embs in moving_scene(0):
+            outputs = tracker.update(dets, embs)
+        tracks = outputs[0]
+        self.assertGreater(len(tracks), 20)
+        ids = [t.track_id for t in tracks]
+        self.assertEqual(len(ids), len(set(ids)))
+        # the objects keep their first ids
+        self.assertLessEqual(max(ids), 40)
+        table = tracker.track_tables[0]
+        self.assertLessEqual(len(table.mean), 128)
+
+    def test_frozen_scenes(self):
+        for name, scene in FROZEN_SCENES.items():
+            num_classes = scene['num_classes']
+            BaseTrack.init_count(num_classes)
+            tracker = JDETracker(
+                use_byte=scene['use_byte'],
+                num_classes=num_classes,
+                conf_thres=0.4)
+            tracker.max_time_lost = 3
+            ids = []
+            for dets, embs in crossing_scene(
+                    scene['seed'], num_classes=num_classes):
+                outputs = tracker.update(dets, embs
+                                         if scene['use_emb'] else None)
+                ids.append([[t.track_id for t in outputs[c]]
+                            for c in range(num_classes)])
+            self.assertEqual(ids, scene['ids'], name)
+            for c, boxes in enumerate(scene['boxes']):
+                self.assertEqual([t.track_id for t in outputs[c]],
+                                 [tid for tid, _ in boxes], name)
+                np.testing.assert_allclose(
+                    [t.tlwh for t in outputs[c]],
+                    np.array([tlwh for _, tlwh in boxes]).reshape(-1, 4),
+                    atol=1e-2,
+                    err_msg=name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+#   Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+
+import copy
+import unittest
+
+# add python path of PaddleDetection to sys.path
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+from ppdet.data.transform.batch_operators import Gt2YoloTarget
+from ppdet.data.transform.op_helper import jaccard_overlap
+import numpy as np
+
+ANCHORS = [[10, 13], [16, 30], [33, 23], [30, 61], [62, 45], [59, 119],
+           [116, 90], [156, 198], [373, 326]]
+ANCHOR_MASKS = [[6, 7, 8], [3, 4, 5], [0, 1, 2]]
+DOWNSAMPLE_RATIOS = [32, 16, 8]
+
+
+def gt2yolotarget_naive(samples, anchors, anchor_masks, downsample_ratios,
+                        num_classes, iou_thresh):
+    """
+    Per-box reference of Gt2YoloTarget
+    """
+    h, w = samples[0]['image'].shape[1:3]
+    an_hw = np.array(anchors) / np.array([[w, h]])
+    for sample in samples:
+        gt_bbox = sample['gt_bbox']
+        gt_class = sample['gt_class']
+        if 'gt_score' not in sample:
+            sample['gt_score'] = np.ones(
+                (gt_bbox.shape[0], 1), dtype=np.float32)
+        gt_score = sample['gt_score']
+        for i, (mask, downsample_ratio
+                ) in enumerate(zip(anchor_masks, downsample_ratios)):
+            grid_h = int(h / downsample_ratio)
+            grid_w = int(w / downsample_ratio)
+            target = np.zeros(
+                (len(mask), 6 + num_classes, grid_h, grid_w), dtype=np.float32)
+            for b in range(gt_bbox.shape[0]):
+                gx, gy, gw, gh = gt_bbox[b, :]
+                cls = gt_class[b]
+                score = gt_score[b, 0]
+                if gw <= 0. or gh <= 0. or score <= 0.:
+                    continue
+                best_iou = 0.
+                best_idx = -1
+                for an_idx in range(an_hw.shape[0]):
+                    iou = jaccard_overlap(
+                        [0., 0., gw, gh],
+                        [0., 0., an_hw[an_idx, 0], an_hw[an_idx, 1]])
+                    if iou > best_iou:
+                        best_iou = iou
+                        best_idx = an_idx
+                gi = int(gx * grid_w)
+                gj = int(gy * grid_h)
+                if best_idx in mask:
+                    best_n = mask.index(best_idx)
+                    target[best_n, 0, gj, gi] = gx * grid_w - gi
+                    target[best_n, 1, gj, gi] = gy * grid_h - gj
+                    target[best_n, 2, gj, gi] = np.log(
+                        gw * w / anchors[best_idx][0])
+                    target[best_n, 3, gj, gi] = np.log(
+                        gh * h / anchors[best_idx][1])
+                    target[best_n, 4, gj, gi] = 2.0 - gw * gh
+                    target[best_n, 5, gj, gi] = score
+                    target[best_n, 6 + cls, gj, gi] = 1.
+                if iou_thresh < 1:
+                    for idx, mask_i in enumerate(mask):
+                        if mask_i == best_idx: continue
+                        iou = jaccard_overlap(
+                            [0., 0., gw, gh],
+                            [0., 0., an_hw[mask_i, 0], an_hw[mask_i, 1]])
+                        if iou > iou_thresh and target[idx, 5, gj, gi] == 0.:
+                            target[idx, 0, gj, gi] = gx * grid_w - gi
+                            target[idx, 1, gj, gi] = gy * grid_h - gj
+                            target[idx, 2, gj, gi] = np.log(
+                                gw * w / anchors[mask_i][0])
+                            target[idx, 3, gj, gi] = np.log(
+                                gh * h / anchors[mask_i][1])
+                            target[idx, 4, gj, gi] = 2.0 - gw * gh
+                            target[idx, 5, gj, gi] = score
+                            target[idx, 6 + cls, gj, gi] = 1.
+            sample['target{}'.format(i)] = target
+        sample.pop('gt_class')
+        sample.pop('gt_score')
+    return samples
+
+
+def random_samples(batch_size, num_boxes, num_classes, size=320, seed=0):
+    rng = np.random.RandomState(seed)
+    samples = []
+    for _ in range(batch_size):
+        n = rng.randint(0, num_boxes + 1)
+        xy = rng.uniform(0., 0.999, (n, 2))
+        # small boxes so that many share a grid cell
+        wh = rng.choice([0., 0.01, 0.05, 0.1, 0.3, 0.6], (n, 2)) + \
+            rng.uniform(0., 0.02, (n, 2))
+        sample = {
+            'image': np.zeros(
+                (3, size, size), dtype=np.float32),
+            'gt_bbox': np.concatenate(
+                [xy, wh], axis=1).astype(np.float32),
+            'gt_class': rng.randint(
+                0, num_classes, (n, 1)).astype(np.int32),
+        }
+        if rng.rand() < 0.5:
+            sample['gt_score'] = rng.choice(
+                [0., 0.5, 1.], (n, 1)).astype(np.float32)
+        samples.append(sample)
+    return samples
+
+
+class TestGt2YoloTarget(unittest.TestCase):
+    def setUp(self):
+        self.num_classes = 5
+        self.iou_thresh = 1.
+        self.batch_size = 8
+        self.num_boxes = 150
+
+    def run_both(self, seed):
+        samples = random_samples(self.batch_size, self.num_boxes,
+                                 self.num_classes, seed=seed)
+        ref = gt2yolotarget_naive(
+            copy.deepcopy(samples), ANCHORS, ANCHOR_MASKS, DOWNSAMPLE_RATIOS,
+            self.num_classes, self.iou_thresh)
+        op = Gt2YoloTarget(ANCHORS, ANCHOR_MASKS, DOWNSAMPLE_RATIOS,
+                           self.num_classes, self.iou_thresh)
+        out = op(copy.deepcopy(samples))
+        return ref, out
+
+    def test_bit_identical(self):
+        for seed in range(5):
+            ref, out = self.run_both(seed)
+            for r, o in zip(ref, out):
+                self.assertEqual(sorted(r.keys()), sorted(o.keys()))
+                for i in range(len(ANCHOR_MASKS)):
+                    key = 'target{}'.format(i)
+                    self.assertEqual(r[key].shape, o[key].shape)
+                    self.assertTrue(
+                        np.array_equal(
+                            r[key].view(np.uint32), o[key].view(np.uint32)))
+
+
+class TestGt2YoloTargetIouThresh(TestGt2YoloTarget):
+    def setUp(self):
+        super(TestGt2YoloTargetIouThresh, self).setUp()
+        self.iou_thresh = 0.2
+
+
+if __name__ == '__main__':
+    unittest.main()
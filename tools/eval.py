@@ -142,6 +142,9 @@ def run(FLAGS, cfg):
         # load ARSL_weights
         trainer.load_weights(cfg.weights, ARSL_eval=True)
     else:
+        if FLAGS.slice_infer:
+            # slices of an image are merged on the same device
+            cfg['distributed_eval'] = False
         # build trainer
         trainer = Trainer(cfg, mode='eval')
         #load weights
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Pack the images of a dataset into a few large shard files, to be read by
+PackedCOCODataSet, e.g.
+
+    python tools/pack_images.py --image_dir dataset/coco/train2017 \
+        --anno_path dataset/coco/annotations/instances_train2017.json \
+        --output_dir dataset/coco/train2017_pack
+"""
+
+import os
+import sys
+import json
+import argparse
+from tqdm import tqdm
+
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 2)))
+sys.path.insert(0, parent_path)
+
+from ppdet.data.source.packed import ImagePackWriter
+
+IMG_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def list_images(image_dir, anno_path=None):
+    if anno_path is not None:
+        with open(anno_path) as f:
+            images = json.load(f)['images']
+        return sorted(set(im['file_name'] for im in images))
+    files = []
+    for root, _, fnames in os.walk(image_dir, followlinks=True):
+        for fname in fnames:
+            if fname.lower().endswith(IMG_EXTENSIONS):
+                files.append(
+                    os.path.relpath(os.path.join(root, fname), image_dir))
+    return sorted(files)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--image_dir', required=True, help='directory of the images')
+    parser.add_argument(
+        '--anno_path',
+        default=None,
+        help='coco annotation file, only pack the images it lists. '
+        'Pack all images under image_dir if not set.')
+    parser.add_argument(
+        '--output_dir', required=True, help='output directory of the pack')
+    parser.add_argument(
+        '--shard_size', type=int, default=1024, help='shard size in MB')
+    args = parser.parse_args()
+
+    files = list_images(args.image_dir, args.anno_path)
+    with ImagePackWriter(args.output_dir, args.shard_size << 20) as writer:
+        for fname in tqdm(files):
+            path = os.path.join(args.image_dir, fname)
+            if not os.path.isfile(path):
+                print('Image {} not found, skip it.'.format(path))
+                continue
+            writer.add_file(fname, path)
+
+
+if __name__ == '__main__':
+    main()